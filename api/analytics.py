@@ -0,0 +1,161 @@
+"""
+Agregados de vendas para o dashboard
+
+As tabelas sales_daily_rollups (bot/dia) e sales_plan_daily_rollups
+(bot/plano/dia) são mantidas pelo trigger sales_rollups_after_insert
+(migrations/004_sales_rollup_trigger.sql) na mesma transação do INSERT em
+sales; vendas inseridas pela API ou pelas rotas do Next.js entram nos
+agregados sem nenhum estado em memória.
+
+As consultas do dashboard leem apenas esses agregados (O(dias)), em
+páginas pela chave primária: o max-rows do PostgREST (1000) cortaria sem
+aviso os totais de quem tem muitos bots ou muitos dias.
+"""
+
+import logging
+from datetime import datetime, date, timezone
+from typing import Dict, Any, Optional, List, Tuple
+
+from .queries import select
+from .pagination import iter_keyset_rows
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = "sales_daily_rollups"
+PLAN_ROLLUP_TABLE = "sales_plan_daily_rollups"
+
+# Chaves primárias (ordem das páginas)
+ROLLUP_KEY = ("day", "bot_id")
+PLAN_ROLLUP_KEY = ("day", "bot_id", "plan_id")
+
+class SalesAnalytics:
+    """Responde às consultas do dashboard a partir dos agregados diários"""
+
+    def _load_days(self, bot_ids: List[str], since: Optional[date] = None) -> Dict[Tuple[str, str], Dict[str, float]]:
+        """
+        Agregados diários dos bots por (bot_id, dia)
+
+        Com since, só os dias a partir dele e, antes dele, os dias com acessos
+        sem expiração (que continuam ativos)
+        """
+        def build_query():
+            query = select(
+                "analytics.days", ROLLUP_TABLE,
+                ("bot_id", "day", "sales_count", "revenue", "lifetime_count", "expiring_count")
+            ).in_("bot_id", bot_ids)
+            if since:
+                query.params = query.params.add("or", f"(day.gte.{since.isoformat()},lifetime_count.gt.0)")
+            return query
+
+        rows = {}
+        for row in iter_keyset_rows(build_query, ROLLUP_KEY):
+            rows[(row["bot_id"], row["day"])] = {
+                "sales_count": row["sales_count"],
+                "revenue": float(row["revenue"]),
+                "lifetime_count": row["lifetime_count"],
+                "expiring_count": row["expiring_count"]
+            }
+
+        return rows
+
+    def _load_plans(
+        self,
+        bot_ids: List[str],
+        start: Optional[date],
+        end: Optional[date]
+    ) -> Dict[str, Dict[str, float]]:
+        """Totais por plano no período"""
+        def build_query():
+            query = select(
+                "analytics.plans", PLAN_ROLLUP_TABLE, ("bot_id", "plan_id", "day", "sales_count", "revenue")
+            ).in_("bot_id", bot_ids)
+            if start:
+                query = query.gte("day", start.isoformat())
+            if end:
+                query = query.lte("day", end.isoformat())
+            return query
+
+        totals: Dict[str, Dict[str, float]] = {}
+        for row in iter_keyset_rows(build_query, PLAN_ROLLUP_KEY):
+            total = totals.setdefault(row["plan_id"], {"sales_count": 0, "revenue": 0.0})
+            total["sales_count"] += row["sales_count"]
+            total["revenue"] += float(row["revenue"])
+
+        return totals
+
+    def summary(
+        self,
+        bot_ids: List[str],
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """
+        Totais de vendas dos bots no período e acessos ativos hoje
+
+        Acessos ativos = vendas sem expiração + vendas que expiram de hoje em
+        diante (granularidade de dia).
+
+        Returns:
+            Dicionário com total_sales, total_revenue, active_users e daily
+        """
+        if not bot_ids:
+            return {"total_sales": 0, "total_revenue": 0.0, "active_users": 0, "daily": []}
+
+        today = datetime.now(timezone.utc).date()
+        # Antes do período só interessam os acessos sem expiração; expirações
+        # contam de hoje em diante
+        since = min(start, today) if start else None
+        today = today.isoformat()
+        by_day: Dict[str, Dict[str, float]] = {}
+        active_users = 0
+
+        for (_, day), values in self._load_days(bot_ids, since).items():
+            active_users += values["lifetime_count"]
+            if day >= today:
+                active_users += values["expiring_count"]
+
+            if values["sales_count"] and _in_range(day, start, end):
+                total = by_day.setdefault(day, {"sales_count": 0, "revenue": 0.0})
+                total["sales_count"] += values["sales_count"]
+                total["revenue"] += values["revenue"]
+
+        daily = [
+            {"day": day, "sales": int(values["sales_count"]), "revenue": round(values["revenue"], 2)}
+            for day, values in sorted(by_day.items())
+        ]
+
+        return {
+            "total_sales": sum(item["sales"] for item in daily),
+            "total_revenue": round(sum(values["revenue"] for values in by_day.values()), 2),
+            "active_users": int(active_users),
+            "daily": daily
+        }
+
+    def top_plans(
+        self,
+        bot_ids: List[str],
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """Planos com maior receita no período"""
+        if not bot_ids:
+            return []
+
+        totals = self._load_plans(bot_ids, start, end)
+        ranking = sorted(totals.items(), key=lambda item: item[1]["revenue"], reverse=True)
+
+        return [
+            {"plan_id": plan_id, "sales": int(values["sales_count"]), "revenue": round(values["revenue"], 2)}
+            for plan_id, values in ranking[:limit]
+        ]
+
+def _in_range(day: str, start: Optional[date], end: Optional[date]) -> bool:
+    if start and day < start.isoformat():
+        return False
+    if end and day > end.isoformat():
+        return False
+    return True
+
+# Instância global usada pelo dashboard
+sales_analytics = SalesAnalytics()
@@ -0,0 +1,95 @@
+"""
+Autenticação das rotas de configuração da API
+
+Dois níveis, lidos do cabeçalho Authorization: Bearer <token>:
+
+    admin   o token é o ADMIN_API_TOKEN (operação; compara em tempo constante)
+    dono    o token é o JWT da sessão do Supabase de quem é dono do bot
+            (bots.owner_id = auth.uid(), a mesma regra das políticas RLS);
+            o admin também passa
+
+Sem ADMIN_API_TOKEN configurado as rotas de admin ficam fechadas (403):
+a configuração nunca fica aberta por omissão.
+
+Variáveis de ambiente:
+    ADMIN_API_TOKEN    token das rotas de administração (sem ele, ficam fechadas)
+"""
+
+import os
+import hmac
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import Header, HTTPException, status
+from dotenv import load_dotenv
+
+from .database import get_db
+from .queries import select
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+
+def bearer_token(authorization: Optional[str]) -> str:
+    """Token do cabeçalho Authorization (vazio se ausente ou em outro esquema)"""
+    scheme, _, token = (authorization or "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else ""
+
+def is_admin(token: str, admin_token: str = None) -> bool:
+    admin_token = ADMIN_API_TOKEN if admin_token is None else admin_token
+    return bool(admin_token) and hmac.compare_digest(token.encode("utf-8"), admin_token.encode("utf-8"))
+
+def _unauthorized(detail: str = "Não autenticado") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+async def require_admin(authorization: Optional[str] = Header(None)):
+    """Dependência: só o token de administração"""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administração desativada (ADMIN_API_TOKEN não configurado)"
+        )
+    if not is_admin(bearer_token(authorization)):
+        raise _unauthorized()
+
+async def session_user_id(token: str) -> Optional[str]:
+    """ID do usuário da sessão do Supabase, ou None se o JWT não for válido"""
+    try:
+        response = await asyncio.to_thread(get_db().auth.get_user, token)
+    except Exception as e:
+        logger.warning(f"Sessão recusada: {str(e)}")
+        return None
+    user = getattr(response, "user", None)
+    return str(user.id) if user is not None else None
+
+async def require_bot_owner(bot_token: str, authorization: Optional[str] = Header(None)):
+    """Dependência: dono do bot do caminho (bot_token) ou admin"""
+    token = bearer_token(authorization)
+    if not token:
+        raise _unauthorized()
+    if is_admin(token):
+        return
+
+    user_id = await session_user_id(token)
+    if user_id is None:
+        raise _unauthorized("Sessão inválida")
+
+    response = await select("auth.bot_owner", "bots", ("owner_id",)).eq("token", bot_token).execute_shared()
+    if not response.data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bot não encontrado"
+        )
+    if str(response.data[0].get("owner_id")) != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Bot de outro usuário"
+        )
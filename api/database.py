@@ -2,6 +2,9 @@ import os
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from .tracing import instrument_supabase
+from .resilience import protect_supabase
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -25,6 +28,9 @@ def get_db():
     global _client
     if _client is None:
         _client = get_supabase_client()
+        # O span envolve o breaker: chamadas recusadas também aparecem nos traces
+        protect_supabase(_client)
+        instrument_supabase(_client)
     return _client
 
 # Definição das tabelas principais
@@ -40,8 +46,8 @@ REMINDERS_TABLE = "reminders"
 
 async def get_user_by_id(user_id: str):
     """Busca um usuário pelo ID"""
-    client = get_db()
-    response = client.table(USERS_TABLE).select("*").eq("id", user_id).execute()
+    from .queries import select, USER_COLUMNS
+    response = select("database.user_by_id", USERS_TABLE, USER_COLUMNS).eq("id", user_id).execute()
     
     if len(response.data) == 0:
         return None
@@ -50,8 +56,8 @@ async def get_user_by_id(user_id: str):
 
 async def get_bot_by_token(bot_token: str):
     """Busca um bot pelo token"""
-    client = get_db()
-    response = client.table(BOTS_TABLE).select("*").eq("token", bot_token).execute()
+    from .queries import select, BOT_COLUMNS
+    response = select("database.bot_by_token", BOTS_TABLE, BOT_COLUMNS).eq("token", bot_token).execute()
     
     if len(response.data) == 0:
         return None
@@ -0,0 +1,279 @@
+"""
+Verificações de saúde das dependências (GET /health/live e /health/ready)
+
+As verificações rodam em uma task de fundo a cada `interval` segundos e o
+resultado fica em cache; os probes do balanceador só leem o cache, então
+custam o mesmo que /health e não multiplicam consultas ao banco.
+
+Cada verificação reporta status (ok, degraded, down), latência e erro. A
+instância fica pronta (ready) quando todas as verificações críticas estão
+recentes e nenhuma está down. Verificações locais da instância (event loop)
+também a tiram do balanceamento quando degraded. Já uma dependência
+compartilhada (shared=True, ex.: o banco) lenta fica apenas reportada como
+degraded: todas as instâncias a veem igual, e drená-las juntas por um round
+trip lento derrubaria o serviço inteiro. Falhas de verificações não críticas
+(gateways de pagamento, tamanho do pool de Applications, que não diminui)
+aparecem no relatório sem drenar a instância.
+
+Variáveis de ambiente:
+    HEALTH_CHECK_INTERVAL     segundos entre rodadas (padrão: 10)
+    HEALTH_CHECK_TIMEOUT      tempo máximo de cada verificação (padrão: 3)
+    HEALTH_MAX_APPLICATIONS   Applications do Telegram antes de degradar (padrão: 500)
+"""
+
+import os
+import time
+import asyncio
+import inspect
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Callable, List
+
+import httpx
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = "ok"
+STATUS_DEGRADED = "degraded"
+STATUS_DOWN = "down"
+
+class CheckResult:
+    """Último resultado de uma verificação"""
+
+    def __init__(self, status: str, latency_ms: float, error: Optional[str] = None, details: Any = None):
+        self.status = status
+        self.latency_ms = latency_ms
+        self.error = error
+        self.details = details
+        self.checked_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "status": self.status,
+            "latency_ms": round(self.latency_ms, 2),
+            "checked_at": datetime.fromtimestamp(self.checked_at, timezone.utc).isoformat()
+        }
+        if self.error:
+            data["error"] = self.error
+        if self.details is not None:
+            data["details"] = self.details
+        return data
+
+class HealthCheck:
+    """Verificação registrada no monitor"""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        critical: bool = True,
+        degraded_ms: Optional[float] = None,
+        timeout: Optional[float] = None,
+        shared: bool = False
+    ):
+        """
+        Args:
+            name: Nome no relatório
+            func: Função (síncrona ou async) que levanta exceção se a dependência
+                estiver fora do ar; pode retornar detalhes (ou um status explícito
+                em {"status": ..., ...})
+            critical: Se False, a falha não tira a instância do balanceamento
+            degraded_ms: Latência acima da qual o status vira degraded
+            timeout: Tempo máximo da verificação (padrão: o do monitor)
+            shared: Dependência compartilhada por todas as instâncias; só down
+                (não degraded) tira a instância do balanceamento
+        """
+        self.name = name
+        self.func = func
+        self.critical = critical
+        self.degraded_ms = degraded_ms
+        self.timeout = timeout
+        self.shared = shared
+        self.result: Optional[CheckResult] = None
+        self.consecutive_failures = 0
+
+class HealthMonitor:
+    """Executa as verificações periodicamente e responde os probes a partir do cache"""
+
+    def __init__(self, interval: float = 10.0, timeout: float = 3.0):
+        self.interval = interval
+        self.timeout = timeout
+        self.checks: Dict[str, HealthCheck] = {}
+        self.started_at = time.time()
+        self.task: Optional[asyncio.Task] = None
+        self.rounds = 0
+
+    def add_check(
+        self,
+        name: str,
+        func: Callable,
+        critical: bool = True,
+        degraded_ms: Optional[float] = None,
+        timeout: Optional[float] = None,
+        shared: bool = False
+    ):
+        self.checks[name] = HealthCheck(name, func, critical, degraded_ms, timeout, shared)
+
+    async def _run_check(self, check: HealthCheck) -> CheckResult:
+        start = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(check.func):
+                call = check.func()
+            else:
+                # Clientes síncronos (Supabase) não podem bloquear o event loop
+                call = asyncio.to_thread(check.func)
+            details = await asyncio.wait_for(call, check.timeout or self.timeout)
+        except asyncio.TimeoutError:
+            return CheckResult(STATUS_DOWN, (time.perf_counter() - start) * 1000, "timeout")
+        except Exception as e:
+            return CheckResult(STATUS_DOWN, (time.perf_counter() - start) * 1000, f"{type(e).__name__}: {e}")
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        status = STATUS_OK
+        if isinstance(details, dict) and details.get("status") in (STATUS_OK, STATUS_DEGRADED, STATUS_DOWN):
+            details = dict(details)
+            status = details.pop("status")
+        if status == STATUS_OK and check.degraded_ms is not None and latency_ms > check.degraded_ms:
+            status = STATUS_DEGRADED
+        return CheckResult(status, latency_ms, details=details)
+
+    async def run_checks(self):
+        """Executa todas as verificações em paralelo e atualiza o cache"""
+        checks = list(self.checks.values())
+        results = await asyncio.gather(*(self._run_check(check) for check in checks))
+
+        for check, result in zip(checks, results):
+            previous = check.result.status if check.result else None
+            check.result = result
+            check.consecutive_failures = check.consecutive_failures + 1 if result.status == STATUS_DOWN else 0
+
+            if result.status != previous and previous is not None:
+                log = logger.warning if result.status != STATUS_OK else logger.info
+                log(
+                    "Verificação %s: %s -> %s", check.name, previous, result.status,
+                    extra={"event": "health.transition", "check": check.name, "error": result.error}
+                )
+
+        self.rounds += 1
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_checks()
+            except Exception as e:
+                logger.error(f"Erro nas verificações de saúde: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    # Probes
+
+    def _stale(self, check: HealthCheck) -> bool:
+        # Sem resultado ou sem atualização por 3 intervalos (a task de fundo parou)
+        return check.result is None or time.time() - check.result.checked_at > self.interval * 3
+
+    def readiness(self) -> Dict[str, Any]:
+        """Relatório do cache; ready é False se uma verificação crítica está down, sem resultado recente ou (se local) degraded"""
+        checks = {}
+        reasons: List[str] = []
+
+        for check in self.checks.values():
+            if check.result is None:
+                checks[check.name] = {"status": "pending", "critical": check.critical}
+            else:
+                checks[check.name] = {
+                    **check.result.to_dict(),
+                    "critical": check.critical,
+                    "shared": check.shared,
+                    "consecutive_failures": check.consecutive_failures
+                }
+
+            if not check.critical:
+                continue
+            if self._stale(check):
+                reasons.append(f"{check.name}: sem resultado recente")
+            elif check.result.status == STATUS_DOWN or (check.result.status != STATUS_OK and not check.shared):
+                reasons.append(f"{check.name}: {check.result.status}")
+
+        statuses = [check.result.status for check in self.checks.values() if check.result]
+        if reasons:
+            status = "not_ready"
+        elif STATUS_DOWN in statuses or STATUS_DEGRADED in statuses:
+            status = STATUS_DEGRADED
+        else:
+            status = STATUS_OK
+
+        return {
+            "ready": not reasons,
+            "status": status,
+            "reasons": reasons,
+            "checks": checks
+        }
+
+    def liveness(self) -> Dict[str, Any]:
+        """O processo responde e a task de verificações está viva (não depende das dependências)"""
+        return {
+            "alive": True,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "monitor_running": self.task is not None and not self.task.done(),
+            "rounds": self.rounds
+        }
+
+# Verificações
+
+async def check_event_loop() -> Dict[str, Any]:
+    """Atraso do event loop para executar um callback (loop bloqueado por código síncrono)"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    scheduled = time.perf_counter()
+    loop.call_soon(lambda: future.done() or future.set_result(time.perf_counter() - scheduled))
+    lag = await future
+    return {"lag_ms": round(lag * 1000, 3)}
+
+def http_reachability(base_url: str) -> Callable:
+    """
+    Verificação de um serviço HTTP: qualquer resposta abaixo de 500 (inclusive
+    401/404 na raiz) mostra que o serviço está acessível
+    """
+    # Cliente reaproveitado: criar o contexto SSL a cada rodada bloqueia o event loop
+    client: Optional[httpx.AsyncClient] = None
+
+    async def check() -> Dict[str, Any]:
+        nonlocal client
+        if client is None:
+            client = httpx.AsyncClient()
+        response = await client.get(base_url)
+        if response.status_code >= 500:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        return {"http_status": response.status_code}
+
+    return check
+
+def pool_size_check(name: str, size: Callable[[], int], limit: int) -> Callable:
+    """Verificação de um pool em memória: degraded quando passa do limite"""
+    async def check() -> Dict[str, Any]:
+        current = size()
+        return {"status": STATUS_DEGRADED if current > limit else STATUS_OK, name: current, "limit": limit}
+
+    return check
+
+# Instância global
+health_monitor = HealthMonitor(
+    interval=float(os.getenv("HEALTH_CHECK_INTERVAL", "10")),
+    timeout=float(os.getenv("HEALTH_CHECK_TIMEOUT", "3"))
+)
@@ -0,0 +1,259 @@
+"""
+Configuração de logging estruturado, amostrado e sem I/O no caminho quente
+
+O handler instalado no logger raiz só coloca o registro em uma fila; uma
+thread (QueueWriter) acorda a cada intervalo, formata o lote pendente e o
+escreve em stderr com uma única escrita. O chamador nunca acorda a thread
+nem espera I/O. A mensagem é formatada apenas na thread de escrita, então
+chamadas no estilo
+logger.info("Pagamento %s aprovado", payment_id) não montam a string no
+event loop, e registros abaixo do nível configurado custam só a checagem
+de nível.
+
+Eventos de alto volume são amostrados por tipo: o tipo vem de
+extra={"event": "..."} e a taxa de LOG_SAMPLE_RATES (ou dos padrões de
+quem chama setup_logging). Avisos e erros nunca são amostrados. Registros
+amostrados levam "sample_rate", para que as contagens possam ser
+reconstruídas.
+
+Usado também pelo bot (processo separado) através de bot/shared.py.
+
+Variáveis de ambiente:
+    LOG_LEVEL          nível mínimo (padrão: INFO)
+    LOG_FORMAT         "json" (padrão) ou "text"
+    LOG_SAMPLE_RATES   ex.: telegram.group_message=0.01,payment.status=0.1
+    LOG_QUEUE_SIZE     registros pendentes antes de descartar (padrão: 10000)
+
+Exemplo:
+    logger.info("Webhook processado", extra={"event": "payment.webhook", "payment_id": payment_id})
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+# Atributos padrão do LogRecord (o resto veio de extra= e vai para o JSON)
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por linha com os campos padrão e os de extra="""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                data[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+class SamplingFilter(logging.Filter):
+    """
+    Mantém 1 a cada N registros de cada tipo de evento amostrado
+
+    A contagem é determinística (sem sorteio): com taxa 0.01, o 1º, o 101º,
+    o 201º... registro do evento passam.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.every: Dict[str, int] = {}
+        self.seen: Dict[str, int] = {}
+        self.dropped = 0
+        for event, rate in (rates or {}).items():
+            self.set_rate(event, rate)
+
+    def set_rate(self, event: str, rate: float):
+        if rate >= 1:
+            self.every.pop(event, None)
+        else:
+            self.every[event] = max(1, round(1 / rate)) if rate > 0 else 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        every = self.every.get(event) if event else None
+        if every is None or record.levelno >= logging.WARNING:
+            return True
+
+        seen = self.seen.get(event, 0)
+        self.seen[event] = seen + 1
+        if every and seen % every == 0:
+            record.sample_rate = 1 / every
+            return True
+
+        self.dropped += 1
+        return False
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que não formata no chamador e descarta quando a fila enche
+
+    O QueueHandler padrão formata a mensagem antes de enfileirar; aqui só a
+    exceção é convertida em texto (o traceback não pode atravessar a fila
+    com segurança) e o resto fica para a thread de escrita. A fila é uma
+    SimpleQueue (sem lock em Python); o limite é checado pelo tamanho.
+    """
+
+    def __init__(self, log_queue: Optional[queue.SimpleQueue] = None, max_size: int = 10000):
+        super().__init__(log_queue if log_queue is not None else queue.SimpleQueue())
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.max_size and self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+class QueueWriter:
+    """
+    Thread que esvazia a fila em lotes: formata os registros pendentes e faz
+    uma escrita (e um flush) por lote, a cada `interval` segundos
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, stream, formatter: logging.Formatter, interval: float = 0.05):
+        self.queue = log_queue
+        self.stream = stream
+        self.formatter = formatter
+        self.interval = interval
+        self.written = 0
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            self.drain()
+
+    def drain(self):
+        lines = []
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception as e:
+                lines.append(f"Erro ao formatar registro de {record.name}: {e}")
+
+        if lines:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+            self.written += len(lines)
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.drain()
+
+class LoggingState:
+    """Componentes instalados por setup_logging (usados em stats e no encerramento)"""
+
+    def __init__(self, handler: NonBlockingQueueHandler, writer: QueueWriter, sampling: SamplingFilter):
+        self.handler = handler
+        self.writer = writer
+        self.sampling = sampling
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.handler.queue.qsize(),
+            "written": self.writer.written,
+            "dropped_queue_full": self.handler.dropped,
+            "dropped_sampling": self.sampling.dropped,
+            "sampled_events": {event: (1 / every if every else 0.0) for event, every in self.sampling.every.items()}
+        }
+
+    def stop(self):
+        self.writer.stop()
+
+_state: Optional[LoggingState] = None
+
+def parse_sample_rates(text: Optional[str]) -> Dict[str, float]:
+    """'telegram.group_message=0.01,payment.status=0.1' -> {evento: taxa}"""
+    rates = {}
+    for part in (text or "").split(","):
+        if "=" in part:
+            event, _, rate = part.partition("=")
+            rates[event.strip()] = float(rate)
+    return rates
+
+def setup_logging(
+    level: Optional[str] = None,
+    json_output: Optional[bool] = None,
+    sample_rates: Optional[Dict[str, float]] = None,
+    queue_size: Optional[int] = None,
+    stream=None
+) -> LoggingState:
+    """
+    Instala o handler em fila no logger raiz (substitui logging.basicConfig)
+
+    Args:
+        level: Nível mínimo (padrão: LOG_LEVEL ou INFO)
+        json_output: JSON por linha (padrão: LOG_FORMAT != "text")
+        sample_rates: Taxas padrão por evento; LOG_SAMPLE_RATES tem precedência
+        queue_size: Registros pendentes antes de descartar (padrão: LOG_QUEUE_SIZE ou 10000)
+        stream: Destino (padrão: sys.stderr)
+
+    Returns:
+        O estado instalado; chamadas repetidas retornam o mesmo estado
+    """
+    global _state
+    if _state is not None:
+        return _state
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    if json_output is None:
+        json_output = os.getenv("LOG_FORMAT", "json").lower() != "text"
+    rates = {**(sample_rates or {}), **parse_sample_rates(os.getenv("LOG_SAMPLE_RATES"))}
+    queue_size = queue_size or int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    handler = NonBlockingQueueHandler(max_size=queue_size)
+    sampling = SamplingFilter(rates)
+    handler.addFilter(sampling)
+
+    formatter = (
+        JsonFormatter() if json_output
+        else logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    writer = QueueWriter(handler.queue, stream or sys.stderr, formatter)
+    writer.start()
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    _state = LoggingState(handler, writer, sampling)
+    # Escreve o que ainda estiver na fila ao encerrar
+    atexit.register(_state.stop)
+    return _state
+
+def logging_stats() -> Dict[str, Any]:
+    return _state.stats() if _state else {}
@@ -1,15 +1,43 @@
 import os
-from fastapi import FastAPI, HTTPException, Depends
+import logging
+from fastapi import FastAPI, HTTPException, Depends, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import uvicorn
 
-# Importar routers
-from .routers import bots, payments, plans, telegram
+from .logging_config import setup_logging, logging_stats
+
+# Eventos de alto volume registrados por amostragem (LOG_SAMPLE_RATES sobrescreve)
+LOG_SAMPLE_RATES = {
+    "gateway.payment_status": 0.1
+}
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Logging em JSON escrito por uma thread (os handlers só enfileiram). Vem antes
+# dos outros imports: os módulos registram avisos de configuração ao importar
+# (ex.: segredo de webhook ausente), que sairiam sem o formato JSON
+setup_logging(sample_rates=LOG_SAMPLE_RATES)
+
+# Importar routers
+from .routers import bots, payments, plans, telegram, dashboard, reports, sales
+from .queries import query_metrics, select
+from .tracing import tracer, TracingMiddleware
+from .metrics import registry, MetricsMiddleware, CONTENT_TYPE
+from .payment_events import payment_events
+from .payments.qr import qr_image_cache
+from .payments.pix import pix_config
+from .payments.mercadopago import recent_notifications
+from .singleflight import flights, singleflight_stats
+from .update_log import update_log
+from .webhook_buffer import payment_webhook_buffer
+from .resilience import dependencies, dependency_stats, STATE_VALUES
+from .health import health_monitor, check_event_loop, http_reachability, pool_size_check, STATUS_OK
+
+logger = logging.getLogger(__name__)
+
 # Inicializar aplicação FastAPI
 app = FastAPI(
     title="Black-In-Bot API",
@@ -26,11 +54,182 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Span raiz de cada requisição (consultas, gateways e Telegram viram spans filhos)
+app.add_middleware(TracingMiddleware)
+
+# Latência e status por rota (GET /metrics)
+app.add_middleware(MetricsMiddleware)
+
+# Filas e caches lidos no momento da coleta
+registry.callback(
+    "payment_event_subscribers", "Clientes aguardando eventos de pagamento (SSE/long-poll)",
+    lambda: payment_events.stats()["subscribers"]
+)
+registry.callback(
+    "payment_events_published_total", "Eventos de pagamento publicados",
+    lambda: payment_events.published, metric_type="counter"
+)
+registry.callback(
+    "tracing_export_pending", "Spans aguardando envio aos exportadores",
+    lambda: len(tracer.export_queue)
+)
+registry.callback(
+    "qr_image_cache_requests_total", "Consultas ao cache de imagens de QR Code por resultado",
+    lambda: {"hit": qr_image_cache.hits, "miss": qr_image_cache.misses},
+    metric_type="counter", labels=("result",)
+)
+registry.callback(
+    "log_records_dropped_total", "Registros de log descartados por motivo",
+    lambda: {"queue_full": logging_stats()["dropped_queue_full"], "sampling": logging_stats()["dropped_sampling"]},
+    metric_type="counter", labels=("reason",)
+)
+registry.callback(
+    "qr_image_cache_entries", "Imagens de QR Code em cache",
+    lambda: len(qr_image_cache.entries)
+)
+registry.callback(
+    "dependency_circuit_state", "Estado do circuit breaker por dependência (0 fechado, 1 meio-aberto, 2 aberto)",
+    lambda: {name: STATE_VALUES[item.breaker.state] for name, item in dependencies.items()},
+    labels=("dependency",)
+)
+registry.callback(
+    "dependency_rejected_total", "Chamadas recusadas sem chegar à dependência por motivo",
+    lambda: {
+        **{(name, "circuit_open"): item.breaker.rejected for name, item in dependencies.items()},
+        **{(name, "bulkhead_full"): item.bulkhead.rejected for name, item in dependencies.items()}
+    },
+    metric_type="counter", labels=("dependency", "reason")
+)
+registry.callback(
+    "dependency_in_flight", "Chamadas em andamento por dependência",
+    lambda: {name: item.bulkhead.in_flight for name, item in dependencies.items()},
+    labels=("dependency",)
+)
+registry.callback(
+    "dependency_timeout_seconds", "Timeout adaptativo atual por dependência",
+    lambda: {name: item.timeout.current() for name, item in dependencies.items()},
+    labels=("dependency",)
+)
+registry.callback(
+    "dependency_hedged_requests_total", "Segundas tentativas disparadas por hedging",
+    lambda: {name: item.hedges for name, item in dependencies.items()},
+    metric_type="counter", labels=("dependency",)
+)
+registry.callback(
+    "singleflight_calls_total", "Chamadas single-flight que executaram ou aguardaram uma execução em andamento",
+    lambda: {
+        (name, label, result): getattr(stats, attribute)
+        for name, flight in flights.items()
+        for label, stats in flight.labels.items()
+        for result, attribute in (("executed", "executions"), ("shared", "shared"))
+    },
+    metric_type="counter", labels=("flight", "key", "result")
+)
+registry.callback(
+    "singleflight_in_flight", "Execuções single-flight em andamento",
+    lambda: {name: len(flight.in_flight) for name, flight in flights.items()},
+    labels=("flight",)
+)
+registry.callback(
+    "mercadopago_duplicate_notifications_total", "Reenvios de notificações do Mercado Pago já aplicadas",
+    lambda: recent_notifications.duplicates, metric_type="counter"
+)
+registry.callback(
+    "update_log_pending", "Updates gravados no log aguardando processamento",
+    lambda: len(update_log.log.pending) if update_log.log else 0
+)
+
+# Verificações de saúde (rodam em segundo plano; /health/ready lê o cache)
+# O banco é compartilhado por todas as instâncias: lento fica só reportado
+# (degraded), fora do ar tira a instância do balanceamento
+health_monitor.add_check(
+    "database",
+    lambda: {"rows": len(select("health.database", "bots", ("id",)).limit(1).execute().data)},
+    critical=True, shared=True, degraded_ms=float(os.getenv("HEALTH_DB_DEGRADED_MS", "500"))
+)
+health_monitor.add_check("event_loop", check_event_loop, critical=True, degraded_ms=100)
+# Applications nunca são removidas do pool: acima do limite o worker só é
+# reportado (degraded), senão ficaria fora do balanceamento para sempre
+health_monitor.add_check(
+    "telegram_applications",
+    pool_size_check("applications", lambda: len(telegram.bot_dispatchers), int(os.getenv("HEALTH_MAX_APPLICATIONS", "500"))),
+    critical=False
+)
+# Gateways são compartilhados por todas as instâncias: a falha aparece no
+# relatório, mas não tira a instância do balanceamento
+if os.getenv("PUSHINPAY_API_KEY"):
+    health_monitor.add_check(
+        "pushinpay", http_reachability(os.getenv("PUSHINPAY_API_URL", "https://api.pushinpay.com.br/v1")),
+        critical=False, degraded_ms=1000
+    )
+if os.getenv("MERCADOPAGO_ACCESS_TOKEN"):
+    health_monitor.add_check(
+        "mercadopago", http_reachability(os.getenv("MERCADOPAGO_API_URL", "https://api.mercadopago.com")),
+        critical=False, degraded_ms=1000
+    )
+
+registry.callback(
+    "health_check_up", "Resultado da última verificação de saúde (1 = ok)",
+    lambda: {
+        name: int(check.result is not None and check.result.status == STATUS_OK)
+        for name, check in health_monitor.checks.items()
+    },
+    labels=("check",)
+)
+registry.callback(
+    "health_check_latency_seconds", "Latência da última verificação de saúde",
+    lambda: {
+        name: check.result.latency_ms / 1000
+        for name, check in health_monitor.checks.items() if check.result is not None
+    },
+    labels=("check",)
+)
+
 # Incluir routers
 app.include_router(bots.router)
 app.include_router(payments.router)
 app.include_router(plans.router)
 app.include_router(telegram.router)
+app.include_router(dashboard.router)
+app.include_router(reports.router)
+app.include_router(sales.router)
+
+# Configuração do PIX: sem ela os pagamentos são recusados com 503
+@app.on_event("startup")
+async def check_pix_config():
+    try:
+        pix_config()
+    except ValueError as e:
+        logger.error(f"PIX não configurado, pagamentos serão recusados: {str(e)}")
+
+# Verificações de saúde em segundo plano
+@app.on_event("startup")
+async def start_health_monitor():
+    health_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_health_monitor():
+    await health_monitor.stop()
+
+# Log de updates do webhook (UPDATE_LOG_DIR): reprocessa o que ficou sem ack
+@app.on_event("startup")
+async def open_update_log():
+    await telegram.recover_logged_updates()
+
+@app.on_event("shutdown")
+async def close_update_log():
+    await telegram.stop_logged_updates()
+    update_log.close()
+
+# Gravar as notificações de pagamento que estão no buffer ao encerrar
+@app.on_event("shutdown")
+async def flush_webhook_buffer():
+    await payment_webhook_buffer.stop()
+
+# Enviar os spans pendentes aos exportadores ao encerrar
+@app.on_event("shutdown")
+async def flush_traces():
+    tracer.shutdown()
 
 # Rota raiz para verificar se a API está funcionando
 @app.get("/")
@@ -45,6 +244,52 @@ async def health_check():
         "version": "0.1.0"
     }
 
+# Liveness: o processo responde (não consulta dependências; falha só se o worker travou)
+@app.get("/health/live")
+async def health_live():
+    return health_monitor.liveness()
+
+# Readiness: resultado em cache das verificações; 503 tira a instância do balanceador
+@app.get("/health/ready")
+async def health_ready():
+    report = health_monitor.readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+# Métricas das consultas ao banco (linhas e bytes recebidos por consulta)
+@app.get("/stats/queries")
+async def query_stats():
+    return query_metrics.snapshot()
+
+# Circuit breakers, bulkheads e timeouts adaptativos das dependências externas
+@app.get("/stats/dependencies")
+async def dependency_statistics():
+    return dependency_stats()
+
+# Lotes de notificações dos gateways de pagamento (tamanho, coalescência e tempo de gravação)
+@app.get("/stats/webhook-buffer")
+async def webhook_buffer_stats():
+    return payment_webhook_buffer.stats()
+
+# Leituras e consultas ao gateway compartilhadas entre chamadas simultâneas, por consulta
+@app.get("/stats/singleflight")
+async def singleflight_statistics():
+    return singleflight_stats()
+
+# Métricas no formato do Prometheus (soma de todos os workers com METRICS_MULTIPROC_DIR)
+@app.get("/metrics")
+async def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+# Traces recentes do buffer em memória, com o tempo gasto em banco, gateways e Telegram
+@app.get("/stats/traces")
+async def trace_list(limit: int = 20, min_ms: float = 0.0, name: str = None):
+    return {"tracer": tracer.stats(), "traces": tracer.traces(limit=limit, min_ms=min_ms, name=name)}
+
+# Tempo médio por componente de cada rota
+@app.get("/stats/traces/breakdown")
+async def trace_breakdown():
+    return tracer.breakdown()
+
 # Iniciar servidor se executado diretamente
 if __name__ == "__main__":
     host = os.getenv("API_HOST", "0.0.0.0")
@@ -0,0 +1,595 @@
+"""
+Métricas no formato de exposição do Prometheus (GET /metrics)
+
+Contadores, gauges e histogramas com labels. As atualizações não usam
+lock: cada thread escreve no seu próprio shard (dicionário) e a coleta soma
+os shards, então o caminho quente é apenas um acesso a dicionário.
+
+Modo multi-worker: com METRICS_MULTIPROC_DIR definido, cada worker grava
+periodicamente (e a cada coleta) um snapshot em <dir>/<pid>-<início>.json, e
+o /metrics de qualquer worker responde com a soma de todos. O instante de
+início no nome impede que um worker novo que reutiliza o pid de um
+encerrado (container reiniciado) sobrescreva o snapshot dele.
+
+Contadores e histogramas de workers encerrados continuam somados (os totais
+não voltam atrás): a coleta os soma em archive.json e apaga o snapshot do
+worker, então o diretório não cresce a cada reinício. Gauges consideram
+apenas os workers vivos (pid existente e snapshot recente).
+
+Exemplo:
+    http_requests.inc(method="GET", route="/bots/{bot_id}", status="200")
+    db_query_seconds.observe(0.012, query="telegram.config")
+"""
+
+import os
+import json
+import time
+import bisect
+import inspect
+import logging
+import tempfile
+import threading
+import functools
+from typing import Dict, Any, Optional, List, Callable, Tuple, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows (desenvolvimento): um único worker
+    fcntl = None
+
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limites (segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[str, ...]
+
+# Totais dos workers encerrados (modo multi-worker)
+ARCHIVE_FILE = "archive.json"
+ARCHIVE_LOCK_FILE = "archive.lock"
+
+class _Shards:
+    """Um dicionário de valores por thread; só o registro de um shard novo usa lock"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards: List[Dict[LabelKey, Any]] = []
+
+    def get(self) -> Dict[LabelKey, Any]:
+        try:
+            return self.local.values
+        except AttributeError:
+            values: Dict[LabelKey, Any] = {}
+            with self.lock:
+                self.shards.append(values)
+            self.local.values = values
+            return values
+
+    def copies(self) -> List[Dict[LabelKey, Any]]:
+        # dict.copy() é atômico sob o GIL; os shards de threads encerradas são mantidos
+        return [shard.copy() for shard in list(self.shards)]
+
+class Metric:
+    """Base das métricas: nome, descrição e nomes dos labels"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def values(self) -> Dict[LabelKey, Any]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    """Valor que só cresce (total de requisições, erros, ...)"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.shards = _Shards()
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        shard = self.shards.get()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0.0) + amount
+
+    def values(self) -> Dict[LabelKey, float]:
+        merged: Dict[LabelKey, float] = {}
+        for shard in self.shards.copies():
+            for key, value in shard.items():
+                merged[key] = merged.get(key, 0.0) + value
+        return merged
+
+class Gauge(Metric):
+    """Valor atual (em andamento, profundidade de fila, ...)"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.shards = _Shards()
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        shard = self.shards.get()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any):
+        self.inc(-amount, **labels)
+
+    def values(self) -> Dict[LabelKey, float]:
+        merged: Dict[LabelKey, float] = {}
+        for shard in self.shards.copies():
+            for key, value in shard.items():
+                merged[key] = merged.get(key, 0.0) + value
+        return merged
+
+class Histogram(Metric):
+    """Distribuição de valores em buckets (latências)"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.shards = _Shards()
+
+    def observe(self, value: float, **labels: Any):
+        shard = self.shards.get()
+        key = self._key(labels)
+        # [contagem por bucket (não cumulativa)..., +Inf, soma, total]
+        counts = shard.get(key)
+        if counts is None:
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def time(self, **labels: Any) -> "_Timer":
+        """Context manager que observa a duração do bloco"""
+        return _Timer(self, labels)
+
+    def values(self) -> Dict[LabelKey, List[float]]:
+        merged: Dict[LabelKey, List[float]] = {}
+        for shard in self.shards.copies():
+            for key, counts in shard.items():
+                total = merged.get(key)
+                if total is None:
+                    merged[key] = list(counts)
+                else:
+                    for index, count in enumerate(counts):
+                        total[index] += count
+        return merged
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+class CallbackMetric(Metric):
+    """Métrica lida na coleta a partir de outro componente (filas, caches)"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Any],
+        metric_type: str = "gauge",
+        labels: Sequence[str] = ()
+    ):
+        """
+        Args:
+            callback: Retorna um número, ou um dicionário {valor_do_label: número}
+                (ou {tupla_de_labels: número}) quando a métrica tem labels
+            metric_type: "gauge" ou "counter"
+        """
+        super().__init__(name, documentation, labels)
+        self.type = metric_type
+        self.callback = callback
+
+    def values(self) -> Dict[LabelKey, float]:
+        try:
+            result = self.callback()
+        except Exception as e:
+            logger.error(f"Erro ao coletar a métrica {self.name}: {e}")
+            return {}
+
+        if not isinstance(result, dict):
+            return {(): float(result)}
+        return {
+            (key if isinstance(key, tuple) else (key,)): float(value)
+            for key, value in result.items()
+        }
+
+# Formato de exposição
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def render(snapshot: Dict[str, Dict[str, Any]]) -> str:
+    """Converte um snapshot (Registry.snapshot ou aggregate) para o texto do Prometheus"""
+    lines = []
+    for name, metric in snapshot.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labels = metric["labels"]
+
+        for key, value in metric["values"]:
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels_text(labels, key)} {_number(value)}")
+                continue
+
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + [float("inf")], value[:-2]):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{name}_bucket{_labels_text(labels, key, le)} {_number(cumulative)}")
+            lines.append(f"{name}_sum{_labels_text(labels, key)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels_text(labels, key)} {_number(value[-1])}")
+
+    return "\n".join(lines) + "\n"
+
+def aggregate(snapshots: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Soma os snapshots de vários workers (mesmas métricas e labels)"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.get(name)
+            if target is None:
+                target = merged[name] = {**metric, "values": {}}
+            values = target["values"]
+            for key, value in metric["values"]:
+                key = tuple(key)
+                if key not in values:
+                    values[key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    values[key] = [old + new for old, new in zip(values[key], value)]
+                else:
+                    values[key] += value
+
+    for metric in merged.values():
+        metric["values"] = sorted(metric["values"].items())
+    return merged
+
+class Registry:
+    """Métricas do processo e, opcionalmente, a agregação entre workers"""
+
+    def __init__(self, multiproc_dir: Optional[str] = None, write_interval: float = 5.0):
+        """
+        Args:
+            multiproc_dir: Diretório compartilhado pelos workers (None = só este processo)
+            write_interval: Intervalo (segundos) entre gravações do snapshot deste worker
+        """
+        self.metrics: Dict[str, Metric] = {}
+        self.multiproc_dir = multiproc_dir
+        self.write_interval = write_interval
+        self.started = time.time_ns()
+        self.writer: Optional[threading.Thread] = None
+
+        if multiproc_dir:
+            os.makedirs(multiproc_dir, exist_ok=True)
+            self.writer = threading.Thread(target=self._write_loop, name="metrics-writer", daemon=True)
+            self.writer.start()
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Métrica já registrada: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Any],
+        metric_type: str = "gauge",
+        labels: Sequence[str] = ()
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, callback, metric_type, labels))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Valores atuais deste processo em formato serializável"""
+        snapshot = {}
+        for name, metric in self.metrics.items():
+            snapshot[name] = {
+                "type": metric.type,
+                "help": metric.documentation,
+                "labels": list(metric.labels),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "values": sorted([list(key), value] for key, value in metric.values().items())
+            }
+        return snapshot
+
+    # Modo multi-worker
+
+    def _path(self) -> str:
+        return os.path.join(self.multiproc_dir, f"{os.getpid()}-{self.started}.json")
+
+    def write_snapshot(self):
+        """Grava o snapshot deste worker (troca atômica do arquivo)"""
+        data = json.dumps({"pid": os.getpid(), "time": time.time(), "metrics": self.snapshot()})
+        descriptor, temporary = tempfile.mkstemp(dir=self.multiproc_dir, suffix=".tmp")
+        with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(temporary, self._path())
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self.write_interval)
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                logger.error(f"Erro ao gravar snapshot de métricas: {e}")
+
+    def _worker_snapshots(self) -> List[Dict[str, Dict[str, Any]]]:
+        snapshots = []
+        dead = []
+        stale_after = time.time() - 6 * self.write_interval
+        for entry in os.scandir(self.multiproc_dir):
+            if not entry.name.endswith(".json") or entry.name == ARCHIVE_FILE:
+                continue
+            try:
+                with open(entry.path, encoding="utf-8") as file:
+                    data = json.load(file)
+            except FileNotFoundError:
+                # Somado ao arquivo por outro worker durante a leitura
+                continue
+            except (OSError, ValueError) as e:
+                logger.error(f"Snapshot de métricas ilegível {entry.name}: {e}")
+                continue
+
+            if not _pid_alive(data["pid"]):
+                dead.append(entry.path)
+                continue
+            metrics = data["metrics"]
+            if data["time"] < stale_after:
+                # pid reutilizado por outro processo: só os totais continuam valendo
+                metrics = _totals(metrics)
+            snapshots.append(metrics)
+
+        if dead:
+            self._archive(dead)
+        archive = self._read_archive()
+        if archive:
+            snapshots.append(archive["metrics"])
+        return snapshots
+
+    def _read_archive(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.multiproc_dir, ARCHIVE_FILE), encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _archive(self, paths: List[str]):
+        """
+        Soma contadores e histogramas dos workers encerrados em archive.json e
+        apaga os snapshots deles
+
+        O arquivo guarda os nomes somados na última vez: se o processo cair
+        entre a gravação e a remoção, os snapshots restantes são só apagados.
+        """
+        with open(os.path.join(self.multiproc_dir, ARCHIVE_LOCK_FILE), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            archive = self._read_archive() or {"metrics": {}, "folded": []}
+            already_folded = set(archive["folded"])
+            snapshots = [archive["metrics"]]
+            folded = []
+            for path in paths:
+                name = os.path.basename(path)
+                if name in already_folded:
+                    folded.append(path)
+                    continue
+                try:
+                    with open(path, encoding="utf-8") as file:
+                        data = json.load(file)
+                except FileNotFoundError:
+                    continue
+                except (OSError, ValueError) as e:
+                    logger.error(f"Snapshot de métricas ilegível {name}: {e}")
+                    continue
+                snapshots.append(_totals(data["metrics"]))
+                folded.append(path)
+
+            if len(snapshots) > 1:
+                data = json.dumps({
+                    "metrics": aggregate(snapshots),
+                    "folded": [os.path.basename(path) for path in folded]
+                })
+                descriptor, temporary = tempfile.mkstemp(dir=self.multiproc_dir, suffix=".tmp")
+                with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                    file.write(data)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temporary, os.path.join(self.multiproc_dir, ARCHIVE_FILE))
+
+            for path in folded:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot deste processo, ou a soma de todos os workers no modo multi-worker"""
+        if not self.multiproc_dir:
+            return self.snapshot()
+
+        self.write_snapshot()
+        return aggregate(self._worker_snapshots())
+
+    def render(self) -> str:
+        return render(self.collect())
+
+def _totals(metrics: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Só contadores e histogramas (o que continua valendo de um worker encerrado)"""
+    return {name: metric for name, metric in metrics.items() if metric["type"] != "gauge"}
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# Registro global
+registry = Registry(os.getenv("METRICS_MULTIPROC_DIR") or None)
+
+# Métricas de uso geral da API
+http_requests = registry.counter(
+    "http_requests_total", "Requisições HTTP atendidas", ("method", "route", "status")
+)
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP por rota", ("method", "route")
+)
+http_in_progress = registry.gauge("http_requests_in_progress", "Requisições HTTP em andamento")
+telegram_updates = registry.counter(
+    "telegram_updates_total",
+    "Updates recebidos no webhook por bot (ID público; bots ainda não encontrados no banco: desconhecido)",
+    ("bot", "result")
+)
+gateway_requests = registry.counter(
+    "gateway_requests_total", "Chamadas aos gateways de pagamento", ("gateway", "operation", "outcome")
+)
+gateway_request_seconds = registry.histogram(
+    "gateway_request_duration_seconds", "Latência das chamadas aos gateways de pagamento", ("gateway", "operation")
+)
+db_query_seconds = registry.histogram(
+    "db_query_duration_seconds", "Duração das consultas nomeadas ao banco", ("query",)
+)
+db_query_errors = registry.counter("db_query_errors_total", "Consultas ao banco que falharam", ("query",))
+
+def observe_gateway(gateway: str, operation: str):
+    """
+    Decorador que mede a latência e o resultado de uma chamada de gateway
+
+    Os métodos dos gateways retornam (success, data); success False conta
+    como erro, assim como uma exceção.
+    """
+    def outcome(result: Any) -> str:
+        if isinstance(result, tuple) and result and result[0] is False:
+            return "error"
+        return "success"
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                result_outcome = "error"
+                try:
+                    result = await func(*args, **kwargs)
+                    result_outcome = outcome(result)
+                    return result
+                finally:
+                    gateway_request_seconds.observe(time.perf_counter() - start, gateway=gateway, operation=operation)
+                    gateway_requests.inc(gateway=gateway, operation=operation, outcome=result_outcome)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result_outcome = "error"
+            try:
+                result = func(*args, **kwargs)
+                result_outcome = outcome(result)
+                return result
+            finally:
+                gateway_request_seconds.observe(time.perf_counter() - start, gateway=gateway, operation=operation)
+                gateway_requests.inc(gateway=gateway, operation=operation, outcome=result_outcome)
+        return wrapper
+
+    return decorator
+
+class MetricsMiddleware:
+    """Middleware ASGI que mede latência e status por rota (template da rota, nunca o caminho real)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        http_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_progress.dec()
+            method = scope["method"]
+            route = getattr(scope.get("route"), "path", None) or "(sem rota)"
+            http_request_seconds.observe(time.perf_counter() - start, method=method, route=route)
+            http_requests.inc(method=method, route=route, status=str(status[0]))
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, EmailStr
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, date
 from enum import Enum
 
 # Enums
@@ -165,9 +165,21 @@ class ReminderResponse(ReminderBase):
         from_attributes = True
 
 # Modelos para estatísticas e relatórios
+class DailySales(BaseModel):
+    day: date
+    sales: int
+    revenue: float
+
+class PlanSales(BaseModel):
+    plan_id: str
+    sales: int
+    revenue: float
+
 class DashboardStats(BaseModel):
     total_sales: int
     total_revenue: float
     active_users: int
     plans_count: int
-    recent_sales: List[SaleResponse] 
\ No newline at end of file
+    recent_sales: List[SaleResponse]
+    daily: List[DailySales] = []
+    top_plans: List[PlanSales] = []
@@ -0,0 +1,153 @@
+"""
+Paginação por cursor (keyset) em (created_at, id)
+
+Em vez de OFFSET, cada página continua a partir da última linha retornada:
+    created_at < c OR (created_at = c AND id < i)
+O custo de cada página é o mesmo independente da profundidade, e linhas
+inseridas durante a navegação não deslocam as páginas seguintes.
+
+O cursor é opaco para o cliente: base64 de [created_at, id].
+
+Tabelas sem essas colunas (agregados) são percorridas pela chave primária
+com iter_keyset_rows.
+"""
+
+import json
+import base64
+import binascii
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterator, Sequence
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_PAGE_SIZE = 1000
+KEYSET_PAGE_SIZE = 500
+
+# Cabeçalho com o cursor da próxima página nas listagens
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    payload = json.dumps([row["created_at"], row["id"]], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Raises:
+        ValueError: Se o cursor não foi gerado por encode_cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Cursor inválido")
+
+    if not isinstance(created_at, str) or not isinstance(row_id, str):
+        raise ValueError("Cursor inválido")
+    return created_at, row_id
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def _quote(value: str) -> str:
+    # Valores com ':' ou ',' precisam de aspas dentro de or=(...)
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def apply_keyset(query, cursor: Optional[str] = None, descending: bool = True):
+    """
+    Ordena a consulta por (created_at, id) e aplica o cursor
+
+    Args:
+        query: Consulta do Supabase já filtrada (select + eq/in_/...)
+        cursor: Cursor da última linha da página anterior
+        descending: Mais recentes primeiro
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        operator = "lt" if descending else "gt"
+        condition = (
+            f"created_at.{operator}.{_quote(created_at)},"
+            f"and(created_at.eq.{_quote(created_at)},id.{operator}.{_quote(row_id)})"
+        )
+        query.params = query.params.add("or", f"({condition})")
+
+    # Uma única cláusula order: o PostgREST não combina parâmetros order repetidos
+    direction = "desc" if descending else "asc"
+    query.params = query.params.add("order", f"created_at.{direction},id.{direction}")
+    return query
+
+def fetch_page(
+    build_query: Callable[[], Any],
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    descending: bool = True
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Busca uma página
+
+    Args:
+        build_query: Função que monta a consulta filtrada (uma nova a cada chamada)
+
+    Returns:
+        (linhas, cursor da próxima página ou None na última página)
+    """
+    rows = apply_keyset(build_query(), cursor, descending).limit(limit + 1).execute().data
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+def iter_rows(
+    build_query: Callable[[], Any],
+    page_size: int = EXPORT_PAGE_SIZE,
+    descending: bool = False
+) -> Iterator[Dict[str, Any]]:
+    """Percorre todas as linhas página a página, mantendo só uma página em memória"""
+    cursor = None
+    while True:
+        rows, cursor = fetch_page(build_query, cursor, page_size, descending)
+        yield from rows
+        if cursor is None:
+            return
+
+def apply_column_keyset(query, columns: Sequence[str], last: Optional[Dict[str, Any]] = None):
+    """
+    Ordena a consulta pelas colunas (ascendente) e continua depois da linha last
+
+    Para tabelas sem (created_at, id), como os agregados: as colunas devem
+    formar uma chave única e não nula (ex.: a chave primária).
+    """
+    if last is not None:
+        branches = []
+        for index, column in enumerate(columns):
+            conditions = [f"{previous}.eq.{_quote(str(last[previous]))}" for previous in columns[:index]]
+            conditions.append(f"{column}.gt.{_quote(str(last[column]))}")
+            branches.append(f"and({','.join(conditions)})" if index else conditions[0])
+        # Em and=(...) para não conflitar com um or= do chamador
+        query.params = query.params.add("and", f"(or({','.join(branches)}))")
+
+    query.params = query.params.add("order", ",".join(f"{column}.asc" for column in columns))
+    return query
+
+def iter_keyset_rows(
+    build_query: Callable[[], Any],
+    columns: Sequence[str],
+    page_size: int = KEYSET_PAGE_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """
+    Percorre todas as linhas em páginas pela chave columns
+
+    page_size fica abaixo do max-rows do PostgREST (1000 por padrão): uma
+    página menor que page_size é sempre a última, nunca um corte do servidor.
+    """
+    last = None
+    while True:
+        rows = apply_column_keyset(build_query(), columns, last).limit(page_size).execute().data
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+
+def ndjson_lines(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    """Uma linha JSON por registro (application/x-ndjson)"""
+    for row in rows:
+        yield json.dumps(row, default=str, ensure_ascii=False) + "\n"
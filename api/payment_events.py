@@ -0,0 +1,119 @@
+"""
+Pub/sub em processo para eventos de status de pagamento
+
+Os webhooks dos gateways publicam a mudança de status e os clientes que
+aguardam o pagamento (SSE ou long-poll) são notificados imediatamente,
+sem consultar o banco repetidamente.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, Any, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Status que encerram a espera do cliente
+FINAL_STATUSES = frozenset({"completed", "approved", "failed", "refunded", "cancelled", "expired"})
+
+def is_final_status(status: Any) -> bool:
+    return getattr(status, "value", status) in FINAL_STATUSES
+
+def format_sse(event: Dict[str, Any], event_type: str = "status") -> str:
+    """Formata um evento no padrão Server-Sent Events"""
+    return f"event: {event_type}\ndata: {json.dumps(event, default=str)}\n\n"
+
+class PaymentEventBus:
+    """Distribui eventos de pagamento para os assinantes de cada payment_id"""
+
+    def __init__(self, retention_seconds: float = 300.0, max_retained: int = 10000):
+        """
+        Args:
+            retention_seconds: Por quanto tempo o último evento final fica disponível
+                para quem assinar depois da publicação
+            max_retained: Quantidade máxima de eventos retidos
+        """
+        self.retention_seconds = retention_seconds
+        self.max_retained = max_retained
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self.retained: Dict[str, tuple] = {}
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, payment_id: str) -> asyncio.Queue:
+        """Registra um assinante; o último evento final retido é entregue de imediato"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self.subscribers.setdefault(payment_id, set()).add(queue)
+
+        retained = self.retained.get(payment_id)
+        if retained and time.monotonic() - retained[1] <= self.retention_seconds:
+            queue.put_nowait(retained[0])
+
+        return queue
+
+    def unsubscribe(self, payment_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(payment_id)
+        if queues is None:
+            return
+
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[payment_id]
+
+    def publish(self, payment_id: str, event: Dict[str, Any]) -> int:
+        """
+        Publica um evento para os assinantes do pagamento
+
+        Returns:
+            Quantidade de assinantes notificados
+        """
+        self.published += 1
+
+        if is_final_status(event.get("status")):
+            self._retain(payment_id, event)
+
+        queues = self.subscribers.get(payment_id, ())
+        for queue in queues:
+            queue.put_nowait(event)
+
+        self.delivered += len(queues)
+        return len(queues)
+
+    def _retain(self, payment_id: str, event: Dict[str, Any]):
+        now = time.monotonic()
+        self.retained[payment_id] = (event, now)
+
+        if len(self.retained) > self.max_retained:
+            expired = [
+                key for key, (_, published_at) in self.retained.items()
+                if now - published_at > self.retention_seconds
+            ]
+            for key in expired:
+                del self.retained[key]
+
+            # Se ainda estiver cheio, descartar os mais antigos (ordem de inserção)
+            while len(self.retained) > self.max_retained:
+                del self.retained[next(iter(self.retained))]
+
+    async def wait(self, payment_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Aguarda o próximo evento do pagamento por até `timeout` segundos"""
+        queue = self.subscribe(payment_id)
+        try:
+            return await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.unsubscribe(payment_id, queue)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "subscribers": sum(len(queues) for queues in self.subscribers.values()),
+            "payments_watched": len(self.subscribers),
+            "retained": len(self.retained),
+            "published": self.published,
+            "delivered": self.delivered
+        }
+
+# Instância global usada pelos webhooks e pelos endpoints de espera
+payment_events = PaymentEventBus()
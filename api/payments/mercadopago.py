@@ -1,10 +1,19 @@
 import os
+import time
+import asyncio
 import logging
 import json
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional, Tuple, Mapping
 import mercadopago
+from mercadopago.http import HttpClient
+
+from ..tracing import traced, COMPONENT_GATEWAY
+from ..metrics import observe_gateway
+from ..resilience import dependency, AdaptiveTimeout, http_failure
+from ..singleflight import SingleFlight
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -12,6 +21,130 @@ load_dotenv()
 # Configuração de logging
 logger = logging.getLogger(__name__)
 
+MERCADOPAGO_API_URL = "https://api.mercadopago.com"
+
+# IPN legado ({"topic": "payment", "id": ...}) não é assinado pelo Mercado Pago;
+# é aceito sem assinatura porque o status e a referência sempre vêm da consulta
+# ao pagamento (a notificação só diz qual pagamento consultar).
+# "false" recusa o IPN legado
+LEGACY_IPN_ENABLED = os.getenv("MERCADOPAGO_LEGACY_IPN", "true").lower() != "false"
+
+# Status do Mercado Pago que não mudam mais (exceto estorno)
+FINAL_STATUSES = frozenset({"approved", "rejected", "cancelled", "refunded", "charged_back"})
+
+class MercadoPagoNotification:
+    """Notificação de pagamento (webhook v2 ou IPN legado)"""
+
+    __slots__ = ("id", "payment_id", "action", "legacy")
+
+    def __init__(
+        self,
+        payment_id: str,
+        notification_id: Optional[str] = None,
+        action: Optional[str] = None,
+        legacy: bool = False
+    ):
+        self.id = notification_id
+        self.payment_id = payment_id
+        self.action = action
+        # IPN legado: sem assinatura, só vale com a consulta do status
+        self.legacy = legacy
+
+def parse_notification(
+    webhook_data: Dict[str, Any],
+    query_params: Optional[Mapping[str, str]] = None
+) -> Optional[MercadoPagoNotification]:
+    """
+    Extrai o pagamento notificado
+
+    Formatos aceitos:
+        v2:     {"id": <notificação>, "type": "payment", "action": "payment.updated",
+                 "data": {"id": <pagamento>}} (?data.id=<pagamento>&type=payment)
+        legado: {"topic": "payment", "id": <pagamento>} (?topic=payment&id=<pagamento>)
+
+    O IPN legado não tem assinatura (legacy=True): quem recebe não deve usar
+    nada da notificação além do ID do pagamento a consultar.
+
+    Returns:
+        A notificação, ou None se não for de pagamento ou não tiver o ID do pagamento
+    """
+    query = query_params or {}
+    kind = webhook_data.get("type") or webhook_data.get("topic") or query.get("type") or query.get("topic")
+    if kind != "payment":
+        return None
+
+    data = webhook_data.get("data")
+    payment_id = (data.get("id") if isinstance(data, dict) else None) or query.get("data.id")
+    if payment_id:
+        # No v2 o "id" do corpo é o da notificação, repetido nos reenvios
+        notification_id = webhook_data.get("id")
+        return MercadoPagoNotification(
+            str(payment_id), str(notification_id) if notification_id else None, webhook_data.get("action")
+        )
+
+    payment_id = webhook_data.get("id") or query.get("id")
+    return MercadoPagoNotification(str(payment_id), legacy=True) if payment_id else None
+
+class RecentNotifications:
+    """IDs de notificações já aplicadas, esquecidos depois de ttl segundos"""
+
+    def __init__(self, ttl: float = 3600.0, max_size: int = 100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: "OrderedDict[str, float]" = OrderedDict()
+        self.duplicates = 0
+
+    def seen(self, notification_id: Optional[str]) -> bool:
+        if not notification_id:
+            return False
+
+        now = time.monotonic()
+        # Entradas em ordem de inserção: as expiradas ficam no começo
+        while self.entries and next(iter(self.entries.values())) < now:
+            self.entries.popitem(last=False)
+
+        if notification_id in self.entries:
+            self.duplicates += 1
+            return True
+        return False
+
+    def add(self, notification_id: Optional[str]):
+        if not notification_id:
+            return
+        self.entries[notification_id] = time.monotonic() + self.ttl
+        self.entries.move_to_end(notification_id)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+# Consultas de status em andamento por pagamento e notificações já aplicadas (por worker)
+status_flight = SingleFlight("mercadopago.payment_status")
+recent_notifications = RecentNotifications(ttl=float(os.getenv("MERCADOPAGO_NOTIFICATION_TTL", "3600")))
+
+class ResilientHttpClient(HttpClient):
+    """
+    Cliente HTTP do SDK com circuit breaker, bulkhead e timeout adaptativo
+    (o SDK não define timeout); base_url troca a URL da API (testes de carga)
+    """
+
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.dependency = dependency(
+            "mercadopago", max_concurrent=20,
+            timeout=AdaptiveTimeout(initial=10.0, minimum=2.0, maximum=30.0)
+        )
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        if self.base_url and url.startswith(MERCADOPAGO_API_URL):
+            url = self.base_url + url[len(MERCADOPAGO_API_URL):]
+        # O SDK repassa timeout=None quando as RequestOptions não definem um
+        requested = kwargs.pop("timeout", None)
+        return self.dependency.call_sync(
+            lambda timeout: super(ResilientHttpClient, self).request(
+                method, url, maxretries, timeout=requested or timeout, **kwargs
+            ),
+            lambda response: http_failure(response["status"])
+        )
+
 # Classe para integração com Mercado Pago
 class MercadoPago:
     def __init__(self):
@@ -22,8 +155,13 @@ class MercadoPago:
             raise ValueError("MERCADOPAGO_ACCESS_TOKEN não definido nas variáveis de ambiente")
         
         # Inicializar o SDK do Mercado Pago
-        self.sdk = mercadopago.SDK(self.access_token)
+        self.sdk = mercadopago.SDK(
+            self.access_token,
+            http_client=ResilientHttpClient(os.getenv("MERCADOPAGO_API_URL"))
+        )
     
+    @traced("mercadopago.generate_payment", kind="client", component=COMPONENT_GATEWAY)
+    @observe_gateway("mercadopago", "generate_payment")
     def generate_payment(
         self, 
         amount: float, 
@@ -73,7 +211,10 @@ class MercadoPago:
             
             if response["status"] == 201:
                 data = response["response"]
-                logger.info(f"Pagamento gerado com sucesso: {data['id']}")
+                logger.info(
+                    "Pagamento gerado com sucesso: %s", data["id"],
+                    extra={"event": "gateway.payment_created", "gateway": "mercadopago", "payment_id": data["id"]}
+                )
                 return True, data
             else:
                 logger.error(f"Erro ao gerar pagamento: {response}")
@@ -82,6 +223,8 @@ class MercadoPago:
             logger.error(f"Erro ao gerar pagamento: {str(e)}")
             return False, {"error": str(e)}
     
+    @traced("mercadopago.check_payment_status", kind="client", component=COMPONENT_GATEWAY)
+    @observe_gateway("mercadopago", "check_payment_status")
     def check_payment_status(self, payment_id: str) -> Tuple[bool, Dict[str, Any]]:
         """
         Verifica o status de um pagamento no Mercado Pago
@@ -99,7 +242,10 @@ class MercadoPago:
             
             if response["status"] == 200:
                 data = response["response"]
-                logger.info(f"Status do pagamento {payment_id}: {data['status']}")
+                logger.info(
+                    "Status do pagamento %s: %s", payment_id, data["status"],
+                    extra={"event": "gateway.payment_status", "gateway": "mercadopago", "payment_id": payment_id}
+                )
                 return True, data
             else:
                 logger.error(f"Erro ao verificar status do pagamento: {response}")
@@ -108,12 +254,67 @@ class MercadoPago:
             logger.error(f"Erro ao verificar status do pagamento: {str(e)}")
             return False, {"error": str(e)}
     
-    def process_webhook(self, webhook_data: Dict[str, Any]) -> Tuple[bool, Dict[str, Any]]:
+    async def fetch_payment_status(self, payment_id: str) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Consulta o status fora do event loop, compartilhando a consulta com as
+        notificações do mesmo pagamento que chegarem enquanto ela está em andamento
+        """
+        def fetch():
+            return asyncio.to_thread(self.check_payment_status, payment_id)
+
+        joined = status_flight.is_in_flight(payment_id)
+        success, data = await status_flight.do(payment_id, fetch)
+
+        # A consulta compartilhada pode ter começado antes da mudança que gerou
+        # esta notificação; um status ainda não final é consultado de novo (uma
+        # vez, também compartilhada pelas outras notificações na mesma situação)
+        if joined and success and data.get("status") not in FINAL_STATUSES:
+            success, data = await status_flight.do(payment_id, fetch)
+
+        return success, data
+
+    async def process_notification(self, notification: MercadoPagoNotification) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Busca o status do pagamento notificado
+
+        Returns:
+            Tupla com (success, data)
+            success: True se o status foi obtido, False caso contrário
+            data: payment_id, status e external_reference, ou o erro
+        """
+        payment_id = notification.payment_id
+        success, payment_data = await self.fetch_payment_status(payment_id)
+
+        if not success:
+            logger.error(f"Erro ao buscar informações do pagamento: {payment_data}")
+            return False, payment_data
+
+        # Extrair informações relevantes
+        status = payment_data.get("status", "")
+        external_reference = payment_data.get("external_reference", "")
+
+        logger.info(
+            "Webhook processado para pagamento %s: %s", payment_id, status,
+            extra={"event": "gateway.webhook", "gateway": "mercadopago", "payment_id": payment_id}
+        )
+
+        return True, {
+            "payment_id": payment_id,
+            "status": status,
+            "external_reference": external_reference
+        }
+
+    async def process_webhook(
+        self,
+        webhook_data: Dict[str, Any],
+        query_params: Optional[Mapping[str, str]] = None
+    ) -> Tuple[bool, Dict[str, Any]]:
         """
         Processa um webhook recebido do Mercado Pago
         
         Args:
             webhook_data: Dados recebidos no webhook
+            query_params: Parâmetros da URL do webhook (data.id, type, topic, id)
             
         Returns:
             Tupla com (success, data)
@@ -121,38 +322,13 @@ class MercadoPago:
             data: Dicionário com informações processadas ou erro
         """
         try:
-            # Verificar o tipo de notificação
-            topic = webhook_data.get("topic", "")
-            
-            if topic != "payment":
-                logger.error(f"Webhook com tópico não suportado: {topic}")
-                return False, {"error": f"Tópico não suportado: {topic}"}
-            
-            # Extrair o ID do pagamento
-            payment_id = webhook_data.get("id", "")
+            notification = parse_notification(webhook_data, query_params)
             
-            if not payment_id:
-                logger.error("Webhook não contém ID do pagamento")
+            if notification is None:
+                logger.error(f"Webhook não suportado ou sem ID do pagamento: {webhook_data}")
                 return False, {"error": "Webhook inválido"}
             
-            # Buscar informações do pagamento
-            success, payment_data = self.check_payment_status(payment_id)
-            
-            if not success:
-                logger.error(f"Erro ao buscar informações do pagamento: {payment_data}")
-                return False, payment_data
-            
-            # Extrair informações relevantes
-            status = payment_data.get("status", "")
-            external_reference = payment_data.get("external_reference", "")
-            
-            logger.info(f"Webhook processado para pagamento {payment_id}: {status}")
-            
-            return True, {
-                "payment_id": payment_id,
-                "status": status,
-                "external_reference": external_reference
-            }
+            return await self.process_notification(notification)
         except Exception as e:
             logger.error(f"Erro ao processar webhook: {str(e)}")
-            return False, {"error": str(e)} 
\ No newline at end of file
+            return False, {"error": str(e)}
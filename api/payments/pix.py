@@ -0,0 +1,199 @@
+import os
+import re
+import unicodedata
+from dotenv import load_dotenv
+from typing import Dict, Any, Optional, List, Tuple
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Identificador do arranjo PIX no campo Merchant Account Information
+PIX_GUI = "br.gov.bcb.pix"
+
+# IDs dos campos do BR Code (padrão EMV QRCPS-MPM)
+ID_PAYLOAD_FORMAT = "00"
+ID_POINT_OF_INITIATION = "01"
+ID_MERCHANT_ACCOUNT = "26"
+ID_MERCHANT_CATEGORY = "52"
+ID_CURRENCY = "53"
+ID_AMOUNT = "54"
+ID_COUNTRY = "58"
+ID_MERCHANT_NAME = "59"
+ID_MERCHANT_CITY = "60"
+ID_ADDITIONAL_DATA = "62"
+ID_CRC = "63"
+
+# Subcampos
+ID_GUI = "00"
+ID_PIX_KEY = "01"
+ID_DESCRIPTION = "02"
+ID_TXID = "05"
+
+MAX_TXID_LENGTH = 25
+MAX_MERCHANT_NAME_LENGTH = 25
+MAX_MERCHANT_CITY_LENGTH = 15
+
+def crc16_ccitt(data: bytes, crc: int = 0xFFFF) -> int:
+    """CRC16-CCITT (polinômio 0x1021, valor inicial 0xFFFF) usado no campo 63"""
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+def _tlv(field_id: str, value: str) -> str:
+    """Monta um campo ID + tamanho (2 dígitos) + valor"""
+    length = len(value.encode("utf-8"))
+    if length > 99:
+        raise ValueError(f"Campo {field_id} excede 99 bytes")
+    return f"{field_id}{length:02d}{value}"
+
+def _normalize_text(value: str, max_length: int) -> str:
+    """Remove acentos e caracteres fora do conjunto aceito pelos leitores de BR Code"""
+    value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
+    value = re.sub(r"[^A-Za-z0-9 .,\-/]", "", value).strip().upper()
+    return value[:max_length]
+
+def make_txid(reference: str) -> str:
+    """Gera um txid válido (até 25 caracteres alfanuméricos) a partir de uma referência"""
+    txid = re.sub(r"[^A-Za-z0-9]", "", reference or "")[:MAX_TXID_LENGTH]
+    return txid or "***"
+
+def pix_config() -> Dict[str, str]:
+    """
+    Chave e recebedor das variáveis de ambiente, já validados
+
+    Chamada antes de criar um pagamento e na inicialização da API: sem uma
+    chave válida nenhum BR Code pode ser gerado.
+
+    Raises:
+        ValueError: Se PIX_KEY não estiver definida ou não couber no campo 26
+    """
+    pix_key = (os.getenv("PIX_KEY") or "").strip()
+    if not pix_key:
+        raise ValueError("PIX_KEY não definida nas variáveis de ambiente")
+
+    # GUI + chave precisam caber nos 99 bytes do campo 26
+    if len(_tlv(ID_GUI, PIX_GUI).encode("utf-8")) + 4 + len(pix_key.encode("utf-8")) > 99:
+        raise ValueError("PIX_KEY excede o tamanho aceito pelo BR Code")
+
+    merchant_name = _normalize_text(os.getenv("PIX_MERCHANT_NAME", "BLACK IN BOT"), MAX_MERCHANT_NAME_LENGTH)
+    merchant_city = _normalize_text(os.getenv("PIX_MERCHANT_CITY", "SAO PAULO"), MAX_MERCHANT_CITY_LENGTH)
+    if not merchant_name or not merchant_city:
+        raise ValueError("PIX_MERCHANT_NAME e PIX_MERCHANT_CITY precisam ter letras ou números")
+
+    return {"pix_key": pix_key, "merchant_name": merchant_name, "merchant_city": merchant_city}
+
+def build_pix_payload(
+    amount: Optional[float],
+    txid: str,
+    pix_key: Optional[str] = None,
+    merchant_name: Optional[str] = None,
+    merchant_city: Optional[str] = None,
+    description: Optional[str] = None,
+    single_use: bool = True
+) -> str:
+    """
+    Gera o código PIX copia e cola (BR Code estático com valor e txid)
+
+    Args:
+        amount: Valor em reais (None para o pagador informar)
+        txid: Identificador da transação (até 25 caracteres alfanuméricos)
+        pix_key: Chave PIX do recebedor (padrão: PIX_KEY)
+        merchant_name: Nome do recebedor (padrão: PIX_MERCHANT_NAME)
+        merchant_city: Cidade do recebedor (padrão: PIX_MERCHANT_CITY)
+        description: Texto livre exibido ao pagador
+        single_use: Marca o código como de uso único (Point of Initiation 12)
+
+    Returns:
+        Payload do BR Code com CRC16 no final
+    """
+    pix_key = pix_key or os.getenv("PIX_KEY")
+    if not pix_key:
+        raise ValueError("PIX_KEY não definida nas variáveis de ambiente")
+
+    merchant_name = _normalize_text(
+        merchant_name or os.getenv("PIX_MERCHANT_NAME", "BLACK IN BOT"), MAX_MERCHANT_NAME_LENGTH
+    )
+    merchant_city = _normalize_text(
+        merchant_city or os.getenv("PIX_MERCHANT_CITY", "SAO PAULO"), MAX_MERCHANT_CITY_LENGTH
+    )
+
+    account = _tlv(ID_GUI, PIX_GUI) + _tlv(ID_PIX_KEY, pix_key)
+    if description:
+        # O campo 26 inteiro não pode passar de 99 bytes
+        available = 99 - len(account.encode("utf-8")) - 4
+        description = _normalize_text(description, available)
+        if description:
+            account += _tlv(ID_DESCRIPTION, description)
+
+    payload = _tlv(ID_PAYLOAD_FORMAT, "01")
+    if single_use:
+        payload += _tlv(ID_POINT_OF_INITIATION, "12")
+    payload += _tlv(ID_MERCHANT_ACCOUNT, account)
+    payload += _tlv(ID_MERCHANT_CATEGORY, "0000")
+    payload += _tlv(ID_CURRENCY, "986")
+    if amount is not None:
+        payload += _tlv(ID_AMOUNT, f"{float(amount):.2f}")
+    payload += _tlv(ID_COUNTRY, "BR")
+    payload += _tlv(ID_MERCHANT_NAME, merchant_name)
+    payload += _tlv(ID_MERCHANT_CITY, merchant_city)
+    payload += _tlv(ID_ADDITIONAL_DATA, _tlv(ID_TXID, make_txid(txid)))
+
+    # O CRC é calculado sobre todo o payload, incluindo "6304"
+    payload += ID_CRC + "04"
+    return payload + f"{crc16_ccitt(payload.encode('utf-8')):04X}"
+
+def _parse_tlv(data: str) -> List[Tuple[str, str]]:
+    fields = []
+    position = 0
+    while position < len(data):
+        if position + 4 > len(data):
+            raise ValueError("Campo TLV incompleto")
+        field_id = data[position:position + 2]
+        length = int(data[position + 2:position + 4])
+        value = data[position + 4:position + 4 + length]
+        if len(value) != length:
+            raise ValueError(f"Tamanho inválido no campo {field_id}")
+        fields.append((field_id, value))
+        position += 4 + length
+    return fields
+
+def parse_pix_payload(payload: str) -> Dict[str, Any]:
+    """
+    Decodifica um BR Code e valida o CRC
+
+    Returns:
+        Dicionário com pix_key, amount, merchant_name, merchant_city, txid, description
+
+    Raises:
+        ValueError: Se o payload estiver malformado ou o CRC não conferir
+    """
+    if len(payload) < 8 or payload[-8:-4] != ID_CRC + "04":
+        raise ValueError("BR Code sem campo CRC")
+
+    expected = f"{crc16_ccitt(payload[:-4].encode('utf-8')):04X}"
+    if payload[-4:].upper() != expected:
+        raise ValueError("CRC do BR Code inválido")
+
+    fields = dict(_parse_tlv(payload))
+    account = dict(_parse_tlv(fields.get(ID_MERCHANT_ACCOUNT, "")))
+    additional = dict(_parse_tlv(fields.get(ID_ADDITIONAL_DATA, "")))
+
+    if account.get(ID_GUI, "").lower() != PIX_GUI:
+        raise ValueError("BR Code não é um PIX")
+
+    amount = fields.get(ID_AMOUNT)
+
+    return {
+        "pix_key": account.get(ID_PIX_KEY),
+        "description": account.get(ID_DESCRIPTION),
+        "amount": float(amount) if amount else None,
+        "merchant_name": fields.get(ID_MERCHANT_NAME),
+        "merchant_city": fields.get(ID_MERCHANT_CITY),
+        "txid": additional.get(ID_TXID),
+        "single_use": fields.get(ID_POINT_OF_INITIATION) == "12"
+    }
@@ -6,6 +6,10 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from typing import Dict, Any, Optional, Tuple
 
+from ..tracing import traced, COMPONENT_GATEWAY
+from ..metrics import observe_gateway
+from ..resilience import dependency, AdaptiveTimeout, AsyncResilientTransport
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -16,12 +20,24 @@ logger = logging.getLogger(__name__)
 class PushinPay:
     def __init__(self):
         self.api_key = os.getenv("PUSHINPAY_API_KEY")
-        self.base_url = "https://api.pushinpay.com.br/v1"  # URL fictícia para exemplo
+        self.base_url = os.getenv("PUSHINPAY_API_URL", "https://api.pushinpay.com.br/v1")  # URL fictícia para exemplo
         
         if not self.api_key:
             logger.error("PUSHINPAY_API_KEY não definida nas variáveis de ambiente")
             raise ValueError("PUSHINPAY_API_KEY não definida nas variáveis de ambiente")
+        
+        # Breaker, bulkhead e timeout compartilhados por todas as instâncias
+        self.dependency = dependency(
+            "pushinpay", max_concurrent=20,
+            timeout=AdaptiveTimeout(initial=10.0, minimum=2.0, maximum=30.0)
+        )
+    
+    def _client(self) -> httpx.AsyncClient:
+        """Cliente com as requisições passando pelo Dependency (consultas de status usam hedging)"""
+        return httpx.AsyncClient(transport=AsyncResilientTransport(httpx.AsyncHTTPTransport(), self.dependency))
     
+    @traced("pushinpay.generate_pix_payment", kind="client", component=COMPONENT_GATEWAY)
+    @observe_gateway("pushinpay", "generate_pix_payment")
     async def generate_pix_payment(
         self, 
         amount: float, 
@@ -59,7 +75,7 @@ class PushinPay:
             }
             
             # Fazer a requisição para a API
-            async with httpx.AsyncClient() as client:
+            async with self._client() as client:
                 headers = {
                     "Authorization": f"Bearer {self.api_key}",
                     "Content-Type": "application/json"
@@ -73,7 +89,10 @@ class PushinPay:
                 
                 if response.status_code == 201:
                     data = response.json()
-                    logger.info(f"Pagamento PIX gerado com sucesso: {data['id']}")
+                    logger.info(
+                        "Pagamento PIX gerado com sucesso: %s", data["id"],
+                        extra={"event": "gateway.payment_created", "gateway": "pushinpay", "payment_id": data["id"]}
+                    )
                     return True, data
                 else:
                     logger.error(f"Erro ao gerar pagamento PIX: {response.text}")
@@ -82,6 +101,8 @@ class PushinPay:
             logger.error(f"Erro ao gerar pagamento PIX: {str(e)}")
             return False, {"error": str(e)}
     
+    @traced("pushinpay.check_payment_status", kind="client", component=COMPONENT_GATEWAY)
+    @observe_gateway("pushinpay", "check_payment_status")
     async def check_payment_status(self, payment_id: str) -> Tuple[bool, Dict[str, Any]]:
         """
         Verifica o status de um pagamento no PushinPay
@@ -95,7 +116,7 @@ class PushinPay:
             data: Dicionário com informações do pagamento ou erro
         """
         try:
-            async with httpx.AsyncClient() as client:
+            async with self._client() as client:
                 headers = {
                     "Authorization": f"Bearer {self.api_key}",
                     "Content-Type": "application/json"
@@ -108,7 +129,10 @@ class PushinPay:
                 
                 if response.status_code == 200:
                     data = response.json()
-                    logger.info(f"Status do pagamento {payment_id}: {data['status']}")
+                    logger.info(
+                        "Status do pagamento %s: %s", payment_id, data["status"],
+                        extra={"event": "gateway.payment_status", "gateway": "pushinpay", "payment_id": payment_id}
+                    )
                     return True, data
                 else:
                     logger.error(f"Erro ao verificar status do pagamento: {response.text}")
@@ -130,8 +154,8 @@ class PushinPay:
             data: Dicionário com informações processadas ou erro
         """
         try:
-            # Verificar a assinatura do webhook (em uma implementação real)
-            # ...
+            # A assinatura já foi verificada sobre o corpo bruto da requisição
+            # (signatures.verify_pushinpay_signature, chamada pelo router)
             
             # Extrair informações relevantes
             payment_id = webhook_data.get("payment_id")
@@ -142,7 +166,10 @@ class PushinPay:
                 logger.error("Webhook não contém payment_id ou status")
                 return False, {"error": "Webhook inválido"}
             
-            logger.info(f"Webhook processado para pagamento {payment_id}: {status}")
+            logger.info(
+                "Webhook processado para pagamento %s: %s", payment_id, status,
+                extra={"event": "gateway.webhook", "gateway": "pushinpay", "payment_id": payment_id}
+            )
             
             return True, {
                 "payment_id": payment_id,
@@ -0,0 +1,494 @@
+import zlib
+import base64
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Dict
+
+# Codificador de QR Code em Python puro (modo byte, versões 1 a 40)
+# usado para renderizar o PIX copia e cola em PNG ou SVG
+
+# Níveis de correção de erro: (índice nas tabelas, bits de formato)
+ECC_LEVELS = {"L": (0, 1), "M": (1, 0), "Q": (2, 3), "H": (3, 2)}
+
+ECC_CODEWORDS_PER_BLOCK = (
+    (-1, 7, 10, 15, 20, 26, 18, 20, 24, 30, 18, 20, 24, 26, 30, 22, 24, 28, 30, 28, 28, 28, 28, 30, 30, 26, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    (-1, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26, 26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28),
+    (-1, 13, 22, 18, 26, 18, 24, 18, 22, 20, 24, 28, 26, 24, 20, 30, 24, 28, 28, 26, 30, 28, 30, 30, 30, 30, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    (-1, 17, 28, 22, 16, 22, 28, 26, 26, 24, 28, 24, 28, 22, 24, 24, 30, 28, 28, 26, 28, 30, 24, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+)
+
+NUM_ERROR_CORRECTION_BLOCKS = (
+    (-1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 6, 6, 6, 6, 7, 8, 8, 9, 9, 10, 12, 12, 12, 13, 14, 15, 16, 17, 18, 19, 19, 20, 21, 22, 24, 25),
+    (-1, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16, 17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49),
+    (-1, 1, 1, 2, 2, 4, 4, 6, 6, 8, 8, 8, 10, 12, 16, 12, 17, 16, 18, 21, 20, 23, 23, 25, 27, 29, 34, 34, 35, 38, 40, 43, 45, 48, 51, 53, 56, 59, 62, 65, 68),
+    (-1, 1, 1, 2, 4, 4, 4, 5, 6, 8, 8, 11, 11, 16, 16, 18, 16, 19, 21, 25, 25, 25, 34, 30, 32, 35, 37, 40, 42, 45, 48, 51, 54, 57, 60, 63, 66, 70, 74, 77, 81),
+)
+
+# Pesos das regras de penalidade usadas na escolha da máscara
+PENALTY_N1 = 3
+PENALTY_N2 = 3
+PENALTY_N3 = 40
+PENALTY_N4 = 10
+
+# Tabelas de exponencial/logaritmo do GF(256) com polinômio 0x11D
+_GF_EXP = [0] * 512
+_GF_LOG = [0] * 256
+_value = 1
+for _i in range(255):
+    _GF_EXP[_i] = _value
+    _GF_LOG[_value] = _i
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11D
+for _i in range(255, 512):
+    _GF_EXP[_i] = _GF_EXP[_i - 255]
+
+def _gf_multiply(x: int, y: int) -> int:
+    if x == 0 or y == 0:
+        return 0
+    return _GF_EXP[_GF_LOG[x] + _GF_LOG[y]]
+
+_DIVISOR_CACHE: Dict[int, List[int]] = {}
+
+def _reed_solomon_divisor(degree: int) -> List[int]:
+    divisor = _DIVISOR_CACHE.get(degree)
+    if divisor is not None:
+        return divisor
+
+    result = [0] * (degree - 1) + [1]
+    root = 1
+    for _ in range(degree):
+        for j in range(degree):
+            result[j] = _gf_multiply(result[j], root)
+            if j + 1 < degree:
+                result[j] ^= result[j + 1]
+        root = _gf_multiply(root, 0x02)
+
+    _DIVISOR_CACHE[degree] = result
+    return result
+
+def _reed_solomon_remainder(data: List[int], divisor: List[int]) -> List[int]:
+    result = [0] * len(divisor)
+    log_divisor = [_GF_LOG[coef] for coef in divisor]
+    for byte in data:
+        factor = byte ^ result.pop(0)
+        result.append(0)
+        if factor:
+            log_factor = _GF_LOG[factor]
+            for i, log_coef in enumerate(log_divisor):
+                result[i] ^= _GF_EXP[log_coef + log_factor]
+    return result
+
+def _num_raw_data_modules(version: int) -> int:
+    result = (16 * version + 128) * version + 64
+    if version >= 2:
+        num_align = version // 7 + 2
+        result -= (25 * num_align - 10) * num_align - 55
+        if version >= 7:
+            result -= 36
+    return result
+
+def _num_data_codewords(version: int, ecc_index: int) -> int:
+    return (
+        _num_raw_data_modules(version) // 8
+        - ECC_CODEWORDS_PER_BLOCK[ecc_index][version] * NUM_ERROR_CORRECTION_BLOCKS[ecc_index][version]
+    )
+
+def _alignment_positions(version: int) -> List[int]:
+    if version == 1:
+        return []
+    size = version * 4 + 17
+    num_align = version // 7 + 2
+    step = (version * 8 + num_align * 3 + 5) // (num_align * 4 - 4) * 2
+    result = [size - 7 - i * step for i in range(num_align - 1)] + [6]
+    return list(reversed(result))
+
+class QRCode:
+    """Matriz de um QR Code (True = módulo escuro)"""
+
+    def __init__(self, version: int, ecc_level: str, modules: List[List[bool]], mask: int):
+        self.version = version
+        self.ecc_level = ecc_level
+        self.size = len(modules)
+        self.modules = modules
+        self.mask = mask
+
+def _encode_data(data: bytes, version: int, ecc_index: int) -> List[int]:
+    """Monta os codewords de dados (modo byte + terminador + preenchimento)"""
+    capacity_bits = _num_data_codewords(version, ecc_index) * 8
+    count_bits = 8 if version <= 9 else 16
+
+    # Indicador de modo byte (0100) + contador de caracteres + dados
+    value = (0b0100 << count_bits) | len(data)
+    value = (value << (len(data) * 8)) | int.from_bytes(data, "big") if data else value
+    bit_length = 4 + count_bits + len(data) * 8
+
+    terminator = min(4, capacity_bits - bit_length)
+    value <<= terminator
+    bit_length += terminator
+
+    padding = -bit_length % 8
+    value <<= padding
+    bit_length += padding
+
+    codewords = list(value.to_bytes(bit_length // 8, "big"))
+    pad_byte = 0xEC
+    while len(codewords) < capacity_bits // 8:
+        codewords.append(pad_byte)
+        pad_byte ^= 0xEC ^ 0x11
+
+    return codewords
+
+def _add_ecc_and_interleave(data: List[int], version: int, ecc_index: int) -> List[int]:
+    num_blocks = NUM_ERROR_CORRECTION_BLOCKS[ecc_index][version]
+    block_ecc_length = ECC_CODEWORDS_PER_BLOCK[ecc_index][version]
+    raw_codewords = _num_raw_data_modules(version) // 8
+    num_short_blocks = num_blocks - raw_codewords % num_blocks
+    short_block_length = raw_codewords // num_blocks
+
+    divisor = _reed_solomon_divisor(block_ecc_length)
+    blocks = []
+    position = 0
+    for i in range(num_blocks):
+        length = short_block_length - block_ecc_length + (0 if i < num_short_blocks else 1)
+        block = data[position:position + length]
+        position += length
+        ecc = _reed_solomon_remainder(block, divisor)
+        if i < num_short_blocks:
+            block.append(0)
+        blocks.append(block + ecc)
+
+    result = []
+    for i in range(len(blocks[0])):
+        for j, block in enumerate(blocks):
+            # Pular o byte de preenchimento dos blocos curtos
+            if i != short_block_length - block_ecc_length or j >= num_short_blocks:
+                result.append(block[i])
+
+    return result
+
+class _Matrix:
+    def __init__(self, version: int):
+        self.version = version
+        self.size = version * 4 + 17
+        self.modules = [[False] * self.size for _ in range(self.size)]
+        self.is_function = [[False] * self.size for _ in range(self.size)]
+
+    def set_function(self, x: int, y: int, dark: bool):
+        self.modules[y][x] = dark
+        self.is_function[y][x] = True
+
+    def draw_function_patterns(self):
+        size = self.size
+
+        # Padrões de temporização
+        for i in range(size):
+            self.set_function(6, i, i % 2 == 0)
+            self.set_function(i, 6, i % 2 == 0)
+
+        # Padrões de localização (com separadores)
+        for cx, cy in ((3, 3), (size - 4, 3), (3, size - 4)):
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    x, y = cx + dx, cy + dy
+                    if 0 <= x < size and 0 <= y < size:
+                        self.set_function(x, y, max(abs(dx), abs(dy)) not in (2, 4))
+
+        # Padrões de alinhamento
+        positions = _alignment_positions(self.version)
+        last = len(positions) - 1
+        for i, cx in enumerate(positions):
+            for j, cy in enumerate(positions):
+                if (i, j) in ((0, 0), (0, last), (last, 0)):
+                    continue
+                for dy in range(-2, 3):
+                    for dx in range(-2, 3):
+                        self.set_function(cx + dx, cy + dy, max(abs(dx), abs(dy)) != 1)
+
+        # Reservar as áreas de formato (desenhadas de verdade depois da máscara)
+        self.draw_format_bits(0, 0)
+
+        # Informação de versão (versões 7+)
+        if self.version >= 7:
+            remainder = self.version
+            for _ in range(12):
+                remainder = (remainder << 1) ^ ((remainder >> 11) * 0x1F25)
+            bits = self.version << 12 | remainder
+            for i in range(18):
+                dark = (bits >> i) & 1 != 0
+                a = size - 11 + i % 3
+                b = i // 3
+                self.set_function(a, b, dark)
+                self.set_function(b, a, dark)
+
+    def draw_format_bits(self, ecc_format_bits: int, mask: int):
+        data = ecc_format_bits << 3 | mask
+        remainder = data
+        for _ in range(10):
+            remainder = (remainder << 1) ^ ((remainder >> 9) * 0x537)
+        bits = (data << 10 | remainder) ^ 0x5412
+        size = self.size
+
+        def bit(i):
+            return (bits >> i) & 1 != 0
+
+        # Primeira cópia (ao redor do localizador superior esquerdo)
+        for i in range(6):
+            self.set_function(8, i, bit(i))
+        self.set_function(8, 7, bit(6))
+        self.set_function(8, 8, bit(7))
+        self.set_function(7, 8, bit(8))
+        for i in range(9, 15):
+            self.set_function(14 - i, 8, bit(i))
+
+        # Segunda cópia
+        for i in range(8):
+            self.set_function(size - 1 - i, 8, bit(i))
+        for i in range(8, 15):
+            self.set_function(8, size - 15 + i, bit(i))
+        self.set_function(8, size - 8, True)
+
+    def draw_codewords(self, codewords: List[int]):
+        size = self.size
+        total_bits = len(codewords) * 8
+        i = 0
+        right = size - 1
+        while right >= 1:
+            if right == 6:
+                right = 5
+            upward = ((right + 1) & 2) == 0
+            for vert in range(size):
+                y = size - 1 - vert if upward else vert
+                for x in (right, right - 1):
+                    if not self.is_function[y][x] and i < total_bits:
+                        self.modules[y][x] = (codewords[i >> 3] >> (7 - (i & 7))) & 1 != 0
+                        i += 1
+            right -= 2
+
+_MASKS = (
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+)
+
+def _apply_mask(modules: List[List[bool]], is_function: List[List[bool]], mask: int) -> List[List[bool]]:
+    condition = _MASKS[mask]
+    size = len(modules)
+    return [
+        [
+            modules[y][x] ^ (not is_function[y][x] and condition(x, y))
+            for x in range(size)
+        ]
+        for y in range(size)
+    ]
+
+_FINDER_LIKE = ("10111010000", "00001011101")
+
+def _penalty_score(modules: List[List[bool]]) -> int:
+    size = len(modules)
+    rows = ["".join("1" if dark else "0" for dark in row) for row in modules]
+    columns = ["".join(row[x] for row in rows) for x in range(size)]
+    result = 0
+
+    for line in rows + columns:
+        # Sequências de 5+ módulos da mesma cor
+        run_color = line[0]
+        run_length = 1
+        for color in line[1:]:
+            if color == run_color:
+                run_length += 1
+            else:
+                if run_length >= 5:
+                    result += PENALTY_N1 + run_length - 5
+                run_color = color
+                run_length = 1
+        if run_length >= 5:
+            result += PENALTY_N1 + run_length - 5
+
+        # Padrões parecidos com o localizador
+        for pattern in _FINDER_LIKE:
+            start = line.find(pattern)
+            while start != -1:
+                result += PENALTY_N3
+                start = line.find(pattern, start + 1)
+
+    # Blocos 2x2 da mesma cor
+    for y in range(size - 1):
+        row, next_row = modules[y], modules[y + 1]
+        for x in range(size - 1):
+            color = row[x]
+            if color == row[x + 1] == next_row[x] == next_row[x + 1]:
+                result += PENALTY_N2
+
+    # Proporção de módulos escuros
+    dark = sum(row.count("1") for row in rows)
+    total = size * size
+    k = (abs(dark * 20 - total * 10) + total - 1) // total - 1
+    result += k * PENALTY_N4
+
+    return result
+
+def encode_qr(
+    data,
+    ecc_level: str = "M",
+    min_version: int = 1,
+    max_version: int = 40,
+    mask: Optional[int] = None
+) -> QRCode:
+    """
+    Codifica dados em um QR Code (modo byte)
+
+    Args:
+        data: Texto (codificado em UTF-8) ou bytes
+        ecc_level: Nível de correção de erro (L, M, Q, H)
+        min_version: Versão mínima
+        max_version: Versão máxima
+        mask: Máscara fixa (0-7); None escolhe a de menor penalidade
+
+    Returns:
+        QRCode com a matriz de módulos
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    ecc_index, ecc_format_bits = ECC_LEVELS[ecc_level]
+
+    for version in range(min_version, max_version + 1):
+        count_bits = 8 if version <= 9 else 16
+        needed_bits = 4 + count_bits + len(data) * 8
+        if len(data) < (1 << count_bits) and needed_bits <= _num_data_codewords(version, ecc_index) * 8:
+            break
+    else:
+        raise ValueError("Dados muito longos para um QR Code")
+
+    codewords = _add_ecc_and_interleave(_encode_data(data, version, ecc_index), version, ecc_index)
+
+    matrix = _Matrix(version)
+    matrix.draw_function_patterns()
+    matrix.draw_codewords(codewords)
+
+    if mask is None:
+        best_score = None
+        for candidate in range(8):
+            matrix.draw_format_bits(ecc_format_bits, candidate)
+            score = _penalty_score(_apply_mask(matrix.modules, matrix.is_function, candidate))
+            if best_score is None or score < best_score:
+                best_score = score
+                mask = candidate
+
+    matrix.draw_format_bits(ecc_format_bits, mask)
+
+    return QRCode(version, ecc_level, _apply_mask(matrix.modules, matrix.is_function, mask), mask)
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    chunk = chunk_type + data
+    return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk) & 0xFFFFFFFF)
+
+def render_png(qr: QRCode, scale: int = 8, border: int = 4) -> bytes:
+    """Renderiza o QR Code como PNG monocromático (1 bit por pixel)"""
+    width = (qr.size + border * 2) * scale
+    row_bytes = (width + 7) // 8
+    padding_bits = row_bytes * 8 - width
+
+    blank_row = b"\x00" + b"\xff" * row_bytes
+    white_border = "1" * (border * scale)
+
+    raw = bytearray()
+    for _ in range(border * scale):
+        raw += blank_row
+
+    for row in qr.modules:
+        bits = white_border + "".join(("0" if dark else "1") * scale for dark in row) + white_border
+        bits += "1" * padding_bits
+        line = b"\x00" + int(bits, 2).to_bytes(row_bytes, "big")
+        for _ in range(scale):
+            raw += line
+
+    for _ in range(border * scale):
+        raw += blank_row
+
+    header = struct.pack(">IIBBBBB", width, width, 1, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(bytes(raw), 9))
+        + _png_chunk(b"IEND", b"")
+    )
+
+def render_svg(qr: QRCode, border: int = 4) -> str:
+    """Renderiza o QR Code como SVG (um único path)"""
+    size = qr.size + border * 2
+    parts = []
+    for y, row in enumerate(qr.modules):
+        x = 0
+        while x < qr.size:
+            if row[x]:
+                start = x
+                while x < qr.size and row[x]:
+                    x += 1
+                parts.append(f"M{start + border},{y + border}h{x - start}v1h{start - x}z")
+            else:
+                x += 1
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'shape-rendering="crispEdges"><rect width="100%" height="100%" fill="#fff"/>'
+        f'<path d="{"".join(parts)}" fill="#000"/></svg>'
+    )
+
+class QRImageCache:
+    """Cache LRU de imagens renderizadas, indexado pelo hash do payload"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _key(self, payload: str, image_format: str, ecc_level: str, scale: int) -> str:
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return f"{digest}:{image_format}:{ecc_level}:{scale}"
+
+    def get_or_render(self, payload: str, image_format: str = "png", ecc_level: str = "M", scale: int = 8):
+        key = self._key(payload, image_format, ecc_level, scale)
+
+        with self._lock:
+            image = self.entries.get(key)
+            if image is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        qr = encode_qr(payload, ecc_level)
+        image = render_png(qr, scale=scale) if image_format == "png" else render_svg(qr)
+
+        with self._lock:
+            self.entries[key] = image
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+        return image
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+# Cache global de imagens de QR Code
+qr_image_cache = QRImageCache()
+
+def qr_code_data_uri(payload: str, image_format: str = "png") -> str:
+    """Retorna a imagem do QR Code do payload como data URI (com cache)"""
+    image = qr_image_cache.get_or_render(payload, image_format)
+
+    if image_format == "png":
+        return "data:image/png;base64," + base64.b64encode(image).decode("ascii")
+
+    return "data:image/svg+xml;base64," + base64.b64encode(image.encode("utf-8")).decode("ascii")
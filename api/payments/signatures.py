@@ -0,0 +1,233 @@
+"""
+Verificação das assinaturas HMAC dos webhooks dos gateways
+
+Sem a assinatura, qualquer um que conheça a URL do webhook poderia marcar
+um pagamento como aprovado. A verificação roda antes de qualquer consulta
+ao banco ou ao gateway: uma notificação forjada custa um HMAC e é
+recusada com 401.
+
+    Mercado Pago  cabeçalhos x-signature: ts=<timestamp>,v1=<hex> e x-request-id
+                  HMAC-SHA256 do manifesto "id:<data.id>;request-id:<x-request-id>;ts:<ts>;"
+                  (formato documentado pelo Mercado Pago)
+    PushinPay     formato configurável, não confirmado na documentação do gateway:
+                  timestamped  <cabeçalho>: t=<timestamp>,v1=<hex>, HMAC-SHA256 de
+                               "<timestamp>." + corpo bruto (padrão)
+                  body         <cabeçalho>: <hex>, HMAC-SHA256 do corpo bruto
+
+As chaves ficam em memória como objetos HMAC já inicializados (o padding
+da chave é calculado uma vez; cada verificação só copia o estado), e a
+comparação usa hmac.compare_digest, que leva o mesmo tempo acerte ou erre
+o primeiro byte. Timestamps fora da tolerância são recusados para impedir
+a reutilização de uma notificação capturada.
+
+Cada variável aceita vários segredos separados por vírgula (o novo e o
+antigo durante a rotação). Sem o segredo do Mercado Pago a verificação
+falha fechada: todas as notificações são recusadas com 401 (só com
+WEBHOOK_SIGNATURE_REQUIRED=false, em desenvolvimento local, são aceitas
+sem assinatura). O PushinPay não falha fechado, porque o formato da
+assinatura é uma suposição: sem PUSHINPAY_WEBHOOK_SECRET a notificação é
+aceita sem assinatura e o router consulta o status no gateway em vez de
+confiar no corpo. Com o segredo, confira se o cabeçalho e o formato
+conferem com o que o PushinPay envia antes de ativar em produção.
+
+Variáveis de ambiente:
+    PUSHINPAY_WEBHOOK_SECRET       segredo(s) do webhook do PushinPay
+    PUSHINPAY_SIGNATURE_HEADER     cabeçalho da assinatura do PushinPay (padrão: x-pushinpay-signature)
+    PUSHINPAY_SIGNATURE_FORMAT     timestamped ou body (padrão: timestamped)
+    MERCADOPAGO_WEBHOOK_SECRET     assinatura secreta do webhook do Mercado Pago
+    WEBHOOK_SIGNATURE_TOLERANCE    idade máxima da assinatura em segundos (padrão: 300)
+    WEBHOOK_SIGNATURE_REQUIRED     false aceita notificações do Mercado Pago sem
+                                   assinatura quando não há segredo (padrão: true)
+"""
+
+import os
+import hmac
+import time
+import hashlib
+import logging
+from typing import Dict, Any, Optional, Sequence, Mapping
+
+from dotenv import load_dotenv
+
+from ..metrics import registry
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Suposição (o PushinPay não documenta o formato): ajustar pelas variáveis de ambiente
+PUSHINPAY_SIGNATURE_HEADER = os.getenv("PUSHINPAY_SIGNATURE_HEADER", "x-pushinpay-signature").lower()
+PUSHINPAY_SIGNATURE_FORMAT = os.getenv("PUSHINPAY_SIGNATURE_FORMAT", "timestamped").lower()
+PUSHINPAY_SIGNATURE_FORMATS = ("timestamped", "body")
+
+if PUSHINPAY_SIGNATURE_FORMAT not in PUSHINPAY_SIGNATURE_FORMATS:
+    logger.error(f"PUSHINPAY_SIGNATURE_FORMAT inválido: {PUSHINPAY_SIGNATURE_FORMAT}; usando timestamped")
+    PUSHINPAY_SIGNATURE_FORMAT = "timestamped"
+
+MERCADOPAGO_SIGNATURE_HEADER = "x-signature"
+MERCADOPAGO_REQUEST_ID_HEADER = "x-request-id"
+
+webhook_signature_checks = registry.counter(
+    "webhook_signature_checks_total", "Verificações de assinatura dos webhooks por resultado", ("gateway", "result")
+)
+
+class InvalidSignature(Exception):
+    """A notificação não tem uma assinatura válida e recente"""
+
+    def __init__(self, gateway: str, reason: str):
+        super().__init__(f"Assinatura inválida do {gateway}: {reason}")
+        self.gateway = gateway
+        self.reason = reason
+
+def parse_signature_header(value: Optional[str]) -> Dict[str, str]:
+    """Converte "ts=123,v1=abc" em {"ts": "123", "v1": "abc"}"""
+    parts = {}
+    for item in (value or "").split(","):
+        key, separator, part = item.strip().partition("=")
+        if separator:
+            parts[key.strip()] = part.strip()
+    return parts
+
+class SignatureVerifier:
+    """Segredos de um gateway com as chaves HMAC pré-calculadas"""
+
+    def __init__(self, gateway: str, secrets: Sequence[str], tolerance: float = 300.0, required: bool = True):
+        """
+        Args:
+            gateway: Nome do gateway (logs e métricas)
+            secrets: Segredos aceitos; o primeiro é usado para assinar
+            tolerance: Idade máxima (s) do timestamp assinado; 0 desliga a verificação
+            required: Sem segredos, recusa todas as notificações (False as aceita)
+
+        O timestamp passado a verify é None quando o formato não assina um timestamp.
+        """
+        self.gateway = gateway
+        self.tolerance = tolerance
+        self.required = required
+        self._keys = [hmac.new(secret.encode("utf-8"), digestmod=hashlib.sha256) for secret in secrets]
+
+        if not self._keys and required:
+            logger.error(f"Segredo do webhook do {gateway} não configurado; todas as notificações serão recusadas")
+        elif not self._keys:
+            logger.warning(f"Segredo do webhook do {gateway} não configurado; assinaturas não serão verificadas")
+
+    @classmethod
+    def from_env(cls, gateway: str, variable: str, required: Optional[bool] = None) -> "SignatureVerifier":
+        secrets = [secret.strip() for secret in os.getenv(variable, "").split(",") if secret.strip()]
+        if required is None:
+            required = os.getenv("WEBHOOK_SIGNATURE_REQUIRED", "true").lower() != "false"
+        return cls(
+            gateway, secrets,
+            tolerance=float(os.getenv("WEBHOOK_SIGNATURE_TOLERANCE", "300")),
+            required=required
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._keys)
+
+    def sign(self, message: bytes) -> str:
+        """Assinatura hexadecimal com o segredo atual"""
+        key = self._keys[0].copy()
+        key.update(message)
+        return key.hexdigest()
+
+    def _matches(self, message: bytes, signature: str) -> bool:
+        signature = signature.lower().encode("ascii", "replace")
+        matched = False
+        # Todas as chaves são comparadas, sem parar na primeira que confere
+        for prototype in self._keys:
+            key = prototype.copy()
+            key.update(message)
+            matched |= hmac.compare_digest(key.hexdigest().encode("ascii"), signature)
+        return matched
+
+    def _check_timestamp(self, timestamp: str, now: Optional[float] = None):
+        try:
+            signed_at = float(timestamp)
+        except (TypeError, ValueError):
+            raise InvalidSignature(self.gateway, "timestamp ausente")
+        # O Mercado Pago envia o timestamp em milissegundos
+        if signed_at > 1e11:
+            signed_at /= 1000
+        if self.tolerance and abs((now or time.time()) - signed_at) > self.tolerance:
+            raise InvalidSignature(self.gateway, "timestamp fora da tolerância")
+
+    def verify(self, message: bytes, signature: Optional[str], timestamp: Optional[str], now: Optional[float] = None):
+        """
+        Raises:
+            InvalidSignature: Se a assinatura não confere com nenhum segredo, o
+                timestamp está fora da tolerância ou não há segredo configurado
+        """
+        if not self.enabled and not self.required:
+            webhook_signature_checks.inc(gateway=self.gateway, result="disabled")
+            return
+
+        try:
+            if not self.enabled:
+                raise InvalidSignature(self.gateway, "segredo do webhook não configurado")
+            if not signature:
+                raise InvalidSignature(self.gateway, "assinatura ausente")
+            if timestamp is not None:
+                self._check_timestamp(timestamp, now)
+            if not self._matches(message, signature):
+                raise InvalidSignature(self.gateway, "assinatura não confere")
+        except InvalidSignature as e:
+            webhook_signature_checks.inc(gateway=self.gateway, result="rejected")
+            logger.warning(str(e), extra={"event": "gateway.signature_rejected", "gateway": self.gateway})
+            raise
+
+        webhook_signature_checks.inc(gateway=self.gateway, result="valid")
+
+# Instâncias globais (segredos lidos uma vez na importação)
+# PushinPay nunca falha fechado: sem segredo o router confirma o status no gateway
+pushinpay_signatures = SignatureVerifier.from_env("pushinpay", "PUSHINPAY_WEBHOOK_SECRET", required=False)
+mercadopago_signatures = SignatureVerifier.from_env("mercadopago", "MERCADOPAGO_WEBHOOK_SECRET")
+
+def pushinpay_message(timestamp: str, body: bytes) -> bytes:
+    return f"{timestamp}.".encode("ascii") + body
+
+def mercadopago_manifest(data_id: str, request_id: Optional[str], timestamp: str) -> bytes:
+    # IDs alfanuméricos entram no manifesto em minúsculas (documentação do Mercado Pago)
+    manifest = f"id:{str(data_id).lower()};"
+    if request_id:
+        manifest += f"request-id:{request_id};"
+    return (manifest + f"ts:{timestamp};").encode("utf-8")
+
+def verify_pushinpay_signature(
+    headers: Mapping[str, str],
+    body: bytes,
+    header: str = PUSHINPAY_SIGNATURE_HEADER,
+    signature_format: str = PUSHINPAY_SIGNATURE_FORMAT
+):
+    """
+    Verifica a assinatura de um webhook do PushinPay sobre o corpo bruto
+
+    Sem segredo configurado não verifica nada (pushinpay_signatures.enabled é
+    False e o router consulta o status no gateway).
+
+    Raises:
+        InvalidSignature
+    """
+    if signature_format == "body":
+        pushinpay_signatures.verify(body, headers.get(header), None)
+        return
+
+    parts = parse_signature_header(headers.get(header))
+    timestamp = parts.get("t", "")
+    pushinpay_signatures.verify(pushinpay_message(timestamp, body), parts.get("v1"), timestamp)
+
+def verify_mercadopago_signature(headers: Mapping[str, str], data_id: Any):
+    """
+    Verifica a assinatura de um webhook do Mercado Pago para o pagamento data_id
+
+    Raises:
+        InvalidSignature
+    """
+    parts = parse_signature_header(headers.get(MERCADOPAGO_SIGNATURE_HEADER))
+    timestamp = parts.get("ts", "")
+    mercadopago_signatures.verify(
+        mercadopago_manifest(data_id, headers.get(MERCADOPAGO_REQUEST_ID_HEADER), timestamp),
+        parts.get("v1"), timestamp
+    )
@@ -0,0 +1,310 @@
+"""
+Camada de consultas com projeção de colunas e métricas de payload
+
+Cada consulta declara um nome (usado nas métricas), a tabela e as colunas
+que o chamador realmente usa; select("*") não é aceito. A resposta de cada
+execute() é medida (linhas, bytes do JSON e tempo) por nome de consulta,
+para identificar as consultas quentes que ainda trafegam dados demais.
+
+Exemplo:
+    response = select("bots.exists_by_token", "bots", ("id",)).eq("token", token).execute()
+"""
+
+import json
+import time
+import asyncio
+import threading
+from typing import Dict, Any, Optional, List, Sequence, Tuple, Type, Union
+
+from pydantic import BaseModel
+
+from .database import get_db
+from .tracing import tracer, COMPONENT_DB
+from .metrics import db_query_seconds, db_query_errors
+from .models import BotResponse, PlanResponse, PaymentResponse, SaleResponse, UserResponse
+from .singleflight import SingleFlight
+
+def columns_of(model: Type[BaseModel], *extra: str) -> Tuple[str, ...]:
+    """Colunas correspondentes aos campos de um modelo de resposta"""
+    return tuple(model.model_fields) + extra
+
+# Projeções usadas pelos endpoints que retornam os modelos completos
+USER_COLUMNS = columns_of(UserResponse)
+BOT_COLUMNS = columns_of(BotResponse)
+PLAN_COLUMNS = columns_of(PlanResponse)
+PAYMENT_COLUMNS = columns_of(PaymentResponse)
+SALE_COLUMNS = columns_of(SaleResponse)
+
+Columns = Union[Sequence[str], Type[BaseModel]]
+
+class QueryStats:
+    """Contadores de uma consulta nomeada"""
+
+    def __init__(self, table: str, columns: str):
+        self.table = table
+        self.columns = columns
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.bytes = 0
+        self.max_bytes = 0
+        self.seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        calls = self.calls or 1
+        return {
+            "table": self.table,
+            "columns": self.columns,
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "avg_bytes": round(self.bytes / calls),
+            "max_bytes": self.max_bytes,
+            "avg_ms": round(self.seconds / calls * 1000, 2)
+        }
+
+class QueryMetrics:
+    """Métricas agregadas por nome de consulta"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries: Dict[str, QueryStats] = {}
+
+    def _stats(self, name: str, table: str, columns: str) -> QueryStats:
+        stats = self.queries.get(name)
+        if stats is None:
+            stats = self.queries[name] = QueryStats(table, columns)
+        return stats
+
+    def record(self, name: str, table: str, columns: str, rows: int, size: int, seconds: float):
+        with self.lock:
+            stats = self._stats(name, table, columns)
+            stats.calls += 1
+            stats.rows += rows
+            stats.bytes += size
+            stats.max_bytes = max(stats.max_bytes, size)
+            stats.seconds += seconds
+
+    def record_error(self, name: str, table: str, columns: str):
+        with self.lock:
+            self._stats(name, table, columns).errors += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Consultas ordenadas pelo total de bytes recebidos"""
+        with self.lock:
+            items = sorted(self.queries.items(), key=lambda item: item[1].bytes, reverse=True)
+            return {name: stats.to_dict() for name, stats in items}
+
+    def reset(self):
+        with self.lock:
+            self.queries.clear()
+
+# Instância global
+query_metrics = QueryMetrics()
+
+# Leituras idênticas em andamento (Query.execute_shared)
+read_flight = SingleFlight("db.reads")
+
+def payload_size(data: Any) -> int:
+    """Tamanho aproximado em bytes do JSON recebido"""
+    return len(json.dumps(data, separators=(",", ":"), default=str, ensure_ascii=False).encode("utf-8"))
+
+class Query:
+    """
+    Envelopa o builder do Supabase mantendo a interface (eq, in_, order,
+    limit, ...) e registra as métricas no execute()
+    """
+
+    __slots__ = ("_name", "_table", "_columns", "_builder")
+
+    def __init__(self, name: str, table: str, columns: str, builder):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_table", table)
+        object.__setattr__(self, "_columns", columns)
+        object.__setattr__(self, "_builder", builder)
+
+    def __getattr__(self, attribute: str):
+        value = getattr(self._builder, attribute)
+        if not callable(value):
+            return value
+
+        def method(*args, **kwargs):
+            result = value(*args, **kwargs)
+            if hasattr(result, "execute"):
+                object.__setattr__(self, "_builder", result)
+                return self
+            return result
+
+        return method
+
+    def __setattr__(self, attribute: str, value: Any):
+        # Permite ajustar params diretamente (usado pela paginação por cursor)
+        setattr(self._builder, attribute, value)
+
+    def execute(self):
+        with tracer.span(self._name, component=COMPONENT_DB, **{"db.table": self._table}) as span:
+            start = time.perf_counter()
+            try:
+                response = self._builder.execute()
+            except Exception:
+                query_metrics.record_error(self._name, self._table, self._columns)
+                db_query_errors.inc(query=self._name)
+                raise
+
+            elapsed = time.perf_counter() - start
+            db_query_seconds.observe(elapsed, query=self._name)
+
+            data = response.data
+            rows = len(data) if isinstance(data, list) else int(data is not None)
+            size = payload_size(data)
+            query_metrics.record(self._name, self._table, self._columns, rows, size, elapsed)
+            if span is not None:
+                span.set("db.rows", rows)
+                span.set("db.bytes", size)
+            return response
+
+    async def execute_shared(self):
+        """
+        execute() fora do event loop, compartilhado entre as chamadas
+        simultâneas da mesma leitura: mesma tabela, colunas, filtros e
+        formato da resposta (Accept muda com .single()), feita com as mesmas
+        credenciais (o cliente passado em select(client=...) pode ser outro)
+
+        Para consultas quentes disparadas em rajada com os mesmos argumentos
+        (configuração e planos do bot no /start). A resposta é o mesmo objeto
+        para todos os chamadores e não deve ser alterada.
+        """
+        builder = self._builder
+        if builder.http_method != "GET":
+            raise ValueError(f"A consulta {self._name} não é uma leitura")
+
+        session = builder.session.headers
+        key = (
+            str(builder.session.base_url), self._table, str(builder.params),
+            builder.headers.get("accept"), builder.headers.get("prefer"),
+            builder.headers.get("authorization", session.get("authorization")),
+            builder.headers.get("apikey", session.get("apikey"))
+        )
+        return await read_flight.do(key, lambda: asyncio.to_thread(self.execute), label=self._name)
+
+def _projection(name: str, columns: Columns) -> str:
+    if isinstance(columns, type) and issubclass(columns, BaseModel):
+        columns = columns_of(columns)
+    if isinstance(columns, str):
+        columns = (columns,)
+    if not columns or "*" in columns:
+        raise ValueError(f"A consulta {name} deve declarar as colunas usadas")
+    return ",".join(columns)
+
+def select(name: str, table: str, columns: Columns, count: Optional[str] = None, client=None) -> Query:
+    """
+    Inicia uma consulta com projeção explícita
+
+    Args:
+        name: Identificador da consulta nas métricas (ex.: "telegram.config")
+        table: Tabela consultada
+        columns: Colunas (ou modelo Pydantic cujos campos são as colunas);
+            pode incluir recursos embutidos como "plans!inner(name)"
+        count: Método de contagem do PostgREST ("exact", "planned", ...)
+        client: Cliente Supabase (padrão: get_db())
+    """
+    projection = _projection(name, columns)
+    builder = (client or get_db()).table(table).select(projection, count=count)
+    return Query(name, table, projection, builder)
+
+def _returning(name: str, table: str, columns: Columns, builder) -> Query:
+    # PostgREST aplica ?select= também à representação retornada pela escrita
+    projection = _projection(name, columns)
+    builder.params = builder.params.add("select", projection)
+    return Query(name, table, projection, builder)
+
+def update_returning(
+    name: str,
+    table: str,
+    values: Dict[str, Any],
+    match: Dict[str, Any],
+    columns: Columns,
+    client=None
+) -> Optional[Dict[str, Any]]:
+    """
+    UPDATE ... WHERE match RETURNING columns em uma única requisição
+
+    Returns:
+        A linha atualizada, ou None se nenhuma linha corresponder ao filtro
+    """
+    builder = (client or get_db()).table(table).update(values)
+    for column, value in match.items():
+        builder = builder.eq(column, value)
+
+    rows = _returning(name, table, columns, builder).execute().data
+    return rows[0] if rows else None
+
+def update_many_returning(
+    name: str,
+    table: str,
+    values: Dict[str, Any],
+    column: str,
+    keys: Sequence[Any],
+    columns: Columns,
+    exclude: Optional[Dict[str, Any]] = None,
+    client=None
+) -> List[Dict[str, Any]]:
+    """
+    UPDATE ... WHERE column IN (keys) AND campo <> valor RETURNING columns
+
+    Com exclude a escrita é condicional: linhas que já têm o valor não são
+    atualizadas nem retornadas, então entre requisições concorrentes só uma
+    recebe cada linha (ex.: exclude={"status": "completed"}).
+
+    Returns:
+        As linhas atualizadas
+    """
+    builder = (client or get_db()).table(table).update(values).in_(column, list(keys))
+    for field, value in (exclude or {}).items():
+        builder = builder.neq(field, value)
+
+    return _returning(name, table, columns, builder).execute().data
+
+def insert_if_absent(
+    name: str,
+    table: str,
+    values: Dict[str, Any],
+    on_conflict: str,
+    columns: Columns,
+    client=None
+) -> Optional[Dict[str, Any]]:
+    """
+    INSERT ... ON CONFLICT (on_conflict) DO NOTHING RETURNING columns
+
+    Requer uma restrição única nas colunas de on_conflict.
+
+    Returns:
+        A linha inserida, ou None se já existia uma linha com a mesma chave
+    """
+    builder = (client or get_db()).table(table).upsert(
+        values, ignore_duplicates=True, on_conflict=on_conflict
+    )
+
+    rows = _returning(name, table, columns, builder).execute().data
+    return rows[0] if rows else None
+
+def insert_many_if_absent(
+    name: str,
+    table: str,
+    rows: List[Dict[str, Any]],
+    on_conflict: str,
+    columns: Columns,
+    client=None
+) -> List[Dict[str, Any]]:
+    """
+    insert_if_absent para várias linhas em uma única requisição
+
+    Returns:
+        As linhas inseridas (as que já existiam ficam de fora)
+    """
+    builder = (client or get_db()).table(table).upsert(
+        rows, ignore_duplicates=True, on_conflict=on_conflict
+    )
+
+    return _returning(name, table, columns, builder).execute().data
@@ -0,0 +1,488 @@
+"""
+Relatórios financeiros colunares sobre as vendas
+
+As vendas são lidas do Supabase em páginas e convertidas para arrays NumPy:
+valores em centavos (int64), datas em datetime64[s] e ids de bot, plano,
+usuário e método de pagamento como códigos categóricos (int32) com a tabela
+de categorias ao lado. Agrupamentos, coortes de retenção e curvas de MRR e
+churn são calculados de forma vetorizada, sem iterar sobre as vendas em
+Python.
+
+A saída é um Report (colunas nomeadas) que pode ser gravado em CSV ou, se o
+pyarrow estiver instalado, em Parquet.
+"""
+
+import csv
+import io
+import logging
+from datetime import datetime, date, timezone
+from typing import Dict, Any, Optional, List, Sequence, Tuple
+
+import numpy as np
+
+from .queries import select
+from .pagination import fetch_page
+
+logger = logging.getLogger(__name__)
+
+SALES_REPORT_COLUMNS = (
+    "id", "bot_id", "plan_id", "user_telegram_id", "amount", "created_at", "expires_at", "payments(method)"
+)
+
+# Unidades NumPy de cada período de agrupamento
+PERIOD_UNITS = {"day": "D", "week": "W", "month": "M", "year": "Y"}
+
+# As semanas do NumPy (datetime64[W]) contam a partir de 1970-01-01, uma
+# quinta-feira; deslocar 3 dias alinha os índices às semanas ISO (segunda-feira)
+WEEK_OFFSET = np.timedelta64(3, "D")
+
+# Dimensões aceitas em revenue_by
+DIMENSIONS = ("bot", "plan", "method", "period")
+
+UNKNOWN = ""
+
+def _parse_timestamp(value: Optional[str]) -> str:
+    """Normaliza um timestamp ISO para UTC sem fuso (formato aceito pelo NumPy)"""
+    if not value:
+        return "NaT"
+    if value.endswith("+00:00") or value.endswith("Z"):
+        return value[:19]
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S")
+
+def parse_timestamps(values: Sequence[Optional[str]]) -> np.ndarray:
+    """Converte timestamps ISO (com ou sem fuso) para datetime64[s] em UTC"""
+    return np.array([_parse_timestamp(value) for value in values], dtype="datetime64[s]")
+
+def _period_index(timestamps: np.ndarray, period: str) -> np.ndarray:
+    if period not in PERIOD_UNITS:
+        raise ValueError(f"Período inválido: {period}")
+    if period == "week":
+        timestamps = timestamps + WEEK_OFFSET
+    return timestamps.astype(f"datetime64[{PERIOD_UNITS[period]}]").astype(np.int64)
+
+def _period_labels(indexes: np.ndarray, period: str) -> np.ndarray:
+    """Rótulo de cada período: a data de início (semanas começam na segunda-feira)"""
+    periods = indexes.astype(f"datetime64[{PERIOD_UNITS[period]}]")
+    if period == "week":
+        periods = periods.astype("datetime64[D]") - WEEK_OFFSET
+    return periods.astype(str)
+
+class SalesColumns:
+    """Vendas em formato colunar"""
+
+    def __init__(
+        self,
+        created_at: np.ndarray,
+        expires_at: np.ndarray,
+        amount_cents: np.ndarray,
+        bot_codes: np.ndarray,
+        plan_codes: np.ndarray,
+        user_codes: np.ndarray,
+        method_codes: np.ndarray,
+        bots: np.ndarray,
+        plans: np.ndarray,
+        users: np.ndarray,
+        methods: np.ndarray
+    ):
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.amount_cents = amount_cents
+        self.bot_codes = bot_codes
+        self.plan_codes = plan_codes
+        self.user_codes = user_codes
+        self.method_codes = method_codes
+        self.bots = bots
+        self.plans = plans
+        self.users = users
+        self.methods = methods
+
+    def __len__(self) -> int:
+        return len(self.amount_cents)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (
+            self.created_at, self.expires_at, self.amount_cents,
+            self.bot_codes, self.plan_codes, self.user_codes, self.method_codes
+        )
+        return sum(array.nbytes for array in arrays)
+
+    def filter(self, mask: np.ndarray) -> "SalesColumns":
+        """Seleciona as vendas do mask mantendo as tabelas de categorias"""
+        return SalesColumns(
+            self.created_at[mask], self.expires_at[mask], self.amount_cents[mask],
+            self.bot_codes[mask], self.plan_codes[mask], self.user_codes[mask], self.method_codes[mask],
+            self.bots, self.plans, self.users, self.methods
+        )
+
+    def between(self, start: Optional[date] = None, end: Optional[date] = None) -> "SalesColumns":
+        """Vendas criadas entre start e end (inclusive)"""
+        mask = np.ones(len(self), dtype=bool)
+        days = self.created_at.astype("datetime64[D]")
+        if start:
+            mask &= days >= np.datetime64(start, "D")
+        if end:
+            mask &= days <= np.datetime64(end, "D")
+        return self.filter(mask)
+
+class SalesColumnsBuilder:
+    """Acumula páginas de vendas (dicts do Supabase) em colunas"""
+
+    def __init__(self):
+        self.bot_index: Dict[str, int] = {}
+        self.plan_index: Dict[str, int] = {}
+        self.user_index: Dict[str, int] = {}
+        self.method_index: Dict[str, int] = {}
+        self.chunks: List[Tuple[np.ndarray, ...]] = []
+
+    @staticmethod
+    def _encode(index: Dict[str, int], values: List[Any]) -> np.ndarray:
+        codes = [index.setdefault(value or UNKNOWN, len(index)) for value in values]
+        return np.array(codes, dtype=np.int32)
+
+    def add_page(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+
+        methods = []
+        for row in rows:
+            payment = row.get("payments")
+            methods.append(payment.get("method") if isinstance(payment, dict) else row.get("method"))
+
+        amounts = np.array([row.get("amount") or 0 for row in rows], dtype=np.float64)
+
+        self.chunks.append((
+            parse_timestamps([row.get("created_at") for row in rows]),
+            parse_timestamps([row.get("expires_at") for row in rows]),
+            np.rint(amounts * 100).astype(np.int64),
+            self._encode(self.bot_index, [row.get("bot_id") for row in rows]),
+            self._encode(self.plan_index, [row.get("plan_id") for row in rows]),
+            self._encode(self.user_index, [row.get("user_telegram_id") for row in rows]),
+            self._encode(self.method_index, methods)
+        ))
+
+    def build(self) -> SalesColumns:
+        if self.chunks:
+            columns = [np.concatenate(parts) for parts in zip(*self.chunks)]
+        else:
+            columns = [
+                np.array([], dtype="datetime64[s]"), np.array([], dtype="datetime64[s]"),
+                np.array([], dtype=np.int64)
+            ] + [np.array([], dtype=np.int32)] * 4
+
+        categories = [
+            np.array(list(index), dtype=object)
+            for index in (self.bot_index, self.plan_index, self.user_index, self.method_index)
+        ]
+        return SalesColumns(*columns, *categories)
+
+def fetch_sales_columns(
+    bot_ids: List[str],
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    page_size: int = 1000
+) -> SalesColumns:
+    """
+    Lê as vendas dos bots em páginas e monta as colunas
+
+    Args:
+        bot_ids: Bots incluídos no relatório
+        start: Data inicial (inclusive) das vendas
+        end: Data final (inclusive) das vendas
+        page_size: Linhas por requisição ao Supabase
+    """
+    builder = SalesColumnsBuilder()
+    if not bot_ids:
+        return builder.build()
+
+    def build_query():
+        query = select("reporting.sales", "sales", SALES_REPORT_COLUMNS).in_("bot_id", bot_ids)
+        if start:
+            query = query.gte("created_at", start.isoformat())
+        if end:
+            query = query.lte("created_at", f"{end.isoformat()}T23:59:59.999999+00:00")
+        return query
+
+    cursor = None
+    while True:
+        rows, cursor = fetch_page(build_query, cursor, page_size, descending=False)
+        builder.add_page(rows)
+        if cursor is None:
+            break
+
+    columns = builder.build()
+    logger.info("Relatório: %d vendas carregadas (%.0f KiB em colunas)", len(columns), columns.nbytes / 1024)
+    return columns
+
+class Report:
+    """Tabela de resultado com colunas nomeadas"""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        names = list(self.columns)
+        values = [self.columns[name].tolist() for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def to_csv(self, target: Any = None) -> Optional[str]:
+        """
+        Grava o relatório em CSV
+
+        Args:
+            target: Caminho ou arquivo aberto; sem target retorna o CSV como texto
+        """
+        if target is None:
+            buffer = io.StringIO()
+            self._write_csv(buffer)
+            return buffer.getvalue()
+
+        if isinstance(target, str):
+            with open(target, "w", newline="", encoding="utf-8") as file:
+                self._write_csv(file)
+        else:
+            self._write_csv(target)
+        return None
+
+    def _write_csv(self, file):
+        writer = csv.writer(file)
+        writer.writerow(self.columns.keys())
+        writer.writerows(zip(*(column.tolist() for column in self.columns.values())))
+
+    def to_parquet(self, path: str):
+        """Grava o relatório em Parquet (requer pyarrow)"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("pyarrow não está instalado; use to_csv ou instale pyarrow")
+
+        table = pa.table({
+            name: column.astype(str) if column.dtype == object else column
+            for name, column in self.columns.items()
+        })
+        pq.write_table(table, path)
+
+def _group(keys: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Agrupa por várias colunas inteiras
+
+    Returns:
+        (chaves únicas com uma coluna por dimensão, índice do grupo de cada linha)
+    """
+    # Combina as colunas em uma única chave int64 (base mista) para ordenar
+    # um vetor só, bem mais rápido que np.unique(axis=0)
+    offsets = [int(key.min()) for key in keys]
+    sizes = [int(key.max()) - offset + 1 for key, offset in zip(keys, offsets)]
+    if np.prod(np.array(sizes, dtype=np.float64)) >= 2 ** 63:
+        stacked = np.stack(keys, axis=1)
+        unique, inverse = np.unique(stacked, axis=0, return_inverse=True)
+        return unique, inverse.reshape(-1)
+
+    combined = np.zeros(len(keys[0]), dtype=np.int64)
+    for key, offset, size in zip(keys, offsets, sizes):
+        combined = combined * size + (key.astype(np.int64) - offset)
+
+    unique_combined, inverse = np.unique(combined, return_inverse=True)
+
+    unique = np.empty((len(unique_combined), len(keys)), dtype=np.int64)
+    remainder = unique_combined
+    for position in range(len(keys) - 1, -1, -1):
+        unique[:, position] = remainder % sizes[position] + offsets[position]
+        remainder = remainder // sizes[position]
+
+    return unique, inverse.reshape(-1)
+
+def revenue_by(
+    sales: SalesColumns,
+    dimensions: Sequence[str] = ("bot", "period"),
+    period: str = "month"
+) -> Report:
+    """
+    Receita e quantidade de vendas agrupadas
+
+    Args:
+        sales: Vendas em colunas
+        dimensions: Combinação de bot, plan, method e period
+        period: day, week, month ou year (quando period está nas dimensões)
+    """
+    for dimension in dimensions:
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Dimensão inválida: {dimension}")
+
+    if not dimensions:
+        return Report({
+            "sales": np.array([len(sales)]),
+            "revenue": np.array([sales.amount_cents.sum() / 100])
+        })
+
+    sources = {
+        "bot": (sales.bot_codes, sales.bots),
+        "plan": (sales.plan_codes, sales.plans),
+        "method": (sales.method_codes, sales.methods)
+    }
+
+    keys = []
+    for dimension in dimensions:
+        if dimension == "period":
+            keys.append(_period_index(sales.created_at, period))
+        else:
+            keys.append(sources[dimension][0].astype(np.int64))
+
+    if not len(sales):
+        columns = {dimension: np.array([], dtype=object) for dimension in dimensions}
+        columns.update({"sales": np.array([], dtype=np.int64), "revenue": np.array([], dtype=np.float64)})
+        return Report(columns)
+
+    unique, inverse = _group(keys)
+    counts = np.bincount(inverse)
+    revenue = np.bincount(inverse, weights=sales.amount_cents) / 100
+
+    columns = {}
+    for position, dimension in enumerate(dimensions):
+        codes = unique[:, position]
+        if dimension == "period":
+            columns[dimension] = _period_labels(codes, period)
+        else:
+            columns[dimension] = sources[dimension][1][codes]
+
+    columns["sales"] = counts
+    columns["revenue"] = np.round(revenue, 2)
+    return Report(columns)
+
+def cohort_retention(sales: SalesColumns, period: str = "month") -> Report:
+    """
+    Retenção por coorte de primeira compra
+
+    Um usuário da coorte C está retido no período C+k se comprou (ou
+    renovou) em C+k.
+
+    Returns:
+        Report com cohort, offset, users e retention
+    """
+    if not len(sales):
+        return Report({
+            "cohort": np.array([], dtype=object), "offset": np.array([], dtype=np.int64),
+            "users": np.array([], dtype=np.int64), "retention": np.array([], dtype=np.float64)
+        })
+
+    periods = _period_index(sales.created_at, period)
+    users = sales.user_codes.astype(np.int64)
+
+    missing = np.iinfo(np.int64).max
+    first = np.full(len(sales.users), missing)
+    np.minimum.at(first, users, periods)
+
+    # Um registro por usuário e período com compra
+    pairs, _ = _group([users, periods])
+    pair_cohorts = first[pairs[:, 0]]
+    offsets = pairs[:, 1] - pair_cohorts
+
+    unique, inverse = _group([pair_cohorts, offsets])
+    active = np.bincount(inverse)
+
+    cohort_values, cohort_counts = np.unique(first[first != missing], return_counts=True)
+    sizes = cohort_counts[np.searchsorted(cohort_values, unique[:, 0])]
+
+    return Report({
+        "cohort": _period_labels(unique[:, 0], period),
+        "offset": unique[:, 1],
+        "users": active,
+        "retention": np.round(active / sizes, 4)
+    })
+
+def mrr_curve(sales: SalesColumns, grace_days: int = 3, now: Optional[datetime] = None) -> Report:
+    """
+    MRR mensal, assinaturas ativas e churn
+
+    MRR e ativas são medidos no fim de cada mês: uma venda com expiração
+    conta no mês m se created_at <= fim de m < expires_at, com amount /
+    duração em meses. Assim a renovação não se sobrepõe à venda anterior no
+    mês da troca. new conta só as primeiras compras (não as renovações).
+    Uma assinatura conta como churn no mês em que expira se o mesmo usuário
+    não comprar de novo até grace_days depois da expiração; expirações
+    posteriores a `now` ainda não contam. churn_rate é o churn sobre as
+    ativas no início do mês. Vendas sem expiração (acesso vitalício) não
+    entram no MRR.
+
+    Returns:
+        Report com month, mrr, active, new, churned e churn_rate
+    """
+    recurring = ~np.isnat(sales.expires_at)
+    subs = sales.filter(recurring)
+
+    if not len(subs):
+        return Report({
+            "month": np.array([], dtype=object), "mrr": np.array([], dtype=np.float64),
+            "active": np.array([], dtype=np.int64), "new": np.array([], dtype=np.int64),
+            "churned": np.array([], dtype=np.int64), "churn_rate": np.array([], dtype=np.float64)
+        })
+
+    start_month = _period_index(subs.created_at, "month")
+    end_month = _period_index(subs.expires_at, "month")
+    end_month = np.maximum(end_month, start_month)
+
+    duration_days = (subs.expires_at - subs.created_at).astype("timedelta64[s]").astype(np.int64) / 86400
+    months = np.maximum(duration_days / (365.25 / 12), 1 / 30)
+    monthly_value = subs.amount_cents / 100 / months
+
+    base = int(start_month.min())
+    size = int(end_month.max()) - base + 2
+
+    # Diferenças acumuladas: soma no mês da compra e remove no mês da
+    # expiração (no fim dele a venda já expirou); vendas que expiram no
+    # próprio mês da compra não aparecem em nenhum fechamento
+    spans = end_month > start_month
+    mrr_delta = np.zeros(size)
+    np.add.at(mrr_delta, start_month[spans] - base, monthly_value[spans])
+    np.add.at(mrr_delta, end_month[spans] - base, -monthly_value[spans])
+    active_delta = (
+        np.bincount(start_month[spans] - base, minlength=size)
+        - np.bincount(end_month[spans] - base, minlength=size)
+    )
+
+    # Renovação: próxima compra do mesmo usuário (ordenado por usuário e data)
+    order = np.lexsort((subs.created_at, subs.user_codes))
+    users_sorted = subs.user_codes[order]
+    next_created = np.empty(len(order), dtype="datetime64[s]")
+    next_created[:-1] = subs.created_at[order][1:]
+    next_created[-1] = np.datetime64("NaT")
+    same_user = np.zeros(len(order), dtype=bool)
+    same_user[:-1] = users_sorted[:-1] == users_sorted[1:]
+
+    deadline = subs.expires_at[order] + np.timedelta64(grace_days, "D")
+    renewed = same_user & (next_created <= deadline)
+
+    # A compra seguinte a uma venda renovada é renovação, não assinatura nova
+    renewal = np.zeros(len(order), dtype=bool)
+    renewal[1:] = renewed[:-1]
+
+    now = now or datetime.now(timezone.utc)
+    if now.tzinfo is not None:
+        now = now.astimezone(timezone.utc).replace(tzinfo=None)
+    lost = ~renewed & (deadline <= np.datetime64(now, "s"))
+    churned = np.bincount(end_month[order][lost] - base, minlength=size)
+
+    active = np.cumsum(active_delta)[:-1]
+    mrr = np.cumsum(mrr_delta)[:-1]
+    new = np.bincount(start_month[order][~renewal] - base, minlength=size)[:-1]
+    churned = churned[:-1]
+
+    # Churn sobre as assinaturas ativas no fechamento do mês anterior
+    opening = np.concatenate(([0], active[:-1]))
+    churn_rate = np.divide(churned, opening, out=np.zeros(len(churned)), where=opening > 0)
+
+    return Report({
+        "month": _period_labels(np.arange(base, base + size - 1), "month"),
+        "mrr": np.round(mrr, 2),
+        "active": active,
+        "new": new,
+        "churned": churned,
+        "churn_rate": np.round(churn_rate, 4)
+    })
@@ -0,0 +1,432 @@
+"""
+Isolamento de falhas nas chamadas a dependências externas
+
+Cada dependência (Supabase, PushinPay, Mercado Pago, Bot API do Telegram)
+tem um Dependency com:
+    - circuit breaker: após N falhas seguidas as chamadas falham na hora
+      (CircuitOpenError) até reset_timeout; depois uma chamada de teste
+      decide se o circuito fecha ou volta a abrir
+    - timeout adaptativo: múltiplo do p99 das latências recentes, limitado
+      entre minimum e maximum (initial enquanto há poucas amostras)
+    - bulkhead: limite de chamadas simultâneas; excedido, a chamada falha
+      na hora (BulkheadFullError) em vez de ocupar mais um worker
+    - hedging (opcional, só leituras idempotentes): se a resposta passa do
+      p95, uma segunda tentativa é disparada e vale a primeira que terminar
+
+Falhas são exceções, timeouts e respostas que indicam problema na
+dependência (HTTP 5xx e 429); erros 4xx são respostas normais.
+
+O módulo não importa nada do pacote api: o bot (processo separado) usa o
+mesmo código através de bot/shared.py.
+
+Variáveis de ambiente:
+    RESILIENCE_FAILURE_THRESHOLD   falhas seguidas para abrir o circuito (padrão: 5)
+    RESILIENCE_RESET_TIMEOUT       segundos com o circuito aberto (padrão: 30)
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+import httpx
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# Valor de cada estado na métrica dependency_circuit_state
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+class DependencyUnavailable(Exception):
+    """A chamada foi recusada sem chegar à dependência"""
+
+    def __init__(self, dependency: str, reason: str):
+        super().__init__(f"{dependency} indisponível: {reason}")
+        self.dependency = dependency
+
+class CircuitOpenError(DependencyUnavailable):
+    def __init__(self, dependency: str):
+        super().__init__(dependency, "circuito aberto")
+
+class BulkheadFullError(DependencyUnavailable):
+    def __init__(self, dependency: str, limit: int):
+        super().__init__(dependency, f"{limit} chamadas em andamento")
+
+class AdaptiveTimeout:
+    """Timeout derivado das latências recentes das chamadas bem-sucedidas"""
+
+    def __init__(
+        self,
+        initial: float = 10.0,
+        minimum: float = 1.0,
+        maximum: float = 30.0,
+        multiplier: float = 3.0,
+        min_samples: int = 20,
+        window: int = 200
+    ):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.samples = deque(maxlen=window)
+        # Percentis recalculados a cada 10 amostras (ordenar a janela a cada chamada custa caro)
+        self._percentiles: Optional[Dict[str, float]] = None
+        self._pending = 0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self._pending += 1
+        if self._pending >= 10:
+            self._percentiles = None
+
+    def _compute(self) -> Optional[Dict[str, float]]:
+        if len(self.samples) < self.min_samples:
+            return None
+        if self._percentiles is None:
+            ordered = sorted(self.samples)
+            last = len(ordered) - 1
+            self._percentiles = {
+                "p50": ordered[int(last * 0.50)],
+                "p95": ordered[int(last * 0.95)],
+                "p99": ordered[int(last * 0.99)]
+            }
+            self._pending = 0
+        return self._percentiles
+
+    def current(self) -> float:
+        percentiles = self._compute()
+        if percentiles is None:
+            return self.initial
+        return min(self.maximum, max(self.minimum, percentiles["p99"] * self.multiplier))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Espera antes da segunda tentativa (p95); None enquanto há poucas amostras"""
+        percentiles = self._compute()
+        return percentiles["p95"] if percentiles else None
+
+    def stats(self) -> Dict[str, Any]:
+        percentiles = self._compute() or {}
+        return {
+            "timeout": round(self.current(), 3),
+            "samples": len(self.samples),
+            **{name: round(value, 4) for name, value in percentiles.items()}
+        }
+
+class CircuitBreaker:
+    """Abre após failure_threshold falhas seguidas; meio-aberto após reset_timeout"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened = False
+        self.probing = False
+        self.times_opened = 0
+        self.rejected = 0
+        # Chamadas síncronas (Supabase, Mercado Pago) podem vir de threads
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if not self.opened:
+            return STATE_CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return STATE_HALF_OPEN
+        return STATE_OPEN
+
+    def allow(self) -> bool:
+        """Reserva a chamada; no estado meio-aberto só uma chamada de teste passa"""
+        with self.lock:
+            state = self.state
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.opened:
+                logger.info(
+                    "Circuito de %s fechado", self.name,
+                    extra={"event": "resilience.circuit_closed", "dependency": self.name}
+                )
+            self.failures = 0
+            self.opened = False
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or (not self.opened and self.failures >= self.failure_threshold):
+                if not self.opened:
+                    self.times_opened += 1
+                self.opened = True
+                self.opened_at = time.monotonic()
+                self.probing = False
+                logger.warning(
+                    "Circuito de %s aberto após %s falhas seguidas", self.name, self.failures,
+                    extra={"event": "resilience.circuit_opened", "dependency": self.name}
+                )
+
+class Bulkhead:
+    """Limite de chamadas simultâneas; excedido, recusa na hora (não enfileira)"""
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            if self.in_flight >= self.max_concurrent:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+def _never_fails(result: Any) -> bool:
+    return False
+
+class Dependency:
+    """Breaker, timeout adaptativo, bulkhead e hedging de uma dependência"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int = 50,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        timeout: Optional[AdaptiveTimeout] = None
+    ):
+        self.name = name
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.bulkhead = Bulkhead(max_concurrent)
+        self.timeout = timeout or AdaptiveTimeout()
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _admit(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.name)
+        if not self.bulkhead.try_acquire():
+            # A reserva do breaker (chamada de teste) é devolvida sem contar falha
+            self.breaker.probing = False
+            raise BulkheadFullError(self.name, self.bulkhead.max_concurrent)
+        self.calls += 1
+
+    def _record(self, failed: bool, elapsed: float):
+        if failed:
+            self.failures += 1
+            self.breaker.record_failure()
+        else:
+            self.timeout.observe(elapsed)
+            self.breaker.record_success()
+
+    def call_sync(self, func: Callable[[float], Any], is_failure: Callable[[Any], bool] = _never_fails) -> Any:
+        """
+        Executa func(timeout) em uma chamada síncrona
+
+        A função recebe o timeout atual e deve repassá-lo ao cliente HTTP
+        (não há como interromper uma chamada síncrona por fora).
+        """
+        self._admit()
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = func(self.timeout.current())
+            failed = is_failure(result)
+            return result
+        except (httpx.TimeoutException, TimeoutError):
+            self.timeouts += 1
+            raise
+        finally:
+            self.bulkhead.release()
+            self._record(failed, time.perf_counter() - start)
+
+    async def call(
+        self,
+        func: Callable[[float], Awaitable[Any]],
+        is_failure: Callable[[Any], bool] = _never_fails,
+        hedge: bool = False,
+        timeout: Optional[float] = None
+    ) -> Any:
+        """
+        Executa await func(timeout), interrompida ao fim do timeout
+
+        Args:
+            func: Recebe o timeout atual (para repassar ao cliente HTTP)
+            is_failure: Decide se um resultado conta como falha da dependência
+            hedge: Dispara uma segunda tentativa se a primeira passar do p95;
+                use apenas em leituras idempotentes
+            timeout: Substitui o timeout adaptativo nesta chamada
+        """
+        self._admit()
+        start = time.perf_counter()
+        failed = True
+        try:
+            timeout = timeout or self.timeout.current()
+            delay = self.timeout.hedge_delay() if hedge else None
+            if delay is None:
+                result = await asyncio.wait_for(func(timeout), timeout)
+            else:
+                result = await asyncio.wait_for(self._hedged(func, timeout, delay), timeout)
+            failed = is_failure(result)
+            return result
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            self.timeouts += 1
+            raise
+        finally:
+            self.bulkhead.release()
+            self._record(failed, time.perf_counter() - start)
+
+    async def _hedged(self, func: Callable[[float], Awaitable[Any]], timeout: float, delay: float) -> Any:
+        tasks = [asyncio.ensure_future(func(timeout))]
+        acquired = False
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            # A segunda tentativa também respeita o bulkhead
+            if done or not self.bulkhead.try_acquire():
+                return await tasks[0]
+
+            acquired = True
+            self.hedges += 1
+            tasks.append(asyncio.ensure_future(func(timeout)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            self.hedge_wins += 1
+                        return task.result()
+            # As duas falharam: propaga o erro da primeira
+            return tasks[0].result()
+        finally:
+            # Cancelamento (timeout) ou tentativa perdedora
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            if acquired:
+                self.bulkhead.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "times_opened": self.breaker.times_opened,
+            "rejected_open": self.breaker.rejected,
+            "rejected_full": self.bulkhead.rejected,
+            "in_flight": self.bulkhead.in_flight,
+            "max_concurrent": self.bulkhead.max_concurrent,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            **self.timeout.stats()
+        }
+
+# Dependências criadas (nome -> Dependency), expostas em /metrics e /stats/dependencies
+dependencies: Dict[str, Dependency] = {}
+
+def dependency(name: str, **options: Any) -> Dependency:
+    """Retorna a dependência com o nome dado, criando-a na primeira chamada"""
+    if name not in dependencies:
+        options.setdefault("failure_threshold", int(os.getenv("RESILIENCE_FAILURE_THRESHOLD", "5")))
+        options.setdefault("reset_timeout", float(os.getenv("RESILIENCE_RESET_TIMEOUT", "30")))
+        dependencies[name] = Dependency(name, **options)
+    return dependencies[name]
+
+def dependency_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: item.stats() for name, item in dependencies.items()}
+
+# Integração com os clientes HTTP
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+def http_failure(status_code: int) -> bool:
+    """Respostas que indicam problema na dependência (não no pedido)"""
+    return status_code >= 500 or status_code == 429
+
+def _with_timeout(request: httpx.Request, timeout: float) -> httpx.Request:
+    request.extensions = {
+        **request.extensions,
+        "timeout": {"connect": timeout, "read": timeout, "write": timeout, "pool": timeout}
+    }
+    return request
+
+class ResilientTransport(httpx.BaseTransport):
+    """Transporte httpx (síncrono) que passa cada requisição pelo Dependency"""
+
+    def __init__(self, transport: httpx.BaseTransport, dependency: Dependency):
+        self.transport = transport
+        self.dependency = dependency
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.dependency.call_sync(
+            lambda timeout: self.transport.handle_request(_with_timeout(request, timeout)),
+            lambda response: http_failure(response.status_code)
+        )
+
+    def close(self):
+        self.transport.close()
+
+class AsyncResilientTransport(httpx.AsyncBaseTransport):
+    """Transporte httpx assíncrono; leituras (GET/HEAD) podem ser duplicadas por hedging"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, dependency: Dependency, hedge_reads: bool = True):
+        self.transport = transport
+        self.dependency = dependency
+        self.hedge_reads = hedge_reads
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async def send(timeout: float) -> httpx.Response:
+            response = await self.transport.handle_async_request(_with_timeout(request, timeout))
+            # O corpo é lido aqui para que o timeout e o hedging cubram a resposta inteira
+            await response.aread()
+            return response
+
+        return await self.dependency.call(
+            send,
+            lambda response: http_failure(response.status_code),
+            hedge=self.hedge_reads and request.method in IDEMPOTENT_METHODS
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+def protect_supabase(client) -> None:
+    """Passa as requisições do cliente Supabase ao PostgREST pelo Dependency "supabase\""""
+    session = client.postgrest.session
+    if not isinstance(session._transport, ResilientTransport):
+        session._transport = ResilientTransport(
+            session._transport,
+            dependency(
+                "supabase", max_concurrent=64,
+                timeout=AdaptiveTimeout(initial=10.0, minimum=2.0, maximum=30.0)
+            )
+        )
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 import logging
 
 from ..models import BotCreate, BotResponse, BotStatus
-from ..database import get_db
+from ..queries import select, insert_if_absent, update_returning, BOT_COLUMNS
+from ..pagination import (
+    fetch_page, iter_rows, ndjson_lines, clamp_limit, DEFAULT_PAGE_SIZE, NEXT_CURSOR_HEADER
+)
 
 router = APIRouter(
     prefix="/bots",
@@ -19,34 +23,26 @@ async def create_bot(bot: BotCreate):
     Cria um novo bot para o usuário.
     """
     try:
-        supabase = get_db()
-        
-        # Verifica se já existe um bot com o mesmo token
-        response = supabase.table("bots").select("*").eq("token", bot.token).execute()
-        
-        if len(response.data) > 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Já existe um bot com este token"
-            )
-        
-        # Criar o bot
-        response = supabase.table("bots").insert({
+        # Inserção condicional: o índice único em token decide se o bot já existe,
+        # sem uma consulta prévia (e sem corrida entre duas criações simultâneas)
+        created = insert_if_absent("bots.create", "bots", {
             "name": bot.name,
             "token": bot.token,
             "description": bot.description,
             "owner_id": bot.owner_id,
             "webhook_url": bot.webhook_url,
             "status": bot.status,
-        }).execute()
+        }, on_conflict="token", columns=BOT_COLUMNS)
         
-        if len(response.data) == 0:
+        if created is None:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erro ao criar o bot"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Já existe um bot com este token"
             )
         
-        return response.data[0]
+        return created
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao criar bot: {str(e)}")
         raise HTTPException(
@@ -55,15 +51,34 @@ async def create_bot(bot: BotCreate):
         )
 
 @router.get("/", response_model=List[BotResponse])
-async def get_user_bots(owner_id: str):
+async def get_user_bots(
+    owner_id: str,
+    response: Response,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+):
     """
-    Obtém todos os bots de um usuário.
+    Obtém os bots de um usuário, dos mais recentes para os mais antigos.
+    
+    A listagem é paginada: o cursor da próxima página vem no cabeçalho
+    X-Next-Cursor (ausente na última página).
     """
     try:
-        supabase = get_db()
-        response = supabase.table("bots").select("*").eq("owner_id", owner_id).execute()
+        rows, next_cursor = fetch_page(
+            lambda: select("bots.list", "bots", BOT_COLUMNS).eq("owner_id", owner_id),
+            cursor,
+            clamp_limit(limit)
+        )
+        
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
-        return response.data
+        return rows
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Erro ao buscar bots do usuário: {str(e)}")
         raise HTTPException(
@@ -71,14 +86,22 @@ async def get_user_bots(owner_id: str):
             detail=f"Erro ao buscar bots do usuário: {str(e)}"
         )
 
+@router.get("/export")
+async def export_user_bots(owner_id: str):
+    """
+    Exporta todos os bots de um usuário em NDJSON, buscando página a página.
+    """
+    rows = iter_rows(lambda: select("bots.export", "bots", BOT_COLUMNS).eq("owner_id", owner_id))
+    
+    return StreamingResponse(ndjson_lines(rows), media_type="application/x-ndjson")
+
 @router.get("/{bot_id}", response_model=BotResponse)
 async def get_bot(bot_id: str):
     """
     Obtém um bot específico pelo ID.
     """
     try:
-        supabase = get_db()
-        response = supabase.table("bots").select("*").eq("id", bot_id).execute()
+        response = select("bots.get", "bots", BOT_COLUMNS).eq("id", bot_id).execute()
         
         if len(response.data) == 0:
             raise HTTPException(
@@ -97,29 +120,24 @@ async def get_bot(bot_id: str):
         )
 
 @router.patch("/{bot_id}/status", response_model=BotResponse)
-async def update_bot_status(bot_id: str, status: BotStatus):
+async def update_bot_status(bot_id: str, new_status: BotStatus = Query(..., alias="status")):
     """
     Atualiza o status de um bot.
     """
     try:
-        supabase = get_db()
-        
-        # Verifica se o bot existe
-        response = supabase.table("bots").select("*").eq("id", bot_id).execute()
+        # Uma única atualização; sem linha retornada o bot não existe
+        bot = update_returning("bots.update_status", "bots", {
+            "status": new_status,
+            "updated_at": "now()"
+        }, {"id": bot_id}, BOT_COLUMNS)
         
-        if len(response.data) == 0:
+        if bot is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Bot não encontrado"
             )
         
-        # Atualiza o status do bot
-        response = supabase.table("bots").update({
-            "status": status,
-            "updated_at": "now()"
-        }).eq("id", bot_id).execute()
-        
-        return response.data[0]
+        return bot
     except HTTPException:
         raise
     except Exception as e:
@@ -127,4 +145,4 @@ async def update_bot_status(bot_id: str, status: BotStatus):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao atualizar status do bot: {str(e)}"
-        ) 
\ No newline at end of file
+        )
@@ -0,0 +1,89 @@
+from fastapi import APIRouter, HTTPException, status
+from typing import Optional
+from datetime import date
+import logging
+
+from ..models import DashboardStats
+from ..queries import select, SALE_COLUMNS
+from ..analytics import sales_analytics
+
+router = APIRouter(
+    prefix="/dashboard",
+    tags=["dashboard"],
+    responses={404: {"description": "Bot não encontrado"}}
+)
+
+logger = logging.getLogger(__name__)
+
+# Quantidade de vendas recentes exibidas no dashboard
+RECENT_SALES_LIMIT = 10
+
+@router.get("/stats", response_model=DashboardStats)
+async def get_dashboard_stats(
+    owner_id: Optional[str] = None,
+    bot_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    top: int = 5
+):
+    """
+    Estatísticas de vendas de um bot ou de todos os bots de um usuário
+
+    Os totais vêm dos agregados diários (api/analytics.py); apenas as vendas
+    recentes são lidas da tabela sales, com limite.
+    """
+    if not owner_id and not bot_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe owner_id ou bot_id"
+        )
+
+    if start and end and start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A data inicial deve ser anterior à data final"
+        )
+
+    try:
+        if bot_id:
+            bot_ids = [bot_id]
+        else:
+            bots_response = select("dashboard.bots", "bots", ("id",)).eq("owner_id", owner_id).execute()
+            bot_ids = [bot["id"] for bot in bots_response.data]
+
+        if not bot_ids:
+            return DashboardStats(
+                total_sales=0,
+                total_revenue=0.0,
+                active_users=0,
+                plans_count=0,
+                recent_sales=[]
+            )
+
+        summary = sales_analytics.summary(bot_ids, start, end)
+        top_plans = sales_analytics.top_plans(bot_ids, start, end, limit=max(0, min(top, 50)))
+
+        plans_response = select("dashboard.plans_count", "plans", ("id",), count="exact").in_("bot_id", bot_ids).limit(1).execute()
+
+        recent_query = select("dashboard.recent_sales", "sales", SALE_COLUMNS).in_("bot_id", bot_ids)
+        if start:
+            recent_query = recent_query.gte("created_at", start.isoformat())
+        if end:
+            recent_query = recent_query.lt("created_at", f"{end.isoformat()}T23:59:59.999999+00:00")
+        recent_response = recent_query.order("created_at", desc=True).limit(RECENT_SALES_LIMIT).execute()
+
+        return DashboardStats(
+            total_sales=summary["total_sales"],
+            total_revenue=summary["total_revenue"],
+            active_users=summary["active_users"],
+            plans_count=plans_response.count or 0,
+            recent_sales=recent_response.data,
+            daily=summary["daily"],
+            top_plans=top_plans
+        )
+    except Exception as e:
+        logger.error(f"Erro ao calcular estatísticas do dashboard: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao calcular estatísticas do dashboard: {str(e)}"
+        )
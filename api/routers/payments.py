@@ -1,12 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Body
-from typing import Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Body, Response
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, Optional, List, Callable
+import json
+import asyncio
 import logging
 import uuid
-from datetime import datetime, timedelta
 
 from ..database import get_db
 from ..models import PaymentCreate, PaymentResponse, PaymentStatus, PaymentMethod
 from ..payments import PushinPay, MercadoPago
+from ..payments.mercadopago import LEGACY_IPN_ENABLED, parse_notification, recent_notifications
+from ..payments.signatures import (
+    InvalidSignature, pushinpay_signatures, verify_pushinpay_signature, verify_mercadopago_signature
+)
+from ..payment_events import payment_events, is_final_status, format_sse
+from ..webhook_buffer import payment_webhook_buffer, PaymentNotification, WebhookBufferFull
+from ..queries import select, PAYMENT_COLUMNS
+from ..pagination import (
+    fetch_page, iter_rows, ndjson_lines, clamp_limit, DEFAULT_PAGE_SIZE, NEXT_CURSOR_HEADER
+)
 
 router = APIRouter(
     prefix="/payments",
@@ -16,6 +28,11 @@ router = APIRouter(
 
 logger = logging.getLogger(__name__)
 
+# Limites da espera por mudança de status (long-poll e SSE)
+MAX_WAIT_SECONDS = 30
+MAX_STREAM_SECONDS = 15 * 60
+SSE_KEEPALIVE_SECONDS = 15
+
 @router.post("/create", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
 async def create_payment(
     user_telegram_id: str,
@@ -35,7 +52,7 @@ async def create_payment(
         external_id = str(uuid.uuid4())
         
         # Buscar informações do plano
-        plan_response = supabase.table("plans").select("*").eq("id", plan_id).execute()
+        plan_response = select("payments.create.plan", "plans", ("id", "name")).eq("id", plan_id).execute()
         
         if len(plan_response.data) == 0:
             raise HTTPException(
@@ -46,7 +63,7 @@ async def create_payment(
         plan = plan_response.data[0]
         
         # Buscar informações do bot
-        bot_response = supabase.table("bots").select("*").eq("id", bot_id).execute()
+        bot_response = select("payments.create.bot", "bots", ("id", "name")).eq("id", bot_id).execute()
         
         if len(bot_response.data) == 0:
             raise HTTPException(
@@ -171,14 +188,177 @@ async def create_payment(
             detail=f"Erro ao criar pagamento: {str(e)}"
         )
 
+def _payments_query(bot_id: str, payment_status: Optional[PaymentStatus], user_telegram_id: Optional[str]):
+    query = select("payments.list", "payments", PAYMENT_COLUMNS).eq("bot_id", bot_id)
+    if payment_status:
+        query = query.eq("status", payment_status.value)
+    if user_telegram_id:
+        query = query.eq("user_telegram_id", user_telegram_id)
+    return query
+
+@router.get("/", response_model=List[PaymentResponse])
+async def list_payments(
+    bot_id: str,
+    response: Response,
+    payment_status: Optional[PaymentStatus] = None,
+    user_telegram_id: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+):
+    """
+    Lista os pagamentos de um bot, dos mais recentes para os mais antigos
+    
+    Paginado por cursor; o próximo cursor vem no cabeçalho X-Next-Cursor
+    """
+    try:
+        rows, next_cursor = fetch_page(
+            lambda: _payments_query(bot_id, payment_status, user_telegram_id),
+            cursor,
+            clamp_limit(limit)
+        )
+        
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        
+        return rows
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Erro ao listar pagamentos: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao listar pagamentos: {str(e)}"
+        )
+
+@router.get("/export")
+async def export_payments(
+    bot_id: str,
+    payment_status: Optional[PaymentStatus] = None,
+    user_telegram_id: Optional[str] = None
+):
+    """
+    Exporta os pagamentos de um bot em NDJSON, buscando página a página
+    """
+    rows = iter_rows(lambda: _payments_query(bot_id, payment_status, user_telegram_id))
+    return StreamingResponse(ndjson_lines(rows), media_type="application/x-ndjson")
+
+@router.get("/{payment_id}/wait")
+async def wait_payment_status(payment_id: str, timeout: float = 25):
+    """
+    Long-poll: retorna assim que o status do pagamento mudar ou após `timeout` segundos
+    """
+    try:
+        timeout = max(0, min(timeout, MAX_WAIT_SECONDS))
+        
+        # Assinar antes de ler o banco para não perder um evento publicado no meio
+        queue = payment_events.subscribe(payment_id)
+        
+        try:
+            response = select("payments.status", "payments", ("id", "status")).eq("id", payment_id).execute()
+            
+            if len(response.data) == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Pagamento não encontrado"
+                )
+            
+            payment = response.data[0]
+            
+            if is_final_status(payment["status"]) or timeout == 0:
+                return {"payment_id": payment_id, "status": payment["status"], "changed": False}
+            
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return {"payment_id": payment_id, "status": payment["status"], "changed": False}
+            
+            return {"payment_id": payment_id, "status": event["status"], "changed": True}
+        finally:
+            payment_events.unsubscribe(payment_id, queue)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao aguardar status do pagamento: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao aguardar status do pagamento: {str(e)}"
+        )
+
+@router.get("/{payment_id}/events")
+async def stream_payment_status(payment_id: str, request: Request):
+    """
+    Envia o status do pagamento via Server-Sent Events até ele ser finalizado
+    """
+    queue = payment_events.subscribe(payment_id)
+    
+    try:
+        response = select("payments.status", "payments", ("id", "status")).eq("id", payment_id).execute()
+    except Exception as e:
+        payment_events.unsubscribe(payment_id, queue)
+        logger.error(f"Erro ao buscar pagamento: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao buscar pagamento: {str(e)}"
+        )
+    
+    if len(response.data) == 0:
+        payment_events.unsubscribe(payment_id, queue)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Pagamento não encontrado"
+        )
+    
+    payment = response.data[0]
+    
+    async def event_stream():
+        try:
+            yield format_sse({"payment_id": payment_id, "status": payment["status"]})
+            
+            if is_final_status(payment["status"]):
+                return
+            
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + MAX_STREAM_SECONDS
+            
+            while True:
+                remaining = deadline - loop.time()
+                
+                if remaining <= 0:
+                    yield format_sse({"payment_id": payment_id}, event_type="timeout")
+                    return
+                
+                if await request.is_disconnected():
+                    return
+                
+                try:
+                    event = await asyncio.wait_for(queue.get(), min(SSE_KEEPALIVE_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                
+                yield format_sse(event)
+                
+                if is_final_status(event.get("status")):
+                    return
+        finally:
+            payment_events.unsubscribe(payment_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/{payment_id}", response_model=PaymentResponse)
 async def get_payment(payment_id: str):
     """
     Obtém informações de um pagamento específico
     """
     try:
-        supabase = get_db()
-        response = supabase.table("payments").select("*").eq("id", payment_id).execute()
+        response = select("payments.get", "payments", PAYMENT_COLUMNS).eq("id", payment_id).execute()
         
         if len(response.data) == 0:
             raise HTTPException(
@@ -196,6 +376,40 @@ async def get_payment(payment_id: str):
             detail=f"Erro ao buscar pagamento: {str(e)}"
         )
 
+def _check_signature(verify: Callable, *args):
+    """Responde 401 se a assinatura da notificação não for válida"""
+    try:
+        verify(*args)
+    except InvalidSignature:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Assinatura inválida")
+
+async def _submit_notification(notification: PaymentNotification) -> Dict[str, Any]:
+    """
+    Entrega a notificação ao buffer e espera a gravação do lote
+
+    Só responde sucesso ao gateway depois que o status está no banco; se o
+    buffer estiver cheio ou a gravação falhar, responde 503 para o gateway
+    reenviar a notificação.
+    """
+    try:
+        result = await payment_webhook_buffer.submit(notification)
+    except WebhookBufferFull as e:
+        logger.warning(f"Notificação do {notification.gateway} recusada: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Notificações demais aguardando gravação, tente novamente"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Erro ao gravar a notificação: {str(e)}"
+        )
+    
+    if result["status"] != "success":
+        return {"status": "error", "message": result.get("message", "Erro ao processar webhook")}
+    
+    return {"status": "success"}
+
 @router.post("/webhook/pushinpay")
 async def pushinpay_webhook(request: Request):
     """
@@ -203,7 +417,12 @@ async def pushinpay_webhook(request: Request):
     """
     try:
         # Obter os dados do webhook
-        webhook_data = await request.json()
+        body = await request.body()
+        
+        # Recusar notificações forjadas antes de qualquer consulta
+        _check_signature(verify_pushinpay_signature, request.headers, body)
+        
+        webhook_data = json.loads(body)
         
         # Processar o webhook
         pushinpay = PushinPay()
@@ -218,17 +437,17 @@ async def pushinpay_webhook(request: Request):
         status = data.get("status")
         external_id = data.get("external_id")
         
-        # Atualizar o status do pagamento no banco de dados
-        supabase = get_db()
-        
-        # Buscar o pagamento pelo external_id
-        payment_response = supabase.table("payments").select("*").eq("external_id", external_id).execute()
-        
-        if len(payment_response.data) == 0:
-            logger.error(f"Pagamento com external_id {external_id} não encontrado")
-            return {"status": "error", "message": "Pagamento não encontrado"}
-        
-        payment = payment_response.data[0]
+        # Sem assinatura verificada o corpo não é confiável: status e
+        # referência vêm da consulta ao gateway
+        if not pushinpay_signatures.enabled:
+            success, data = await pushinpay.check_payment_status(payment_id)
+            
+            if not success:
+                logger.error(f"Erro ao confirmar o status no PushinPay: {data}")
+                return {"status": "error", "message": "Erro ao processar webhook"}
+            
+            status = data.get("status")
+            external_id = data.get("external_id")
         
         # Mapear o status do PushinPay para o status do sistema
         payment_status = PaymentStatus.PENDING
@@ -238,41 +457,12 @@ async def pushinpay_webhook(request: Request):
         elif status == "cancelled" or status == "failed":
             payment_status = PaymentStatus.FAILED
         
-        # Atualizar o status do pagamento
-        supabase.table("payments").update({
-            "status": payment_status,
-            "updated_at": "now()"
-        }).eq("id", payment["id"]).execute()
-        
-        # Se o pagamento foi completado, registrar a venda e adicionar o usuário ao grupo
-        if payment_status == PaymentStatus.COMPLETED:
-            # Buscar informações do plano
-            plan_response = supabase.table("plans").select("*").eq("id", payment["plan_id"]).execute()
-            
-            if len(plan_response.data) > 0:
-                plan = plan_response.data[0]
-                
-                # Calcular a data de expiração
-                expires_at = None
-                if plan["days_access"] > 0:
-                    expires_at = (datetime.now() + timedelta(days=plan["days_access"])).isoformat()
-                
-                # Registrar a venda
-                sale_data = {
-                    "payment_id": payment["id"],
-                    "bot_id": payment["bot_id"],
-                    "plan_id": payment["plan_id"],
-                    "user_telegram_id": payment["user_telegram_id"],
-                    "amount": payment["amount"],
-                    "expires_at": expires_at
-                }
-                
-                supabase.table("sales").insert(sale_data).execute()
-                
-                # TODO: Adicionar o usuário ao grupo VIP
-                # Isso seria feito através da integração com o bot do Telegram
-        
-        return {"status": "success"}
+        # Gravação em lote com as outras notificações (status, venda e eventos)
+        return await _submit_notification(
+            PaymentNotification("pushinpay", external_id, payment_status, payment_id)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao processar webhook do PushinPay: {str(e)}")
         return {"status": "error", "message": f"Erro ao processar webhook: {str(e)}"}
@@ -283,12 +473,32 @@ async def mercadopago_webhook(request: Request):
     Webhook para notificações do Mercado Pago
     """
     try:
-        # Obter os dados do webhook
+        # Obter os dados do webhook (v2 ou IPN legado)
         webhook_data = await request.json()
+        notification = parse_notification(webhook_data, request.query_params)
+        
+        if notification is None:
+            logger.error(f"Webhook do Mercado Pago não suportado: {webhook_data}")
+            return {"status": "error", "message": "Webhook inválido"}
+        
+        # Recusar notificações forjadas antes de consultar o gateway ou o banco
+        # (o Mercado Pago assina o ID do pagamento). O IPN legado não tem
+        # assinatura: passa porque o status abaixo sempre vem da consulta ao
+        # Mercado Pago, nunca da notificação
+        if notification.legacy:
+            if not LEGACY_IPN_ENABLED:
+                logger.warning(f"IPN legado do Mercado Pago recusado (pagamento {notification.payment_id})")
+                return {"status": "error", "message": "IPN legado desativado"}
+        else:
+            _check_signature(verify_mercadopago_signature, request.headers, notification.payment_id)
         
-        # Processar o webhook
+        # Reenvio de uma notificação já aplicada
+        if recent_notifications.seen(notification.id):
+            return {"status": "success"}
+        
+        # Buscar o status (uma consulta por pagamento para uma rajada de notificações)
         mercadopago_client = MercadoPago()
-        success, data = mercadopago_client.process_webhook(webhook_data)
+        success, data = await mercadopago_client.process_notification(notification)
         
         if not success:
             logger.error(f"Erro ao processar webhook do Mercado Pago: {data}")
@@ -299,18 +509,6 @@ async def mercadopago_webhook(request: Request):
         status = data.get("status")
         external_reference = data.get("external_reference")
         
-        # Atualizar o status do pagamento no banco de dados
-        supabase = get_db()
-        
-        # Buscar o pagamento pelo external_id
-        payment_response = supabase.table("payments").select("*").eq("external_id", external_reference).execute()
-        
-        if len(payment_response.data) == 0:
-            logger.error(f"Pagamento com external_id {external_reference} não encontrado")
-            return {"status": "error", "message": "Pagamento não encontrado"}
-        
-        payment = payment_response.data[0]
-        
         # Mapear o status do Mercado Pago para o status do sistema
         payment_status = PaymentStatus.PENDING
         
@@ -319,41 +517,16 @@ async def mercadopago_webhook(request: Request):
         elif status == "cancelled" or status == "rejected":
             payment_status = PaymentStatus.FAILED
         
-        # Atualizar o status do pagamento
-        supabase.table("payments").update({
-            "status": payment_status,
-            "updated_at": "now()"
-        }).eq("id", payment["id"]).execute()
-        
-        # Se o pagamento foi completado, registrar a venda e adicionar o usuário ao grupo
-        if payment_status == PaymentStatus.COMPLETED:
-            # Buscar informações do plano
-            plan_response = supabase.table("plans").select("*").eq("id", payment["plan_id"]).execute()
-            
-            if len(plan_response.data) > 0:
-                plan = plan_response.data[0]
-                
-                # Calcular a data de expiração
-                expires_at = None
-                if plan["days_access"] > 0:
-                    expires_at = (datetime.now() + timedelta(days=plan["days_access"])).isoformat()
-                
-                # Registrar a venda
-                sale_data = {
-                    "payment_id": payment["id"],
-                    "bot_id": payment["bot_id"],
-                    "plan_id": payment["plan_id"],
-                    "user_telegram_id": payment["user_telegram_id"],
-                    "amount": payment["amount"],
-                    "expires_at": expires_at
-                }
-                
-                supabase.table("sales").insert(sale_data).execute()
-                
-                # TODO: Adicionar o usuário ao grupo VIP
-                # Isso seria feito através da integração com o bot do Telegram
+        # Gravação em lote com as outras notificações (status, venda e eventos)
+        result = await _submit_notification(
+            PaymentNotification("mercadopago", external_reference, payment_status, payment_id)
+        )
         
-        return {"status": "success"}
+        if result["status"] == "success":
+            recent_notifications.add(notification.id)
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao processar webhook do Mercado Pago: {str(e)}")
         return {"status": "error", "message": f"Erro ao processar webhook: {str(e)}"}
@@ -364,8 +537,7 @@ async def check_payment_status(payment_id: str):
     Verifica o status atual de um pagamento no gateway
     """
     try:
-        supabase = get_db()
-        response = supabase.table("payments").select("*").eq("id", payment_id).execute()
+        response = select("payments.check", "payments", ("id", "method", "transaction_id")).eq("id", payment_id).execute()
         
         if len(response.data) == 0:
             raise HTTPException(
@@ -397,7 +569,7 @@ async def check_payment_status(payment_id: str):
         
         elif payment["method"] == PaymentMethod.MERCADO_PAGO:
             mercadopago_client = MercadoPago()
-            success, data = mercadopago_client.check_payment_status(transaction_id)
+            success, data = await mercadopago_client.fetch_payment_status(transaction_id)
             
             if not success:
                 raise HTTPException(
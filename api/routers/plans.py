@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 import logging
 
 from ..models import PlanCreate, PlanResponse, PlanPeriod
 from ..database import get_db
+from ..queries import select, update_returning, PLAN_COLUMNS
+from ..pagination import (
+    fetch_page, iter_rows, ndjson_lines, clamp_limit, DEFAULT_PAGE_SIZE, NEXT_CURSOR_HEADER
+)
 
 router = APIRouter(
     prefix="/plans",
@@ -22,7 +27,7 @@ async def create_plan(plan: PlanCreate):
         supabase = get_db()
         
         # Verificar se o bot existe
-        bot_response = supabase.table("bots").select("*").eq("id", plan.bot_id).execute()
+        bot_response = select("plans.bot_exists", "bots", ("id",)).eq("id", plan.bot_id).execute()
         
         if len(bot_response.data) == 0:
             raise HTTPException(
@@ -57,8 +62,7 @@ async def get_plan(plan_id: str):
     Obtém detalhes de um plano específico
     """
     try:
-        supabase = get_db()
-        response = supabase.table("plans").select("*").eq("id", plan_id).execute()
+        response = select("plans.get", "plans", PLAN_COLUMNS).eq("id", plan_id).execute()
         
         if len(response.data) == 0:
             raise HTTPException(
@@ -77,15 +81,33 @@ async def get_plan(plan_id: str):
         )
 
 @router.get("/bot/{bot_id}", response_model=List[PlanResponse])
-async def get_bot_plans(bot_id: str):
+async def get_bot_plans(
+    bot_id: str,
+    response: Response,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+):
     """
-    Obtém todos os planos de um bot específico
+    Obtém os planos ativos de um bot específico
+    
+    Paginado por cursor; o próximo cursor vem no cabeçalho X-Next-Cursor
     """
     try:
-        supabase = get_db()
-        response = supabase.table("plans").select("*").eq("bot_id", bot_id).eq("is_active", True).execute()
+        rows, next_cursor = fetch_page(
+            lambda: select("plans.list", "plans", PLAN_COLUMNS).eq("bot_id", bot_id).eq("is_active", True),
+            cursor,
+            clamp_limit(limit)
+        )
         
-        return response.data
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        
+        return rows
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Erro ao buscar planos do bot: {str(e)}")
         raise HTTPException(
@@ -93,35 +115,35 @@ async def get_bot_plans(bot_id: str):
             detail=f"Erro ao buscar planos do bot: {str(e)}"
         )
 
+@router.get("/bot/{bot_id}/export")
+async def export_bot_plans(bot_id: str, include_inactive: bool = False):
+    """
+    Exporta os planos de um bot em NDJSON, buscando página a página
+    """
+    def build_query():
+        query = select("plans.export", "plans", PLAN_COLUMNS).eq("bot_id", bot_id)
+        return query if include_inactive else query.eq("is_active", True)
+    
+    return StreamingResponse(ndjson_lines(iter_rows(build_query)), media_type="application/x-ndjson")
+
 @router.patch("/{plan_id}", response_model=PlanResponse)
 async def update_plan(plan_id: str, plan_update: dict):
     """
     Atualiza um plano existente
     """
     try:
-        supabase = get_db()
+        # Uma única atualização; sem linha retornada o plano não existe
+        plan_update["updated_at"] = "now()"
         
-        # Verificar se o plano existe
-        plan_response = supabase.table("plans").select("*").eq("id", plan_id).execute()
+        plan = update_returning("plans.update", "plans", plan_update, {"id": plan_id}, PLAN_COLUMNS)
         
-        if len(plan_response.data) == 0:
+        if plan is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Plano não encontrado"
             )
         
-        # Atualizar o plano
-        plan_update["updated_at"] = "now()"
-        
-        response = supabase.table("plans").update(plan_update).eq("id", plan_id).execute()
-        
-        if len(response.data) == 0:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erro ao atualizar o plano"
-            )
-        
-        return response.data[0]
+        return plan
     except HTTPException:
         raise
     except Exception as e:
@@ -137,23 +159,18 @@ async def delete_plan(plan_id: str):
     Remove um plano (desativa)
     """
     try:
-        supabase = get_db()
-        
-        # Verificar se o plano existe
-        plan_response = supabase.table("plans").select("*").eq("id", plan_id).execute()
+        # Desativar o plano ao invés de excluir, em uma única atualização
+        plan = update_returning("plans.deactivate", "plans", {
+            "is_active": False,
+            "updated_at": "now()"
+        }, {"id": plan_id}, ("id",))
         
-        if len(plan_response.data) == 0:
+        if plan is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Plano não encontrado"
             )
         
-        # Desativar o plano ao invés de excluir
-        response = supabase.table("plans").update({
-            "is_active": False,
-            "updated_at": "now()"
-        }).eq("id", plan_id).execute()
-        
         return None
     except HTTPException:
         raise
@@ -162,4 +179,4 @@ async def delete_plan(plan_id: str):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao remover plano: {str(e)}"
-        ) 
\ No newline at end of file
+        )
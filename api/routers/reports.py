@@ -0,0 +1,152 @@
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import Response
+from typing import Optional, List
+from datetime import date
+import asyncio
+import logging
+
+from ..queries import select
+from ..reporting import (
+    Report, SalesColumns, fetch_sales_columns, revenue_by, cohort_retention, mrr_curve,
+    DIMENSIONS, PERIOD_UNITS
+)
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["reports"],
+    responses={404: {"description": "Relatório não encontrado"}}
+)
+
+logger = logging.getLogger(__name__)
+
+def _resolve_bot_ids(owner_id: Optional[str], bot_id: Optional[str]) -> List[str]:
+    if bot_id:
+        return [bot_id]
+    if not owner_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe owner_id ou bot_id"
+        )
+
+    response = select("reports.bots", "bots", ("id",)).eq("owner_id", owner_id).execute()
+    return [bot["id"] for bot in response.data]
+
+async def _load_sales(
+    owner_id: Optional[str],
+    bot_id: Optional[str],
+    start: Optional[date],
+    end: Optional[date]
+) -> SalesColumns:
+    bot_ids = _resolve_bot_ids(owner_id, bot_id)
+    # A leitura paginada e o cálculo rodam fora do event loop
+    return await asyncio.to_thread(fetch_sales_columns, bot_ids, start, end)
+
+def _render(report: Report, output: str, name: str):
+    if output == "csv":
+        return Response(
+            content=report.to_csv(),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{name}.csv"'}
+        )
+    return {"success": True, "rows": report.to_dicts()}
+
+def _validate(output: str, period: str):
+    if output not in ("json", "csv"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato inválido (use json ou csv)"
+        )
+    if period not in PERIOD_UNITS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Período inválido (use {', '.join(PERIOD_UNITS)})"
+        )
+
+@router.get("/revenue")
+async def revenue_report(
+    owner_id: Optional[str] = None,
+    bot_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_by: str = "bot,period",
+    period: str = "month",
+    output: str = "json"
+):
+    """
+    Receita agrupada por bot, plano, método de pagamento e/ou período
+    """
+    _validate(output, period)
+    dimensions = [dimension.strip() for dimension in group_by.split(",") if dimension.strip()]
+    invalid = [dimension for dimension in dimensions if dimension not in DIMENSIONS]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Agrupamento inválido: {', '.join(invalid)}"
+        )
+
+    try:
+        sales = await _load_sales(owner_id, bot_id, start, end)
+        report = await asyncio.to_thread(revenue_by, sales, dimensions, period)
+        return _render(report, output, "receita")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao gerar relatório de receita: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao gerar relatório de receita: {str(e)}"
+        )
+
+@router.get("/cohorts")
+async def cohorts_report(
+    owner_id: Optional[str] = None,
+    bot_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    period: str = "month",
+    output: str = "json"
+):
+    """
+    Retenção por coorte de primeira compra
+    """
+    _validate(output, period)
+
+    try:
+        sales = await _load_sales(owner_id, bot_id, start, end)
+        report = await asyncio.to_thread(cohort_retention, sales, period)
+        return _render(report, output, "coortes")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao gerar relatório de coortes: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao gerar relatório de coortes: {str(e)}"
+        )
+
+@router.get("/mrr")
+async def mrr_report(
+    owner_id: Optional[str] = None,
+    bot_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    grace_days: int = 3,
+    output: str = "json"
+):
+    """
+    MRR mensal, assinaturas ativas e churn
+    """
+    _validate(output, "month")
+
+    try:
+        sales = await _load_sales(owner_id, bot_id, start, end)
+        report = await asyncio.to_thread(mrr_curve, sales, grace_days)
+        return _render(report, output, "mrr")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao gerar relatório de MRR: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao gerar relatório de MRR: {str(e)}"
+        )
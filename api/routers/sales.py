@@ -0,0 +1,85 @@
+from fastapi import APIRouter, HTTPException, status, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import date
+import logging
+
+from ..models import SaleResponse
+from ..queries import select, SALE_COLUMNS
+from ..pagination import (
+    fetch_page, iter_rows, ndjson_lines, clamp_limit, DEFAULT_PAGE_SIZE, NEXT_CURSOR_HEADER
+)
+
+router = APIRouter(
+    prefix="/sales",
+    tags=["sales"],
+    responses={404: {"description": "Venda não encontrada"}}
+)
+
+logger = logging.getLogger(__name__)
+
+def _sales_query(
+    bot_id: str,
+    plan_id: Optional[str],
+    start: Optional[date],
+    end: Optional[date]
+):
+    query = select("sales.list", "sales", SALE_COLUMNS).eq("bot_id", bot_id)
+    if plan_id:
+        query = query.eq("plan_id", plan_id)
+    if start:
+        query = query.gte("created_at", start.isoformat())
+    if end:
+        query = query.lte("created_at", f"{end.isoformat()}T23:59:59.999999+00:00")
+    return query
+
+@router.get("/", response_model=List[SaleResponse])
+async def list_sales(
+    bot_id: str,
+    response: Response,
+    plan_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+):
+    """
+    Lista as vendas de um bot, das mais recentes para as mais antigas
+
+    Paginado por cursor; o próximo cursor vem no cabeçalho X-Next-Cursor
+    """
+    try:
+        rows, next_cursor = fetch_page(
+            lambda: _sales_query(bot_id, plan_id, start, end),
+            cursor,
+            clamp_limit(limit)
+        )
+
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+        return rows
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Erro ao listar vendas: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao listar vendas: {str(e)}"
+        )
+
+@router.get("/export")
+async def export_sales(
+    bot_id: str,
+    plan_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+):
+    """
+    Exporta as vendas de um bot em NDJSON (mais antigas primeiro), buscando página a página
+    """
+    rows = iter_rows(lambda: _sales_query(bot_id, plan_id, start, end))
+    return StreamingResponse(ndjson_lines(rows), media_type="application/x-ndjson")
@@ -1,10 +1,25 @@
 from fastapi import APIRouter, HTTPException, Request, Depends, status
+import os
+import asyncio
 import logging
 import json
+from typing import Tuple
 from telegram import Update
-from telegram.ext import Application, Dispatcher
+from telegram.ext import Application
 
+from ..auth import require_admin, require_bot_owner
 from ..database import get_db
+from ..queries import select, update_returning
+from ..update_filter import update_filter, UpdateFilterRules
+from ..payment_events import payment_events
+from ..payments.pix import build_pix_payload, make_txid, pix_config
+from ..payments.qr import qr_code_data_uri
+from ..update_log import update_log
+from ..scheduler import (
+    update_scheduler, scheduler_stats, set_bot_policy, sync_bot_policy, TenantPolicy, FairTelegramRequest,
+    SchedulerQueueFull
+)
+from ..metrics import registry, telegram_updates
 
 router = APIRouter(
     prefix="/telegram",
@@ -14,53 +29,221 @@ router = APIRouter(
 
 logger = logging.getLogger(__name__)
 
-# Dicionário para armazenar as instâncias dos dispatchers dos bots
-# Chave: token do bot, Valor: instância do dispatcher
+# Dicionário para armazenar as aplicações (python-telegram-bot 20) dos bots
+# Chave: token do bot, Valor: instância da Application já inicializada
 bot_dispatchers = {}
 
+# IDs dos bots já encontrados no banco por este worker: só eles viram label
+# nas métricas (tokens inventados não criam séries novas)
+known_bots = set()
+UNKNOWN_BOT_LABEL = "desconhecido"
+
+# URL da Bot API (os testes de carga apontam para o simulador local)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+# Colunas lidas por cada consulta (apenas o que a resposta usa)
+BOT_CONFIG_COLUMNS = (
+    "id", "name", "description", "is_activated",
+    "welcome_message", "welcome_media_url", "welcome_media_type"
+)
+BOT_WEBHOOK_COLUMNS = ("id", "scheduler_tier", "scheduler_max_concurrency")
+PLAN_MENU_COLUMNS = ("id", "name", "price", "description", "period", "days_access")
+TELEGRAM_PAYMENT_COLUMNS = (
+    "id", "bot_id", "plan_id", "telegram_user_id", "user_name",
+    "amount", "method", "status", "expires_at", "created_at"
+)
+
+registry.callback(
+    "telegram_applications", "Applications do python-telegram-bot inicializadas neste worker",
+    lambda: len(bot_dispatchers)
+)
+
+def telegram_bot_id(bot_token: str) -> str:
+    """Retorna a parte pública do token (ID do bot no Telegram), usada como chave nas métricas"""
+    return bot_token.split(":", 1)[0]
+
+def require_pix_config():
+    """Recusa com 503 quando o PIX não está configurado (antes de criar o pagamento)"""
+    try:
+        pix_config()
+    except ValueError as e:
+        logger.error(f"PIX indisponível: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Pagamento via PIX indisponível no momento"
+        )
+
+def pix_details(payment_id: str, amount: float, description: str = None) -> dict:
+    """Gera o PIX copia e cola (BR Code) do pagamento e a imagem do QR Code (em cache)"""
+    payload = build_pix_payload(amount, txid=make_txid(payment_id), description=description)
+    
+    return {
+        "pix_copy_paste": payload,
+        "qr_code_image_url": qr_code_data_uri(payload)
+    }
+
+async def lookup_bot(bot_token: str) -> dict:
+    """
+    Busca o bot pelo token (leitura compartilhada entre updates simultâneos)
+
+    Raises:
+        HTTPException: 404 se o bot não existir
+    """
+    bot_response = await select("telegram.webhook.bot", "bots", BOT_WEBHOOK_COLUMNS).eq("token", bot_token).execute_shared()
+    
+    if len(bot_response.data) == 0:
+        logger.error("Bot %s não encontrado", telegram_bot_id(bot_token))
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bot não encontrado"
+        )
+    
+    known_bots.add(telegram_bot_id(bot_token))
+    # Política de escalonamento gravada no bot (vale a partir do próximo update)
+    sync_bot_policy(telegram_bot_id(bot_token), bot_response.data[0])
+    return bot_response.data[0]
+
+async def process_telegram_update(bot_token: str, update_data: dict):
+    """Valida o bot, obtém (ou cria) a Application e processa o update"""
+    # Verificar se o bot existe no banco de dados
+    await lookup_bot(bot_token)
+    
+    # Obter a aplicação para este bot (criar uma nova se não existir)
+    if bot_token not in bot_dispatchers:
+        # Criar uma nova aplicação para este bot
+        # em uma aplicação real, você pode querer carregar e configurar 
+        # os handlers específicos para este bot
+        application = (
+            Application.builder()
+            .token(bot_token)
+            .base_url(f"{TELEGRAM_API_URL}/bot")
+            .request(FairTelegramRequest())
+            .build()
+        )
+        await application.initialize()
+        bot_dispatchers[bot_token] = application
+        
+        # Registrar handlers para este bot
+        # Isso seria feito de forma dinâmica com base nas configurações do bot
+        # Por enquanto, estamos apenas simulando
+        logger.info("Nova aplicação criada para o bot %s", telegram_bot_id(bot_token))
+    
+    # Obter a aplicação para este bot
+    application = bot_dispatchers[bot_token]
+    
+    # Processar a atualização
+    update = Update.de_json(update_data, application.bot)
+    
+    # Processar a atualização na aplicação
+    await application.process_update(update)
+
+# Updates do log sendo processados fora da requisição (referência evita o coletor de lixo)
+logged_update_tasks = set()
+
+async def process_logged_update(bot_token: str, update_data: dict, offset: int):
+    """Processa um update já gravado no log e registra o ack (também em caso de erro)"""
+    try:
+        # Já aceito (gravado e respondido): entra na fila mesmo acima do limite
+        await update_scheduler.run(
+            telegram_bot_id(bot_token), lambda: process_telegram_update(bot_token, update_data), bounded=False
+        )
+    except asyncio.CancelledError:
+        # Encerramento: sem ack, o update é reprocessado na próxima inicialização
+        raise
+    except HTTPException as e:
+        logger.error(f"Update {offset} descartado: {e.detail}")
+    except Exception as e:
+        logger.error(f"Erro ao processar update {offset} do log: {str(e)}")
+    update_log.log.ack(offset, update_data.get("update_id"))
+
+def schedule_logged_update(bot_token: str, update_data: dict, offset: int):
+    task = asyncio.get_running_loop().create_task(process_logged_update(bot_token, update_data, offset))
+    logged_update_tasks.add(task)
+    task.add_done_callback(logged_update_tasks.discard)
+
+async def stop_logged_updates(timeout: float = 5.0):
+    """Espera os updates em andamento; os que não terminarem ficam sem ack e são reprocessados"""
+    if not logged_update_tasks:
+        return
+    _, pending = await asyncio.wait(set(logged_update_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+def encode_logged_update(bot_token: str, body: bytes) -> bytes:
+    """
+    Registro do log: token + quebra de linha + corpo do update
+
+    A chave do registro continua sendo o ID público do bot (watermarks e
+    /stats/update-log); o token vai nos dados para a recuperação não precisar
+    procurar o bot no banco.
+    """
+    return bot_token.encode("utf-8") + b"\n" + body
+
+def decode_logged_update(data: bytes) -> Tuple[str, bytes]:
+    """(token, corpo) de um registro gravado por encode_logged_update"""
+    token, _, body = data.partition(b"\n")
+    return token.decode("utf-8"), body
+
+async def recover_logged_updates():
+    """Abre o log de updates do worker e reprocessa os updates que ficaram sem ack"""
+    if not update_log.enabled:
+        return
+    
+    for record in update_log.open():
+        bot_token, body = decode_logged_update(record.data)
+        update_data = json.loads(body)
+        # Cópia reenviada de um update que já teve ack (ou que está antes no log)
+        if not update_log.log.claim(record.key, update_data.get("update_id")):
+            logger.warning(f"Update {record.offset} do log repetido ({record.key}); descartado")
+            update_log.log.ack(record.offset)
+            continue
+        schedule_logged_update(bot_token, update_data, record.offset)
+
 @router.post("/webhook/{bot_token}")
 async def telegram_webhook(bot_token: str, request: Request):
     """
     Endpoint para receber atualizações do Telegram via webhook
     """
     try:
-        # Verificar se o bot existe no banco de dados
-        supabase = get_db()
-        bot_response = supabase.table("bots").select("*").eq("token", bot_token).execute()
-        
-        if len(bot_response.data) == 0:
-            logger.error(f"Bot com token {bot_token} não encontrado")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Bot não encontrado"
-            )
-        
-        bot = bot_response.data[0]
-        
-        # Obter o dispatcher para este bot (criar um novo se não existir)
-        if bot_token not in bot_dispatchers:
-            # Criar uma nova instância do dispatcher para este bot
-            # em uma aplicação real, você pode querer carregar e configurar 
-            # o dispatcher com os handlers específicos para este bot
-            application = Application.builder().token(bot_token).build()
-            bot_dispatchers[bot_token] = application.dispatcher
-            
-            # Registrar handlers para este bot
-            # Isso seria feito de forma dinâmica com base nas configurações do bot
-            # Por enquanto, estamos apenas simulando
-            logger.info(f"Novo dispatcher criado para o bot {bot_token}")
-        
-        # Obter o dispatcher para este bot
-        dispatcher = bot_dispatchers[bot_token]
-        
-        # Processar a atualização
-        update_data = await request.json()
-        update = Update.de_json(update_data, dispatcher.bot)
-        
-        # Processar a atualização no dispatcher
-        await dispatcher.process_update(update)
+        body = await request.body()
+        update_data = json.loads(body)
+        bot_key = telegram_bot_id(bot_token)
+        
+        # Descartar updates irrelevantes antes de consultar o banco e montar o Update
+        label = bot_key if bot_key in known_bots else UNKNOWN_BOT_LABEL
+        dispatch, reason = update_filter.check(bot_key, update_data, counter_key=label)
+        telegram_updates.inc(bot=label, result="dispatched" if dispatch else f"ignored:{reason}")
+        
+        if not dispatch:
+            return {"status": "ignored", "reason": reason}
+        
+        if update_log.log is not None:
+            # Bot desconhecido é recusado antes de qualquer escrita em disco
+            await lookup_bot(bot_token)
+            update_scheduler.check_capacity(bot_key)
+            # Reenvio do Telegram de um update já aceito
+            if not update_log.log.claim(bot_key, update_data.get("update_id")):
+                return {"status": "duplicate"}
+            # Responde assim que o update está no disco; o processamento segue fora da
+            # requisição e é refeito após uma queda se não chegar ao ack
+            offset = update_log.log.append(bot_key, encode_logged_update(bot_token, body))
+            await update_log.log.wait_durable(offset)
+            schedule_logged_update(bot_token, update_data, offset)
+            return {"status": "accepted"}
+        
+        # Vaga no worker por deficit round-robin entre os bots (um bot em lançamento
+        # não atrasa os updates dos outros)
+        await update_scheduler.run(bot_key, lambda: process_telegram_update(bot_token, update_data))
         
         return {"status": "success"}
+    except SchedulerQueueFull as e:
+        logger.warning("Update recusado: %s", e, extra={"event": "scheduler.queue_full", "bot": e.tenant})
+        # O Telegram reenvia o update mais tarde
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e)
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -70,6 +253,80 @@ async def telegram_webhook(bot_token: str, request: Request):
             detail=f"Erro ao processar webhook: {str(e)}"
         )
 
+@router.put("/scheduler/{bot_token}", dependencies=[Depends(require_admin)])
+async def set_scheduler_policy(bot_token: str, policy: dict):
+    """
+    Define o plano (peso no escalonamento) e o limite de tarefas simultâneas de um bot
+
+    Só o admin: o plano define a fatia do worker que o bot recebe. A política
+    é gravada no bot; os outros workers a aplicam na próxima consulta do bot.
+    """
+    try:
+        tenant_policy = TenantPolicy.from_dict(policy, update_scheduler.default_tier)
+        if tenant_policy.tier not in update_scheduler.tier_weights:
+            raise ValueError(f"Plano desconhecido: {tenant_policy.tier}")
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Política inválida: {str(e)}"
+        )
+    
+    try:
+        bot = update_returning(
+            "telegram.scheduler_policy", "bots", tenant_policy.to_row(), {"token": bot_token}, ("id",)
+        )
+    except Exception as e:
+        logger.error(f"Erro ao gravar a política do bot: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao gravar a política: {str(e)}"
+        )
+    
+    if bot is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bot não encontrado"
+        )
+    
+    set_bot_policy(telegram_bot_id(bot_token), tenant_policy)
+    return {"status": "success", "policy": tenant_policy.to_dict()}
+
+@router.get("/update-log/stats")
+async def get_update_log_stats():
+    """
+    Retorna offsets, updates pendentes e watermarks por bot do log de updates
+    """
+    return update_log.stats()
+
+@router.get("/scheduler/stats")
+async def get_scheduler_stats():
+    """
+    Retorna filas, tarefas em execução e espera média por bot nos escalonadores
+    """
+    return scheduler_stats()
+
+@router.put("/update-filter/{bot_token}", dependencies=[Depends(require_bot_owner)])
+async def set_update_filter_rules(bot_token: str, rules: dict):
+    """
+    Define as regras do pré-filtro de updates para um bot (dono do bot ou admin)
+    """
+    try:
+        update_filter.set_rules(telegram_bot_id(bot_token), UpdateFilterRules.from_dict(rules))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Regras inválidas: {str(e)}"
+        )
+    
+    return {"status": "success", "rules": update_filter.get_rules(telegram_bot_id(bot_token)).to_dict()}
+
+@router.get("/update-filter/stats")
+async def get_update_filter_stats():
+    """
+    Retorna os contadores de updates despachados e descartados por bot
+    """
+    return update_filter.stats()
+
 @router.post("/setup-webhook/{bot_token}")
 async def setup_webhook(bot_token: str, webhook_url: str):
     """
@@ -80,7 +337,7 @@ async def setup_webhook(bot_token: str, webhook_url: str):
     try:
         # Verificar se o bot existe no banco de dados
         supabase = get_db()
-        bot_response = supabase.table("bots").select("*").eq("token", bot_token).execute()
+        bot_response = select("telegram.bot_exists", "bots", ("id",)).eq("token", bot_token).execute()
         
         if len(bot_response.data) == 0:
             logger.error(f"Bot com token {bot_token} não encontrado")
@@ -124,7 +381,7 @@ async def remove_webhook(bot_token: str):
     try:
         # Verificar se o bot existe no banco de dados
         supabase = get_db()
-        bot_response = supabase.table("bots").select("*").eq("token", bot_token).execute()
+        bot_response = select("telegram.bot_exists", "bots", ("id",)).eq("token", bot_token).execute()
         
         if len(bot_response.data) == 0:
             logger.error(f"Bot com token {bot_token} não encontrado")
@@ -167,8 +424,7 @@ async def add_user_to_group(user_telegram_id: str, group_id: str, bot_token: str
     
     try:
         # Verificar se o bot existe no banco de dados
-        supabase = get_db()
-        bot_response = supabase.table("bots").select("*").eq("token", bot_token).execute()
+        bot_response = select("telegram.bot_exists", "bots", ("id",)).eq("token", bot_token).execute()
         
         if len(bot_response.data) == 0:
             logger.error(f"Bot com token {bot_token} não encontrado")
@@ -178,7 +434,7 @@ async def add_user_to_group(user_telegram_id: str, group_id: str, bot_token: str
             )
         
         # Verificar se o grupo existe
-        group_response = supabase.table("groups").select("*").eq("telegram_id", group_id).execute()
+        group_response = select("telegram.group_exists", "groups", ("id",)).eq("telegram_id", group_id).execute()
         
         if len(group_response.data) == 0:
             logger.error(f"Grupo com ID {group_id} não encontrado")
@@ -219,10 +475,10 @@ async def get_bot_config(request: dict):
                 detail="Token do bot é obrigatório"
             )
         
-        supabase = get_db()
-        
         # Buscar bot pelo token
-        bot_response = supabase.table("bots").select("*").eq("token", bot_token).execute()
+        bot_response = await select(
+            "telegram.config", "bots", BOT_CONFIG_COLUMNS
+        ).eq("token", bot_token).execute_shared()
         
         if len(bot_response.data) == 0:
             return {"success": False, "error": "Bot não encontrado"}
@@ -267,14 +523,15 @@ async def activate_bot(request: dict):
         
         supabase = get_db()
         
-        # Buscar código de ativação válido
         from datetime import datetime
         current_time = datetime.utcnow().isoformat()
         
-        code_response = supabase.table("bot_activation_codes").select("""
-            *,
-            bots!inner(id, name, token)
-        """).eq("activation_code", activation_code).gt("expires_at", current_time).eq("used_at", None).execute()
+        # Consumir o código em uma única atualização condicional: só um grupo
+        # consegue marcar o código como usado enquanto ele ainda é válido
+        code_response = supabase.table("bot_activation_codes").update({
+            "used_at": current_time,
+            "used_by_telegram_id": telegram_user_id
+        }).eq("activation_code", activation_code).is_("used_at", "null").gt("expires_at", current_time).execute()
         
         if len(code_response.data) == 0:
             return {
@@ -283,20 +540,18 @@ async def activate_bot(request: dict):
             }
         
         code_data = code_response.data[0]
-        bot_data = code_data["bots"]
-        
-        # Marcar código como usado
-        supabase.table("bot_activation_codes").update({
-            "used_at": current_time,
-            "used_by_telegram_id": telegram_user_id
-        }).eq("id", code_data["id"]).execute()
         
         # Ativar o bot
-        supabase.table("bots").update({
+        bot_response = supabase.table("bots").update({
             "is_activated": True,
             "activated_at": current_time,
             "activated_by_telegram_id": telegram_user_id
-        }).eq("id", bot_data["id"]).execute()
+        }).eq("id", code_data["bot_id"]).execute()
+        
+        if len(bot_response.data) == 0:
+            return {"success": False, "message": "❌ Bot não encontrado"}
+        
+        bot_data = bot_response.data[0]
         
         return {
             "success": True,
@@ -313,6 +568,40 @@ async def activate_bot(request: dict):
         logger.error(f"Erro ao ativar bot: {str(e)}")
         return {"success": False, "error": str(e)}
 
+@router.post("/activation-codes/pending")
+async def list_pending_activation_codes(request: dict):
+    """
+    Lista os códigos de ativação ainda válidos de um bot (usado pelo índice local do bot)
+    """
+    try:
+        bot_token = request.get('token')
+        if not bot_token:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Token do bot é obrigatório"
+            )
+        
+        from datetime import datetime
+        current_time = datetime.utcnow().isoformat()
+        
+        codes_response = select(
+            "telegram.pending_codes", "bot_activation_codes", ("activation_code", "expires_at", "bots!inner(token)")
+        ).eq("bots.token", bot_token).is_("used_at", "null").gt("expires_at", current_time).execute()
+        
+        return {
+            "success": True,
+            "codes": [
+                {"activation_code": code["activation_code"], "expires_at": code["expires_at"]}
+                for code in codes_response.data
+            ]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao listar códigos de ativação: {str(e)}")
+        return {"success": False, "error": str(e)}
+
 @router.post("/check-access")
 async def check_user_access(request: dict):
     """
@@ -334,10 +623,9 @@ async def check_user_access(request: dict):
         from datetime import datetime
         current_time = datetime.utcnow().isoformat()
         
-        access_response = supabase.table("user_accesses").select("""
-            *,
-            plans!inner(name, duration_days)
-        """).eq("bot_id", bot_id).eq("telegram_user_id", telegram_user_id).eq("active", True).execute()
+        access_response = select(
+            "telegram.check_access", "user_accesses", ("id", "expires_at", "plans!inner(name)")
+        ).eq("bot_id", bot_id).eq("telegram_user_id", telegram_user_id).eq("active", True).execute()
         
         if len(access_response.data) == 0:
             return {"has_access": False}
@@ -381,10 +669,10 @@ async def list_plans(request: dict):
                 detail="bot_id é obrigatório"
             )
         
-        supabase = get_db()
-        
-        # Buscar planos ativos do bot
-        plans_response = supabase.table("plans").select("*").eq("bot_id", bot_id).eq("is_active", True).execute()
+        # Buscar planos ativos do bot (leitura compartilhada entre chamadas simultâneas)
+        plans_response = await select(
+            "telegram.list_plans", "plans", PLAN_MENU_COLUMNS
+        ).eq("bot_id", bot_id).eq("is_active", True).execute_shared()
         
         return {
             "success": True,
@@ -414,10 +702,13 @@ async def create_payment(request: dict):
                 detail="Parâmetros obrigatórios: bot_id, plan_id, telegram_user_id"
             )
         
+        # Sem PIX configurado o pagamento ficaria pendente sem código para pagar
+        require_pix_config()
+        
         supabase = get_db()
         
         # Buscar o plano
-        plan_response = supabase.table("plans").select("*").eq("id", plan_id).execute()
+        plan_response = select("telegram.create_payment.plan", "plans", ("id", "name", "price")).eq("id", plan_id).execute()
         
         if len(plan_response.data) == 0:
             return {"success": False, "error": "Plano não encontrado"}
@@ -446,11 +737,8 @@ async def create_payment(request: dict):
         
         payment = payment_response.data[0]
         
-        # Aqui você integraria com PushinPay para gerar QR code
-        # Por enquanto, vamos simular
         payment["plan_name"] = plan["name"]
-        payment["pix_copy_paste"] = f"00020126580014BR.GOV.BCB.PIX0136{payment['id'][:36]}520400005303986540{plan['price']:.2f}5802BR6009SAO PAULO62070503***6304"
-        payment["qr_code_image_url"] = f"data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8/5+hHgAHggJ/PchI7wAAAABJRU5ErkJggg=="
+        payment.update(pix_details(payment["id"], plan["price"], plan["name"]))
         
         return {
             "success": True,
@@ -469,27 +757,27 @@ async def get_payment_details(payment_id: str):
     Busca detalhes de um pagamento
     """
     try:
-        supabase = get_db()
+        require_pix_config()
         
-        payment_response = supabase.table("payments").select("""
-            *,
-            plans!inner(name)
-        """).eq("id", payment_id).execute()
+        payment_response = select(
+            "telegram.payment_details", "payments", TELEGRAM_PAYMENT_COLUMNS + ("plans!inner(name)",)
+        ).eq("id", payment_id).execute()
         
         if len(payment_response.data) == 0:
             return {"success": False, "error": "Pagamento não encontrado"}
         
         payment = payment_response.data[0]
         
-        # Adicionar dados simulados do PIX
-        payment["pix_copy_paste"] = f"00020126580014BR.GOV.BCB.PIX0136{payment['id'][:36]}520400005303986540{payment['amount']:.2f}5802BR6009SAO PAULO62070503***6304"
-        payment["qr_code_image_url"] = f"data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8/5+hHgAHggJ/PchI7wAAAABJRU5ErkJggg=="
+        # Dados do PIX (o QR Code renderizado fica em cache pelo hash do payload)
+        payment.update(pix_details(payment["id"], payment["amount"], payment["plans"]["name"]))
         
         return {
             "success": True,
             "payment": payment
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao buscar detalhes do pagamento: {str(e)}")
         return {"success": False, "error": str(e)}
@@ -498,24 +786,37 @@ async def get_payment_details(payment_id: str):
 async def check_payment_status(payment_id: str, request: dict):
     """
     Verifica status de um pagamento
+    
+    Com `wait` (segundos, até 30) no corpo, um pagamento pendente aguarda a
+    notificação do gateway antes de responder (long-poll), em vez de o cliente
+    repetir a consulta.
     """
+    queue = None
+    
     try:
         telegram_user_id = request.get('telegram_user_id')
+        wait = max(0, min(float(request.get('wait') or 0), 30))
         
-        supabase = get_db()
+        # Assinar antes da consulta para não perder uma notificação no meio
+        if wait:
+            queue = payment_events.subscribe(payment_id)
         
-        payment_response = supabase.table("payments").select("""
-            *,
-            plans!inner(name, period_days)
-        """).eq("id", payment_id).eq("telegram_user_id", telegram_user_id).execute()
+        payment_response = select(
+            "telegram.payment_status", "payments", TELEGRAM_PAYMENT_COLUMNS + ("plans!inner(name)",)
+        ).eq("id", payment_id).eq("telegram_user_id", telegram_user_id).execute()
         
         if len(payment_response.data) == 0:
             return {"success": False, "error": "Pagamento não encontrado"}
         
         payment = payment_response.data[0]
         
-        # Por enquanto, vamos simular aprovação para teste
-        # Em produção, você verificaria com PushinPay
+        # Aguardar a notificação do gateway em vez de o cliente repetir a consulta
+        if payment["status"] == "pending" and queue is not None:
+            try:
+                event = await asyncio.wait_for(queue.get(), wait)
+                payment["status"] = event["status"]
+            except asyncio.TimeoutError:
+                pass
         
         if payment["status"] == "pending":
             # Simular aprovação para testes (opcional)
@@ -548,4 +849,7 @@ async def check_payment_status(payment_id: str, request: dict):
         
     except Exception as e:
         logger.error(f"Erro ao verificar status do pagamento: {str(e)}")
-        return {"success": False, "error": str(e)} 
\ No newline at end of file
+        return {"success": False, "error": str(e)}
+    finally:
+        if queue is not None:
+            payment_events.unsubscribe(payment_id, queue)
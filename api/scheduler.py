@@ -0,0 +1,428 @@
+"""
+Escalonamento justo entre bots (tenants) com deficit round-robin
+
+Todos os bots dividem o mesmo worker. Sem escalonamento, os updates são
+processados na ordem de chegada e o lançamento de um bot grande enche o
+event loop de trabalho dele: o /start dos outros bots espera na fila.
+
+O FairScheduler limita quantas tarefas rodam ao mesmo tempo (concurrency).
+Quando o limite é atingido, as próximas esperam em filas por bot, e cada
+vaga liberada é entregue por deficit round-robin: a cada volta o bot recebe
+quantum × peso do seu plano (tier) de crédito e é atendido enquanto o
+crédito cobre o custo da próxima tarefa. Um bot com 1000 updates na fila
+e outro com 1 recebem vagas na proporção dos pesos, e não 1000:1.
+
+Cada bot também tem um limite de tarefas simultâneas (max_concurrency):
+mesmo com vagas livres, um bot não ocupa o worker inteiro, e sobra espaço
+para os updates de outros bots que chegarem em seguida.
+
+A política de cada bot (plano e limite) fica no banco, em
+bots.scheduler_tier e bots.scheduler_max_concurrency: só a rota de
+administração a grava, e cada worker a aplica ao consultar o bot
+(sync_bot_policy), então vale em todos os workers e depois de reiniciar.
+
+Há dois escalonadores: updates recebidos no webhook (update_scheduler) e
+chamadas de envio à Bot API (send_scheduler, via FairTelegramRequest).
+
+Variáveis de ambiente:
+    SCHEDULER_UPDATE_CONCURRENCY   updates processados ao mesmo tempo (padrão: 32)
+    SCHEDULER_SEND_CONCURRENCY     envios à Bot API ao mesmo tempo (padrão: 64)
+    SCHEDULER_TIER_WEIGHTS         ex.: free=1,pro=2,business=4 (padrão)
+    SCHEDULER_DEFAULT_TIER         plano dos bots sem política (padrão: free)
+    SCHEDULER_MAX_PER_BOT          tarefas simultâneas por bot (padrão: 8)
+    SCHEDULER_MAX_QUEUE_PER_BOT    tarefas na fila por bot antes de recusar (padrão: 1000)
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, Optional, Callable, Awaitable, Deque
+
+from dotenv import load_dotenv
+from telegram.request import BaseRequest
+
+from .metrics import registry
+from .tracing import TracedTelegramRequest
+from .resilience import dependency, AdaptiveTimeout, http_failure
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIER_WEIGHTS = {"free": 1.0, "pro": 2.0, "business": 4.0}
+
+scheduler_wait_seconds = registry.histogram(
+    "scheduler_wait_seconds", "Espera na fila do escalonador por plano", ("scheduler", "tier")
+)
+
+class SchedulerQueueFull(Exception):
+    """A fila do bot atingiu o limite; a tarefa foi recusada"""
+
+    def __init__(self, tenant: str, limit: int):
+        super().__init__(f"Fila do bot {tenant} cheia ({limit} tarefas)")
+        self.tenant = tenant
+
+def _check_weight(tier: str, weight: float):
+    # Com peso zero o bot nunca acumula crédito e o _dispatch não sai do laço
+    if not weight > 0:
+        raise ValueError(f"Peso do plano {tier} deve ser maior que zero: {weight}")
+
+class TenantPolicy:
+    """Plano (peso) e limite de tarefas simultâneas de um bot"""
+
+    def __init__(self, tier: str, max_concurrency: Optional[int] = None):
+        # Com limite zero o bot nunca recebe vaga e as tarefas esperam para sempre
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(f"max_concurrency deve ser pelo menos 1: {max_concurrency}")
+        self.tier = tier
+        self.max_concurrency = max_concurrency
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], default_tier: str) -> "TenantPolicy":
+        max_concurrency = data.get("max_concurrency")
+        return cls(
+            tier=data.get("tier", default_tier),
+            max_concurrency=int(max_concurrency) if max_concurrency is not None else None
+        )
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any], default_tier: str) -> "TenantPolicy":
+        """Política gravada no bot (colunas scheduler_tier e scheduler_max_concurrency)"""
+        return cls(row.get("scheduler_tier") or default_tier, row.get("scheduler_max_concurrency"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"tier": self.tier, "max_concurrency": self.max_concurrency}
+
+    def to_row(self) -> Dict[str, Any]:
+        return {"scheduler_tier": self.tier, "scheduler_max_concurrency": self.max_concurrency}
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TenantPolicy) and self.to_dict() == other.to_dict()
+
+class _Tenant:
+    """Fila, crédito e contadores de um bot"""
+
+    __slots__ = ("key", "queue", "deficit", "running", "completed", "rejected", "wait_total", "wait_max")
+
+    def __init__(self, key: str):
+        self.key = key
+        # (custo, futuro que recebe a vaga, instante da entrada na fila)
+        self.queue: Deque = deque()
+        self.deficit = 0.0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+class FairScheduler:
+    """Limita tarefas simultâneas e distribui as vagas entre bots por DRR ponderado"""
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int = 32,
+        quantum: float = 1.0,
+        tier_weights: Optional[Dict[str, float]] = None,
+        default_tier: str = "free",
+        max_per_tenant: int = 8,
+        max_queue_per_tenant: int = 1000
+    ):
+        """
+        Args:
+            name: Nome nas métricas
+            concurrency: Tarefas rodando ao mesmo tempo no worker
+            quantum: Crédito por volta de um bot com peso 1 (em unidades de custo)
+            tier_weights: Peso de cada plano (maior que zero)
+            default_tier: Plano dos bots sem política definida
+            max_per_tenant: Tarefas simultâneas por bot (a política pode mudar)
+            max_queue_per_tenant: Tarefas na fila por bot antes de recusar
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.quantum = quantum
+        self.tier_weights = dict(tier_weights or DEFAULT_TIER_WEIGHTS)
+        for tier, weight in self.tier_weights.items():
+            _check_weight(tier, weight)
+        self.default_tier = default_tier
+        self.default_policy = TenantPolicy(default_tier)
+        self.max_per_tenant = max_per_tenant
+        self.max_queue_per_tenant = max_queue_per_tenant
+        self.policies: Dict[str, TenantPolicy] = {}
+        self.tenants: Dict[str, _Tenant] = {}
+        # Bots com tarefas na fila, na ordem da volta do round-robin
+        self.active: Deque[_Tenant] = deque()
+        self.running = 0
+        self.queued = 0
+
+    # Políticas
+
+    def set_policy(self, tenant: str, policy: TenantPolicy):
+        if policy.tier not in self.tier_weights:
+            raise ValueError(f"Plano desconhecido: {policy.tier} (planos: {', '.join(self.tier_weights)})")
+        _check_weight(policy.tier, self.tier_weights[policy.tier])
+        self.policies[tenant] = policy
+        # Um limite maior pode liberar tarefas que estavam esperando
+        self._dispatch()
+
+    def get_policy(self, tenant: str) -> TenantPolicy:
+        return self.policies.get(tenant, self.default_policy)
+
+    def _weight(self, tenant: str) -> float:
+        return self.tier_weights.get(self.get_policy(tenant).tier, 1.0)
+
+    def _limit(self, tenant: str) -> int:
+        limit = self.get_policy(tenant).max_concurrency
+        return limit if limit is not None else self.max_per_tenant
+
+    # Execução
+
+    def _tenant(self, tenant: str) -> _Tenant:
+        state = self.tenants.get(tenant)
+        if state is None:
+            state = self.tenants[tenant] = _Tenant(tenant)
+        return state
+
+    def check_capacity(self, tenant: str):
+        """
+        Recusa antecipadamente quando a fila do bot está cheia (para quem aceita
+        a tarefa antes de executá-la, como o webhook com o log de updates)
+
+        Raises:
+            SchedulerQueueFull: se a fila do bot estiver cheia
+        """
+        state = self._tenant(tenant)
+        if len(state.queue) >= self.max_queue_per_tenant:
+            state.rejected += 1
+            raise SchedulerQueueFull(tenant, self.max_queue_per_tenant)
+
+    async def run(self, tenant: str, func: Callable[[], Awaitable[Any]], cost: float = 1.0, bounded: bool = True) -> Any:
+        """
+        Executa await func() quando houver vaga para o bot
+
+        Args:
+            bounded: Se False, a tarefa entra na fila mesmo acima do limite
+                (tarefas já aceitas, ex.: updates recuperados do log)
+
+        Raises:
+            SchedulerQueueFull: se a fila do bot estiver cheia
+        """
+        state = self._tenant(tenant)
+
+        # Caminho rápido: vaga livre e ninguém do mesmo bot na frente
+        if self.running < self.concurrency and not state.queue and state.running < self._limit(tenant):
+            self._acquire(state)
+        else:
+            if bounded:
+                self.check_capacity(tenant)
+            await self._wait(state, cost)
+
+        try:
+            return await func()
+        finally:
+            self._release(state)
+
+    async def _wait(self, state: _Tenant, cost: float):
+        waiter = asyncio.get_running_loop().create_future()
+        enqueued = time.perf_counter()
+        state.queue.append((cost, waiter, enqueued))
+        self.queued += 1
+        if len(state.queue) == 1:
+            self.active.append(state)
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # A vaga foi entregue junto com o cancelamento: devolve
+                self._release(state)
+            raise
+
+        waited = time.perf_counter() - enqueued
+        state.wait_total += waited
+        state.wait_max = max(state.wait_max, waited)
+        scheduler_wait_seconds.observe(waited, scheduler=self.name, tier=self.get_policy(state.key).tier)
+
+    def _acquire(self, state: _Tenant):
+        self.running += 1
+        state.running += 1
+
+    def _release(self, state: _Tenant):
+        self.running -= 1
+        state.running -= 1
+        state.completed += 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Entrega as vagas livres aos bots da fila ativa (deficit round-robin)"""
+        skipped = 0
+        while self.running < self.concurrency and self.active and skipped < len(self.active):
+            state = self.active[0]
+
+            # Tarefas canceladas enquanto esperavam
+            while state.queue and state.queue[0][1].done():
+                state.queue.popleft()
+                self.queued -= 1
+            if not state.queue:
+                state.deficit = 0.0
+                self.active.popleft()
+                continue
+
+            # Bot no limite de tarefas simultâneas: passa a vez sem perder a posição
+            if state.running >= self._limit(state.key):
+                self.active.rotate(-1)
+                skipped += 1
+                continue
+
+            cost = state.queue[0][0]
+            if state.deficit < cost:
+                # Nova volta: crédito proporcional ao peso; o bot vai para o fim da fila
+                state.deficit += self.quantum * self._weight(state.key)
+                if state.deficit < cost:
+                    self.active.rotate(-1)
+                    continue
+
+            _, waiter, _ = state.queue.popleft()
+            self.queued -= 1
+            state.deficit -= cost
+            self._acquire(state)
+            waiter.set_result(None)
+            skipped = 0
+
+            if not state.queue:
+                state.deficit = 0.0
+                self.active.popleft()
+            elif state.deficit < state.queue[0][0]:
+                self.active.rotate(-1)
+
+    def stats(self) -> Dict[str, Any]:
+        tenants = {}
+        for key, state in self.tenants.items():
+            if not (state.queue or state.running or state.completed or state.rejected):
+                continue
+            waited = state.completed or 1
+            tenants[key] = {
+                **self.get_policy(key).to_dict(),
+                "queued": len(state.queue),
+                "running": state.running,
+                "completed": state.completed,
+                "rejected": state.rejected,
+                "avg_wait_ms": round(state.wait_total / waited * 1000, 2),
+                "max_wait_ms": round(state.wait_max * 1000, 2)
+            }
+
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "queued": self.queued,
+            "tier_weights": self.tier_weights,
+            "max_per_tenant": self.max_per_tenant,
+            "tenants": tenants
+        }
+
+def parse_tier_weights(text: Optional[str]) -> Dict[str, float]:
+    """
+    'free=1,pro=2,business=4' -> {plano: peso}
+
+    Raises:
+        ValueError: Se algum peso não for um número maior que zero
+    """
+    weights = {}
+    for part in (text or "").split(","):
+        if "=" in part:
+            tier, _, weight = part.partition("=")
+            weights[tier.strip()] = float(weight)
+            _check_weight(tier.strip(), weights[tier.strip()])
+    return weights
+
+def create_scheduler(name: str, concurrency_env: str, default_concurrency: int) -> FairScheduler:
+    """Escalonador configurado pelas variáveis de ambiente SCHEDULER_*"""
+    return FairScheduler(
+        name,
+        concurrency=int(os.getenv(concurrency_env, str(default_concurrency))),
+        tier_weights=parse_tier_weights(os.getenv("SCHEDULER_TIER_WEIGHTS")) or DEFAULT_TIER_WEIGHTS,
+        default_tier=os.getenv("SCHEDULER_DEFAULT_TIER", "free"),
+        max_per_tenant=int(os.getenv("SCHEDULER_MAX_PER_BOT", "8")),
+        max_queue_per_tenant=int(os.getenv("SCHEDULER_MAX_QUEUE_PER_BOT", "1000"))
+    )
+
+def set_bot_policy(bot_key: str, policy: TenantPolicy):
+    """Aplica a política do bot aos dois escalonadores"""
+    for scheduler in (update_scheduler, send_scheduler):
+        scheduler.set_policy(bot_key, policy)
+
+def sync_bot_policy(bot_key: str, row: Dict[str, Any]):
+    """
+    Aplica a política gravada no bot, se mudou (chamada a cada consulta do bot)
+
+    A política fica no banco para valer em todos os workers e depois de
+    reiniciar; um plano que não existe mais em SCHEDULER_TIER_WEIGHTS cai no
+    plano padrão.
+    """
+    try:
+        policy = TenantPolicy.from_row(row, update_scheduler.default_tier)
+    except ValueError as e:
+        logger.error(f"Política do bot {bot_key} inválida: {str(e)}")
+        return
+    if policy.tier not in update_scheduler.tier_weights:
+        logger.error(f"Plano do bot {bot_key} desconhecido: {policy.tier}")
+        policy = TenantPolicy(update_scheduler.default_tier, policy.max_concurrency)
+    if policy != update_scheduler.get_policy(bot_key):
+        set_bot_policy(bot_key, policy)
+
+class ResilientTelegramRequest(TracedTelegramRequest):
+    """Requisições à Bot API com breaker, bulkhead e timeout de leitura adaptativo"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dependency = dependency(
+            "telegram", max_concurrent=100,
+            timeout=AdaptiveTimeout(initial=5.0, minimum=2.0, maximum=20.0)
+        )
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs):
+        # Timeout pedido pelo chamador (ex.: envio de arquivos) é mantido; None é sem limite
+        requested = kwargs.get("read_timeout", BaseRequest.DEFAULT_NONE)
+        if requested is BaseRequest.DEFAULT_NONE:
+            timeout = None
+        else:
+            timeout = requested if requested is not None else self.dependency.timeout.maximum
+
+        async def send(adaptive: float):
+            if timeout is None:
+                kwargs["read_timeout"] = adaptive
+            return await super(ResilientTelegramRequest, self).do_request(url, method, request_data, **kwargs)
+
+        return await self.dependency.call(send, lambda result: http_failure(result[0]), timeout=timeout)
+
+class FairTelegramRequest(ResilientTelegramRequest):
+    """Envios à Bot API passando pelo send_scheduler (o bot é o ID no token da URL)"""
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs):
+        # URL: {base}/bot{id}:{segredo}/{método}
+        bot_key = url.rsplit("/", 2)[-2].split(":", 1)[0].removeprefix("bot")
+        send = super().do_request
+        return await send_scheduler.run(bot_key, lambda: send(url, method, request_data, **kwargs))
+
+# Instâncias globais
+update_scheduler = create_scheduler("updates", "SCHEDULER_UPDATE_CONCURRENCY", 32)
+send_scheduler = create_scheduler("sends", "SCHEDULER_SEND_CONCURRENCY", 64)
+
+def scheduler_stats() -> Dict[str, Any]:
+    return {"updates": update_scheduler.stats(), "sends": send_scheduler.stats()}
+
+def _queued_by_scheduler() -> Dict[str, int]:
+    return {"updates": update_scheduler.queued, "sends": send_scheduler.queued}
+
+def _running_by_scheduler() -> Dict[str, int]:
+    return {"updates": update_scheduler.running, "sends": send_scheduler.running}
+
+registry.callback(
+    "scheduler_queued", "Tarefas esperando vaga no escalonador", _queued_by_scheduler, labels=("scheduler",)
+)
+registry.callback(
+    "scheduler_running", "Tarefas em execução no escalonador", _running_by_scheduler, labels=("scheduler",)
+)
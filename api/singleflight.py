@@ -0,0 +1,131 @@
+"""
+Single-flight: chamadas simultâneas com a mesma chave compartilham uma execução
+
+Em rajadas (o gateway reenviando notificações do mesmo pagamento, centenas
+de /start no bot que viralizou), a primeira chamada de uma chave executa a
+função e as que chegam enquanto ela está em andamento aguardam o mesmo
+resultado (ou a mesma exceção), sem repetir a consulta.
+
+Nada fica em cache depois que a execução termina: a próxima chamada da
+chave executa de novo. A execução roda em uma task própria, então o
+cancelamento de quem a iniciou não cancela os demais que estão esperando.
+O resultado é o mesmo objeto para todos e não deve ser alterado.
+
+As métricas são agregadas por rótulo (label), não pela chave: a chave
+inclui os argumentos (token, bot_id) e o rótulo identifica a operação
+(o nome da consulta), o que mantém a cardinalidade limitada.
+
+Exemplo:
+    data = await status_flight.do(payment_id, lambda: fetch_status(payment_id))
+"""
+
+import asyncio
+import logging
+from typing import Dict, Any, Callable, Awaitable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Todas as instâncias, para as métricas e GET /stats/singleflight
+flights: Dict[str, "SingleFlight"] = {}
+
+class FlightStats:
+    """Contadores de um rótulo"""
+
+    __slots__ = ("calls", "executions", "shared", "max_shared")
+
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0
+        self.max_shared = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "shared": self.shared,
+            "max_shared": self.max_shared,
+            "coalesced_ratio": round(self.shared / self.calls, 4) if self.calls else 0.0
+        }
+
+class _Flight:
+    __slots__ = ("task", "stats", "waiters")
+
+    def __init__(self, task: asyncio.Task, stats: FlightStats):
+        self.task = task
+        self.stats = stats
+        self.waiters = 1
+
+class SingleFlight:
+    """Execuções em andamento por chave"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.in_flight: Dict[Hashable, _Flight] = {}
+        self.labels: Dict[str, FlightStats] = {}
+        flights[name] = self
+
+    def is_in_flight(self, key: Hashable) -> bool:
+        return key in self.in_flight
+
+    def _stats(self, label: str) -> FlightStats:
+        stats = self.labels.get(label)
+        if stats is None:
+            stats = self.labels[label] = FlightStats()
+        return stats
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]], label: Optional[str] = None) -> Any:
+        """
+        Executa func() ou aguarda a execução em andamento da mesma chave
+
+        Args:
+            key: Identifica chamadas equivalentes
+            func: Cria a corrotina executada
+            label: Operação nas métricas (padrão: o nome do SingleFlight)
+
+        Returns:
+            O resultado da execução (compartilhado entre todos que aguardaram)
+        """
+        flight = self.in_flight.get(key)
+        if flight is None:
+            stats = self._stats(label or self.name)
+            stats.calls += 1
+            stats.executions += 1
+            task = asyncio.get_running_loop().create_task(func())
+            flight = self.in_flight[key] = _Flight(task, stats)
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            # Contabilizado no rótulo de quem iniciou a execução
+            flight.stats.calls += 1
+            flight.stats.shared += 1
+            flight.waiters += 1
+            flight.stats.max_shared = max(flight.stats.max_shared, flight.waiters - 1)
+
+        return await asyncio.shield(flight.task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        flight = self.in_flight.get(key)
+        if flight is not None and flight.task is task:
+            del self.in_flight[key]
+        # Evita o aviso de exceção não recuperada quando todos os chamadores desistiram
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def executions(self) -> int:
+        return sum(stats.executions for stats in self.labels.values())
+
+    @property
+    def shared(self) -> int:
+        return sum(stats.shared for stats in self.labels.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self.in_flight),
+            "executions": self.executions,
+            "shared": self.shared,
+            "labels": {label: stats.to_dict() for label, stats in sorted(self.labels.items())}
+        }
+
+def singleflight_stats() -> Dict[str, Any]:
+    return {name: flight.stats() for name, flight in flights.items()}
@@ -0,0 +1,591 @@
+"""
+Rastreamento (tracing) leve das requisições
+
+Cada requisição HTTP vira um trace com spans filhos para as consultas ao
+banco (PostgREST), as chamadas aos gateways de pagamento e os envios ao
+Telegram. Os spans terminados ficam em um buffer circular em memória
+(GET /stats/traces) e podem ser exportados para um coletor OpenTelemetry
+local (OTLP/HTTP com JSON) ou para um arquivo JSON lines.
+
+O contexto do span atual é propagado com contextvars; o cabeçalho W3C
+traceparent é aceito na entrada (o bot envia o seu) e devolvido na resposta.
+O bot usa este mesmo módulo (via bot/shared.py), com o seu nome de serviço.
+
+Configuração (variáveis de ambiente):
+    TRACING_ENABLED        "false" desliga o rastreamento (padrão: ligado)
+    TRACING_SAMPLE_RATE    fração dos traces gravados (padrão: 1.0)
+    TRACING_BUFFER_SIZE    spans mantidos em memória (padrão: 4096)
+    TRACING_OTLP_ENDPOINT  ex.: http://localhost:4318/v1/traces
+    TRACING_JSON_FILE      arquivo JSON lines que recebe os spans exportados
+    TRACING_SERVICE_NAME   service.name enviado ao coletor (padrão: black-in-bot-api)
+
+Exemplo:
+    with tracer.span("reports.build", component="report", bot_id=bot_id):
+        ...
+
+    @traced("pushinpay.generate_pix_payment", component="gateway")
+    async def generate_pix_payment(...):
+        ...
+"""
+
+import os
+import json
+import time
+import random
+import inspect
+import logging
+import threading
+import functools
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from telegram.request import HTTPXRequest
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "black-in-bot-api")
+
+# Componentes usados no detalhamento do tempo de cada trace
+COMPONENT_DB = "db"
+COMPONENT_GATEWAY = "gateway"
+COMPONENT_TELEGRAM = "telegram"
+
+# Valores de kind do OTLP
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+class Span:
+    """Operação medida dentro de um trace"""
+
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind", "component",
+        "start_ns", "end_ns", "attributes", "error", "sampled", "_token"
+    )
+
+    def __init__(
+        self,
+        trace_id: str,
+        parent_id: Optional[str],
+        name: str,
+        kind: str,
+        component: Optional[str],
+        attributes: Dict[str, Any],
+        sampled: bool
+    ):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.component = component
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.sampled = sampled
+        self._token = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "component": self.component,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+class RemoteParent:
+    """Span de outro processo recebido pelo cabeçalho traceparent"""
+
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+def parse_traceparent(value: Optional[str]) -> Optional[RemoteParent]:
+    """Lê um cabeçalho W3C traceparent (00-<trace_id>-<span_id>-<flags>)"""
+    if not value:
+        return None
+
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        if int(parts[1], 16) == 0 or int(parts[2], 16) == 0:
+            return None
+    except ValueError:
+        return None
+
+    return RemoteParent(parts[1], parts[2], bool(flags & 1))
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+class Tracer:
+    """Cria spans, mantém os terminados em um buffer circular e entrega aos exportadores"""
+
+    def __init__(self, buffer_size: int = 4096, sample_rate: float = 1.0, enabled: bool = True):
+        """
+        Args:
+            buffer_size: Quantidade de spans terminados mantidos em memória
+            sample_rate: Fração dos traces gravados (decidida no span raiz)
+            enabled: Se False, span() e traced() não medem nada
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.finished: deque = deque(maxlen=buffer_size)
+        self.exporters: List[Any] = []
+        self.export_queue: deque = deque(maxlen=buffer_size * 4)
+        self.export_interval = 2.0
+        self.export_thread: Optional[threading.Thread] = None
+        self.stopping = threading.Event()
+        self.started = 0
+        self.dropped = 0
+
+    def start_span(
+        self,
+        name: str,
+        kind: str = "internal",
+        component: Optional[str] = None,
+        parent: Any = None,
+        **attributes: Any
+    ) -> Optional[Span]:
+        """
+        Inicia um span filho do span atual (ou de parent) e o torna o span atual
+
+        Returns:
+            O span, ou None se o rastreamento estiver desligado
+        """
+        if not self.enabled:
+            return None
+
+        parent = parent or _current_span.get()
+        if parent is None:
+            span = Span(
+                os.urandom(16).hex(), None, name, kind, component, attributes,
+                self.sample_rate >= 1.0 or random.random() < self.sample_rate
+            )
+        else:
+            span = Span(parent.trace_id, parent.span_id, name, kind, component, attributes, parent.sampled)
+
+        span._token = _current_span.set(span)
+        self.started += 1
+        return span
+
+    def end_span(self, span: Optional[Span]):
+        if span is None:
+            return
+
+        span.end_ns = time.time_ns()
+        try:
+            _current_span.reset(span._token)
+        except ValueError:
+            # Terminado em outro contexto (ex.: outra task); o span atual fica como está
+            pass
+
+        if span.sampled:
+            self.finished.append(span)
+            if self.exporters:
+                if len(self.export_queue) == self.export_queue.maxlen:
+                    self.dropped += 1
+                self.export_queue.append(span)
+
+    def span(self, name: str, kind: str = "internal", component: Optional[str] = None, **attributes: Any):
+        """Context manager que mede o bloco como um span (with tracer.span(...) as span)"""
+        return _SpanScope(self, name, kind, component, attributes)
+
+    def traced(self, name: Optional[str] = None, kind: str = "internal", component: Optional[str] = None):
+        """Decorador que mede cada chamada da função (síncrona ou async)"""
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__qualname__
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with _SpanScope(self, span_name, kind, component, {}):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with _SpanScope(self, span_name, kind, component, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+
+        return decorator
+
+    def inject(self, headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Cabeçalhos com o traceparent do span atual (para chamadas a outro serviço)"""
+        headers = dict(headers or {})
+        span = _current_span.get()
+        if span is not None:
+            headers["traceparent"] = span.traceparent()
+        return headers
+
+    # Exportação
+
+    def add_exporter(self, exporter):
+        """Registra um exportador (objeto com export(spans)) e inicia a thread de envio"""
+        self.exporters.append(exporter)
+        if self.export_thread is None:
+            self.export_thread = threading.Thread(target=self._export_loop, name="tracing-export", daemon=True)
+            self.export_thread.start()
+
+    def _export_loop(self):
+        while not self.stopping.wait(self.export_interval):
+            self.flush()
+
+    def flush(self):
+        """Entrega os spans pendentes a todos os exportadores"""
+        batch = []
+        while self.export_queue:
+            try:
+                batch.append(self.export_queue.popleft())
+            except IndexError:
+                break
+        if not batch:
+            return
+
+        for exporter in self.exporters:
+            try:
+                exporter.export(batch)
+            except Exception as e:
+                logger.error(f"Erro ao exportar {len(batch)} spans com {type(exporter).__name__}: {e}")
+
+    def shutdown(self):
+        self.stopping.set()
+        self.flush()
+
+    # Consultas sobre o buffer
+
+    def _grouped(self) -> Dict[str, List[Span]]:
+        grouped: Dict[str, List[Span]] = {}
+        for span in list(self.finished):
+            grouped.setdefault(span.trace_id, []).append(span)
+        return grouped
+
+    def traces(self, limit: int = 20, min_ms: float = 0.0, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Traces mais recentes do buffer, com os spans em ordem de início"""
+        result = []
+        for trace_id, spans in reversed(list(self._grouped().items())):
+            root = root_span(spans) or spans[-1]
+            if root.duration_ms < min_ms or (name and name not in root.name):
+                continue
+
+            spans.sort(key=lambda span: span.start_ns)
+            result.append({
+                "trace_id": trace_id,
+                "name": root.name,
+                "duration_ms": round(root.duration_ms, 3),
+                "breakdown_ms": {key: round(value, 3) for key, value in component_times(spans).items()},
+                "spans": [span.to_dict() for span in spans]
+            })
+            if len(result) >= limit:
+                break
+
+        return result
+
+    def breakdown(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Tempo médio por componente (db, gateway, telegram, ...) de cada
+        operação raiz, calculado sobre os traces completos do buffer
+        """
+        totals: Dict[str, Dict[str, Any]] = {}
+        for spans in self._grouped().values():
+            root = root_span(spans)
+            if root is None:
+                continue
+
+            entry = totals.setdefault(root.name, {"count": 0, "errors": 0, "total_ms": 0.0, "components": {}})
+            entry["count"] += 1
+            entry["errors"] += int(root.error is not None)
+            entry["total_ms"] += root.duration_ms
+            for component, milliseconds in component_times(spans).items():
+                entry["components"][component] = entry["components"].get(component, 0.0) + milliseconds
+
+        result = {}
+        for name, entry in sorted(totals.items(), key=lambda item: item[1]["total_ms"], reverse=True):
+            count = entry["count"]
+            components = {key: round(value / count, 3) for key, value in entry["components"].items()}
+            avg_ms = entry["total_ms"] / count
+            result[name] = {
+                "count": count,
+                "errors": entry["errors"],
+                "avg_ms": round(avg_ms, 3),
+                "components_avg_ms": components,
+                "other_avg_ms": round(max(0.0, avg_ms - sum(components.values())), 3)
+            }
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "started": self.started,
+            "buffered": len(self.finished),
+            "buffer_size": self.finished.maxlen,
+            "exporters": [type(exporter).__name__ for exporter in self.exporters],
+            "export_pending": len(self.export_queue),
+            "export_dropped": self.dropped
+        }
+
+    def reset(self):
+        self.finished.clear()
+
+class _SpanScope:
+    """Context manager de Tracer.span (classe simples, mais barata que @contextmanager)"""
+
+    __slots__ = ("tracer", "name", "kind", "component", "attributes", "span")
+
+    def __init__(self, tracer: Tracer, name: str, kind: str, component: Optional[str], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.component = component
+        self.attributes = attributes
+        self.span = None
+
+    def __enter__(self) -> Optional[Span]:
+        self.span = self.tracer.start_span(self.name, self.kind, self.component, **self.attributes)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is not None and exc is not None:
+            self.span.record_error(exc)
+        self.tracer.end_span(self.span)
+        return False
+
+def root_span(spans: List[Span]) -> Optional[Span]:
+    """Span cujo pai não está no trace (raiz local, mesmo com pai em outro processo)"""
+    ids = {span.span_id for span in spans}
+    return next((span for span in spans if span.parent_id not in ids), None)
+
+def component_times(spans: List[Span]) -> Dict[str, float]:
+    """
+    Soma a duração dos spans de cada componente em um trace, contando só o
+    span mais externo quando spans do mesmo componente estão aninhados
+    (ex.: a consulta nomeada e a requisição HTTP ao PostgREST dentro dela)
+    """
+    components = {span.span_id: span.component for span in spans}
+    times: Dict[str, float] = {}
+    for span in spans:
+        if span.component and components.get(span.parent_id) != span.component:
+            times[span.component] = times.get(span.component, 0.0) + span.duration_ms
+    return times
+
+# Exportadores
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def to_otlp(spans: List[Span], service_name: str = SERVICE_NAME) -> Dict[str, Any]:
+    """Converte spans para o corpo JSON de POST /v1/traces (OTLP/HTTP)"""
+    otlp_spans = []
+    for span in spans:
+        attributes = dict(span.attributes)
+        if span.component:
+            attributes["component"] = span.component
+
+        item = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": SPAN_KINDS.get(span.kind, 1),
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+        }
+        if span.parent_id:
+            item["parentSpanId"] = span.parent_id
+        otlp_spans.append(item)
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}]
+        }]
+    }
+
+class OtlpHttpExporter:
+    """Envia spans a um coletor OpenTelemetry (OTLP/HTTP com JSON, porta 4318)"""
+
+    def __init__(self, endpoint: str, service_name: str = SERVICE_NAME, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.client = httpx.Client(timeout=timeout)
+
+    def export(self, spans: List[Span]):
+        response = self.client.post(self.endpoint, json=to_otlp(spans, self.service_name))
+        if response.status_code >= 400:
+            raise RuntimeError(f"coletor respondeu {response.status_code}: {response.text[:200]}")
+
+class JsonFileExporter:
+    """Acrescenta os spans a um arquivo JSON lines (um span por linha)"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]):
+        with open(self.path, "a", encoding="utf-8") as file:
+            for span in spans:
+                file.write(json.dumps(span.to_dict(), default=str, ensure_ascii=False))
+                file.write("\n")
+
+# Instrumentação
+
+class TracingMiddleware:
+    """
+    Middleware ASGI que abre o span raiz de cada requisição HTTP
+
+    O nome do span usa o template da rota (ex.: POST /telegram/webhook/{bot_token}),
+    nunca o caminho real, que pode conter tokens.
+    """
+
+    def __init__(self, app, tracer: Optional[Tracer] = None):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        active = self.tracer or tracer
+        if scope["type"] != "http" or not active.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for key, value in scope.get("headers") or ():
+            if key == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+
+        method = scope["method"]
+        span = active.start_span(method, kind="server", parent=parent, **{"http.method": method})
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                span.set("http.status_code", message["status"])
+                headers = list(message.get("headers") or ())
+                headers.append((b"traceparent", span.traceparent().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except Exception as e:
+            span.record_error(e)
+            span.set("http.status_code", 500)
+            raise
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None)
+            span.name = f"{method} {path}" if path else f"{method} (sem rota)"
+            if path:
+                span.set("http.route", path)
+            if span.attributes.get("http.status_code", 200) >= 500 and span.error is None:
+                span.error = f"HTTP {span.attributes['http.status_code']}"
+            active.end_span(span)
+
+class TracedTransport(httpx.BaseTransport):
+    """Transporte httpx (síncrono) que mede cada requisição como um span cliente"""
+
+    def __init__(self, transport: httpx.BaseTransport, component: str, prefix: str = ""):
+        self.transport = transport
+        self.component = component
+        self.prefix = prefix
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if self.prefix and path.startswith(self.prefix):
+            path = path[len(self.prefix):]
+
+        with tracer.span(
+            f"{self.component} {request.method} {path}", kind="client", component=self.component,
+            **{"http.method": request.method, "http.target": path}
+        ) as span:
+            response = self.transport.handle_request(request)
+            if span is not None:
+                span.set("http.status_code", response.status_code)
+            return response
+
+    def close(self):
+        self.transport.close()
+
+def instrument_supabase(client) -> None:
+    """Mede as requisições do cliente Supabase ao PostgREST (todas as consultas de get_db())"""
+    session = client.postgrest.session
+    if not isinstance(session._transport, TracedTransport):
+        session._transport = TracedTransport(session._transport, COMPONENT_DB, prefix="/rest/v1")
+
+class TracedTelegramRequest(HTTPXRequest):
+    """Requisições à Bot API medidas como spans (sendMessage, answerCallbackQuery, ...)"""
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs) -> Tuple[int, bytes]:
+        # A URL contém o token do bot; o span guarda apenas o método da Bot API
+        endpoint = url.rsplit("/", 1)[-1]
+        with tracer.span(
+            f"telegram {endpoint}", kind="client", component=COMPONENT_TELEGRAM, **{"telegram.method": endpoint}
+        ) as span:
+            status_code, payload = await super().do_request(url, method, request_data, **kwargs)
+            if span is not None:
+                span.set("http.status_code", status_code)
+            return status_code, payload
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+def create_tracer() -> Tracer:
+    """Tracer configurado pelas variáveis de ambiente TRACING_*"""
+    instance = Tracer(
+        buffer_size=int(_env_float("TRACING_BUFFER_SIZE", 4096)),
+        sample_rate=min(1.0, max(0.0, _env_float("TRACING_SAMPLE_RATE", 1.0))),
+        enabled=os.getenv("TRACING_ENABLED", "true").lower() != "false"
+    )
+
+    if os.getenv("TRACING_OTLP_ENDPOINT"):
+        instance.add_exporter(OtlpHttpExporter(os.environ["TRACING_OTLP_ENDPOINT"]))
+    if os.getenv("TRACING_JSON_FILE"):
+        instance.add_exporter(JsonFileExporter(os.environ["TRACING_JSON_FILE"]))
+
+    return instance
+
+# Instância global
+tracer = create_tracer()
+traced = tracer.traced
@@ -0,0 +1,240 @@
+"""
+Pré-filtro de updates do Telegram
+
+Classifica o JSON bruto recebido no webhook e descarta updates irrelevantes
+antes de construir o objeto Update e percorrer os handlers do dispatcher.
+"""
+
+import re
+import logging
+from collections import Counter
+from typing import Dict, Any, Optional, Tuple, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Formato dos códigos de ativação enviados nos grupos (XXXX-XXXX)
+ACTIVATION_CODE_PATTERN = re.compile(r'^[A-Z0-9]{4}-[A-Z0-9]{4}$')
+
+GROUP_CHAT_TYPES = ("group", "supergroup")
+
+# Limites da regex de texto de grupo enviada pelo dono do bot (roda em toda
+# mensagem de grupo): sem grupos, alternação ou repetição ilimitada, e com
+# poucas repetições de tamanho variável, o backtracking fica limitado
+MAX_PATTERN_LENGTH = 64
+MAX_PATTERN_REPEAT = 32
+MAX_PATTERN_VARIABLE_REPEATS = 2
+FORBIDDEN_PATTERN_CHARS = frozenset("()|*+\\")
+REPEAT_PATTERN = re.compile(r'\{(\d*)(,?)(\d*)\}')
+
+# Motivos de descarte usados nos contadores
+DROP_UPDATE_TYPE = "tipo_update"
+DROP_NO_TEXT = "sem_texto"
+DROP_COMMAND = "comando"
+DROP_PRIVATE_TEXT = "texto_privado"
+DROP_GROUP_TEXT = "texto_grupo"
+DROP_CALLBACK = "callback"
+DROP_INVALID = "invalido"
+
+def compile_group_text_pattern(pattern: str) -> re.Pattern:
+    """
+    Compila a regex de texto de grupo recebida na API
+
+    Aceita literais, classes ([A-Z0-9]), âncoras, "." e repetições limitadas
+    ({n}, ou {n,m} com m <= MAX_PATTERN_REPEAT); no máximo
+    MAX_PATTERN_VARIABLE_REPEATS repetições de tamanho variável ("?" e {n,m}).
+
+    Raises:
+        ValueError: Se a regex for longa demais ou usar construções não aceitas
+    """
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        raise ValueError(f"group_text_pattern maior que {MAX_PATTERN_LENGTH} caracteres")
+
+    forbidden = FORBIDDEN_PATTERN_CHARS.intersection(pattern)
+    if forbidden:
+        raise ValueError(f"group_text_pattern não aceita {''.join(sorted(forbidden))}")
+
+    variable = pattern.count("?")
+    for low, comma, high in REPEAT_PATTERN.findall(pattern):
+        limit = high if comma else low
+        if not limit or int(limit) > MAX_PATTERN_REPEAT:
+            raise ValueError(f"group_text_pattern aceita repetições de até {MAX_PATTERN_REPEAT}")
+        if comma and low != high:
+            variable += 1
+    if variable > MAX_PATTERN_VARIABLE_REPEATS:
+        raise ValueError(
+            f"group_text_pattern aceita até {MAX_PATTERN_VARIABLE_REPEATS} repetições de tamanho variável"
+        )
+
+    return re.compile(pattern)
+
+class UpdateFilterRules:
+    """Regras de filtragem de um bot"""
+
+    def __init__(
+        self,
+        update_types: Iterable[str] = ("message", "callback_query"),
+        commands: Iterable[str] = ("start",),
+        callback_prefixes: Iterable[str] = ("plan_",),
+        group_text_pattern: Optional[re.Pattern] = ACTIVATION_CODE_PATTERN,
+        private_text: bool = False
+    ):
+        """
+        Args:
+            update_types: Tipos de update aceitos (message, callback_query, ...)
+            commands: Comandos aceitos, sem a barra
+            callback_prefixes: Prefixos aceitos no callback_data
+            group_text_pattern: Regex aplicada ao texto (em maiúsculas) das mensagens de grupo.
+                None descarta todo texto de grupo que não seja comando
+            private_text: Se True, aceita texto livre em conversas privadas
+        """
+        self.update_types = frozenset(update_types)
+        self.commands = frozenset(command.lower() for command in commands)
+        self.callback_prefixes = tuple(callback_prefixes)
+        self.group_text_pattern = group_text_pattern
+        self.private_text = private_text
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UpdateFilterRules":
+        """Cria regras a partir de um dicionário (ex: corpo de requisição)"""
+        pattern = data.get("group_text_pattern", ACTIVATION_CODE_PATTERN.pattern)
+
+        return cls(
+            update_types=data.get("update_types", ("message", "callback_query")),
+            commands=data.get("commands", ("start",)),
+            callback_prefixes=data.get("callback_prefixes", ("plan_",)),
+            group_text_pattern=compile_group_text_pattern(pattern) if pattern else None,
+            private_text=data.get("private_text", False)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "update_types": sorted(self.update_types),
+            "commands": sorted(self.commands),
+            "callback_prefixes": list(self.callback_prefixes),
+            "group_text_pattern": self.group_text_pattern.pattern if self.group_text_pattern else None,
+            "private_text": self.private_text
+        }
+
+class UpdateFilter:
+    """Classificador de updates com regras e contadores por bot"""
+
+    def __init__(self, default_rules: Optional[UpdateFilterRules] = None):
+        self.default_rules = default_rules or UpdateFilterRules()
+        self.rules: Dict[str, UpdateFilterRules] = {}
+        self.dispatched: Counter = Counter()
+        self.dropped: Dict[str, Counter] = {}
+
+    def set_rules(self, bot_key: str, rules: UpdateFilterRules):
+        """Define regras específicas para um bot"""
+        self.rules[bot_key] = rules
+
+    def get_rules(self, bot_key: str) -> UpdateFilterRules:
+        return self.rules.get(bot_key, self.default_rules)
+
+    def classify(self, rules: UpdateFilterRules, update_data: Dict[str, Any]) -> Optional[str]:
+        """
+        Classifica um update bruto
+
+        Returns:
+            None se o update deve ser despachado, ou o motivo do descarte
+        """
+        if not isinstance(update_data, dict):
+            return DROP_INVALID
+
+        update_type = None
+        for key in update_data:
+            if key != "update_id":
+                update_type = key
+                break
+
+        if update_type not in rules.update_types:
+            return DROP_UPDATE_TYPE
+
+        payload = update_data[update_type]
+        if not isinstance(payload, dict):
+            return DROP_INVALID
+
+        if update_type == "callback_query":
+            data = payload.get("data") or ""
+            if data.startswith(rules.callback_prefixes):
+                return None
+            return DROP_CALLBACK
+
+        if update_type not in ("message", "edited_message", "channel_post", "edited_channel_post"):
+            return None
+
+        text = payload.get("text")
+        if not text:
+            return DROP_NO_TEXT
+
+        if text[0] == "/":
+            command = text[1:].split(maxsplit=1)[0].split("@", 1)[0].lower() if len(text) > 1 else ""
+            if command in rules.commands:
+                return None
+            return DROP_COMMAND
+
+        chat_type = (payload.get("chat") or {}).get("type")
+
+        if chat_type in GROUP_CHAT_TYPES:
+            pattern = rules.group_text_pattern
+            if pattern is not None and pattern.match(text.strip().upper()):
+                return None
+            return DROP_GROUP_TEXT
+
+        if rules.private_text:
+            return None
+
+        return DROP_PRIVATE_TEXT
+
+    def check(
+        self,
+        bot_key: str,
+        update_data: Dict[str, Any],
+        counter_key: Optional[str] = None
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Classifica um update e atualiza os contadores do bot
+
+        counter_key substitui bot_key nos contadores (ex.: um único label para
+        bots que não existem, sem um contador por token inventado).
+
+        Returns:
+            Tupla com (dispatch, reason)
+            dispatch: True se o update deve seguir para o dispatcher
+            reason: Motivo do descarte quando dispatch é False
+        """
+        reason = self.classify(self.get_rules(bot_key), update_data)
+        counter_key = counter_key or bot_key
+
+        if reason is None:
+            self.dispatched[counter_key] += 1
+            return True, None
+
+        dropped = self.dropped.get(counter_key)
+        if dropped is None:
+            dropped = self.dropped[counter_key] = Counter()
+        dropped[reason] += 1
+
+        return False, reason
+
+    def stats(self, bot_key: Optional[str] = None) -> Dict[str, Any]:
+        """Retorna os contadores de updates despachados e descartados"""
+        bot_keys = [bot_key] if bot_key else sorted(set(self.dispatched) | set(self.dropped))
+
+        bots = {}
+        for key in bot_keys:
+            dropped = self.dropped.get(key, Counter())
+            bots[key] = {
+                "dispatched": self.dispatched.get(key, 0),
+                "dropped": sum(dropped.values()),
+                "dropped_by_reason": dict(dropped)
+            }
+
+        return {
+            "dispatched": sum(bot["dispatched"] for bot in bots.values()),
+            "dropped": sum(bot["dropped"] for bot in bots.values()),
+            "bots": bots
+        }
+
+# Instância global usada pelo webhook do Telegram
+update_filter = UpdateFilter()
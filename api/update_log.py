@@ -0,0 +1,528 @@
+"""
+Log local de updates do webhook (write-ahead log)
+
+Com UPDATE_LOG_DIR definido, o webhook do Telegram grava o corpo bruto do
+update neste log (chave: ID público do bot; dados: token do bot e corpo,
+então o diretório deve ter as mesmas permissões restritas do .env), espera
+o fsync e só então responde 200; o processamento
+acontece depois, fora da requisição, e termina com um ack no log. Se o
+worker morrer no meio, os updates sem ack são reprocessados na próxima
+inicialização (open() os devolve em ordem de offset).
+
+Formato: segmentos append-only ({offset base}.log) com registros
+
+    cabeçalho (tipo, tamanho, crc32, offset, tamanho da chave) | chave | dados
+
+Registros UPDATE recebem offsets crescentes; registros ACK repetem o offset
+do update concluído. O crc cobre tipo, offset, chave e dados: um registro
+cortado por queda de energia no fim do último segmento é descartado (e o
+arquivo truncado) na recuperação.
+
+Escrita em grupo: append() só escreve no buffer do arquivo (alguns µs, sem
+syscall na maioria das chamadas); uma thread faz flush + fsync a cada
+fsync_interval e libera de uma vez todos os wait_durable() cobertos. Um
+fsync por lote, não por update.
+
+Compactação: segmentos antigos cujos updates já tiveram ack são apagados,
+sempre a partir do mais antigo (um ACK nunca fica em um segmento anterior
+ao do seu update, então apagar um prefixo não ressuscita updates).
+
+Os offsets confirmados de cada bot (watermarks: todos os updates do bot
+até o offset tiveram ack) ficam em offsets.json a cada compactação.
+
+Updates repetidos: o Telegram reenvia um update que não recebeu 200 a
+tempo, e a cópia entraria no log com outro offset. Cada bot tem o
+conjunto dos últimos update_id aceitos (claim antes do append); o ACK
+grava o update_id, então na recuperação o conjunto é refeito a partir dos
+ACKs e de offsets.json (que o guarda junto com as watermarks), e a cópia
+de um update já processado é descartada em vez de reprocessada.
+
+Com vários workers, cada um reserva um subdiretório (w0, w1, ...) com
+flock; após um reinício, os workers reassumem os diretórios e recuperam
+o que ficou pendente.
+
+Variáveis de ambiente:
+    UPDATE_LOG_DIR            diretório do log (vazio: desligado, processamento síncrono)
+    UPDATE_LOG_FSYNC_MS       intervalo do fsync em lote (padrão: 5)
+    UPDATE_LOG_SEGMENT_MB     tamanho de cada segmento (padrão: 64)
+"""
+
+import os
+import json
+import zlib
+import struct
+import asyncio
+import bisect
+import logging
+import threading
+from collections import deque, OrderedDict
+from typing import Dict, Any, Optional, List, Iterator, Tuple, Deque
+
+try:
+    import fcntl
+except ImportError:  # Windows (desenvolvimento): um único worker
+    fcntl = None
+
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# tipo, tamanho dos dados, crc32, offset, tamanho da chave
+HEADER = struct.Struct("<BIIQH")
+
+TYPE_UPDATE = 1
+TYPE_ACK = 2
+
+SEGMENT_SUFFIX = ".log"
+OFFSETS_FILE = "offsets.json"
+
+class LogRecord:
+    """Update lido do log"""
+
+    __slots__ = ("offset", "key", "data")
+
+    def __init__(self, offset: int, key: str, data: bytes):
+        self.offset = offset
+        self.key = key
+        self.data = data
+
+class Segment:
+    """Arquivo do log e a contagem de updates ainda sem ack"""
+
+    __slots__ = ("base", "path", "live")
+
+    def __init__(self, base: int, path: str):
+        self.base = base
+        self.path = path
+        self.live = 0
+
+def _checksum(record_type: int, offset: int, key: bytes, data: bytes) -> int:
+    return zlib.crc32(data, zlib.crc32(key, zlib.crc32(struct.pack("<BQ", record_type, offset))))
+
+def scan_segment(path: str) -> Iterator[Tuple[int, int, str, bytes, int]]:
+    """
+    Lê os registros de um segmento
+
+    Yields:
+        (tipo, offset, chave, dados, posição do fim do registro); para no
+        primeiro registro incompleto ou com crc inválido
+    """
+    with open(path, "rb") as file:
+        content = file.read()
+
+    position = 0
+    size = len(content)
+    while position + HEADER.size <= size:
+        record_type, length, crc, offset, key_length = HEADER.unpack_from(content, position)
+        start = position + HEADER.size
+        end = start + key_length + length
+        if end > size:
+            return
+        key = content[start:start + key_length]
+        data = content[start + key_length:end]
+        if record_type not in (TYPE_UPDATE, TYPE_ACK) or _checksum(record_type, offset, key, data) != crc:
+            return
+        yield record_type, offset, key.decode("utf-8"), data, end
+        position = end
+
+class UpdateLog:
+    """Log segmentado com fsync em lote, acks por update e watermarks por bot"""
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        fsync_interval: float = 0.005,
+        seen_per_key: int = 1000
+    ):
+        self.directory = directory
+        self.seen_per_key = seen_per_key
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        # Serializa as chamadas de sync (thread de fsync e close)
+        self.sync_lock = threading.Lock()
+        self.segments: List[Segment] = []
+        self.bases: List[int] = []
+        self.file = None
+        self.file_size = 0
+        self.next_offset = 0
+        self.written_offset = -1
+        self.durable_offset = -1
+        self.dirty = False
+        # offset -> chave dos updates sem ack; por bot, os offsets na ordem de chegada
+        self.pending: Dict[int, str] = {}
+        self.pending_by_key: Dict[str, Deque[int]] = {}
+        self.watermarks: Dict[str, int] = {}
+        # Por bot, os últimos update_id aceitos (em ordem de chegada)
+        self.seen: Dict[str, OrderedDict] = {}
+        self.duplicates = 0
+        self.waiters: List[Tuple[int, asyncio.Future]] = []
+        self.appended = 0
+        self.acked = 0
+        self.syncs = 0
+        self.compacted = 0
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    # Recuperação
+
+    def open(self) -> List[LogRecord]:
+        """
+        Lê os segmentos existentes, abre um segmento novo e inicia a thread de fsync
+
+        Returns:
+            Updates sem ack, em ordem de offset (para reprocessar)
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_offsets()
+
+        records: Dict[int, LogRecord] = {}
+        last_offset = -1
+        paths = sorted(
+            (int(name[:-len(SEGMENT_SUFFIX)]), os.path.join(self.directory, name))
+            for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX)
+        )
+
+        for base, path in paths:
+            end = 0
+            for record_type, offset, key, data, end in scan_segment(path):
+                if record_type == TYPE_UPDATE:
+                    records[offset] = LogRecord(offset, key, data)
+                    last_offset = max(last_offset, offset)
+                else:
+                    records.pop(offset, None)
+                    self.watermarks[key] = max(self.watermarks.get(key, -1), offset)
+                    if data:
+                        self._remember(key, int(data))
+
+            if end < os.path.getsize(path):
+                # Registro incompleto no fim (queda durante a escrita): descarta
+                logger.warning(
+                    "Segmento %s truncado em %s bytes", path, end,
+                    extra={"event": "update_log.truncated", "segment": path}
+                )
+                with open(path, "r+b") as file:
+                    file.truncate(end)
+
+            self._add_segment(base, path)
+            last_offset = max(last_offset, base - 1)
+
+        pending = [records[offset] for offset in sorted(records)]
+        for record in pending:
+            self._track(record.offset, record.key)
+        for key, offsets in self.pending_by_key.items():
+            self.watermarks[key] = offsets[0] - 1
+
+        self.next_offset = last_offset + 1
+        self.written_offset = self.durable_offset = last_offset
+        self._rotate()
+        self.compact()
+
+        self.thread = threading.Thread(target=self._run, name="update-log-fsync", daemon=True)
+        self.thread.start()
+
+        if pending:
+            logger.warning(
+                "%s updates sem ack recuperados do log", len(pending),
+                extra={"event": "update_log.recovered", "count": len(pending)}
+            )
+        return pending
+
+    def _load_offsets(self):
+        path = os.path.join(self.directory, OFFSETS_FILE)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                offsets = json.load(file)
+            self.watermarks = {key: int(value) for key, value in offsets["watermarks"].items()}
+            for key, update_ids in offsets["seen"].items():
+                for update_id in update_ids:
+                    self._remember(key, update_id)
+
+    def _add_segment(self, base: int, path: str):
+        self.segments.append(Segment(base, path))
+        self.bases.append(base)
+
+    def _remember(self, key: str, update_id: int) -> bool:
+        seen = self.seen.get(key)
+        if seen is None:
+            seen = self.seen[key] = OrderedDict()
+        elif update_id in seen:
+            return False
+        seen[update_id] = None
+        if len(seen) > self.seen_per_key:
+            seen.popitem(last=False)
+        return True
+
+    def claim(self, key: str, update_id: Optional[int]) -> bool:
+        """
+        Reserva o update_id do bot antes do append (ou do reprocessamento)
+
+        Returns:
+            False se o update já foi aceito (cópia reenviada pelo Telegram)
+        """
+        if update_id is None:
+            return True
+        with self.lock:
+            if self._remember(key, update_id):
+                return True
+            self.duplicates += 1
+            return False
+
+    def _track(self, offset: int, key: str):
+        self.pending[offset] = key
+        self.pending_by_key.setdefault(key, deque()).append(offset)
+        self.segments[bisect.bisect_right(self.bases, offset) - 1].live += 1
+
+    # Escrita
+
+    def _rotate(self):
+        """Fecha o segmento atual (com fsync) e abre um novo a partir de next_offset"""
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.durable_offset = self.written_offset
+        path = os.path.join(self.directory, f"{self.next_offset:020d}{SEGMENT_SUFFIX}")
+        self.file = open(path, "ab", buffering=1024 * 1024)
+        self.file_size = 0
+        if not self.bases or self.bases[-1] != self.next_offset:
+            self._add_segment(self.next_offset, path)
+
+    def _write(self, record_type: int, offset: int, key: bytes, data: bytes):
+        self.file.write(HEADER.pack(record_type, len(data), _checksum(record_type, offset, key, data), offset, len(key)))
+        self.file.write(key)
+        self.file.write(data)
+        self.file_size += HEADER.size + len(key) + len(data)
+        self.dirty = True
+
+    def append(self, key: str, data: bytes) -> int:
+        """Grava um update no buffer do log e retorna o offset (durável após wait_durable)"""
+        encoded = key.encode("utf-8")
+        with self.lock:
+            if self.file_size >= self.segment_bytes:
+                self._rotate()
+            offset = self.next_offset
+            self.next_offset += 1
+            self._write(TYPE_UPDATE, offset, encoded, data)
+            self.written_offset = offset
+            self._track(offset, key)
+            self.appended += 1
+        return offset
+
+    def ack(self, offset: int, update_id: Optional[int] = None):
+        """Marca o update como processado e avança a watermark do bot (o ACK grava o update_id)"""
+        with self.lock:
+            key = self.pending.pop(offset, None)
+            if key is None:
+                return
+            data = str(update_id).encode("ascii") if update_id is not None else b""
+            self._write(TYPE_ACK, offset, key.encode("utf-8"), data)
+            self.acked += 1
+            self.segments[bisect.bisect_right(self.bases, offset) - 1].live -= 1
+
+            offsets = self.pending_by_key[key]
+            while offsets and offsets[0] not in self.pending:
+                offsets.popleft()
+            if offsets:
+                self.watermarks[key] = offsets[0] - 1
+            else:
+                self.watermarks[key] = max(self.watermarks.get(key, -1), offset)
+                del self.pending_by_key[key]
+
+    async def wait_durable(self, offset: int):
+        """Espera o fsync que cobre o offset"""
+        future = asyncio.get_running_loop().create_future()
+        with self.lock:
+            if offset <= self.durable_offset:
+                return
+            self.waiters.append((offset, future))
+        await future
+
+    # Thread de fsync
+
+    def _run(self):
+        while not self.stopping.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Erro no fsync do log de updates: {e}")
+
+    def sync(self):
+        """flush + fsync do segmento atual e libera os wait_durable cobertos"""
+        with self.sync_lock:
+            fd = None
+            with self.lock:
+                if self.dirty:
+                    self.file.flush()
+                    self.dirty = False
+                    target = self.written_offset
+                    # Cópia do descritor: o segmento pode ser trocado durante o fsync
+                    fd = os.dup(self.file.fileno())
+            if fd is not None:
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                self.syncs += 1
+
+            with self.lock:
+                if fd is not None:
+                    self.durable_offset = max(self.durable_offset, target)
+                ready = [future for offset, future in self.waiters if offset <= self.durable_offset]
+                self.waiters = [(offset, future) for offset, future in self.waiters if offset > self.durable_offset]
+
+        by_loop: Dict[Any, List[asyncio.Future]] = {}
+        for future in ready:
+            by_loop.setdefault(future.get_loop(), []).append(future)
+        for loop, futures in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_resolve, futures)
+            except RuntimeError:
+                # Loop já encerrado
+                pass
+
+        if len(self.segments) > 1 and self.segments[0].live == 0:
+            self.compact()
+
+    # Leitura e compactação
+
+    def read(self, from_offset: int = 0, key: Optional[str] = None) -> Iterator[LogRecord]:
+        """Updates a partir de um offset (opcionalmente de um bot), inclusive os que já tiveram ack"""
+        with self.lock:
+            self.file.flush()
+            segments = list(self.segments)
+
+        start = max(0, bisect.bisect_right([segment.base for segment in segments], from_offset) - 1)
+        for segment in segments[start:]:
+            if not os.path.exists(segment.path):
+                continue
+            for record_type, offset, record_key, data, _ in scan_segment(segment.path):
+                if record_type == TYPE_UPDATE and offset >= from_offset and (key is None or record_key == key):
+                    yield LogRecord(offset, record_key, data)
+
+    def compact(self) -> int:
+        """Apaga os segmentos mais antigos sem updates pendentes (nunca o segmento atual)"""
+        removed = []
+        with self.lock:
+            while len(self.segments) > 1 and self.segments[0].live == 0:
+                removed.append(self.segments.pop(0))
+                self.bases.pop(0)
+            offsets = {
+                "watermarks": dict(self.watermarks),
+                "seen": {key: list(seen) for key, seen in self.seen.items()}
+            }
+
+        if not removed:
+            return 0
+
+        # Watermarks e update_id gravados antes de apagar os segmentos (e os ACKs) que os comprovam
+        path = os.path.join(self.directory, OFFSETS_FILE)
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(offsets, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+
+        for segment in removed:
+            try:
+                os.remove(segment.path)
+            except FileNotFoundError:
+                pass
+        self.compacted += len(removed)
+        return len(removed)
+
+    def close(self):
+        """Para a thread, faz o último fsync e fecha o segmento"""
+        self.stopping.set()
+        if self.thread is not None and self.thread.is_alive():
+            self.thread.join()
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "segments": len(self.segments),
+            "next_offset": self.next_offset,
+            "durable_offset": self.durable_offset,
+            "pending": len(self.pending),
+            "appended": self.appended,
+            "acked": self.acked,
+            "fsyncs": self.syncs,
+            "compacted_segments": self.compacted,
+            "duplicates": self.duplicates,
+            "watermarks": dict(self.watermarks)
+        }
+
+def _resolve(futures: List[asyncio.Future]):
+    for future in futures:
+        if not future.done():
+            future.set_result(None)
+
+def claim_directory(root: str, attempts: int = 64) -> Tuple[str, Any]:
+    """
+    Reserva um subdiretório w0, w1, ... para este worker (flock exclusivo)
+
+    Returns:
+        (diretório, arquivo de lock, que deve ficar aberto enquanto o worker vive)
+    """
+    os.makedirs(root, exist_ok=True)
+    if fcntl is None:
+        return os.path.join(root, "w0"), None
+
+    for index in range(attempts):
+        directory = os.path.join(root, f"w{index}")
+        os.makedirs(directory, exist_ok=True)
+        lock_file = open(os.path.join(directory, "lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        return directory, lock_file
+
+    raise RuntimeError(f"Nenhum diretório livre em {root} (mais de {attempts} workers?)")
+
+class WorkerUpdateLog:
+    """UpdateLog do worker atual, aberto na inicialização da API"""
+
+    def __init__(self, root: Optional[str]):
+        self.root = root
+        self.log: Optional[UpdateLog] = None
+        self.lock_file = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def open(self) -> List[LogRecord]:
+        directory, self.lock_file = claim_directory(self.root)
+        self.log = UpdateLog(
+            directory,
+            segment_bytes=int(float(os.getenv("UPDATE_LOG_SEGMENT_MB", "64")) * 1024 * 1024),
+            fsync_interval=float(os.getenv("UPDATE_LOG_FSYNC_MS", "5")) / 1000
+        )
+        return self.log.open()
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def stats(self) -> Dict[str, Any]:
+        if self.log is None:
+            return {"enabled": self.enabled}
+        return {"enabled": True, **self.log.stats()}
+
+# Instância global (desligada sem UPDATE_LOG_DIR)
+update_log = WorkerUpdateLog(os.getenv("UPDATE_LOG_DIR") or None)
@@ -0,0 +1,419 @@
+"""
+Buffer de notificações dos gateways de pagamento com gravação em lote
+
+Cada notificação do PushinPay e do Mercado Pago custava, no próprio
+handler, uma consulta do pagamento, um UPDATE, a consulta do plano e o
+INSERT da venda. Na liquidação de PIX em massa os gateways entregam
+centenas de notificações por segundo, e cada uma esperava as suas idas ao
+banco.
+
+Os webhooks agora validam a notificação e a entregam ao WebhookBuffer. Um
+flusher junta as notificações por external_id (várias entregas do mesmo
+pagamento viram uma escrita) e a cada flush_interval, ou quando o lote
+chega a max_batch pagamentos, aplica o lote inteiro com poucas consultas:
+
+    SELECT payments WHERE external_id IN (...)
+    UPDATE payments SET status = s WHERE id IN (...) AND status <> s RETURNING id   (um por status)
+    SELECT plans WHERE id IN (...)
+    INSERT INTO sales VALUES (...), ... ON CONFLICT (payment_id) DO NOTHING
+
+O webhook só responde depois que o lote foi gravado: a resposta 200 ao
+gateway significa que a mudança de status está no banco. Se a gravação
+falhar, todas as notificações do lote recebem o erro e o gateway reenvia.
+
+As escritas são idempotentes. O UPDATE condicional só devolve os
+pagamentos que ele mesmo mudou, então entre dois workers gravando o mesmo
+external_id apenas um cria a venda. A venda tem chave única em payment_id
+(migrations/005_sales_payment_id_unique.sql): a reentrega de um pagamento
+já completed tenta inserir a venda de novo, o que recupera uma venda
+perdida quando o INSERT falhou depois do UPDATE e não duplica nada quando
+ela já existe.
+
+Variáveis de ambiente:
+    WEBHOOK_BUFFER_FLUSH_MS      espera máxima antes de gravar um lote (padrão: 5)
+    WEBHOOK_BUFFER_MAX_BATCH     pagamentos por lote (padrão: 100)
+    WEBHOOK_BUFFER_MAX_PENDING   notificações aguardando gravação antes de recusar (padrão: 10000)
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+
+from dotenv import load_dotenv
+
+from .database import get_db
+from .models import PaymentStatus
+from .queries import select, update_many_returning, insert_many_if_absent
+from .metrics import registry
+from .payment_events import payment_events
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Campos do pagamento usados para aplicar a notificação e registrar a venda
+BATCH_PAYMENT_COLUMNS = ("id", "external_id", "status", "bot_id", "plan_id", "user_telegram_id", "amount")
+
+# Status que uma notificação atrasada de pending não pode desfazer
+FINAL_PAYMENT_STATUSES = frozenset({
+    PaymentStatus.COMPLETED.value, PaymentStatus.FAILED.value, PaymentStatus.REFUNDED.value
+})
+
+webhook_flush_seconds = registry.histogram(
+    "webhook_buffer_flush_seconds", "Duração da gravação de um lote de notificações"
+)
+webhook_wait_seconds = registry.histogram(
+    "webhook_buffer_wait_seconds", "Tempo entre a chegada da notificação e a gravação do lote", ("gateway",)
+)
+
+class WebhookBufferFull(Exception):
+    """Notificações demais aguardando gravação; a notificação foi recusada"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Buffer de webhooks cheio ({limit} notificações)")
+        self.limit = limit
+
+class PaymentNotification:
+    """Mudança de status informada por um gateway"""
+
+    __slots__ = ("gateway", "external_id", "status", "transaction_id", "received_at")
+
+    def __init__(
+        self,
+        gateway: str,
+        external_id: str,
+        status: PaymentStatus,
+        transaction_id: Optional[str] = None
+    ):
+        self.gateway = gateway
+        self.external_id = external_id
+        self.status = status
+        self.transaction_id = transaction_id
+        self.received_at = time.perf_counter()
+
+class _Entry:
+    """Notificações de um mesmo external_id aguardando o lote"""
+
+    __slots__ = ("notification", "futures", "received_at")
+
+    def __init__(self, notification: PaymentNotification, future: asyncio.Future):
+        self.notification = notification
+        self.futures = [future]
+        self.received_at = notification.received_at
+
+    def merge(self, notification: PaymentNotification, future: asyncio.Future):
+        # A entrega mais recente vence, exceto pending depois de um status final
+        # (reentregas fora de ordem do gateway)
+        if not (
+            notification.status == PaymentStatus.PENDING
+            and self.notification.status.value in FINAL_PAYMENT_STATUSES
+        ):
+            self.notification = notification
+        self.futures.append(future)
+
+ApplyBatch = Callable[[Dict[str, PaymentNotification]], Awaitable[Dict[str, Dict[str, Any]]]]
+
+class WebhookBuffer:
+    """Acumula notificações e grava em lote; cada submit espera a gravação do seu lote"""
+
+    def __init__(
+        self,
+        apply: ApplyBatch,
+        flush_interval: float = 0.005,
+        max_batch: int = 100,
+        max_pending: int = 10000
+    ):
+        """
+        Args:
+            apply: Corrotina que grava o lote {external_id: notificação} e retorna
+                o resultado de cada external_id
+            flush_interval: Espera máxima (s) entre a primeira notificação e a gravação
+            max_batch: Pagamentos por lote; um lote cheio é gravado sem esperar
+            max_pending: Notificações aguardando antes de recusar (WebhookBufferFull)
+        """
+        self.apply = apply
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+
+        self.pending: Dict[str, _Entry] = {}
+        self.waiting = 0
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.written = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+
+    def _ensure_task(self, loop: asyncio.AbstractEventLoop):
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = loop.create_task(self._run())
+
+    async def submit(self, notification: PaymentNotification) -> Dict[str, Any]:
+        """
+        Enfileira a notificação e espera a gravação do lote
+
+        Returns:
+            Resultado da notificação ({"status": "success", ...} ou {"status": "error", ...})
+
+        Raises:
+            WebhookBufferFull: Se há max_pending notificações aguardando
+            Exception: O erro da gravação do lote (o gateway deve reenviar)
+        """
+        if self.waiting >= self.max_pending:
+            raise WebhookBufferFull(self.max_pending)
+
+        loop = asyncio.get_running_loop()
+        self._ensure_task(loop)
+        future = loop.create_future()
+
+        entry = self.pending.get(notification.external_id)
+        if entry is None:
+            self.pending[notification.external_id] = _Entry(notification, future)
+        else:
+            entry.merge(notification, future)
+            self.coalesced += 1
+        self.submitted += 1
+        self.waiting += 1
+
+        if len(self.pending) >= self.max_batch:
+            self.wakeup.set()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.flush_interval, self.wakeup.set)
+
+        return await future
+
+    def _take_batch(self) -> Dict[str, _Entry]:
+        if len(self.pending) <= self.max_batch:
+            batch, self.pending = self.pending, {}
+            return batch
+
+        # Lote cheio: o restante vai no próximo flush, sem esperar o intervalo
+        batch = {key: self.pending.pop(key) for key in list(islice(self.pending, self.max_batch))}
+        self.wakeup.set()
+        return batch
+
+    async def _run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+            batch = self._take_batch()
+            if batch:
+                await self._flush(batch)
+
+            # Notificações que chegaram durante a gravação
+            if self.pending and not self.wakeup.is_set() and self.timer is None:
+                self.timer = asyncio.get_running_loop().call_later(self.flush_interval, self.wakeup.set)
+
+    async def _flush(self, batch: Dict[str, _Entry]):
+        start = time.perf_counter()
+        try:
+            results = await self.apply({key: entry.notification for key, entry in batch.items()})
+        except Exception as e:
+            self.failed_flushes += 1
+            logger.error(f"Erro ao gravar lote de {len(batch)} notificações de pagamento: {e}")
+            for entry in batch.values():
+                self._resolve(entry, error=e)
+            return
+
+        now = time.perf_counter()
+        self.flushes += 1
+        self.written += len(batch)
+        self.last_batch_size = len(batch)
+        self.last_flush_ms = (now - start) * 1000
+        webhook_flush_seconds.observe(now - start)
+
+        for key, entry in batch.items():
+            webhook_wait_seconds.observe(now - entry.received_at, gateway=entry.notification.gateway)
+            result = results.get(key) or {"status": "error", "message": "Notificação não aplicada"}
+            self._resolve(entry, result=result)
+
+    def _resolve(self, entry: _Entry, result: Optional[Dict[str, Any]] = None, error: Optional[Exception] = None):
+        self.waiting -= len(entry.futures)
+        for future in entry.futures:
+            # O cliente pode ter desconectado; a gravação vale do mesmo jeito
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def stop(self, timeout: float = 5.0):
+        """Grava as notificações pendentes e encerra o flusher"""
+        if self.task is None:
+            return
+
+        deadline = time.monotonic() + timeout
+        while (self.pending or self.waiting) and not self.task.done() and time.monotonic() < deadline:
+            self.wakeup.set()
+            await asyncio.sleep(0.01)
+
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_payments": len(self.pending),
+            "waiting": self.waiting,
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "avg_batch_size": round(self.written / self.flushes, 2) if self.flushes else 0,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "flush_interval_ms": self.flush_interval * 1000,
+            "max_batch": self.max_batch
+        }
+
+# Gravação dos lotes de pagamento
+
+def write_payment_batch(
+    batch: Dict[str, PaymentNotification],
+    client=None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Aplica um lote de notificações no banco (síncrono; roda fora do event loop)
+
+    Returns:
+        Resultado por external_id; changed é True só nos pagamentos cujo
+        status este lote mudou
+    """
+    supabase = client or get_db()
+
+    payments = select(
+        "payments.webhook.batch_by_external_id", "payments", BATCH_PAYMENT_COLUMNS, client=supabase
+    ).in_("external_id", list(batch)).execute().data
+    by_external_id = {payment["external_id"]: payment for payment in payments}
+
+    results: Dict[str, Dict[str, Any]] = {}
+    changes: Dict[PaymentStatus, List[Dict[str, Any]]] = {}
+    completed: List[Dict[str, Any]] = []
+
+    for external_id, notification in batch.items():
+        payment = by_external_id.get(external_id)
+        if payment is None:
+            logger.error(f"Pagamento com external_id {external_id} não encontrado")
+            results[external_id] = {"status": "error", "message": "Pagamento não encontrado"}
+            continue
+
+        current = payment.get("status")
+        target = notification.status
+        if target == PaymentStatus.PENDING and current in FINAL_PAYMENT_STATUSES:
+            target = PaymentStatus(current)
+
+        results[external_id] = {
+            "status": "success", "payment_id": payment["id"], "payment_status": target.value, "changed": False
+        }
+
+        if target.value != current:
+            changes.setdefault(target, []).append(payment)
+        elif target == PaymentStatus.COMPLETED:
+            # Reentrega: recria a venda se o INSERT anterior falhou depois do UPDATE
+            completed.append(payment)
+
+    for target, changed in changes.items():
+        # Só voltam os pagamentos que este lote mudou; os demais já foram
+        # gravados por outro worker, que também cria a venda
+        updated = update_many_returning(
+            "payments.webhook.batch_update_status", "payments",
+            {"status": target.value, "updated_at": "now()"},
+            "id", [payment["id"] for payment in changed], ("id",),
+            exclude={"status": target.value}, client=supabase
+        )
+        updated_ids = {row["id"] for row in updated}
+        for payment in changed:
+            if payment["id"] in updated_ids:
+                results[payment["external_id"]]["changed"] = True
+        if target == PaymentStatus.COMPLETED:
+            completed.extend(payment for payment in changed if payment["id"] in updated_ids)
+
+    if completed:
+        plan_ids = list({payment["plan_id"] for payment in completed if payment.get("plan_id")})
+        plans = select(
+            "payments.webhook.batch_plans", "plans", ("id", "days_access"), client=supabase
+        ).in_("id", plan_ids).execute().data if plan_ids else []
+        days_by_plan = {plan["id"]: plan["days_access"] for plan in plans}
+
+        sale_rows = []
+        for payment in completed:
+            days_access = days_by_plan.get(payment.get("plan_id"))
+            if days_access is None:
+                continue
+
+            # Calcular a data de expiração
+            expires_at = None
+            if days_access > 0:
+                expires_at = (datetime.now() + timedelta(days=days_access)).isoformat()
+
+            sale_rows.append({
+                "payment_id": payment["id"],
+                "bot_id": payment["bot_id"],
+                "plan_id": payment["plan_id"],
+                "user_telegram_id": payment["user_telegram_id"],
+                "amount": payment["amount"],
+                "expires_at": expires_at
+            })
+
+        if sale_rows:
+            insert_many_if_absent(
+                "payments.webhook.batch_sales", "sales", sale_rows, "payment_id", ("id",), client=supabase
+            )
+
+    return results
+
+async def apply_payment_batch(batch: Dict[str, PaymentNotification]) -> Dict[str, Dict[str, Any]]:
+    """Grava o lote fora do event loop e depois notifica os clientes"""
+    results = await asyncio.to_thread(write_payment_batch, batch)
+
+    # Notificar os clientes aguardando estes pagamentos (só mudanças de status:
+    # uma notificação que mantém o pagamento pendente não encerra o long-poll)
+    for result in results.values():
+        if result.get("changed"):
+            payment_events.publish(result["payment_id"], {
+                "payment_id": result["payment_id"],
+                "status": result["payment_status"]
+            })
+
+    return results
+
+# Instância global
+payment_webhook_buffer = WebhookBuffer(
+    apply_payment_batch,
+    flush_interval=float(os.getenv("WEBHOOK_BUFFER_FLUSH_MS", "5")) / 1000,
+    max_batch=int(os.getenv("WEBHOOK_BUFFER_MAX_BATCH", "100")),
+    max_pending=int(os.getenv("WEBHOOK_BUFFER_MAX_PENDING", "10000"))
+)
+
+registry.callback(
+    "webhook_buffer_waiting", "Notificações de pagamento aguardando a gravação do lote",
+    lambda: payment_webhook_buffer.waiting
+)
+registry.callback(
+    "webhook_buffer_coalesced_total", "Notificações do mesmo pagamento juntadas em uma escrita",
+    lambda: payment_webhook_buffer.coalesced, metric_type="counter"
+)
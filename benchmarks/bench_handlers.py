@@ -0,0 +1,276 @@
+"""
+Micro-benchmarks dos handlers do bot
+
+Uso:
+    python -m benchmarks.bench_handlers                  # mede e mostra
+    python -m benchmarks.bench_handlers --save           # grava benchmarks/baselines/handlers.json
+    python -m benchmarks.bench_handlers --compare        # compara com a baseline (sai com 1 se piorou)
+    python -m benchmarks.bench_handlers --only start_command --rounds 30
+
+Mede Update.de_json com payloads reais, os handlers de bot/telegram_bot.py
+(start_command, group_message_handler, plan_callback_handler), os passos da
+conversa de bot/main.py e a conversa completa despachada pela Application.
+
+A Bot API é substituída por um BaseRequest que responde localmente (o
+python-telegram-bot ainda serializa e desserializa cada chamada) e as
+chamadas do bot à API do Black-in-Bot por respostas fixas, então os tempos
+refletem apenas o processamento dos handlers.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import warnings
+import argparse
+from pathlib import Path
+from contextlib import redirect_stdout
+from typing import Dict, Any, Tuple
+
+from telegram import Bot, Update
+from telegram.ext import Application, CallbackContext
+from telegram.request import BaseRequest
+from telegram.warnings import PTBUserWarning
+
+from .harness import Suite, baseline_path, finish
+
+ROOT = Path(__file__).resolve().parent.parent
+BOT_TOKEN = "123456789:AAbenchmarkTOKENbenchmarkTOKENbench"
+BOT_ID = "3f1d6c1e-8d8f-4c57-9a55-4a1b3c1d2e3f"
+ACTIVATION_CODE = "AB12-CD34"
+
+BOT_CONFIG = {
+    "id": BOT_ID,
+    "name": "Black-in-Bot VIP",
+    "description": "Grupo VIP",
+    "is_activated": True,
+    "welcome_message": "🤖 Bem-vindo ao grupo VIP! Escolha um plano:",
+    "welcome_media_url": None,
+    "welcome_media_type": None
+}
+
+PLANS = [
+    {"id": f"0000000{index}-5b1e-4c3a-9d7f-2a6c8e4b1f0{index}", "name": name, "price": price,
+     "description": f"Acesso {name.lower()}", "period": period, "days_access": days}
+    for index, (name, price, period, days) in enumerate((
+        ("Mensal", 29.9, "monthly", 30),
+        ("Trimestral", 79.9, "quarterly", 90),
+        ("Semestral", 149.9, "semi_annual", 180),
+        ("Vitalício", 299.9, "lifetime", 0),
+    ))
+]
+
+class FakeTelegramRequest(BaseRequest):
+    """Bot API respondida localmente, no formato JSON real"""
+
+    def __init__(self):
+        self.message_id = 0
+        self.calls: Dict[str, int] = {}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.message_id += 1
+        return {
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id") or 1), "type": "private"},
+            "text": params.get("text") or params.get("caption") or ""
+        }
+
+    async def do_request(self, url: str, method: str, request_data=None, **timeouts) -> Tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        params = request_data.parameters if request_data else {}
+
+        if endpoint == "getMe":
+            result: Any = {"id": 123456789, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif endpoint in ("sendMessage", "sendPhoto", "sendVideo", "editMessageText"):
+            result = self._message(params)
+        else:
+            result = True
+
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+def _load_update(name: str) -> Dict[str, Any]:
+    return json.loads((ROOT / "web" / name).read_text(encoding="utf-8"))
+
+def sample_updates() -> Dict[str, Dict[str, Any]]:
+    """Payloads reais (gravados) e derivados para cada tipo de update tratado"""
+    private_start = _load_update("test-webhook-start.json")
+    user = private_start["message"]["from"]
+    group = {"id": -1001987654321, "title": "VIP Black-in-Bot", "type": "supergroup"}
+    keyboard = {"inline_keyboard": [
+        [{"text": f"💎 {plan['name']} - R$ {plan['price']:.2f}".replace(".", ","), "callback_data": f"plan_{plan['id']}"}]
+        for plan in PLANS
+    ]}
+    menu_message = {
+        "message_id": 42, "date": 1620000001, "chat": private_start["message"]["chat"],
+        "from": {"id": 123456789, "is_bot": True, "first_name": "Bench", "username": "bench_bot"},
+        "text": BOT_CONFIG["welcome_message"], "reply_markup": keyboard
+    }
+
+    def callback(data: str) -> Dict[str, Any]:
+        return {
+            "update_id": 123460,
+            "callback_query": {
+                "id": "4382bfdwdsb323b2d9", "from": user, "chat_instance": "-1234567890",
+                "message": menu_message, "data": data
+            }
+        }
+
+    def group_text(text: str) -> Dict[str, Any]:
+        return {
+            "update_id": 123457,
+            "message": {"message_id": 7, "from": user, "chat": group, "date": 1620000002, "text": text}
+        }
+
+    return {
+        "private_start": private_start,
+        "group_code": group_text(ACTIVATION_CODE.lower()),
+        "group_unknown_code": group_text("ZZ99-ZZ99"),
+        "group_text": group_text("Alguém sabe quando sai o próximo conteúdo?"),
+        "plan_callback": callback(f"plan_{PLANS[0]['id']}"),
+        "planos_command": {**private_start, "message": {
+            **private_start["message"], "text": "/planos", "entities": [{"offset": 0, "length": 7, "type": "bot_command"}]
+        }},
+        "plano_callback": callback("plano_1"),
+        "pagamento_verificar": callback("pagamento_verificar"),
+        "pagamento_cancelar": callback("pagamento_cancelar")
+    }
+
+def import_bot_modules():
+    """Importa bot/telegram_bot.py e bot/main.py (que usam imports relativos à pasta bot/)"""
+    os.environ["TELEGRAM_BOT_TOKEN"] = BOT_TOKEN
+    sys.path.insert(0, str(ROOT / "bot"))
+    with redirect_stdout(io.StringIO()):
+        import telegram_bot
+        import main as conversation
+    # Os módulos configuram logging em INFO; os benchmarks não medem a escrita de logs
+    logging.getLogger().setLevel(logging.WARNING)
+    # Aviso de per_message da ConversationHandler, já conhecido
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+    return telegram_bot, conversation
+
+async def fake_api(method: str, url: str, **kwargs) -> Dict[str, Any]:
+    """Respostas da API do Black-in-Bot usadas pelo BotManager"""
+    endpoint = url.rsplit("/", 1)[-1]
+    if endpoint == "config":
+        return {"success": True, "bot": BOT_CONFIG}
+    if endpoint == "list-plans":
+        return {"success": True, "plans": PLANS}
+    if endpoint == "pending":
+        expires_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 600))
+        return {"success": True, "codes": [{"activation_code": ACTIVATION_CODE, "expires_at": expires_at}]}
+    if endpoint == "activate-bot":
+        return {"success": True, "message": "Bot ativado"}
+    return {"error": f"endpoint desconhecido: {endpoint}"}
+
+async def build_suite() -> Tuple[Suite, Application]:
+    telegram_bot, conversation = import_bot_modules()
+    telegram_bot.bot_manager.make_request = fake_api
+
+    bot = Bot(BOT_TOKEN, request=FakeTelegramRequest(), get_updates_request=FakeTelegramRequest())
+    application = Application.builder().bot(bot).updater(None).build()
+    application.add_handler(conversation.build_conversation_handler(persistent=False))
+    await application.initialize()
+
+    payloads = sample_updates()
+    updates = {name: Update.de_json(payload, bot) for name, payload in payloads.items()}
+
+    def context(update: Update) -> CallbackContext:
+        return CallbackContext.from_update(update, application)
+
+    def handler(func, update_name: str):
+        update = updates[update_name]
+        return lambda: func(update, context(update))
+
+    suite = Suite("handlers")
+
+    for name in ("private_start", "group_text", "plan_callback"):
+        payload = payloads[name]
+        suite.add(f"de_json.{name}", lambda payload=payload: Update.de_json(payload, bot))
+
+    # bot/telegram_bot.py
+    pending = telegram_bot.bot_manager.pending_codes
+
+    def restore_pending_code():
+        # O handler descarta o código após a ativação
+        pending.codes[ACTIVATION_CODE] = time.time() + 600
+
+    await telegram_bot.load_menu(updates["private_start"])
+    suite.add("telegram_bot.start_command.cache_hit", handler(telegram_bot.start_command, "private_start"))
+    suite.add(
+        "telegram_bot.start_command.cache_miss", handler(telegram_bot.start_command, "private_start"),
+        setup=lambda: telegram_bot.menu_cache.invalidate(telegram_bot.BOT_TOKEN)
+    )
+
+    await pending.refresh()
+    suite.add("telegram_bot.group_message_handler.text", handler(telegram_bot.group_message_handler, "group_text"))
+    suite.add(
+        "telegram_bot.group_message_handler.pending_code",
+        handler(telegram_bot.group_message_handler, "group_code"), setup=restore_pending_code
+    )
+    suite.add(
+        "telegram_bot.group_message_handler.unknown_code",
+        handler(telegram_bot.group_message_handler, "group_unknown_code")
+    )
+    suite.add("telegram_bot.plan_callback_handler", handler(telegram_bot.plan_callback_handler, "plan_callback"))
+
+    # bot/main.py: cada passo da conversa e a conversa inteira despachada pela Application
+    suite.add("conversation.start", handler(conversation.start, "private_start"))
+    suite.add("conversation.planos", handler(conversation.planos, "planos_command"))
+    suite.add("conversation.selecionar_plano", handler(conversation.selecionar_plano, "plano_callback"))
+    suite.add("conversation.verificar_pagamento", handler(conversation.verificar_pagamento, "pagamento_verificar"))
+    suite.add("conversation.cancelar_pagamento", handler(conversation.cancelar_pagamento, "pagamento_cancelar"))
+
+    async def checkout_flow():
+        for name in ("planos_command", "plano_callback", "pagamento_verificar"):
+            await application.process_update(updates[name])
+
+    suite.add("conversation.flow.process_update", checkout_flow)
+
+    return suite, application
+
+async def run(args) -> Dict[str, Any]:
+    # Os handlers usam print(); a saída vai para um buffer descartado
+    with redirect_stdout(io.StringIO()):
+        suite, application = await build_suite()
+        try:
+            return await suite.run_async(
+                rounds=args.rounds, warmup=args.warmup, min_round_time=args.min_round_time,
+                only=args.only, report=lambda line: print(line, file=sys.__stdout__)
+            )
+        finally:
+            await application.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--min-round-time", type=float, default=0.005, help="Duração mínima de cada rodada (s)")
+    parser.add_argument("--only", help="Executa apenas os benchmarks cujo nome contém o texto")
+    parser.add_argument(
+        "--save", nargs="?", const=str(baseline_path("handlers")), metavar="ARQUIVO",
+        help="Grava os resultados (padrão: benchmarks/baselines/handlers.json)"
+    )
+    parser.add_argument(
+        "--compare", nargs="?", const=str(baseline_path("handlers")), metavar="ARQUIVO",
+        help="Compara com a baseline e sai com código 1 se algum benchmark piorou"
+    )
+    parser.add_argument("--threshold", type=float, default=0.2, help="Piora tolerada (0.2 = 20%%)")
+    parser.add_argument("--metric", default="median", choices=("min", "median", "mean"))
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    finish(results, args.save, args.compare, args.threshold, args.metric)
+
+if __name__ == "__main__":
+    main()
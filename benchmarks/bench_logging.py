@@ -0,0 +1,120 @@
+"""
+Custo por mensagem dos handlers de log
+
+Uso:
+    python -m benchmarks.bench_logging                  # mede e mostra
+    python -m benchmarks.bench_logging --save           # grava benchmarks/baselines/logging.json
+    python -m benchmarks.bench_logging --compare        # compara com a baseline (sai com 1 se piorou)
+
+Compara, no thread que loga (o event loop em produção):
+    stream.*   StreamHandler síncrono em um arquivo (o logging.basicConfig anterior)
+    queue.*    NonBlockingQueueHandler de api/logging_config.py, com a escrita
+               em JSON feita em lotes pelo QueueWriter em outra thread
+    sampled.*  evento amostrado a 1% (99 de 100 chamadas param no filtro)
+    disabled.* chamada abaixo do nível configurado
+    writer.*   custo por registro na thread de escrita (formatação JSON)
+
+Durante a medição dos queue.* a thread de escrita fica parada (a fila é
+esvaziada no fim): o número é o custo pago pelo event loop quando a escrita
+acontece nos intervalos ociosos. O trabalho deslocado para a thread aparece
+em writer.*; somado, o custo total de CPU é parecido com o do StreamHandler,
+mas a escrita em stderr (que pode bloquear em um pipe cheio) sai do loop.
+
+A mensagem com f-string é montada antes da chamada mesmo quando o registro
+é descartado; com %-args a formatação só acontece na escrita.
+"""
+
+import os
+import logging
+import argparse
+import tempfile
+
+from api.logging_config import JsonFormatter, SamplingFilter, NonBlockingQueueHandler, QueueWriter
+
+from .harness import Suite, baseline_path, finish
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Campos típicos de uma mensagem de grupo
+CHAT_ID = -1001987654321
+USER_ID = 123456789
+TEXT = "Alguém sabe quando sai o próximo conteúdo?"
+
+def _logger(name: str, handler: logging.Handler, level: int = logging.INFO) -> logging.Logger:
+    logger = logging.getLogger(f"bench.{name}")
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+def build_suite(directory: str):
+    suite = Suite("logging")
+
+    stream_file = open(os.path.join(directory, "stream.log"), "w", encoding="utf-8")
+    stream = logging.StreamHandler(stream_file)
+    stream.setFormatter(logging.Formatter(TEXT_FORMAT))
+    stream_logger = _logger("stream", stream)
+
+    queue_file = open(os.path.join(directory, "queue.log"), "w", encoding="utf-8")
+    # Fila sem limite: o benchmark mede o custo de enfileirar, não descartes
+    queued = NonBlockingQueueHandler(max_size=0)
+    queued.addFilter(SamplingFilter({"telegram.group_message": 0.01}))
+    # Sem start(): a fila é esvaziada só no fim, fora da medição
+    writer = QueueWriter(queued.queue, queue_file, JsonFormatter())
+    queue_logger = _logger("queue", queued)
+
+    extra = {"event": "activation.code_received", "chat_id": CHAT_ID, "user_id": USER_ID}
+    sampled_extra = {"event": "telegram.group_message", "chat_id": CHAT_ID, "user_id": USER_ID}
+
+    suite.add("stream.fstring", lambda: stream_logger.info(f"Mensagem no grupo: '{TEXT}' de {USER_ID} no chat {CHAT_ID}"))
+    suite.add("stream.lazy", lambda: stream_logger.info("Mensagem no grupo: '%s' de %s no chat %s", TEXT, USER_ID, CHAT_ID))
+    suite.add("queue.lazy", lambda: queue_logger.info("Mensagem no grupo: '%s' de %s no chat %s", TEXT, USER_ID, CHAT_ID))
+    suite.add("queue.structured", lambda: queue_logger.info("Código de ativação recebido: %s", "AB12-CD34", extra=extra))
+    suite.add("sampled.structured", lambda: queue_logger.info("Mensagem no grupo ignorada", extra=sampled_extra))
+    suite.add("disabled.fstring", lambda: queue_logger.debug(f"Resultado da ativação: {extra}"))
+    suite.add("disabled.lazy", lambda: queue_logger.debug("Resultado da ativação: %s", extra))
+
+    record = queue_logger.makeRecord(
+        queue_logger.name, logging.INFO, __file__, 0, "Código de ativação recebido: %s", ("AB12-CD34",), None,
+        extra=extra
+    )
+    suite.add("writer.format_json", lambda: writer.formatter.format(record))
+
+    def close():
+        writer.drain()
+        stream_file.close()
+        queue_file.close()
+
+    return suite, close
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--min-round-time", type=float, default=0.005, help="Duração mínima de cada rodada (s)")
+    parser.add_argument("--only", help="Executa apenas os benchmarks cujo nome contém o texto")
+    parser.add_argument(
+        "--save", nargs="?", const=str(baseline_path("logging")), metavar="ARQUIVO",
+        help="Grava os resultados (padrão: benchmarks/baselines/logging.json)"
+    )
+    parser.add_argument(
+        "--compare", nargs="?", const=str(baseline_path("logging")), metavar="ARQUIVO",
+        help="Compara com a baseline e sai com código 1 se algum benchmark piorou"
+    )
+    parser.add_argument("--threshold", type=float, default=0.2, help="Piora tolerada (0.2 = 20%%)")
+    parser.add_argument("--metric", default="median", choices=("min", "median", "mean"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        suite, close = build_suite(directory)
+        try:
+            results = suite.run(
+                rounds=args.rounds, warmup=args.warmup, min_round_time=args.min_round_time, only=args.only
+            )
+        finally:
+            close()
+
+    finish(results, args.save, args.compare, args.threshold, args.metric)
+
+if __name__ == "__main__":
+    main()
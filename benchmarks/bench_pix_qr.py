@@ -0,0 +1,86 @@
+"""
+Benchmark do gerador de BR Code PIX e do codificador de QR Code
+
+Uso:
+    python -m benchmarks.bench_pix_qr [--iterations 200]
+
+Além dos tempos, confere o round-trip de cada payload: o BR Code é
+decodificado de volta (com validação do CRC) e, se o pacote zxing-cpp
+estiver instalado, a imagem PNG gerada é lida por um decodificador real.
+"""
+
+import io
+import time
+import uuid
+import random
+import argparse
+
+from api.payments.pix import build_pix_payload, parse_pix_payload, make_txid
+from api.payments.qr import encode_qr, render_png, render_svg, QRImageCache
+
+PIX_KEY = "pagamentos@blackinbot.com.br"
+
+def _timeit(label: str, func, iterations: int):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed / iterations * 1e3:9.3f} ms/op  ({iterations} iterações)")
+
+def _sample_payloads(count: int):
+    rng = random.Random(42)
+    return [
+        build_pix_payload(
+            round(rng.uniform(5, 500), 2),
+            txid=make_txid(str(uuid.UUID(int=rng.getrandbits(128)))),
+            pix_key=PIX_KEY,
+            description=rng.choice(["Plano Mensal", "Plano Trimestral", "Plano Anual VIP"])
+        )
+        for _ in range(count)
+    ]
+
+def check_round_trip(payloads):
+    """Decodifica os payloads e, se possível, as imagens geradas"""
+    for payload in payloads:
+        assert parse_pix_payload(payload)["pix_key"] == PIX_KEY
+
+    try:
+        import zxingcpp
+        from PIL import Image
+    except ImportError:
+        print("zxing-cpp/Pillow não instalados: round-trip da imagem ignorado")
+        return
+
+    for payload in payloads:
+        image = Image.open(io.BytesIO(render_png(encode_qr(payload), scale=4)))
+        results = zxingcpp.read_barcodes(image)
+        assert results and results[0].text == payload, f"Falha no round-trip: {payload}"
+
+    print(f"round-trip de {len(payloads)} imagens OK")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    payloads = _sample_payloads(50)
+    payload = payloads[0]
+    qr = encode_qr(payload)
+    print(f"payload de {len(payload)} bytes -> QR versão {qr.version}, máscara {qr.mask}\n")
+
+    _timeit("build_pix_payload", lambda: build_pix_payload(29.9, "abc123", pix_key=PIX_KEY), args.iterations)
+    _timeit("parse_pix_payload", lambda: parse_pix_payload(payload), args.iterations)
+    _timeit("encode_qr (máscara automática)", lambda: encode_qr(payload), args.iterations)
+    _timeit("encode_qr (máscara fixa)", lambda: encode_qr(payload, mask=0), args.iterations)
+    _timeit("render_png", lambda: render_png(qr), args.iterations)
+    _timeit("render_svg", lambda: render_svg(qr), args.iterations)
+
+    cache = QRImageCache()
+    cache.get_or_render(payload)
+    _timeit("QRImageCache (hit)", lambda: cache.get_or_render(payload), args.iterations * 10)
+
+    print()
+    check_round_trip(payloads)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark dos relatórios colunares de receita
+
+Uso:
+    python -m benchmarks.bench_reporting [--sales 1000000] [--ingest 200000]
+
+Gera vendas sintéticas diretamente em colunas (--sales) para medir os
+relatórios vetorizados e, separadamente, mede a conversão de páginas de
+dicts no formato do Supabase para colunas (--ingest linhas). Os
+agrupamentos são conferidos contra uma implementação linha a linha em uma
+amostra.
+"""
+
+import time
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from api.reporting import (
+    SalesColumns, SalesColumnsBuilder, revenue_by, cohort_retention, mrr_curve
+)
+
+PRICES = np.array([1990, 4990, 9990, 19990, 29990], dtype=np.int64)
+DURATIONS = np.array([7, 30, 90, 365, 0])
+METHODS = np.array(["pix", "pushinpay", "mercadopago"], dtype=object)
+
+def synthetic_sales(count: int, bots: int = 200, users: int = 150000, seed: int = 7) -> SalesColumns:
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2024-01-01T00:00:00", "s")
+    span = 540 * 86400
+
+    created = start + np.sort(rng.integers(0, span, count)).astype("timedelta64[s]")
+    plan_codes = rng.integers(0, bots * 3, count).astype(np.int32)
+    tier = plan_codes % len(PRICES)
+    durations = DURATIONS[tier]
+    expires = created + (durations * 86400).astype("timedelta64[s]")
+    expires[durations == 0] = np.datetime64("NaT")
+
+    return SalesColumns(
+        created_at=created,
+        expires_at=expires,
+        amount_cents=PRICES[tier],
+        bot_codes=(plan_codes // 3).astype(np.int32),
+        plan_codes=plan_codes,
+        user_codes=rng.integers(0, users, count).astype(np.int32),
+        method_codes=rng.integers(0, len(METHODS), count).astype(np.int32),
+        bots=np.array([f"bot-{i}" for i in range(bots)], dtype=object),
+        plans=np.array([f"plan-{i}" for i in range(bots * 3)], dtype=object),
+        users=np.array([str(100000 + i) for i in range(users)], dtype=object),
+        methods=METHODS
+    )
+
+def sales_rows(count: int):
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rng = np.random.default_rng(11)
+    for i, offset in enumerate(rng.integers(0, 540 * 86400, count).tolist()):
+        created = base + timedelta(seconds=offset)
+        yield {
+            "id": str(i),
+            "bot_id": f"bot-{i % 200}",
+            "plan_id": f"plan-{i % 600}",
+            "user_telegram_id": str(100000 + (i * 7919) % 150000),
+            "amount": 49.9,
+            "created_at": created.isoformat(),
+            "expires_at": (created + timedelta(days=30)).isoformat(),
+            "payments": {"method": "pix"}
+        }
+
+def _timeit(label: str, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<44} {elapsed * 1e3:10.1f} ms")
+    return result
+
+def check_revenue(sales: SalesColumns, sample: int = 20000):
+    """Compara o agrupamento vetorizado com uma soma linha a linha"""
+    subset = sales.filter(np.arange(len(sales)) < sample)
+    expected = defaultdict(int)
+    months = subset.created_at.astype("datetime64[M]").astype(str)
+    for bot, month, cents in zip(subset.bot_codes.tolist(), months.tolist(), subset.amount_cents.tolist()):
+        expected[(subset.bots[bot], month)] += cents
+
+    report = revenue_by(subset, ("bot", "period"))
+    got = {
+        (row["bot"], row["period"]): round(row["revenue"] * 100)
+        for row in report.to_dicts()
+    }
+    assert got == dict(expected), "revenue_by divergente da soma linha a linha"
+    print(f"revenue_by conferido em {sample} vendas")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--ingest", type=int, default=200_000)
+    args = parser.parse_args()
+
+    sales = _timeit(f"gerar {args.sales} vendas", lambda: synthetic_sales(args.sales))
+    print(f"colunas: {sales.nbytes / 1024 / 1024:.1f} MiB\n")
+
+    _timeit("receita por bot e mês", lambda: revenue_by(sales, ("bot", "period")))
+    _timeit("receita por plano, método e semana", lambda: revenue_by(sales, ("plan", "method", "period"), "week"))
+    _timeit("receita por dia", lambda: revenue_by(sales, ("period",), "day"))
+    _timeit("coortes de retenção (mês)", lambda: cohort_retention(sales))
+    report = _timeit("MRR e churn", lambda: mrr_curve(sales, now=datetime(2025, 7, 1)))
+    _timeit("MRR em CSV", lambda: report.to_csv())
+
+    rows = list(sales_rows(args.ingest))
+    builder = SalesColumnsBuilder()
+
+    def ingest():
+        for start in range(0, len(rows), 1000):
+            builder.add_page(rows[start:start + 1000])
+        return builder.build()
+
+    _timeit(f"ingestão de {args.ingest} linhas (páginas de 1000)", ingest)
+
+    print()
+    check_revenue(sales)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Custo de gravação no log de updates do webhook (api/update_log.py)
+
+Uso:
+    python -m benchmarks.bench_update_log                  # mede e mostra
+    python -m benchmarks.bench_update_log --save           # grava benchmarks/baselines/update_log.json
+    python -m benchmarks.bench_update_log --compare        # compara com a baseline (sai com 1 se piorou)
+
+    append.update        append de um update (~600 bytes) no buffer do segmento
+    append_ack.update    append seguido do ack (o ciclo completo de um update)
+    durable.single       append e espera do fsync: latência de um webhook isolado
+                         (limitada pelo intervalo do fsync em lote)
+    durable.batch_1000   1000 appends e espera do fsync do último: 1000 webhooks
+                         simultâneos dividem o mesmo fsync; ops/s × 1000 é a
+                         vazão em updates por segundo
+    recovery.scan_10k    leitura de um segmento com 10.000 updates (recuperação)
+
+O log fica em um diretório temporário; o resultado depende do disco (o
+fsync em tmpfs não chega ao disco).
+"""
+
+import os
+import json
+import argparse
+import tempfile
+
+from api.update_log import UpdateLog, scan_segment
+
+from .harness import Suite, baseline_path, finish
+
+BOT_KEY = "7940039994"
+
+# Update típico de /start em conversa privada
+UPDATE = json.dumps({
+    "update_id": 912345678,
+    "message": {
+        "message_id": 4321,
+        "from": {
+            "id": 123456789, "is_bot": False, "first_name": "Maria", "last_name": "Silva",
+            "username": "mariasilva", "language_code": "pt-br"
+        },
+        "chat": {
+            "id": 123456789, "first_name": "Maria", "last_name": "Silva",
+            "username": "mariasilva", "type": "private"
+        },
+        "date": 1718000000,
+        "text": "/start",
+        "entities": [{"offset": 0, "length": 6, "type": "bot_command"}]
+    }
+}).encode("utf-8")
+
+def build_suite(directory: str):
+    suite = Suite("update_log")
+
+    log = UpdateLog(os.path.join(directory, "log"), fsync_interval=0.005)
+    log.open()
+
+    # Segmento fechado com 10.000 updates para medir a leitura da recuperação
+    scan_log = UpdateLog(os.path.join(directory, "scan"), segment_bytes=1 << 30)
+    scan_log.open()
+    for _ in range(10_000):
+        scan_log.append(BOT_KEY, UPDATE)
+    scan_log.close()
+    scan_path = scan_log.segments[-1].path
+
+    def append_ack():
+        log.ack(log.append(BOT_KEY, UPDATE))
+
+    async def durable_single():
+        offset = log.append(BOT_KEY, UPDATE)
+        await log.wait_durable(offset)
+        log.ack(offset)
+
+    async def durable_batch():
+        offsets = [log.append(BOT_KEY, UPDATE) for _ in range(1000)]
+        await log.wait_durable(offsets[-1])
+        for offset in offsets:
+            log.ack(offset)
+
+    def scan():
+        for _ in scan_segment(scan_path):
+            pass
+
+    suite.add("append.update", lambda: log.append(BOT_KEY, UPDATE))
+    suite.add("append_ack.update", append_ack)
+    suite.add("durable.single", durable_single)
+    suite.add("durable.batch_1000", durable_batch)
+    suite.add("recovery.scan_10k", scan)
+
+    return suite, log.close
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--min-round-time", type=float, default=0.05, help="Duração mínima de cada rodada (s)")
+    parser.add_argument("--only", help="Executa apenas os benchmarks cujo nome contém o texto")
+    parser.add_argument(
+        "--save", nargs="?", const=str(baseline_path("update_log")), metavar="ARQUIVO",
+        help="Grava os resultados (padrão: benchmarks/baselines/update_log.json)"
+    )
+    parser.add_argument(
+        "--compare", nargs="?", const=str(baseline_path("update_log")), metavar="ARQUIVO",
+        help="Compara com a baseline e sai com código 1 se algum benchmark piorou"
+    )
+    parser.add_argument("--threshold", type=float, default=0.2, help="Piora tolerada (0.2 = 20%%)")
+    parser.add_argument("--metric", default="median", choices=("min", "median", "mean"))
+    args = parser.parse_args()
+
+    # O diretório temporário fica no disco do projeto (o /tmp pode ser tmpfs)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(__file__))) as directory:
+        suite, close = build_suite(directory)
+        try:
+            results = suite.run(
+                rounds=args.rounds, warmup=args.warmup, min_round_time=args.min_round_time, only=args.only
+            )
+        finally:
+            close()
+
+    finish(results, args.save, args.compare, args.threshold, args.metric)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Vazão e latência do buffer de notificações de pagamento (api/webhook_buffer.py)
+
+Uso:
+    python -m benchmarks.bench_webhook_buffer                  # mede e mostra
+    python -m benchmarks.bench_webhook_buffer --save           # grava benchmarks/baselines/webhook_buffer.json
+    python -m benchmarks.bench_webhook_buffer --compare        # compara com a baseline (sai com 1 se piorou)
+
+    flush.single            uma notificação isolada: espera do intervalo de flush
+                            mais a gravação do lote (latência de um webhook fora
+                            de pico)
+    burst.buffered_1000     1000 notificações simultâneas de pagamentos distintos;
+                            ops/s × 1000 é a vazão em notificações por segundo
+    burst.coalesced_1000    1000 notificações de 100 pagamentos (reentregas do
+                            gateway): viram 100 escritas
+    burst.inline_100        100 notificações gravadas uma a uma como os webhooks
+                            faziam antes do buffer (consulta, UPDATE, plano e venda
+                            por notificação), para comparação
+
+O banco é simulado: cada consulta custa ROUND_TRIP_MS (ida e volta ao
+PostgREST) e devolve linhas geradas localmente, então os tempos medem o
+número de idas ao banco e o custo do buffer, não o PostgreSQL.
+"""
+
+import time
+import asyncio
+import argparse
+from typing import Dict, Any, List
+
+from api.models import PaymentStatus
+from api.webhook_buffer import WebhookBuffer, PaymentNotification, write_payment_batch
+
+from .harness import Suite, baseline_path, finish
+
+ROUND_TRIP_MS = 1.0
+PLAN_ID = "00000001-5b1e-4c3a-9d7f-2a6c8e4b1f01"
+BOT_ID = "3f1d6c1e-8d8f-4c57-9a55-4a1b3c1d2e3f"
+
+class _Response:
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+
+class _Params:
+    def add(self, key: str, value: str) -> "_Params":
+        return self
+
+class _FakeBuilder:
+    """Builder do PostgREST que responde localmente depois de ROUND_TRIP_MS"""
+
+    def __init__(self, table: str):
+        self.table = table
+        self.params = _Params()
+        self.rows: List[Dict[str, Any]] = []
+        self.ids: List[str] = []
+        self.updating = False
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def update(self, values: Dict[str, Any]):
+        self.updating = True
+        return self
+
+    def insert(self, rows: Any):
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows: Any, **kwargs):
+        return self.insert(rows)
+
+    def in_(self, column: str, values: List[str]):
+        self.ids = values
+        return self
+
+    def eq(self, column: str, value: str):
+        self.ids = [value]
+        return self
+
+    def neq(self, column: str, value: str):
+        return self
+
+    def execute(self):
+        time.sleep(ROUND_TRIP_MS / 1000)
+        if self.rows:
+            return _Response([{"id": str(index), "created_at": "2024-06-10T12:00:00+00:00", **row}
+                              for index, row in enumerate(self.rows)])
+        if self.updating:
+            # Nenhum pagamento do lote foi gravado por outro worker
+            return _Response([{"id": payment_id} for payment_id in self.ids])
+        if self.table == "payments":
+            # Todos os pagamentos consultados estão pendentes (cada lote é uma liquidação nova)
+            return _Response([{
+                "id": f"payment-{external_id}", "external_id": external_id, "status": "pending",
+                "bot_id": BOT_ID, "plan_id": PLAN_ID, "user_telegram_id": "123456789", "amount": 29.9
+            } for external_id in self.ids])
+        if self.table == "plans":
+            return _Response([{"id": plan_id, "days_access": 30} for plan_id in self.ids])
+        return _Response([])
+
+class _FakeClient:
+    def table(self, name: str) -> _FakeBuilder:
+        return _FakeBuilder(name)
+
+CLIENT = _FakeClient()
+
+async def _apply(batch: Dict[str, PaymentNotification]) -> Dict[str, Dict[str, Any]]:
+    return await asyncio.to_thread(write_payment_batch, batch, CLIENT)
+
+def _notification(number: int) -> PaymentNotification:
+    return PaymentNotification("pushinpay", f"loadtest-{number}", PaymentStatus.COMPLETED, str(number))
+
+def _write_inline(number: int):
+    # Caminho anterior: quatro idas ao banco por notificação, no próprio handler
+    external_id = f"loadtest-{number}"
+    for table in ("payments", "payments", "plans", "sales"):
+        builder = CLIENT.table(table).eq("external_id", external_id)
+        builder.execute()
+
+def build_suite() -> Suite:
+    suite = Suite("webhook_buffer")
+    buffer = WebhookBuffer(_apply, flush_interval=0.005, max_batch=100)
+
+    async def flush_single():
+        await buffer.submit(_notification(0))
+
+    async def burst_buffered():
+        await asyncio.gather(*(buffer.submit(_notification(number)) for number in range(1000)))
+
+    async def burst_coalesced():
+        await asyncio.gather(*(buffer.submit(_notification(number % 100)) for number in range(1000)))
+
+    def burst_inline():
+        for number in range(100):
+            _write_inline(number)
+
+    suite.add("flush.single", flush_single)
+    suite.add("burst.buffered_1000", burst_buffered)
+    suite.add("burst.coalesced_1000", burst_coalesced)
+    suite.add("burst.inline_100", burst_inline)
+
+    return suite
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--min-round-time", type=float, default=0.05, help="Duração mínima de cada rodada (s)")
+    parser.add_argument("--only", help="Executa apenas os benchmarks cujo nome contém o texto")
+    parser.add_argument(
+        "--save", nargs="?", const=str(baseline_path("webhook_buffer")), metavar="ARQUIVO",
+        help="Grava os resultados (padrão: benchmarks/baselines/webhook_buffer.json)"
+    )
+    parser.add_argument(
+        "--compare", nargs="?", const=str(baseline_path("webhook_buffer")), metavar="ARQUIVO",
+        help="Compara com a baseline e sai com código 1 se algum benchmark piorou"
+    )
+    parser.add_argument("--threshold", type=float, default=0.2, help="Piora tolerada (0.2 = 20%%)")
+    parser.add_argument("--metric", default="median", choices=("min", "median", "mean"))
+    args = parser.parse_args()
+
+    results = build_suite().run(
+        rounds=args.rounds, warmup=args.warmup, min_round_time=args.min_round_time, only=args.only
+    )
+    finish(results, args.save, args.compare, args.threshold, args.metric)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Compara duas execuções de benchmarks gravadas em JSON
+
+Uso:
+    python -m benchmarks.compare benchmarks/baselines/handlers.json atual.json [--threshold 0.2]
+
+Sai com código 1 quando algum benchmark ficou mais lento que a baseline
+além do limite (0.2 = 20%).
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+from .harness import load_results, compare_results, format_comparison
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Piora tolerada (0.2 = 20%%)")
+    parser.add_argument("--metric", default="median", choices=("min", "median", "mean"))
+    args = parser.parse_args()
+
+    rows, unmatched = compare_results(
+        load_results(Path(args.baseline)), load_results(Path(args.current)), args.threshold, args.metric
+    )
+    print(format_comparison(rows, unmatched, args.threshold, args.metric))
+
+    if any(row["slower"] for row in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Execução de micro-benchmarks com baselines em JSON
+
+Cada benchmark roda em rodadas; o número de chamadas por rodada é calibrado
+para que a rodada dure ao menos min_round_time, e o tempo da rodada dividido
+pelas chamadas é uma amostra. As estatísticas (min, mediana, média, desvio,
+ops/s) são gravadas em JSON no mesmo formato usado por compare_results, que
+aponta os benchmarks que ficaram mais lentos que a baseline além do limite.
+
+Funções que retornam corrotinas são aguardadas dentro de um único event
+loop, chamada a chamada; setup (opcional) roda antes de cada chamada, fora
+da medição.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import inspect
+import platform
+import statistics
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+BASELINES_DIR = Path(__file__).resolve().parent / "baselines"
+MAX_ITERATIONS = 100_000
+
+class Benchmark:
+    """Função medida e seu setup"""
+
+    def __init__(self, name: str, func: Callable, setup: Optional[Callable] = None, group: Optional[str] = None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.group = group or name.split(".", 1)[0]
+
+def summarize(samples: List[float], iterations: int) -> Dict[str, Any]:
+    """Estatísticas (em segundos por chamada) das amostras de um benchmark"""
+    ordered = sorted(samples)
+    quartiles = statistics.quantiles(ordered, n=4) if len(ordered) >= 2 else [ordered[0]] * 3
+    mean = statistics.fmean(ordered)
+    return {
+        "min": ordered[0],
+        "max": ordered[-1],
+        "mean": mean,
+        "median": statistics.median(ordered),
+        "stddev": statistics.stdev(ordered) if len(ordered) >= 2 else 0.0,
+        "iqr": quartiles[2] - quartiles[0],
+        "ops": 1 / mean if mean else 0.0,
+        "rounds": len(ordered),
+        "iterations": iterations
+    }
+
+class Suite:
+    """Conjunto de benchmarks executados e gravados juntos"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.benchmarks: List[Benchmark] = []
+
+    def add(self, name: str, func: Callable, setup: Optional[Callable] = None, group: Optional[str] = None):
+        self.benchmarks.append(Benchmark(name, func, setup, group))
+
+    async def _run_round(self, benchmark: Benchmark, iterations: int) -> float:
+        elapsed = 0.0
+        for _ in range(iterations):
+            if benchmark.setup:
+                benchmark.setup()
+            start = time.perf_counter()
+            result = benchmark.func()
+            if inspect.isawaitable(result):
+                await result
+            elapsed += time.perf_counter() - start
+        return elapsed / iterations
+
+    async def _measure(
+        self,
+        benchmark: Benchmark,
+        rounds: int,
+        warmup: int,
+        min_round_time: float
+    ) -> Dict[str, Any]:
+        for _ in range(warmup):
+            await self._run_round(benchmark, 1)
+
+        # Calibração: dobra as chamadas até a rodada durar min_round_time
+        iterations = 1
+        while iterations < MAX_ITERATIONS:
+            if await self._run_round(benchmark, iterations) * iterations >= min_round_time:
+                break
+            iterations *= 2
+
+        samples = [await self._run_round(benchmark, iterations) for _ in range(rounds)]
+        return summarize(samples, iterations)
+
+    async def run_async(
+        self,
+        rounds: int = 15,
+        warmup: int = 3,
+        min_round_time: float = 0.005,
+        only: Optional[str] = None,
+        report: Callable[[str], None] = print
+    ) -> Dict[str, Any]:
+        results = []
+        for benchmark in self.benchmarks:
+            if only and only not in benchmark.name:
+                continue
+            stats = await self._measure(benchmark, rounds, warmup, min_round_time)
+            results.append({"name": benchmark.name, "group": benchmark.group, "stats": stats})
+            report(
+                f"{benchmark.name:<48} {stats['median'] * 1e6:10.1f} µs  "
+                f"(±{stats['stddev'] * 1e6:.1f}, {stats['rounds']}x{stats['iterations']})"
+            )
+
+        return {
+            "suite": self.name,
+            "datetime": datetime.now(timezone.utc).isoformat(),
+            "machine_info": machine_info(),
+            "commit": current_commit(),
+            "benchmarks": results
+        }
+
+    def run(self, **options) -> Dict[str, Any]:
+        return asyncio.run(self.run_async(**options))
+
+def machine_info() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count()
+    }
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def baseline_path(suite: str) -> Path:
+    return BASELINES_DIR / f"{suite}.json"
+
+def save_results(results: Dict[str, Any], path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+
+def load_results(path: Path) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.2,
+    metric: str = "median"
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Compara os benchmarks presentes nas duas execuções
+
+    Returns:
+        (linhas com baseline, atual, variação e se ficou mais lento que o
+        limite; nomes que só existem em uma das execuções)
+    """
+    before = {item["name"]: item["stats"] for item in baseline["benchmarks"]}
+    after = {item["name"]: item["stats"] for item in current["benchmarks"]}
+
+    rows = []
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name][metric], after[name][metric]
+        change = new / old - 1 if old else 0.0
+        rows.append({
+            "name": name,
+            "baseline": old,
+            "current": new,
+            "change": change,
+            "slower": change > threshold
+        })
+
+    unmatched = sorted(before.keys() ^ after.keys())
+    return rows, unmatched
+
+def format_comparison(rows: List[Dict[str, Any]], unmatched: List[str], threshold: float, metric: str) -> str:
+    lines = [f"{'benchmark':<48} {'baseline':>12} {'atual':>12} {'variação':>9}", "-" * 84]
+    for row in rows:
+        flag = "  LENTO" if row["slower"] else ""
+        lines.append(
+            f"{row['name']:<48} {row['baseline'] * 1e6:10.1f}µs {row['current'] * 1e6:10.1f}µs "
+            f"{row['change'] * 100:+8.1f}%{flag}"
+        )
+    if unmatched:
+        lines.append(f"\nSem correspondência na outra execução: {', '.join(unmatched)}")
+
+    slower = [row for row in rows if row["slower"]]
+    lines.append(
+        f"\n{len(slower)} de {len(rows)} benchmarks mais lentos que a baseline "
+        f"(limite {threshold * 100:.0f}%, métrica {metric})"
+    )
+    return "\n".join(lines)
+
+def finish(results: Dict[str, Any], save: Optional[str], compare: Optional[str], threshold: float, metric: str):
+    """Grava e/ou compara os resultados de uma suíte (usado pelos scripts de benchmark)"""
+    if save:
+        path = Path(save)
+        save_results(results, path)
+        print(f"\nResultados gravados em {path}")
+
+    if compare:
+        rows, unmatched = compare_results(load_results(Path(compare)), results, threshold, metric)
+        print()
+        print(format_comparison(rows, unmatched, threshold, metric))
+        if any(row["slower"] for row in rows):
+            sys.exit(1)
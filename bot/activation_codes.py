@@ -0,0 +1,127 @@
+"""
+Índice local de códigos de ativação pendentes
+
+Mantém em memória os códigos ainda válidos do bot, atualizados por TTL,
+para que apenas mensagens com um código realmente pendente cheguem à API.
+"""
+
+import re
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Formato dos códigos de ativação (XXXX-XXXX)
+ACTIVATION_CODE_RE = re.compile(r'^[A-Z0-9]{4}-[A-Z0-9]{4}$')
+ACTIVATION_CODE_LENGTH = 9
+
+def normalize_activation_code(text: Optional[str]) -> Optional[str]:
+    """
+    Retorna o código normalizado se o texto tiver o formato de código de ativação,
+    ou None caso contrário. A checagem de tamanho evita a regex na maioria das mensagens.
+    """
+    if not text:
+        return None
+
+    code = text.strip()
+    if len(code) != ACTIVATION_CODE_LENGTH or code[4] != '-':
+        return None
+
+    code = code.upper()
+    if not ACTIVATION_CODE_RE.match(code):
+        return None
+
+    return code
+
+def _parse_expires_at(value: Any) -> Optional[float]:
+    """Converte expires_at (ISO 8601) para timestamp"""
+    if not value:
+        return None
+    try:
+        expires_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at.timestamp()
+    except ValueError:
+        return None
+
+class PendingCodeIndex:
+    """Conjunto em memória dos códigos de ativação válidos, com expiração individual"""
+
+    def __init__(
+        self,
+        fetch_codes: Callable[[], Awaitable[Optional[list]]],
+        ttl: float = 30.0,
+        miss_refresh_interval: float = 3.0
+    ):
+        """
+        Args:
+            fetch_codes: Corrotina que retorna a lista de códigos pendentes
+                ({'activation_code', 'expires_at'}) ou None em caso de erro
+            ttl: Intervalo máximo entre atualizações do índice, em segundos
+            miss_refresh_interval: Intervalo mínimo entre atualizações forçadas
+                por um código desconhecido (cobre códigos gerados após a última carga)
+        """
+        self.fetch_codes = fetch_codes
+        self.ttl = ttl
+        self.miss_refresh_interval = miss_refresh_interval
+        self.codes: Dict[str, float] = {}
+        self.loaded_at: float = 0.0
+        self.loaded = False
+        self._lock = asyncio.Lock()
+
+    async def refresh(self) -> bool:
+        """Recarrega o índice a partir da API"""
+        async with self._lock:
+            codes = await self.fetch_codes()
+
+            if codes is None:
+                return False
+
+            now = time.time()
+            index = {}
+            for item in codes:
+                code = normalize_activation_code(item.get('activation_code'))
+                expires_at = _parse_expires_at(item.get('expires_at'))
+                if code and expires_at and expires_at > now:
+                    index[code] = expires_at
+
+            self.codes = index
+            self.loaded_at = time.monotonic()
+            self.loaded = True
+            return True
+
+    def discard(self, code: str):
+        """Remove um código do índice (ex: após ser consumido)"""
+        self.codes.pop(code, None)
+
+    async def contains(self, code: str) -> bool:
+        """
+        Verifica se um código está pendente
+
+        Se o índice não puder ser carregado, retorna True para não bloquear a ativação;
+        a API continua sendo a fonte de verdade.
+        """
+        age = time.monotonic() - self.loaded_at
+
+        if not self.loaded or age > self.ttl:
+            if not await self.refresh() and not self.loaded:
+                return True
+
+        expires_at = self.codes.get(code)
+
+        if expires_at is None and time.monotonic() - self.loaded_at > self.miss_refresh_interval:
+            await self.refresh()
+            expires_at = self.codes.get(code)
+
+        if expires_at is None:
+            return False
+
+        if expires_at <= time.time():
+            self.discard(code)
+            return False
+
+        return True
@@ -12,36 +12,31 @@ from telegram.ext import (
     filters,
 )
 
+from menu_cache import MenuCache
+from persistence import create_persistence
+from shared import setup_logging
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
-# Configuração de logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
+# Configuração de logging (JSON escrito em background)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Estados para conversação
 SELECIONAR_PLANO, PROCESSAR_PAGAMENTO = range(2)
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Comando para iniciar o bot"""
-    user = update.effective_user
-    await update.message.reply_text(
-        f"Olá, {user.first_name}! Bem-vindo ao Bot de Acesso VIP.\n\n"
-        "Use /planos para ver os planos disponíveis."
-    )
+# Aqui seria feita uma consulta à API para obter os planos
+# Por enquanto, vamos usar planos fictícios
+PLANOS = [
+    {"id": "1", "nome": "Plano Mensal", "preco": 29.90, "periodo": "mensal"},
+    {"id": "2", "nome": "Plano Trimestral", "preco": 79.90, "periodo": "trimestral"},
+    {"id": "3", "nome": "Plano Anual", "preco": 199.90, "periodo": "anual"},
+]
+PLANOS_POR_ID = {plano["id"]: plano for plano in PLANOS}
 
-async def planos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Mostra os planos disponíveis"""
-    # Aqui seria feita uma consulta à API para obter os planos
-    # Por enquanto, vamos usar planos fictícios
-    planos = [
-        {"id": "1", "nome": "Plano Mensal", "preco": 29.90, "periodo": "mensal"},
-        {"id": "2", "nome": "Plano Trimestral", "preco": 79.90, "periodo": "trimestral"},
-        {"id": "3", "nome": "Plano Anual", "preco": 199.90, "periodo": "anual"},
-    ]
-    
+def render_planos(bot_data, planos):
+    """Monta a mensagem e o teclado do comando /planos"""
     keyboard = []
     for plano in planos:
         keyboard.append([
@@ -51,11 +46,26 @@ async def planos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
             )
         ])
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return "Escolha um plano para acessar nosso conteúdo VIP:", InlineKeyboardMarkup(keyboard)
+
+# Menu de planos renderizado uma única vez enquanto os planos não mudarem
+menu_cache = MenuCache(render_planos)
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Comando para iniciar o bot"""
+    user = update.effective_user
+    await update.message.reply_text(
+        f"Olá, {user.first_name}! Bem-vindo ao Bot de Acesso VIP.\n\n"
+        "Use /planos para ver os planos disponíveis."
+    )
+
+async def planos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Mostra os planos disponíveis"""
+    menu = menu_cache.get("planos") or menu_cache.update("planos", None, PLANOS)
     
     await update.message.reply_text(
-        "Escolha um plano para acessar nosso conteúdo VIP:",
-        reply_markup=reply_markup,
+        menu.text,
+        reply_markup=menu.reply_markup,
     )
     
     return SELECIONAR_PLANO
@@ -69,15 +79,7 @@ async def selecionar_plano(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     plano_id = query.data.split("_")[1]
     context.user_data["plano_id"] = plano_id
     
-    # Aqui seria feita uma consulta à API para obter os detalhes do plano
-    # Por enquanto, vamos usar dados fictícios
-    planos = {
-        "1": {"nome": "Plano Mensal", "preco": 29.90, "periodo": "mensal"},
-        "2": {"nome": "Plano Trimestral", "preco": 79.90, "periodo": "trimestral"},
-        "3": {"nome": "Plano Anual", "preco": 199.90, "periodo": "anual"},
-    }
-    
-    plano = planos[plano_id]
+    plano = PLANOS_POR_ID[plano_id]
     
     # Gerar um QR Code de pagamento fictício
     # Em uma implementação real, isso seria gerado pela API de pagamento
@@ -114,6 +116,7 @@ async def verificar_pagamento(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Simulação de pagamento realizado
     user = update.effective_user
+    context.user_data.pop("plano_id", None)
     
     # Em uma implementação real, aqui seria chamada a API para registrar o pagamento
     # e adicionar o usuário ao grupo VIP
@@ -130,6 +133,7 @@ async def cancelar_pagamento(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Cancela o processo de pagamento"""
     query = update.callback_query
     await query.answer()
+    context.user_data.pop("plano_id", None)
     
     await query.edit_message_text(
         "Pagamento cancelado. Você pode escolher um plano a qualquer momento com o comando /planos."
@@ -146,19 +150,14 @@ async def ajuda(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "/ajuda - Mostra esta mensagem de ajuda"
     )
 
-def main() -> None:
-    """Inicializa e executa o bot"""
-    # Obter o token do bot do Telegram
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not token:
-        logger.error("TELEGRAM_BOT_TOKEN não encontrado no arquivo .env")
-        return
-    
-    # Criar o aplicativo
-    application = Application.builder().token(token).build()
-    
-    # Adicionar handlers
-    conv_handler = ConversationHandler(
+def build_conversation_handler(persistent: bool = True, conversation_timeout: float = None) -> ConversationHandler:
+    """
+    Conversa de compra: /planos -> seleção do plano -> pagamento
+
+    conversation_timeout encerra (e tira da memória) conversas paradas; requer
+    o JobQueue (python-telegram-bot[job-queue])
+    """
+    return ConversationHandler(
         entry_points=[CommandHandler("planos", planos)],
         states={
             SELECIONAR_PLANO: [
@@ -170,9 +169,39 @@ def main() -> None:
             ],
         },
         fallbacks=[CommandHandler("planos", planos)],
+        name="pagamento",
+        persistent=persistent,
+        conversation_timeout=conversation_timeout,
     )
+
+def main() -> None:
+    """Inicializa e executa o bot"""
+    # Obter o token do bot do Telegram
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    if not token:
+        logger.error("TELEGRAM_BOT_TOKEN não encontrado no arquivo .env")
+        return
     
-    application.add_handler(conv_handler)
+    # Persistência das conversas de pagamento (sobrevive a reinícios; o arquivo
+    # é local, então cada réplica tem o seu estado)
+    ttl = int(os.getenv("BOT_CHECKOUT_TTL", str(24 * 60 * 60)))
+    persistence = create_persistence(
+        os.getenv("BOT_STATE_URL"),
+        ttl=ttl,
+        write_interval=float(os.getenv("BOT_STATE_WRITE_INTERVAL", "1"))
+    )
+    
+    async def post_init(application: Application) -> None:
+        # Grava o buffer a cada segundo e remove os checkouts expirados
+        # periodicamente (do arquivo e do user_data em memória)
+        persistence.start(application)
+        await persistence.evict_expired()
+    
+    # Criar o aplicativo
+    application = Application.builder().token(token).persistence(persistence).post_init(post_init).build()
+    
+    # Adicionar handlers
+    application.add_handler(build_conversation_handler(conversation_timeout=ttl))
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("ajuda", ajuda))
     
@@ -0,0 +1,138 @@
+"""
+Cache de menus de planos pré-renderizados
+
+Guarda, por bot, o texto de boas-vindas e o teclado inline já montados.
+O menu só é reconstruído quando a versão do conjunto de planos muda.
+"""
+
+import json
+import time
+import hashlib
+from typing import Dict, List, Optional, Any, Callable, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+def format_price(price: Any) -> str:
+    """Formata um preço no padrão brasileiro (R$ 29,90)"""
+    return f"R$ {float(price):.2f}".replace('.', ',')
+
+def plans_version(bot_data: Optional[Dict], plans: List[Dict]) -> str:
+    """
+    Calcula a versão do menu a partir dos planos e da mensagem/mídia de boas-vindas
+    """
+    bot_data = bot_data or {}
+    payload = {
+        "welcome": [
+            bot_data.get('name'),
+            bot_data.get('welcome_message'),
+            bot_data.get('welcome_media_url'),
+            bot_data.get('welcome_media_type'),
+        ],
+        "plans": plans,
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+def render_plans_menu(bot_data: Dict, plans: List[Dict]) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """Monta a mensagem de boas-vindas e o teclado de planos do /start"""
+    welcome_message = bot_data.get('welcome_message') or f"🤖 Bem-vindo ao {bot_data['name']}!"
+
+    if not plans:
+        return f"{welcome_message}\n\n❌ Nenhum plano disponível no momento.", None
+
+    keyboard = []
+    for plan in plans:
+        button_text = f"💎 {plan['name']} - {format_price(plan['price'])}"
+        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"plan_{plan['id']}")])
+
+    return welcome_message, InlineKeyboardMarkup(keyboard)
+
+class RenderedMenu:
+    """Menu pronto para envio"""
+
+    def __init__(
+        self,
+        version: str,
+        text: str,
+        reply_markup: Optional[InlineKeyboardMarkup],
+        media_url: Optional[str] = None,
+        media_type: Optional[str] = None
+    ):
+        self.version = version
+        self.text = text
+        self.reply_markup = reply_markup
+        self.keyboard = reply_markup.to_dict() if reply_markup else None
+        self.media_url = media_url
+        self.media_type = media_type
+        self.checked_at = time.monotonic()
+
+class MenuCache:
+    """Cache de menus renderizados por bot"""
+
+    def __init__(
+        self,
+        render: Callable[[Dict, List[Dict]], Tuple[str, Optional[InlineKeyboardMarkup]]] = render_plans_menu,
+        ttl: float = 60.0
+    ):
+        """
+        Args:
+            render: Função que monta (texto, teclado) a partir do bot e dos planos
+            ttl: Tempo, em segundos, durante o qual o menu é usado sem consultar a API
+        """
+        self.render = render
+        self.ttl = ttl
+        self.menus: Dict[str, RenderedMenu] = {}
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+
+    def get(self, key: str) -> Optional[RenderedMenu]:
+        """Retorna o menu do bot se ainda estiver dentro do TTL"""
+        menu = self.menus.get(key)
+
+        if menu is None or time.monotonic() - menu.checked_at > self.ttl:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return menu
+
+    def update(self, key: str, bot_data: Optional[Dict], plans: List[Dict]) -> RenderedMenu:
+        """
+        Atualiza o menu do bot com dados recém-consultados.
+        O menu só é renderizado de novo se a versão dos planos mudou.
+        """
+        version = plans_version(bot_data, plans)
+        menu = self.menus.get(key)
+
+        if menu is not None and menu.version == version:
+            menu.checked_at = time.monotonic()
+            return menu
+
+        text, reply_markup = self.render(bot_data, plans)
+        bot_data = bot_data or {}
+        menu = RenderedMenu(
+            version,
+            text,
+            reply_markup,
+            media_url=bot_data.get('welcome_media_url'),
+            media_type=bot_data.get('welcome_media_type')
+        )
+        self.menus[key] = menu
+        self.renders += 1
+        return menu
+
+    def invalidate(self, key: Optional[str] = None):
+        """Descarta o menu de um bot (ou de todos)"""
+        if key is None:
+            self.menus.clear()
+        else:
+            self.menus.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'menus': len(self.menus),
+            'hits': self.hits,
+            'misses': self.misses,
+            'renders': self.renders
+        }
@@ -0,0 +1,427 @@
+"""
+Persistência do estado das conversas de pagamento
+
+Guarda o estado do ConversationHandler e o user_data (ex: plano_id) fora da
+memória do processo, para que um checkout em andamento sobreviva a reinícios.
+Os backends (SQLite e JSON) são arquivos locais: cada réplica tem o seu, e o
+estado não passa de uma réplica para outra.
+
+O python-telegram-bot entrega as alterações à persistência a cada
+update_interval segundos; aqui elas são acumuladas e gravadas em lote
+(write-behind) por um timer de write_interval segundos, fora do event loop.
+Um crash perde no máximo update_interval + write_interval de alterações.
+
+O mesmo timer remove os checkouts abandonados (TTL) a cada
+eviction_interval segundos: do backend e do user_data em memória da
+Application. O estado da conversa em memória expira pelo
+conversation_timeout do ConversationHandler (bot/main.py usa o mesmo TTL).
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+from copy import deepcopy
+from typing import Dict, Any, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# Tempo padrão para um checkout abandonado expirar (em segundos)
+DEFAULT_TTL = 24 * 60 * 60
+
+def _dumps(data: Any) -> str:
+    """Serialização compacta dos registros"""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+def _encode_key(key: Tuple) -> str:
+    """Converte a chave da conversa (ex: (chat_id, user_id)) em texto"""
+    return ':'.join(str(part) for part in key)
+
+def _decode_key(key: str) -> Tuple:
+    parts = []
+    for part in key.split(':'):
+        try:
+            parts.append(int(part))
+        except ValueError:
+            parts.append(part)
+    return tuple(parts)
+
+class StateStore:
+    """Interface dos backends de armazenamento de estado"""
+
+    def load_users(self, min_updated_at: float) -> Dict[int, Dict]:
+        """Retorna o user_data de todos os usuários atualizados após min_updated_at"""
+        raise NotImplementedError
+
+    def load_conversations(self, name: str, min_updated_at: float) -> Dict[Tuple, Any]:
+        """Retorna os estados da conversa `name` atualizados após min_updated_at"""
+        raise NotImplementedError
+
+    def write_batch(
+        self,
+        users: Dict[int, Optional[Dict]],
+        conversations: Dict[Tuple[str, Tuple], Any],
+        updated_at: float
+    ):
+        """Grava um lote de alterações. Valores None removem o registro."""
+        raise NotImplementedError
+
+    def evict(self, min_updated_at: float) -> int:
+        """Remove registros não atualizados desde min_updated_at"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class SQLiteStateStore(StateStore):
+    """Backend em SQLite local (um registro compacto por usuário)"""
+
+    def __init__(self, path: str = "bot_state.sqlite3"):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS user_data (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS conversations (
+                name TEXT NOT NULL,
+                key TEXT NOT NULL,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (name, key)
+            );
+            CREATE INDEX IF NOT EXISTS idx_user_data_updated_at ON user_data(updated_at);
+            CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations(updated_at);
+        """)
+        self.connection.commit()
+
+    def load_users(self, min_updated_at: float) -> Dict[int, Dict]:
+        rows = self.connection.execute(
+            "SELECT user_id, data FROM user_data WHERE updated_at >= ?", (min_updated_at,)
+        )
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def load_conversations(self, name: str, min_updated_at: float) -> Dict[Tuple, Any]:
+        rows = self.connection.execute(
+            "SELECT key, state FROM conversations WHERE name = ? AND updated_at >= ?",
+            (name, min_updated_at)
+        )
+        return {_decode_key(key): json.loads(state) for key, state in rows}
+
+    def write_batch(
+        self,
+        users: Dict[int, Optional[Dict]],
+        conversations: Dict[Tuple[str, Tuple], Any],
+        updated_at: float
+    ):
+        with self.connection:
+            for user_id, data in users.items():
+                if data:
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO user_data (user_id, data, updated_at) VALUES (?, ?, ?)",
+                        (user_id, _dumps(data), updated_at)
+                    )
+                else:
+                    self.connection.execute("DELETE FROM user_data WHERE user_id = ?", (user_id,))
+
+            for (name, key), state in conversations.items():
+                if state is None:
+                    self.connection.execute(
+                        "DELETE FROM conversations WHERE name = ? AND key = ?",
+                        (name, _encode_key(key))
+                    )
+                else:
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO conversations (name, key, state, updated_at) VALUES (?, ?, ?, ?)",
+                        (name, _encode_key(key), _dumps(state), updated_at)
+                    )
+
+    def evict(self, min_updated_at: float) -> int:
+        with self.connection:
+            users = self.connection.execute(
+                "DELETE FROM user_data WHERE updated_at < ?", (min_updated_at,)
+            ).rowcount
+            conversations = self.connection.execute(
+                "DELETE FROM conversations WHERE updated_at < ?", (min_updated_at,)
+            ).rowcount
+        return users + conversations
+
+    def close(self):
+        self.connection.close()
+
+class JSONFileStateStore(StateStore):
+    """Backend em arquivo JSON, reescrito atomicamente a cada lote"""
+
+    def __init__(self, path: str = "bot_state.json"):
+        self.path = path
+        self.users: Dict[str, list] = {}
+        self.conversations: Dict[str, Dict[str, list]] = {}
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                content = json.load(file)
+            self.users = content.get("users", {})
+            self.conversations = content.get("conversations", {})
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(_dumps({"users": self.users, "conversations": self.conversations}))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+    def load_users(self, min_updated_at: float) -> Dict[int, Dict]:
+        # Registro compacto: [data, updated_at]
+        return {
+            int(user_id): record[0]
+            for user_id, record in self.users.items()
+            if record[1] >= min_updated_at
+        }
+
+    def load_conversations(self, name: str, min_updated_at: float) -> Dict[Tuple, Any]:
+        return {
+            _decode_key(key): record[0]
+            for key, record in self.conversations.get(name, {}).items()
+            if record[1] >= min_updated_at
+        }
+
+    def write_batch(
+        self,
+        users: Dict[int, Optional[Dict]],
+        conversations: Dict[Tuple[str, Tuple], Any],
+        updated_at: float
+    ):
+        for user_id, data in users.items():
+            if data:
+                self.users[str(user_id)] = [data, updated_at]
+            else:
+                self.users.pop(str(user_id), None)
+
+        for (name, key), state in conversations.items():
+            states = self.conversations.setdefault(name, {})
+            if state is None:
+                states.pop(_encode_key(key), None)
+            else:
+                states[_encode_key(key)] = [state, updated_at]
+
+        self._save()
+
+    def evict(self, min_updated_at: float) -> int:
+        removed = 0
+
+        for user_id in [user_id for user_id, record in self.users.items() if record[1] < min_updated_at]:
+            del self.users[user_id]
+            removed += 1
+
+        for states in self.conversations.values():
+            for key in [key for key, record in states.items() if record[1] < min_updated_at]:
+                del states[key]
+                removed += 1
+
+        if removed:
+            self._save()
+
+        return removed
+
+class ConversationPersistence(BasePersistence):
+    """
+    Persistência do python-telegram-bot para conversas e user_data
+
+    As alterações ficam em um buffer e são gravadas no backend em lote a cada
+    write_interval segundos (timer iniciado por start()), quando o buffer
+    atinge batch_size ou quando a aplicação chama flush().
+    """
+
+    def __init__(
+        self,
+        store: StateStore,
+        ttl: float = DEFAULT_TTL,
+        batch_size: int = 100,
+        update_interval: float = 5,
+        write_interval: float = 1,
+        eviction_interval: float = 300
+    ):
+        """
+        Args:
+            store: Backend de armazenamento (SQLiteStateStore, JSONFileStateStore, ...)
+            ttl: Tempo em segundos até um checkout sem atividade ser descartado
+            batch_size: Quantidade de alterações pendentes que força uma gravação
+            update_interval: Intervalo em segundos entre as sincronizações da aplicação
+            write_interval: Intervalo em segundos entre as gravações do buffer
+            eviction_interval: Intervalo em segundos entre as remoções de checkouts expirados
+        """
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.store = store
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.pending_users: Dict[int, Optional[Dict]] = {}
+        self.pending_conversations: Dict[Tuple[str, Tuple], Any] = {}
+        self.write_interval = write_interval
+        self.eviction_interval = eviction_interval
+        self.last_eviction = time.monotonic()
+        self.timer: Optional[asyncio.Task] = None
+        # Uma operação no backend por vez (as gravações rodam em threads)
+        self.store_lock = asyncio.Lock()
+        # Última atividade de cada usuário com user_data em memória
+        self.user_activity: Dict[int, float] = {}
+        self.application = None
+
+    def _min_updated_at(self) -> float:
+        return time.time() - self.ttl
+
+    async def _maybe_write(self):
+        if len(self.pending_users) + len(self.pending_conversations) >= self.batch_size:
+            await self._write()
+
+    async def _write(self):
+        if not self.pending_users and not self.pending_conversations:
+            return
+
+        users, self.pending_users = self.pending_users, {}
+        conversations, self.pending_conversations = self.pending_conversations, {}
+        try:
+            async with self.store_lock:
+                await asyncio.to_thread(self.store.write_batch, users, conversations, time.time())
+        except Exception:
+            # Devolver ao buffer sem sobrescrever alterações mais novas
+            for user_id, data in users.items():
+                self.pending_users.setdefault(user_id, data)
+            for key, state in conversations.items():
+                self.pending_conversations.setdefault(key, state)
+            raise
+
+    def start(self, application=None):
+        """
+        Inicia o timer de gravação (com o event loop rodando, ex: no post_init)
+
+        Args:
+            application: Application cujo user_data expirado é descartado da memória
+        """
+        self.application = application
+        if self.timer is None:
+            self.timer = asyncio.get_running_loop().create_task(self._run_timer())
+
+    async def _run_timer(self):
+        while True:
+            await asyncio.sleep(self.write_interval)
+            try:
+                if time.monotonic() - self.last_eviction >= self.eviction_interval:
+                    await self.evict_expired()
+                else:
+                    await self._write()
+            except Exception as e:
+                logger.error(f"Erro ao gravar o estado das conversas: {str(e)}")
+
+    async def _stop_timer(self):
+        if self.timer is None:
+            return
+        self.timer.cancel()
+        try:
+            await self.timer
+        except asyncio.CancelledError:
+            pass
+        self.timer = None
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        users = self.store.load_users(self._min_updated_at())
+        now = time.time()
+        self.user_activity = {user_id: now for user_id in users}
+        return users
+
+    async def update_user_data(self, user_id: int, data: Dict):
+        self.pending_users[user_id] = deepcopy(data)
+        self.user_activity[user_id] = time.time()
+        await self._maybe_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict):
+        pass
+
+    async def drop_user_data(self, user_id: int):
+        self.pending_users[user_id] = None
+        self.user_activity.pop(user_id, None)
+        await self._maybe_write()
+
+    async def get_conversations(self, name: str) -> Dict[Tuple, Any]:
+        return self.store.load_conversations(name, self._min_updated_at())
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]):
+        self.pending_conversations[(name, key)] = new_state
+        await self._maybe_write()
+
+    async def evict_expired(self) -> int:
+        """Grava o buffer e remove checkouts abandonados do backend e da memória"""
+        await self._write()
+        self.last_eviction = time.monotonic()
+        min_updated_at = self._min_updated_at()
+        async with self.store_lock:
+            removed = await asyncio.to_thread(self.store.evict, min_updated_at)
+        if removed:
+            logger.info(f"{removed} registros de checkout expirados removidos")
+
+        expired = [user_id for user_id, active_at in self.user_activity.items() if active_at < min_updated_at]
+        for user_id in expired:
+            del self.user_activity[user_id]
+            if self.application is not None:
+                self.application.drop_user_data(user_id)
+        return removed
+
+    async def flush(self):
+        await self._stop_timer()
+        await self.evict_expired()
+        self.store.close()
+
+    # Dados de chat, do bot e de callbacks não são persistidos
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: Dict):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def update_bot_data(self, data: Dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict):
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data):
+        pass
+
+def create_persistence(url: Optional[str] = None, **kwargs) -> ConversationPersistence:
+    """
+    Cria a persistência a partir de uma URL simples:
+    sqlite:///caminho/arquivo.sqlite3 ou file:///caminho/arquivo.json
+    """
+    url = url or os.getenv("BOT_STATE_URL", "sqlite:///bot_state.sqlite3")
+
+    if url.startswith("sqlite:///"):
+        store = SQLiteStateStore(url[len("sqlite:///"):])
+    elif url.startswith("file:///"):
+        store = JSONFileStateStore(url[len("file:///"):])
+    else:
+        raise ValueError(f"Backend de persistência não suportado: {url}")
+
+    return ConversationPersistence(store, **kwargs)
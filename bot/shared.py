@@ -0,0 +1,52 @@
+"""
+Módulos compartilhados com a API
+
+O bot roda em um processo separado, com imports a partir da pasta bot/. A
+raiz do repositório entra no sys.path para que o bot use o mesmo código da
+API em vez de cópias que divergem com o tempo:
+
+    api/resilience.py       circuit breaker, timeout adaptativo, bulkhead e hedging
+    api/logging_config.py   logs em JSON escritos por uma thread, com amostragem
+    api/tracing.py          spans dos handlers, das chamadas à API e dos envios ao
+                            Telegram (service.name black-in-bot-bot, salvo se
+                            TRACING_SERVICE_NAME estiver definida)
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Nome do serviço nos spans exportados (lido por api.tracing no import)
+os.environ.setdefault("TRACING_SERVICE_NAME", "black-in-bot-bot")
+
+from api.logging_config import setup_logging, logging_stats  # noqa: E402
+from api.resilience import (  # noqa: E402
+    dependency,
+    dependencies,
+    dependency_stats,
+    AdaptiveTimeout,
+    DependencyUnavailable,
+    CircuitOpenError,
+    BulkheadFullError,
+    http_failure,
+)
+from api.tracing import tracer, traced, TracedTelegramRequest  # noqa: E402
+
+__all__ = [
+    "setup_logging",
+    "logging_stats",
+    "dependency",
+    "dependencies",
+    "dependency_stats",
+    "AdaptiveTimeout",
+    "DependencyUnavailable",
+    "CircuitOpenError",
+    "BulkheadFullError",
+    "http_failure",
+    "tracer",
+    "traced",
+    "TracedTelegramRequest",
+]
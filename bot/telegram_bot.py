@@ -8,70 +8,101 @@ import os
 import asyncio
 import logging
 import json
-import re
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 
 import aiohttp
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 from telegram.constants import ParseMode
 
+from activation_codes import PendingCodeIndex, normalize_activation_code
+from menu_cache import MenuCache
+from shared import (
+    dependency, AdaptiveTimeout, DependencyUnavailable, http_failure, setup_logging,
+    tracer, traced, TracedTelegramRequest
+)
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
-# Configuração de logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Configuração de logging (JSON escrito em background; mensagens de grupo amostradas)
+setup_logging(sample_rates={
+    'telegram.group_message': 0.01
+})
 logger = logging.getLogger(__name__)
 
 # Configurações
 API_BASE_URL = os.getenv('API_BASE_URL', 'http://localhost:3025')
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 
-if not BOT_TOKEN:
-    BOT_TOKEN = "7940039994:AAGLXFQNGHasfyrjsmTSvWTjQ2c-_0Dfy2w"
-
-print(f"🔑 Token: {BOT_TOKEN[:25]}...")
-print(f"🌐 API: {API_BASE_URL}")
-
 class BotManager:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
+        self.pending_codes = PendingCodeIndex(self.get_pending_activation_codes)
+        # Breaker, bulkhead e timeout das chamadas à API
+        self.api = dependency('api', max_concurrent=50, timeout=AdaptiveTimeout(initial=10.0, minimum=2.0, maximum=30.0))
         
     async def init_session(self):
         if not self.session:
             self.session = aiohttp.ClientSession()
     
-    async def make_request(self, method: str, url: str, **kwargs) -> Dict:
+    async def make_request(self, method: str, url: str, idempotent: bool = False, **kwargs) -> Dict:
+        """
+        Chamada à API com circuit breaker, bulkhead e timeout adaptativo;
+        leituras idempotentes (idempotent=True) usam hedging
+        """
         await self.init_session()
-        try:
-            async with self.session.request(method, url, **kwargs) as response:
-                if response.content_type == 'application/json':
-                    return await response.json()
-                else:
+        path = url[len(API_BASE_URL):] if url.startswith(API_BASE_URL) else url
+        with tracer.span(f"api {method} {path}", kind="client") as span:
+            # traceparent liga os spans da API a este trace
+            kwargs['headers'] = tracer.inject(kwargs.get('headers'))
+
+            async def send(timeout: float):
+                async with self.session.request(
+                    method, url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs
+                ) as response:
+                    if response.content_type == 'application/json':
+                        return response.status, await response.json()
                     text = await response.text()
-                    return {'error': f'Resposta não-JSON: {text}'}
-        except Exception as e:
-            logger.error(f"Erro na requisição {method} {url}: {e}")
-            return {'error': str(e)}
+                    return response.status, {'error': f'Resposta não-JSON: {text}'}
+
+            try:
+                status, data = await self.api.call(
+                    send, lambda result: http_failure(result[0]), hedge=idempotent
+                )
+                if span is not None:
+                    span.attributes['http.status_code'] = status
+                return data
+            except DependencyUnavailable as e:
+                if span is not None:
+                    span.error = str(e)
+                return {'error': str(e)}
+            except asyncio.TimeoutError:
+                logger.error(f"Timeout na requisição {method} {url}")
+                if span is not None:
+                    span.error = 'timeout'
+                return {'error': 'Timeout na requisição à API'}
+            except Exception as e:
+                logger.error(f"Erro na requisição {method} {url}: {e}")
+                if span is not None:
+                    span.error = str(e)
+                return {'error': str(e)}
     
-    async def check_activation_code(self, code: str) -> Dict:
-        """Verificar se código de ativação é válido"""
-        try:
-            url = f"{API_BASE_URL}/api/telegram/activate-bot"
-            response = await self.make_request('POST', url, json={
-                'activation_code': code,
-                'telegram_user_id': '0',
-                'chat_id': '0',
-                'chat_type': 'check'
-            })
-            return response
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+    async def get_pending_activation_codes(self) -> Optional[List[Dict]]:
+        """Buscar códigos de ativação pendentes do bot"""
+        url = f"{API_BASE_URL}/api/telegram/activation-codes/pending"
+        response = await self.make_request('POST', url, idempotent=True, json={'token': BOT_TOKEN})
+        
+        if not response.get('success'):
+            return None
+        
+        return response.get('codes', [])
+    
+    async def check_activation_code(self, code: str) -> bool:
+        """Verificar se código de ativação está pendente (consulta o índice local)"""
+        return await self.pending_codes.contains(code)
     
     async def activate_bot(self, code: str, user_id: str, chat_id: str) -> Dict:
         """Ativar bot com código"""
@@ -91,7 +122,7 @@ class BotManager:
         """Buscar configuração do bot"""
         try:
             url = f"{API_BASE_URL}/api/telegram/config"
-            response = await self.make_request('POST', url, json={'token': BOT_TOKEN})
+            response = await self.make_request('POST', url, idempotent=True, json={'token': BOT_TOKEN})
             return response
         except Exception as e:
             return {'success': False, 'error': str(e)}
@@ -100,7 +131,7 @@ class BotManager:
         """Buscar planos do bot"""
         try:
             url = f"{API_BASE_URL}/api/telegram/list-plans"
-            response = await self.make_request('POST', url, json={'bot_id': bot_id})
+            response = await self.make_request('POST', url, idempotent=True, json={'bot_id': bot_id})
             return response
         except Exception as e:
             return {'success': False, 'error': str(e)}
@@ -108,30 +139,33 @@ class BotManager:
 # Instância global
 bot_manager = BotManager()
 
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handler para comando /start"""
-    try:
-        print(f"🔄 /start recebido de usuário {update.effective_user.id}")
-        
-        # Buscar configuração do bot
-        config_response = await bot_manager.get_bot_config()
-        
-        if not config_response.get('success'):
-            await update.message.reply_text(
-                "❌ Erro ao carregar configuração do bot. Tente novamente mais tarde."
-            )
-            return
-        
-        bot_data = config_response.get('bot')
-        if not bot_data:
-            await update.message.reply_text(
-                "❌ Bot não encontrado na base de dados."
-            )
-            return
-        
-        # Verificar se bot está ativado
-        if not bot_data.get('is_activated'):
-            message = """
+# Menus de planos já renderizados (chave: token do bot)
+menu_cache = MenuCache()
+
+async def load_menu(update: Update):
+    """
+    Busca configuração e planos na API e atualiza o menu em cache.
+    Responde ao usuário e retorna None quando o menu não pode ser exibido.
+    """
+    # Buscar configuração do bot
+    config_response = await bot_manager.get_bot_config()
+    
+    if not config_response.get('success'):
+        await update.message.reply_text(
+            "❌ Erro ao carregar configuração do bot. Tente novamente mais tarde."
+        )
+        return None
+    
+    bot_data = config_response.get('bot')
+    if not bot_data:
+        await update.message.reply_text(
+            "❌ Bot não encontrado na base de dados."
+        )
+        return None
+    
+    # Verificar se bot está ativado
+    if not bot_data.get('is_activated'):
+        message = """
 🤖 **Bot ainda não ativado**
 
 Este bot ainda não foi ativado pelo proprietário.
@@ -143,44 +177,47 @@ Este bot ainda não foi ativado pelo proprietário.
 
 ⏰ Códigos expiram em 10 minutos
             """
-            await update.message.reply_text(message.strip(), parse_mode=ParseMode.MARKDOWN)
-            return
-        
-        print(f"✅ Bot ativado! Carregando planos...")
+        await update.message.reply_text(message.strip(), parse_mode=ParseMode.MARKDOWN)
+        return None
+    
+    logger.debug("Bot ativado, carregando planos", extra={'event': 'menu.load'})
+    
+    # Bot ativado - buscar planos
+    plans_response = await bot_manager.get_plans(bot_data['id'])
+    
+    if not plans_response.get('success'):
+        await update.message.reply_text(
+            "❌ Erro ao carregar planos. Tente novamente mais tarde."
+        )
+        return None
+    
+    return menu_cache.update(BOT_TOKEN, bot_data, plans_response.get('plans', []))
+
+@traced("bot.start_command", kind="server")
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler para comando /start"""
+    try:
+        logger.info(
+            "/start recebido de usuário %s", update.effective_user.id,
+            extra={'event': 'telegram.start', 'user_id': update.effective_user.id}
+        )
         
-        # Bot ativado - buscar planos
-        plans_response = await bot_manager.get_plans(bot_data['id'])
+        # Menu pré-renderizado; a API só é consultada quando o cache expira
+        menu = menu_cache.get(BOT_TOKEN) or await load_menu(update)
         
-        if not plans_response.get('success'):
-            await update.message.reply_text(
-                "❌ Erro ao carregar planos. Tente novamente mais tarde."
-            )
+        if menu is None:
             return
         
-        plans = plans_response.get('plans', [])
+        welcome_message = menu.text
+        reply_markup = menu.reply_markup
         
-        # Mensagem de boas-vindas
-        welcome_message = bot_data.get('welcome_message', f"🤖 Bem-vindo ao {bot_data['name']}!")
-        
-        if not plans:
-            await update.message.reply_text(
-                f"{welcome_message}\n\n❌ Nenhum plano disponível no momento."
-            )
+        if reply_markup is None:
+            await update.message.reply_text(welcome_message)
             return
         
-        # Criar botões dos planos
-        keyboard = []
-        for plan in plans:
-            price_text = f"R$ {plan['price']:.2f}".replace('.', ',')
-            button_text = f"💎 {plan['name']} - {price_text}"
-            callback_data = f"plan_{plan['id']}"
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=callback_data)])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         # Enviar mensagem com mídia se disponível
-        media_url = bot_data.get('welcome_media_url')
-        media_type = bot_data.get('welcome_media_type')
+        media_url = menu.media_url
+        media_type = menu.media_type
         
         try:
             if media_url and media_type == 'photo':
@@ -206,17 +243,17 @@ Este bot ainda não foi ativado pelo proprietário.
                     parse_mode=ParseMode.MARKDOWN
                 )
         except Exception as e:
-            print(f"❌ Erro ao enviar mídia: {e}")
+            logger.warning("Erro ao enviar mídia: %s", e, extra={'event': 'telegram.media_error'})
             await update.message.reply_text(
                 welcome_message,
                 reply_markup=reply_markup,
                 parse_mode=ParseMode.MARKDOWN
             )
         
-        print(f"✅ Mensagem de boas-vindas enviada para usuário {update.effective_user.id}")
+        logger.debug("Mensagem de boas-vindas enviada para usuário %s", update.effective_user.id)
         
     except Exception as e:
-        print(f"❌ Erro no /start: {e}")
+        logger.exception("Erro no /start: %s", e, extra={'event': 'telegram.start_error'})
         await update.message.reply_text(
             "❌ Erro interno. Tente novamente mais tarde."
         )
@@ -224,41 +261,66 @@ Este bot ainda não foi ativado pelo proprietário.
 async def group_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler para mensagens nos grupos (códigos de ativação)"""
     try:
-        message_text = update.message.text.strip().upper()
         user_id = update.effective_user.id
         chat_id = update.effective_chat.id
         
-        print(f"📱 Mensagem no grupo: '{message_text}' de {user_id} no chat {chat_id}")
-        
         # Verificar se é código de ativação (formato: XXXX-XXXX)
-        if not re.match(r'^[A-Z0-9]{4}-[A-Z0-9]{4}$', message_text):
-            print(f"⚠️ Não é código de ativação: {message_text}")
-            return
+        message_text = normalize_activation_code(update.message.text)
         
-        print(f"🔑 Código de ativação detectado: {message_text}")
-        
-        # Verificar e ativar bot
-        result = await bot_manager.activate_bot(message_text, str(user_id), str(chat_id))
+        if not message_text:
+            # Evento de alto volume: amostrado e sem o texto da mensagem
+            logger.info(
+                "Mensagem no grupo ignorada (não é código de ativação)",
+                extra={'event': 'telegram.group_message', 'chat_id': chat_id, 'user_id': user_id}
+            )
+            return
         
-        print(f"🔄 Resultado: {result}")
+        logger.info(
+            "Código de ativação recebido: %s", message_text,
+            extra={'event': 'activation.code_received', 'chat_id': chat_id, 'user_id': user_id}
+        )
         
-        if result.get('success'):
-            print(f"🎉 BOT ATIVADO COM SUCESSO!")
-            await update.message.reply_text(
-                "✅ Bot ativado com sucesso!",
-                reply_to_message_id=update.message.message_id
-            )
-        else:
-            error_msg = result.get('message', 'Código inválido ou expirado')
-            print(f"❌ Erro na ativação: {error_msg}")
-            await update.message.reply_text(
-                f"❌ {error_msg}",
-                reply_to_message_id=update.message.message_id
-            )
+        await activate_from_group(update, message_text, str(user_id), str(chat_id))
     
     except Exception as e:
-        print(f"❌ Erro ao processar mensagem do grupo: {e}")
+        logger.exception("Erro ao processar mensagem do grupo: %s", e, extra={'event': 'telegram.group_error'})
 
+# Só as mensagens com código viram traces; texto comum do grupo sai antes, sem custo de span
+@traced("bot.group_message_handler", kind="server")
+async def activate_from_group(update: Update, code: str, user_id: str, chat_id: str):
+    """Ativa o bot com o código enviado no grupo e responde à mensagem"""
+    # Consultar o índice local antes de ir à API
+    if not await bot_manager.check_activation_code(code):
+        logger.info("Código não está pendente: %s", code, extra={'event': 'activation.code_unknown'})
+        await update.message.reply_text(
+            "❌ Código de ativação inválido ou expirado",
+            reply_to_message_id=update.message.message_id
+        )
+        return
+    
+    # Verificar e ativar bot
+    result = await bot_manager.activate_bot(code, user_id, chat_id)
+    
+    logger.debug("Resultado da ativação: %s", result)
+    
+    # O código foi consumido (ou não é mais válido) em ambos os casos
+    bot_manager.pending_codes.discard(code)
+    
+    if result.get('success'):
+        logger.info("Bot ativado pelo código %s no chat %s", code, chat_id, extra={'event': 'activation.success'})
+        await update.message.reply_text(
+            "✅ Bot ativado com sucesso!",
+            reply_to_message_id=update.message.message_id
+        )
+    else:
+        error_msg = result.get('message', 'Código inválido ou expirado')
+        logger.warning("Erro na ativação: %s", error_msg, extra={'event': 'activation.failed'})
+        await update.message.reply_text(
+            f"❌ {error_msg}",
+            reply_to_message_id=update.message.message_id
+        )
+
+@traced("bot.plan_callback_handler", kind="server")
 async def plan_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler para seleção de planos"""
     try:
@@ -269,7 +331,7 @@ async def plan_callback_handler(update: Update, context: ContextTypes.DEFAULT_TY
             return
         
         plan_id = query.data.replace('plan_', '')
-        print(f"💎 Plano selecionado: {plan_id}")
+        logger.info("Plano selecionado: %s", plan_id, extra={'event': 'telegram.plan_selected'})
         
         # Aqui você pode implementar a lógica de pagamento
         await query.edit_message_text(
@@ -278,22 +340,24 @@ async def plan_callback_handler(update: Update, context: ContextTypes.DEFAULT_TY
         )
         
     except Exception as e:
-        print(f"❌ Erro na seleção de plano: {e}")
+        logger.exception("Erro na seleção de plano: %s", e, extra={'event': 'telegram.plan_error'})
 
 def main():
     """Função principal"""
     if not BOT_TOKEN:
-        print("❌ TOKEN não configurado!")
+        logger.error("TELEGRAM_BOT_TOKEN não configurado", extra={'event': 'bot.config_error'})
         return
     
-    print(f"🚀 Iniciando bot...")
+    # Só o ID do bot (parte pública do token) vai para o log
+    logger.info(
+        "Iniciando bot %s (API: %s)", BOT_TOKEN.split(':', 1)[0], API_BASE_URL,
+        extra={'event': 'bot.start'}
+    )
     
     # Criar aplicação
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = ApplicationBuilder().token(BOT_TOKEN).request(TracedTelegramRequest()).build()
     
     # Configurar handlers
-    print("⚙️ Configurando handlers...")
-    
     # Handler para /start
     app.add_handler(CommandHandler("start", start_command))
     
@@ -306,11 +370,10 @@ def main():
     # Handler para callback de planos
     app.add_handler(CallbackQueryHandler(plan_callback_handler, pattern=r"^plan_"))
     
-    print("📱 Iniciando polling...")
-    print("🔥 BOT FUNCIONANDO!")
+    logger.info("Iniciando polling", extra={'event': 'bot.polling'})
     
-    # Iniciar polling
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    # Iniciar polling (apenas os tipos de update tratados pelos handlers)
+    app.run_polling(allowed_updates=[Update.MESSAGE, Update.CALLBACK_QUERY])
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
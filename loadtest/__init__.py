@@ -0,0 +1,17 @@
+"""
+Testes de carga da API (api/main.py)
+
+Sobe simuladores locais da Bot API do Telegram, do PushinPay, do Mercado Pago
+e do PostgREST (Supabase), inicia a API apontando para eles e dispara
+requisições em taxa controlada, reproduzindo updates gravados do Telegram
+(web/test-webhook-start*.json) e as chamadas dos clientes e gateways.
+
+Uso:
+    python -m loadtest --rate 50 --duration 30
+    python -m loadtest --stages 20:10,100:20,200:20 --workers 2 --json resultado.json
+    python -m loadtest --scenarios telegram.webhook --rate 300 --max-p99-ms 250
+
+O relatório traz, por endpoint, requisições, erros, vazão e latências
+p50/p95/p99; --max-p95-ms/--max-p99-ms/--max-error-rate fazem o comando
+sair com código 1 quando excedidos (para uso antes do deploy).
+"""
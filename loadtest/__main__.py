@@ -0,0 +1,171 @@
+"""
+Linha de comando dos testes de carga (python -m loadtest --help)
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from .fixtures import Fixtures, ROOT
+from .stubs import Stubs, _free_port
+from .scenarios import SCENARIOS, select_scenarios
+from .runner import run_load, format_report, check_thresholds
+
+def parse_stages(text: str) -> List[Tuple[float, float]]:
+    """'20:10,100:30' -> [(20 req/s, 10 s), (100 req/s, 30 s)]"""
+    stages = []
+    for part in text.split(","):
+        rate, _, duration = part.partition(":")
+        stages.append((float(rate), float(duration)))
+    if any(rate <= 0 or duration <= 0 for rate, duration in stages):
+        raise ValueError("Taxa e duração dos estágios devem ser positivas")
+    return stages
+
+def parse_latency(text: Optional[str]) -> Dict[str, float]:
+    """'postgrest=5,telegram=40' (ms) -> {"postgrest": 0.005, "telegram": 0.04}"""
+    latency = {}
+    for part in (text or "").split(","):
+        if part.strip():
+            name, _, milliseconds = part.partition("=")
+            latency[name.strip()] = float(milliseconds) / 1000
+    return latency
+
+class ApiProcess:
+    """A API (uvicorn api.main:app) em um processo separado apontando para os simuladores"""
+
+    def __init__(self, env: Dict[str, str], workers: int = 1, port: Optional[int] = None):
+        self.port = port or _free_port()
+        self.env = {**os.environ, **env}
+        self.workers = workers
+        self.process = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 30.0):
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "api.main:app",
+                "--host", "127.0.0.1", "--port", str(self.port),
+                "--workers", str(self.workers), "--log-level", "warning", "--no-access-log"
+            ],
+            cwd=ROOT, env=self.env
+        )
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"A API encerrou ao iniciar (código {self.process.returncode})")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("A API não respondeu em /health")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rate", type=float, default=20, help="Requisições por segundo (estágio único)")
+    parser.add_argument("--duration", type=float, default=10, help="Duração em segundos (estágio único)")
+    parser.add_argument("--stages", help="Estágios taxa:duração separados por vírgula (ex.: 20:10,100:30)")
+    parser.add_argument("--poisson", action="store_true", help="Chegadas com intervalos exponenciais")
+    parser.add_argument("--scenarios", help="Cenários separados por vírgula (padrão: todos)")
+    parser.add_argument("--list", action="store_true", help="Lista os cenários e pesos")
+    parser.add_argument("--updates", nargs="*", help="Arquivos JSON com updates do Telegram gravados")
+    parser.add_argument("--bots", type=int, default=20, help="Bots semeados no PostgREST simulado")
+    parser.add_argument("--payments-per-bot", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="Workers do uvicorn da API")
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument(
+        "--stub-latency", default="postgrest=5,telegram=30,pushinpay=80,mercadopago=80",
+        help="Latência artificial (ms) por simulador"
+    )
+    parser.add_argument("--target", help="URL de uma API já iniciada (não sobe simuladores nem a API)")
+    parser.add_argument("--stubs-only", action="store_true", help="Só sobe os simuladores e mostra o ambiente")
+    parser.add_argument("--json", metavar="ARQUIVO", help="Grava o relatório em JSON")
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-p99-ms", type=float)
+    parser.add_argument("--max-error-rate", type=float)
+    args = parser.parse_args()
+
+    if args.list:
+        for scenario in SCENARIOS:
+            print(f"{scenario.name:<32} peso {scenario.weight}")
+        return
+
+    stages = parse_stages(args.stages) if args.stages else parse_stages(f"{args.rate}:{args.duration}")
+    scenarios = select_scenarios(args.scenarios.split(",") if args.scenarios else None)
+
+    fixtures = Fixtures(bots=args.bots, payments_per_bot=args.payments_per_bot, seed=args.seed)
+    fixtures.load_updates([Path(path) for path in args.updates] if args.updates else None)
+
+    stubs = api = None
+    try:
+        if not args.target:
+            stubs = Stubs(fixtures, parse_latency(args.stub_latency))
+            stubs.start()
+
+            if args.stubs_only:
+                for name, value in stubs.env().items():
+                    print(f"{name}={value}")
+                print("\nSimuladores no ar; Ctrl+C para encerrar")
+                while True:
+                    time.sleep(3600)
+
+            api = ApiProcess(stubs.env(), workers=args.workers)
+            api.start()
+
+        base_url = args.target or api.url
+        print(f"Carga em {base_url}: {', '.join(f'{rate:g} req/s por {duration:g}s' for rate, duration in stages)}")
+
+        result = asyncio.run(run_load(
+            base_url, scenarios, fixtures, stages,
+            seed=args.seed, poisson=args.poisson, max_connections=args.max_connections
+        ))
+    except KeyboardInterrupt:
+        return
+    finally:
+        if api:
+            api.stop()
+        if stubs:
+            stubs.stop()
+
+    report = result.to_dict()
+    if stubs:
+        report["stub_calls"] = stubs.stats()
+
+    print()
+    print(format_report(report, report.get("stub_calls")))
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\nRelatório gravado em {args.json}")
+
+    violations = check_thresholds(report, args.max_p95_ms, args.max_p99_ms, args.max_error_rate)
+    if violations:
+        print("\nLimites excedidos:")
+        for violation in violations:
+            print(f"  {violation}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
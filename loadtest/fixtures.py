@@ -0,0 +1,180 @@
+"""
+Dados de teste carregados no PostgREST simulado e updates do Telegram gravados
+
+Os IDs são derivados da semente (uuid5), então uma execução com --target
+contra uma API iniciada com --stubs-only usa os mesmos bots, planos e
+pagamentos.
+"""
+
+import copy
+import json
+import uuid
+import random
+import itertools
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Updates gravados reproduzidos contra /telegram/webhook
+DEFAULT_UPDATE_FILES = ("web/test-webhook-start.json", "web/test-webhook-start-bot-teste.json")
+
+# Prefixo do external_id dos pagamentos semeados; o Mercado Pago simulado
+# devolve external_reference = prefixo + id do pagamento no gateway
+EXTERNAL_ID_PREFIX = "loadtest-"
+
+# Segredo com que os cenários assinam os webhooks dos gateways
+WEBHOOK_SECRET = "loadtest-webhook-secret"
+
+PLAN_TEMPLATES = (
+    {"name": "Mensal", "price": 29.9, "period": "monthly", "days_access": 30},
+    {"name": "Trimestral", "price": 79.9, "period": "quarterly", "days_access": 90},
+    {"name": "Vitalício", "price": 199.9, "period": "lifetime", "days_access": 0},
+)
+
+class Fixtures:
+    """Usuários, bots, planos, grupos e pagamentos usados pelos cenários"""
+
+    def __init__(self, bots: int = 20, payments_per_bot: int = 50, users: int = 1000, seed: int = 1):
+        self.seed = seed
+        self.namespace = uuid.uuid5(uuid.NAMESPACE_URL, f"blackinbot-loadtest-{seed}")
+        self.rng = random.Random(seed)
+        self.telegram_users = [str(700000000 + index) for index in range(users)]
+        self.tables: Dict[str, List[Dict[str, Any]]] = {
+            "users": [], "bots": [], "plans": [], "groups": [], "payments": [], "sales": [],
+            "bot_activation_codes": [], "user_accesses": [],
+            "sales_daily_rollups": [], "sales_plan_daily_rollups": []
+        }
+        self.updates: List[Dict[str, Any]] = []
+        self._update_ids = itertools.count(1)
+        self._build(bots, payments_per_bot)
+
+    def _id(self, kind: str, *parts: Any) -> str:
+        return str(uuid.uuid5(self.namespace, ":".join([kind, *map(str, parts)])))
+
+    def _build(self, bots: int, payments_per_bot: int):
+        now = datetime.now(timezone.utc)
+        owners = max(1, bots // 4)
+
+        for index in range(owners):
+            self.tables["users"].append({
+                "id": self._id("user", index),
+                "email": f"owner{index}@loadtest.local",
+                "name": f"Owner {index}",
+                "telegram_id": None,
+                "created_at": (now - timedelta(days=365)).isoformat(),
+                "updated_at": None
+            })
+
+        payment_number = itertools.count(1)
+        for index in range(bots):
+            bot_id = self._id("bot", index)
+            created = now - timedelta(days=bots - index)
+            self.tables["bots"].append({
+                "id": bot_id,
+                "name": f"Bot de carga {index}",
+                "token": f"{600000000 + index}:LOADTEST{index:04d}{'x' * 24}",
+                "description": "Bot usado nos testes de carga",
+                "owner_id": self._id("user", index % owners),
+                "webhook_url": None,
+                "status": "active",
+                "is_activated": True,
+                "welcome_message": "Bem-vindo!",
+                "welcome_media_url": None,
+                "welcome_media_type": None,
+                "created_at": created.isoformat(),
+                "updated_at": None
+            })
+
+            self.tables["groups"].append({
+                "id": self._id("group", index),
+                "name": f"VIP {index}",
+                "telegram_id": str(-1001000000000 - index),
+                "bot_id": bot_id,
+                "description": None,
+                "is_vip": True,
+                "created_at": created.isoformat()
+            })
+
+            plan_ids = []
+            for position, template in enumerate(PLAN_TEMPLATES):
+                plan_id = self._id("plan", index, position)
+                plan_ids.append((plan_id, template))
+                self.tables["plans"].append({
+                    "id": plan_id,
+                    "bot_id": bot_id,
+                    "description": f"Plano {template['name']}",
+                    "is_active": True,
+                    "created_at": (created + timedelta(minutes=position)).isoformat(),
+                    "updated_at": None,
+                    **template
+                })
+
+            for position in range(payments_per_bot):
+                number = next(payment_number)
+                plan_id, template = plan_ids[position % len(plan_ids)]
+                user = self.rng.choice(self.telegram_users)
+                self.tables["payments"].append({
+                    "id": self._id("payment", number),
+                    "bot_id": bot_id,
+                    "plan_id": plan_id,
+                    "user_telegram_id": user,
+                    "telegram_user_id": user,
+                    "user_name": "Cliente",
+                    "amount": template["price"],
+                    "method": "pix",
+                    "status": "pending",
+                    "external_id": f"{EXTERNAL_ID_PREFIX}{number}",
+                    "transaction_id": str(number),
+                    "metadata": {},
+                    "expires_at": (now + timedelta(minutes=15)).isoformat(),
+                    "created_at": (created + timedelta(minutes=position)).isoformat(),
+                    "updated_at": None
+                })
+
+    def load_updates(self, paths: Optional[List[Path]] = None):
+        """Carrega os updates gravados (um objeto ou uma lista por arquivo)"""
+        paths = paths or [ROOT / name for name in DEFAULT_UPDATE_FILES]
+        for path in paths:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+            self.updates.extend(data if isinstance(data, list) else [data])
+        if not self.updates:
+            raise ValueError("Nenhum update do Telegram para reproduzir")
+
+    def replay_update(self, rng: random.Random) -> Dict[str, Any]:
+        """
+        Um update gravado com update_id novo e remetente sorteado, para que o
+        filtro de updates e os handlers não o tratem como repetido
+        """
+        update = copy.deepcopy(rng.choice(self.updates))
+        update["update_id"] = next(self._update_ids)
+        user_id = int(rng.choice(self.telegram_users))
+
+        for key in ("message", "edited_message", "callback_query"):
+            payload = update.get(key)
+            if not payload:
+                continue
+            if "from" in payload:
+                payload["from"]["id"] = user_id
+            message = payload.get("message", payload)
+            if message.get("chat", {}).get("type") == "private":
+                message["chat"]["id"] = user_id
+            message["date"] = int(datetime.now(timezone.utc).timestamp())
+        return update
+
+    @property
+    def bots(self) -> List[Dict[str, Any]]:
+        return self.tables["bots"]
+
+    @property
+    def plans(self) -> List[Dict[str, Any]]:
+        return self.tables["plans"]
+
+    @property
+    def payments(self) -> List[Dict[str, Any]]:
+        return self.tables["payments"]
+
+    @property
+    def users(self) -> List[Dict[str, Any]]:
+        return self.tables["users"]
@@ -0,0 +1,200 @@
+"""
+Gerador de carga em malha aberta e relatório de latência
+
+As requisições são disparadas nos instantes programados pela taxa de cada
+estágio, sem esperar as anteriores terminarem; a latência é medida a partir
+do instante programado, então uma API lenta não reduz a carga nem esconde a
+fila (coordinated omission).
+"""
+
+import math
+import time
+import random
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+
+from .fixtures import Fixtures
+from .scenarios import Scenario
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Percentil por posição mais próxima (nearest-rank) de uma lista ordenada"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class EndpointStats:
+    """Latências e erros de um cenário"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.status_codes: Dict[str, int] = {}
+
+    def record(self, latency: float, status: str, ok: bool):
+        self.latencies.append(latency)
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        values = sorted(self.latencies)
+        count = len(values)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "throughput": round((count - self.errors) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+            "status_codes": dict(sorted(self.status_codes.items()))
+        }
+
+class LoadResult:
+    """Resultado agregado de uma execução"""
+
+    def __init__(self):
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.total = EndpointStats()
+        self.elapsed = 0.0
+        self.stages: List[Tuple[float, float]] = []
+
+    def record(self, name: str, latency: float, status: str, ok: bool):
+        self.endpoints.setdefault(name, EndpointStats()).record(latency, status, ok)
+        self.total.record(latency, status, ok)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "elapsed_seconds": round(self.elapsed, 2),
+            "stages": [{"rate": rate, "duration": duration} for rate, duration in self.stages],
+            "total": self.total.summary(self.elapsed),
+            "endpoints": {
+                name: stats.summary(self.elapsed) for name, stats in sorted(self.endpoints.items())
+            }
+        }
+
+def _response_ok(response: httpx.Response) -> bool:
+    if response.status_code >= 400:
+        return False
+    # Vários endpoints respondem 200 com {"success": false} ou {"status": "error"}
+    if "json" in response.headers.get("content-type", ""):
+        try:
+            body = response.json()
+        except ValueError:
+            return False
+        if isinstance(body, dict) and (body.get("success") is False or body.get("status") == "error"):
+            return False
+    return True
+
+async def _fire(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    fixtures: Fixtures,
+    rng: random.Random,
+    scheduled: float,
+    result: LoadResult
+):
+    spec = scenario.build(fixtures, rng)
+    try:
+        response = await client.request(
+            spec.method, spec.path, json=spec.json, params=spec.params, content=spec.content, headers=spec.headers
+        )
+        status, ok = str(response.status_code), _response_ok(response)
+    except httpx.HTTPError as e:
+        status, ok = type(e).__name__, False
+    result.record(scenario.name, time.perf_counter() - scheduled, status, ok)
+
+async def run_load(
+    base_url: str,
+    scenarios: List[Scenario],
+    fixtures: Fixtures,
+    stages: List[Tuple[float, float]],
+    seed: int = 1,
+    poisson: bool = False,
+    max_connections: int = 200,
+    timeout: float = 30.0
+) -> LoadResult:
+    """
+    Executa os estágios (taxa em req/s, duração em segundos) em sequência
+
+    Args:
+        poisson: Intervalos exponenciais entre chegadas em vez de constantes
+        max_connections: Conexões simultâneas com a API (as demais esperam
+            na fila do cliente, e essa espera entra na latência)
+    """
+    rng = random.Random(seed)
+    weights = [scenario.weight for scenario in scenarios]
+    result = LoadResult()
+    result.stages = list(stages)
+    tasks = set()
+
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        started = time.perf_counter()
+
+        for rate, duration in stages:
+            stage_start = time.perf_counter()
+            scheduled = stage_start
+            while scheduled - stage_start < duration:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                scenario = rng.choices(scenarios, weights)[0]
+                task = asyncio.create_task(_fire(client, scenario, fixtures, rng, scheduled, result))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+                scheduled += rng.expovariate(rate) if poisson else 1 / rate
+
+        if tasks:
+            await asyncio.gather(*tasks)
+        result.elapsed = time.perf_counter() - started
+
+    return result
+
+def format_report(report: Dict[str, Any], stub_calls: Optional[Dict[str, Dict[str, int]]] = None) -> str:
+    header = f"{'endpoint':<32} {'req':>7} {'erros':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    lines = [header, "-" * len(header)]
+
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for name, stats in rows:
+        lines.append(
+            f"{name:<32} {stats['requests']:>7} {stats['errors']:>6} {stats['throughput']:>8} "
+            f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['max_ms']:>9}"
+        )
+
+    for name, stats in report["endpoints"].items():
+        failing = {code: count for code, count in stats["status_codes"].items() if not code.startswith("2")}
+        if stats["errors"]:
+            lines.append(f"  {name}: {stats['errors']} erros {failing or '(resposta com success=false)'}")
+
+    lines.append(f"\nDuração: {report['elapsed_seconds']}s")
+    if stub_calls:
+        lines.append("Chamadas aos simuladores:")
+        for stub, calls in stub_calls.items():
+            if calls:
+                summary = ", ".join(f"{name}={count}" for name, count in sorted(calls.items()))
+                lines.append(f"  {stub}: {summary}")
+    return "\n".join(lines)
+
+def check_thresholds(
+    report: Dict[str, Any],
+    max_p95_ms: Optional[float] = None,
+    max_p99_ms: Optional[float] = None,
+    max_error_rate: Optional[float] = None
+) -> List[str]:
+    """Endpoints que excederam os limites (lista vazia quando todos passaram)"""
+    violations = []
+    for name, stats in report["endpoints"].items():
+        if max_p95_ms is not None and stats["p95_ms"] > max_p95_ms:
+            violations.append(f"{name}: p95 {stats['p95_ms']}ms > {max_p95_ms}ms")
+        if max_p99_ms is not None and stats["p99_ms"] > max_p99_ms:
+            violations.append(f"{name}: p99 {stats['p99_ms']}ms > {max_p99_ms}ms")
+        if max_error_rate is not None and stats["error_rate"] > max_error_rate:
+            violations.append(f"{name}: taxa de erro {stats['error_rate']} > {max_error_rate}")
+    return violations
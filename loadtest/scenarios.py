@@ -0,0 +1,155 @@
+"""
+Cenários de carga: endpoint, peso na mistura e montagem da requisição
+
+Os pesos padrão aproximam o tráfego de produção: a maior parte são updates
+do Telegram, seguidos pelas consultas do bot (configuração, planos,
+pagamentos), pelos webhooks dos gateways e pelo painel.
+"""
+
+import hmac
+import json
+import time
+import uuid
+import random
+import hashlib
+from typing import Dict, Any, List, Callable, Optional
+
+from .fixtures import Fixtures, EXTERNAL_ID_PREFIX, WEBHOOK_SECRET
+
+class RequestSpec:
+    """Requisição a ser enviada para a API"""
+
+    def __init__(
+        self,
+        method: str,
+        path: str,
+        json: Any = None,
+        params: Optional[Dict[str, Any]] = None,
+        content: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        self.method = method
+        self.path = path
+        self.json = json
+        self.params = params
+        self.content = content
+        self.headers = headers
+
+class Scenario:
+    """Um endpoint da API exercitado pelo teste de carga"""
+
+    def __init__(self, name: str, weight: float, build: Callable[[Fixtures, random.Random], RequestSpec]):
+        self.name = name
+        self.weight = weight
+        self.build = build
+
+def _telegram_webhook(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    bot = rng.choice(fixtures.bots)
+    return RequestSpec("POST", f"/telegram/webhook/{bot['token']}", json=fixtures.replay_update(rng))
+
+def _telegram_config(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    return RequestSpec("POST", "/telegram/config", json={"token": rng.choice(fixtures.bots)["token"]})
+
+def _telegram_list_plans(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    return RequestSpec("POST", "/telegram/list-plans", json={"bot_id": rng.choice(fixtures.bots)["id"]})
+
+def _telegram_create_payment(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    plan = rng.choice(fixtures.plans)
+    return RequestSpec("POST", "/telegram/create-payment", json={
+        "bot_id": plan["bot_id"],
+        "plan_id": plan["id"],
+        "telegram_user_id": rng.choice(fixtures.telegram_users),
+        "customer_name": "Cliente"
+    })
+
+def _telegram_payment_details(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    return RequestSpec("GET", f"/telegram/payment-details/{rng.choice(fixtures.payments)['id']}")
+
+def _telegram_payment_status(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    payment = rng.choice(fixtures.payments)
+    return RequestSpec(
+        "POST", f"/telegram/payment-status/{payment['id']}",
+        json={"telegram_user_id": payment["telegram_user_id"]}
+    )
+
+def _payments_create(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    plan = rng.choice(fixtures.plans)
+    return RequestSpec("POST", "/payments/create", params={
+        "user_telegram_id": rng.choice(fixtures.telegram_users),
+        "bot_id": plan["bot_id"],
+        "plan_id": plan["id"],
+        "amount": plan["price"],
+        "payment_method": "pushinpay"
+    }, json={"name": "Cliente", "email": "cliente@loadtest.local"})
+
+def _sign(message: bytes) -> str:
+    return hmac.new(WEBHOOK_SECRET.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+def _pushinpay_webhook(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    payment = rng.choice(fixtures.payments)
+    body = json.dumps({
+        "payment_id": payment["transaction_id"],
+        "status": "approved",
+        "external_id": payment["external_id"]
+    }).encode("utf-8")
+    # Assinatura sobre "<timestamp>." + corpo bruto
+    timestamp = str(int(time.time()))
+    return RequestSpec("POST", "/payments/webhook/pushinpay", content=body, headers={
+        "Content-Type": "application/json",
+        "X-PushinPay-Signature": f"t={timestamp},v1={_sign(f'{timestamp}.'.encode('ascii') + body)}"
+    })
+
+def _mercadopago_webhook(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    payment = rng.choice(fixtures.payments)
+    gateway_id = payment["external_id"][len(EXTERNAL_ID_PREFIX):]
+    # Manifesto assinado pelo Mercado Pago: id, x-request-id e timestamp em milissegundos
+    request_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    timestamp = str(int(time.time() * 1000))
+    signature = _sign(f"id:{gateway_id};request-id:{request_id};ts:{timestamp};".encode("utf-8"))
+    # Notificação v2: o "id" do corpo é o da notificação, data.id o do pagamento
+    return RequestSpec(
+        "POST", "/payments/webhook/mercadopago",
+        json={
+            "id": rng.getrandbits(40),
+            "type": "payment",
+            "action": "payment.updated",
+            "data": {"id": gateway_id}
+        },
+        params={"data.id": gateway_id, "type": "payment"},
+        headers={"x-signature": f"ts={timestamp},v1={signature}", "x-request-id": request_id}
+    )
+
+def _bots_list(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    return RequestSpec("GET", "/bots/", params={"owner_id": rng.choice(fixtures.users)["id"]})
+
+def _payments_list(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    return RequestSpec("GET", "/payments/", params={"bot_id": rng.choice(fixtures.bots)["id"]})
+
+def _dashboard_stats(fixtures: Fixtures, rng: random.Random) -> RequestSpec:
+    return RequestSpec("GET", "/dashboard/stats", params={"bot_id": rng.choice(fixtures.bots)["id"]})
+
+SCENARIOS: List[Scenario] = [
+    Scenario("telegram.webhook", 40, _telegram_webhook),
+    Scenario("telegram.config", 10, _telegram_config),
+    Scenario("telegram.list_plans", 10, _telegram_list_plans),
+    Scenario("telegram.create_payment", 5, _telegram_create_payment),
+    Scenario("telegram.payment_details", 5, _telegram_payment_details),
+    Scenario("telegram.payment_status", 5, _telegram_payment_status),
+    Scenario("payments.create", 3, _payments_create),
+    Scenario("payments.webhook.pushinpay", 5, _pushinpay_webhook),
+    Scenario("payments.webhook.mercadopago", 5, _mercadopago_webhook),
+    Scenario("bots.list", 4, _bots_list),
+    Scenario("payments.list", 4, _payments_list),
+    Scenario("dashboard.stats", 4, _dashboard_stats),
+]
+
+def select_scenarios(names: Optional[List[str]] = None) -> List[Scenario]:
+    """Cenários pelo nome (todos quando names é vazio)"""
+    if not names:
+        return list(SCENARIOS)
+
+    by_name = {scenario.name: scenario for scenario in SCENARIOS}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise ValueError(f"Cenários desconhecidos: {', '.join(unknown)}")
+    return [by_name[name] for name in names]
@@ -0,0 +1,484 @@
+"""
+Simuladores locais dos serviços externos usados pela API
+
+- PostgREST (Supabase): tabelas em memória com os filtros, projeção,
+  ordenação, contagem e escritas que o cliente supabase-py envia
+- Bot API do Telegram: getMe, sendMessage e demais métodos com respostas
+  no formato da API
+- PushinPay e Mercado Pago: criação e consulta de pagamentos
+
+Cada simulador é uma aplicação FastAPI servida pelo uvicorn em uma thread,
+com latência artificial opcional para aproximar a rede real.
+"""
+
+import re
+import json
+import time
+import uuid
+import base64
+import socket
+import asyncio
+import threading
+import itertools
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Callable
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from .fixtures import Fixtures, EXTERNAL_ID_PREFIX, WEBHOOK_SECRET
+
+# Parâmetros do PostgREST que não são filtros
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+def _base64url(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+# O cliente supabase-py só aceita chaves no formato JWT; o simulador não as valida
+ANON_KEY = ".".join((_base64url({"alg": "HS256", "typ": "JWT"}), _base64url({"role": "anon", "iss": "loadtest"}), "loadtest"))
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _split(text: str) -> List[str]:
+    """Separa por vírgulas de nível superior (fora de parênteses e aspas)"""
+    parts, current, depth, quoted = [], [], 0, False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        if char == "," and depth == 0 and not quoted:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+def _coerce(stored: Any, raw: str) -> Any:
+    if isinstance(stored, bool):
+        return raw.lower() == "true"
+    if isinstance(stored, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+def _compare(stored: Any, operator: str, raw: str) -> bool:
+    if operator == "is":
+        raw = raw.lower()
+        if raw == "null":
+            return stored is None
+        return stored is (raw == "true")
+    if stored is None:
+        return False
+    if operator == "in":
+        return any(_compare(stored, "eq", _unquote(value)) for value in _split(raw.strip("()")))
+    if operator == "like":
+        # % e * casam qualquer sequência, _ um caractere
+        pattern = "".join(
+            ".*" if char in "%*" else "." if char == "_" else re.escape(char) for char in _unquote(raw)
+        )
+        return re.fullmatch(pattern, str(stored), re.DOTALL) is not None
+
+    value = _coerce(stored, _unquote(raw))
+    left = stored if isinstance(stored, (bool, int, float)) else str(stored)
+    if operator == "eq":
+        return left == value
+    if operator == "neq":
+        return left != value
+    try:
+        if operator == "gt":
+            return left > value
+        if operator == "gte":
+            return left >= value
+        if operator == "lt":
+            return left < value
+        if operator == "lte":
+            return left <= value
+    except TypeError:
+        return False
+    raise ValueError(f"Operador não suportado pelo simulador: {operator}")
+
+def _predicate(column: str, expression: str) -> Callable[[Dict[str, Any]], bool]:
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    operator, _, raw = expression.partition(".")
+
+    def check(row: Dict[str, Any]) -> bool:
+        return _compare(row.get(column), operator, raw) != negate
+
+    return check
+
+def _condition(text: str) -> Callable[[Dict[str, Any]], bool]:
+    """Condição lógica do PostgREST: and(...), or(...) ou coluna.operador.valor"""
+    for keyword, combine in (("and(", all), ("or(", any)):
+        if text.startswith(keyword):
+            children = [_condition(part) for part in _split(text[len(keyword):-1])]
+            return lambda row: combine(child(row) for child in children)
+    column, _, expression = text.partition(".")
+    return _predicate(column, expression)
+
+def _sort_key(value: Any):
+    return (value is None, value if value is not None else 0)
+
+class PostgrestStub:
+    """Tabelas em memória servidas com a API REST do PostgREST (/rest/v1)"""
+
+    def __init__(self, tables: Dict[str, List[Dict[str, Any]]]):
+        self.tables = {name: [dict(row) for row in rows] for name, rows in tables.items()}
+        self.calls: Counter = Counter()
+        self.app = FastAPI()
+        self.app.add_api_route("/rest/v1/rpc/{function}", self.rpc, methods=["POST"])
+        self.app.add_api_route(
+            "/rest/v1/{table}", self.handle, methods=["GET", "POST", "PATCH", "DELETE"]
+        )
+
+    def _related(self, table: str, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = row.get(f"{table[:-1] if table.endswith('s') else table}_id")
+        return next((item for item in self.tables.get(table, []) if item.get("id") == key), None)
+
+    def _project(self, row: Dict[str, Any], select: str) -> Optional[Dict[str, Any]]:
+        if not select or select == "*":
+            return dict(row)
+
+        result = {}
+        for item in _split(select):
+            if "(" in item:
+                name, inner = item[:item.index("(")], item[item.index("(") + 1:-1]
+                table, _, hint = name.partition("!")
+                related = self._related(table, row)
+                if related is None and hint == "inner":
+                    return None
+                result[table] = self._project(related, inner) if related else None
+            elif item == "*":
+                result.update(row)
+            else:
+                alias, _, column = item.rpartition(":")
+                result[alias or column] = row.get(column)
+        return result
+
+    def _filters(self, request: Request) -> List[Callable[[Dict[str, Any]], bool]]:
+        filters = []
+        for key, value in request.query_params.multi_items():
+            if key in RESERVED_PARAMS:
+                continue
+            if key in ("or", "and"):
+                filters.append(_condition(f"{key}{value}"))
+            else:
+                filters.append(_predicate(key, value))
+        return filters
+
+    def _matching(self, table: str, request: Request) -> List[Dict[str, Any]]:
+        filters = self._filters(request)
+        return [row for row in self.tables.setdefault(table, []) if all(check(row) for check in filters)]
+
+    def _represent(self, rows: List[Dict[str, Any]], request: Request) -> List[Dict[str, Any]]:
+        select = request.query_params.get("select", "*")
+        projected = (self._project(row, select) for row in rows)
+        return [row for row in projected if row is not None]
+
+    async def rpc(self, function: str, request: Request):
+        self.calls[f"rpc {function}"] += 1
+        return JSONResponse(None)
+
+    async def handle(self, table: str, request: Request):
+        self.calls[f"{request.method} {table}"] += 1
+        prefer = request.headers.get("prefer", "")
+
+        if request.method == "GET":
+            return self._select(table, request, prefer)
+
+        body = await request.body()
+        payload = json.loads(body) if body else {}
+
+        if request.method == "POST":
+            rows = self._insert(table, payload, request, prefer)
+            status_code = 201
+        elif request.method == "PATCH":
+            rows = self._matching(table, request)
+            for row in rows:
+                row.update(payload)
+            status_code = 200
+        else:
+            rows = self._matching(table, request)
+            removed = {id(row) for row in rows}
+            self.tables[table] = [row for row in self.tables[table] if id(row) not in removed]
+            status_code = 200
+
+        if "return=minimal" in prefer:
+            return Response(status_code=status_code)
+        return JSONResponse(self._represent(rows, request), status_code=status_code)
+
+    def _select(self, table: str, request: Request, prefer: str):
+        rows = self._matching(table, request)
+
+        order = request.query_params.get("order")
+        if order:
+            for part in reversed(_split(order)):
+                column, *options = part.split(".")
+                rows.sort(key=lambda row: _sort_key(row.get(column)), reverse="desc" in options)
+
+        total = len(rows)
+        offset = int(request.query_params.get("offset", 0))
+        limit = request.query_params.get("limit")
+        rows = rows[offset:offset + int(limit)] if limit else rows[offset:]
+        data = self._represent(rows, request)
+
+        headers = {}
+        if "count=" in prefer:
+            headers["Content-Range"] = f"{offset}-{offset + len(data) - 1}/{total}" if data else f"*/{total}"
+        return JSONResponse(data, headers=headers)
+
+    def _insert(self, table: str, payload: Any, request: Request, prefer: str) -> List[Dict[str, Any]]:
+        conflict = [column for column in request.query_params.get("on_conflict", "").split(",") if column]
+        rows = self.tables.setdefault(table, [])
+        inserted = []
+
+        for values in payload if isinstance(payload, list) else [payload]:
+            if conflict:
+                existing = next((
+                    row for row in rows
+                    if all(row.get(column) == values.get(column) for column in conflict)
+                ), None)
+                if existing is not None:
+                    if "merge-duplicates" in prefer:
+                        existing.update(values)
+                        inserted.append(existing)
+                    continue
+
+            row = {"id": str(uuid.uuid4()), "created_at": _now(), **values}
+            rows.append(row)
+            inserted.append(row)
+
+        return inserted
+
+def _parse_body(body: bytes, content_type: str) -> Dict[str, Any]:
+    if not body:
+        return {}
+    if "json" in content_type:
+        return json.loads(body)
+    if "x-www-form-urlencoded" in content_type:
+        return {key: values[-1] for key, values in parse_qs(body.decode()).items()}
+    return {}
+
+class TelegramStub:
+    """Bot API do Telegram (/bot<token>/<método>)"""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self.message_ids = itertools.count(1)
+        self.app = FastAPI()
+        self.app.add_api_route("/bot{token}/{method}", self.handle, methods=["GET", "POST"])
+
+    def _bot_user(self, token: str) -> Dict[str, Any]:
+        bot_id = int(token.split(":", 1)[0]) if token.split(":", 1)[0].isdigit() else 1
+        return {
+            "id": bot_id,
+            "is_bot": True,
+            "first_name": "Bot de carga",
+            "username": f"loadtest_{bot_id}_bot",
+            "can_join_groups": True,
+            "can_read_all_group_messages": False,
+            "supports_inline_queries": False
+        }
+
+    async def handle(self, token: str, method: str, request: Request):
+        self.calls[method] += 1
+        params = _parse_body(await request.body(), request.headers.get("content-type", ""))
+        params.update(request.query_params)
+        chat_id = params.get("chat_id", 0)
+
+        if method == "getMe":
+            result = self._bot_user(token)
+        elif method in ("sendMessage", "sendPhoto", "sendVideo", "sendDocument", "editMessageText", "copyMessage"):
+            result = {
+                "message_id": next(self.message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": "private"},
+                "from": self._bot_user(token),
+                "text": params.get("text", "")
+            }
+        elif method == "getWebhookInfo":
+            result = {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        elif method == "createChatInviteLink":
+            result = {
+                "invite_link": "https://t.me/+loadtest",
+                "creator": self._bot_user(token),
+                "creates_join_request": False,
+                "is_primary": False,
+                "is_revoked": False
+            }
+        elif method == "getChat":
+            result = {"id": int(chat_id), "type": "supergroup", "title": "VIP"}
+        else:
+            result = True
+
+        return {"ok": True, "result": result}
+
+class PushinPayStub:
+    """API de pagamentos PIX do PushinPay (/v1/payments)"""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self.payments: Dict[str, Dict[str, Any]] = {}
+        self.app = FastAPI()
+        self.app.add_api_route("/v1/payments", self.create, methods=["POST"])
+        self.app.add_api_route("/v1/payments/{payment_id}", self.get, methods=["GET"])
+
+    async def create(self, request: Request):
+        self.calls["create"] += 1
+        data = await request.json()
+        payment = {
+            "id": str(uuid.uuid4()),
+            "status": "pending",
+            "amount": data.get("amount"),
+            "external_id": data.get("external_id"),
+            "qr_code": "00020126580014br.gov.bcb.pix0136loadtest",
+            "qr_code_base64": "",
+            "payment_url": "https://pushinpay.local/pay",
+            "expires_at": data.get("expires_at")
+        }
+        self.payments[payment["id"]] = payment
+        return JSONResponse(payment, status_code=201)
+
+    async def get(self, payment_id: str):
+        self.calls["get"] += 1
+        payment = self.payments.get(payment_id) or {"id": payment_id, "external_id": None}
+        return {**payment, "status": "approved"}
+
+class MercadoPagoStub:
+    """API de pagamentos do Mercado Pago (/v1/payments)"""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self.payments: Dict[str, Dict[str, Any]] = {}
+        self.ids = itertools.count(10 ** 9)
+        self.app = FastAPI()
+        self.app.add_api_route("/v1/payments", self.create, methods=["POST"])
+        self.app.add_api_route("/v1/payments/{payment_id}", self.get, methods=["GET"])
+
+    async def create(self, request: Request):
+        self.calls["create"] += 1
+        data = await request.json()
+        payment = {
+            "id": next(self.ids),
+            "status": "pending",
+            "transaction_amount": data.get("transaction_amount"),
+            "external_reference": data.get("external_reference"),
+            "point_of_interaction": {
+                "transaction_data": {"qr_code": "00020126580014br.gov.bcb.pix0136loadtest", "qr_code_base64": ""}
+            }
+        }
+        self.payments[str(payment["id"])] = payment
+        return JSONResponse(payment, status_code=201)
+
+    async def get(self, payment_id: str):
+        self.calls["get"] += 1
+        # Pagamentos não criados aqui correspondem aos semeados (external_id = prefixo + id)
+        payment = self.payments.get(payment_id) or {
+            "id": payment_id, "external_reference": f"{EXTERNAL_ID_PREFIX}{payment_id}"
+        }
+        return {**payment, "status": "approved"}
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _with_latency(app: FastAPI, seconds: float) -> FastAPI:
+    if seconds > 0:
+        @app.middleware("http")
+        async def delay(request, call_next):
+            await asyncio.sleep(seconds)
+            return await call_next(request)
+    return app
+
+class StubServer:
+    """Servidor uvicorn de um simulador, executado em uma thread"""
+
+    def __init__(self, name: str, app: FastAPI, latency: float = 0.0, port: Optional[int] = None):
+        self.name = name
+        self.port = port or _free_port()
+        config = uvicorn.Config(
+            _with_latency(app, latency), host="127.0.0.1", port=self.port,
+            log_level="warning", access_log=False
+        )
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, name=f"stub-{name}", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 10.0):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError(f"Simulador {self.name} não iniciou")
+            time.sleep(0.01)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+class Stubs:
+    """Conjunto dos simuladores e as variáveis de ambiente para a API usá-los"""
+
+    def __init__(self, fixtures: Fixtures, latency: Optional[Dict[str, float]] = None):
+        latency = latency or {}
+        self.postgrest = PostgrestStub(fixtures.tables)
+        self.telegram = TelegramStub()
+        self.pushinpay = PushinPayStub()
+        self.mercadopago = MercadoPagoStub()
+        self.servers = {
+            name: StubServer(name, stub.app, latency.get(name, 0.0))
+            for name, stub in (
+                ("postgrest", self.postgrest), ("telegram", self.telegram),
+                ("pushinpay", self.pushinpay), ("mercadopago", self.mercadopago)
+            )
+        }
+
+    def start(self):
+        for server in self.servers.values():
+            server.start()
+
+    def stop(self):
+        for server in self.servers.values():
+            server.stop()
+
+    def env(self) -> Dict[str, str]:
+        return {
+            "SUPABASE_URL": self.servers["postgrest"].url,
+            "SUPABASE_KEY": ANON_KEY,
+            "TELEGRAM_API_URL": self.servers["telegram"].url,
+            "PUSHINPAY_API_URL": f"{self.servers['pushinpay'].url}/v1",
+            "PUSHINPAY_API_KEY": "loadtest",
+            "MERCADOPAGO_API_URL": self.servers["mercadopago"].url,
+            "MERCADOPAGO_ACCESS_TOKEN": "TEST-loadtest",
+            "PUSHINPAY_WEBHOOK_SECRET": WEBHOOK_SECRET,
+            "MERCADOPAGO_WEBHOOK_SECRET": WEBHOOK_SECRET,
+            "PIX_KEY": "loadtest@blackinbot.local"
+        }
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "postgrest": dict(self.postgrest.calls),
+            "telegram": dict(self.telegram.calls),
+            "pushinpay": dict(self.pushinpay.calls),
+            "mercadopago": dict(self.mercadopago.calls)
+        }
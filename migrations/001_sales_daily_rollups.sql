@@ -0,0 +1,34 @@
+-- Agregados diários de vendas usados pelo dashboard (api/analytics.py)
+--
+-- Cada linha resume um dia de um bot; as consultas do dashboard leem
+-- O(dias) linhas em vez de varrer a tabela sales.
+
+CREATE TABLE IF NOT EXISTS public.sales_daily_rollups (
+  bot_id UUID NOT NULL REFERENCES public.bots(id) ON DELETE CASCADE,
+  day DATE NOT NULL,
+  -- Vendas criadas no dia
+  sales_count INTEGER NOT NULL DEFAULT 0,
+  revenue DECIMAL NOT NULL DEFAULT 0,
+  -- Acessos sem expiração criados no dia
+  lifetime_count INTEGER NOT NULL DEFAULT 0,
+  -- Acessos que expiram no dia (indexado pela data de expiração)
+  expiring_count INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  PRIMARY KEY (bot_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS public.sales_plan_daily_rollups (
+  bot_id UUID NOT NULL REFERENCES public.bots(id) ON DELETE CASCADE,
+  plan_id UUID NOT NULL,
+  day DATE NOT NULL,
+  sales_count INTEGER NOT NULL DEFAULT 0,
+  revenue DECIMAL NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  PRIMARY KEY (bot_id, plan_id, day)
+);
+
+ALTER TABLE public.sales_daily_rollups ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.sales_plan_daily_rollups ENABLE ROW LEVEL SECURITY;
+
+-- Mantidas pelo trigger sales_rollups_after_insert; a carga inicial é feita
+-- pela migração que cria o trigger (004_sales_rollup_trigger.sql)
@@ -0,0 +1,16 @@
+-- Índices para a paginação por cursor (api/pagination.py)
+--
+-- Cada listagem filtra por um campo e ordena por (created_at, id); com o
+-- índice composto a página é lida direto do índice, sem ordenar a tabela.
+
+CREATE INDEX IF NOT EXISTS bots_owner_created_id_idx
+  ON public.bots (owner_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS plans_bot_created_id_idx
+  ON public.plans (bot_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS payments_bot_created_id_idx
+  ON public.payments (bot_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS sales_bot_created_id_idx
+  ON public.sales (bot_id, created_at, id);
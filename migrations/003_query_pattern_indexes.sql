@@ -0,0 +1,65 @@
+-- Índices para os padrões de consulta da API
+--
+-- Gerado por tools/index_advisor.py a partir dos filtros usados em api/.
+-- Cada índice lista as consultas que ele atende e os arquivos que as fazem.
+
+-- bot_activation_codes: activation_code = ? AND used_at is null AND expires_at > ?
+--   api/routers/telegram.py
+CREATE INDEX IF NOT EXISTS bot_activation_codes_activation_code_expires_at_partial_idx
+  ON public.bot_activation_codes (activation_code, expires_at)
+  WHERE used_at is null;
+
+-- bot_activation_codes: used_at is null AND expires_at > ?
+--   api/routers/telegram.py
+CREATE INDEX IF NOT EXISTS bot_activation_codes_expires_at_partial_idx
+  ON public.bot_activation_codes (expires_at)
+  WHERE used_at is null;
+
+-- groups: telegram_id = ?
+--   api/routers/telegram.py
+CREATE INDEX IF NOT EXISTS groups_telegram_id_idx
+  ON public.groups (telegram_id);
+
+-- payments: bot_id = ? AND status = ? ORDER BY created_at, id
+--   api/routers/payments.py
+CREATE INDEX IF NOT EXISTS payments_bot_id_status_created_at_id_idx
+  ON public.payments (bot_id, status, created_at, id);
+
+-- payments: bot_id = ? AND status = ? AND user_telegram_id = ? ORDER BY created_at, id
+--   api/routers/payments.py
+-- payments: bot_id = ? AND status = ? AND user_telegram_id = ?
+--   api/routers/payments.py
+-- payments: bot_id = ? AND status = ?
+--   api/routers/payments.py
+CREATE INDEX IF NOT EXISTS payments_bot_id_status_user_telegram_id_created_at_id_idx
+  ON public.payments (bot_id, status, user_telegram_id, created_at, id);
+
+-- plans: bot_id = ? AND is_active = true ORDER BY created_at, id
+--   api/routers/plans.py
+-- plans: bot_id = ? AND is_active = true
+--   api/routers/plans.py
+--   api/routers/telegram.py
+CREATE INDEX IF NOT EXISTS plans_bot_id_created_at_id_partial_idx
+  ON public.plans (bot_id, created_at, id)
+  WHERE is_active = true;
+
+-- sales: bot_id = ? AND plan_id = ? ORDER BY created_at, id
+--   api/routers/sales.py
+-- sales: bot_id = ? AND plan_id = ? AND created_at > ?
+--   api/routers/sales.py
+-- sales: bot_id = ? AND plan_id = ?
+--   api/routers/sales.py
+CREATE INDEX IF NOT EXISTS sales_bot_id_plan_id_created_at_id_idx
+  ON public.sales (bot_id, plan_id, created_at, id);
+
+-- user_accesses: bot_id = ? AND telegram_user_id = ? AND active = true
+--   api/routers/telegram.py
+-- user_accesses não tem CREATE TABLE nos arquivos .sql (criada no Supabase)
+DO $$
+BEGIN
+  IF to_regclass('public.user_accesses') IS NOT NULL THEN
+    CREATE INDEX IF NOT EXISTS user_accesses_bot_id_telegram_user_id_partial_idx
+      ON public.user_accesses (bot_id, telegram_user_id)
+      WHERE active = true;
+  END IF;
+END $$;
@@ -0,0 +1,111 @@
+-- Agregados de vendas mantidos por trigger (api/analytics.py)
+--
+-- O trigger atualiza sales_daily_rollups e sales_plan_daily_rollups na
+-- mesma transação do INSERT em sales, qualquer que seja a origem (API ou
+-- rotas do Next.js): não há estado em memória que uma queda possa perder.
+-- O trigger é por comando: um INSERT com várias vendas (lote dos webhooks)
+-- soma tudo em um UPDATE por linha de agregado.
+
+CREATE OR REPLACE FUNCTION public.apply_sales_rollups()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  INSERT INTO public.sales_daily_rollups AS r
+    (bot_id, day, sales_count, revenue, lifetime_count, expiring_count)
+  SELECT bot_id, day, SUM(sales_count), SUM(revenue), SUM(lifetime_count), SUM(expiring_count)
+  FROM (
+    SELECT
+      bot_id,
+      (created_at AT TIME ZONE 'UTC')::DATE AS day,
+      1 AS sales_count,
+      amount AS revenue,
+      CASE WHEN expires_at IS NULL THEN 1 ELSE 0 END AS lifetime_count,
+      0 AS expiring_count
+    FROM inserted
+    WHERE bot_id IS NOT NULL
+    UNION ALL
+    SELECT bot_id, (expires_at AT TIME ZONE 'UTC')::DATE, 0, 0, 0, 1
+    FROM inserted
+    WHERE bot_id IS NOT NULL AND expires_at IS NOT NULL
+  ) AS s
+  GROUP BY bot_id, day
+  ON CONFLICT (bot_id, day) DO UPDATE SET
+    sales_count = r.sales_count + EXCLUDED.sales_count,
+    revenue = r.revenue + EXCLUDED.revenue,
+    lifetime_count = r.lifetime_count + EXCLUDED.lifetime_count,
+    expiring_count = r.expiring_count + EXCLUDED.expiring_count,
+    updated_at = NOW();
+
+  INSERT INTO public.sales_plan_daily_rollups AS r
+    (bot_id, plan_id, day, sales_count, revenue)
+  SELECT bot_id, plan_id, (created_at AT TIME ZONE 'UTC')::DATE, COUNT(*), SUM(amount)
+  FROM inserted
+  WHERE bot_id IS NOT NULL AND plan_id IS NOT NULL
+  GROUP BY bot_id, plan_id, (created_at AT TIME ZONE 'UTC')::DATE
+  ON CONFLICT (bot_id, plan_id, day) DO UPDATE SET
+    sales_count = r.sales_count + EXCLUDED.sales_count,
+    revenue = r.revenue + EXCLUDED.revenue,
+    updated_at = NOW();
+
+  RETURN NULL;
+END;
+$$;
+
+-- Recalcula os agregados a partir de sales (sem o trigger, usar com sales travada)
+CREATE OR REPLACE FUNCTION public.rebuild_sales_rollups()
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  rebuilt INTEGER;
+BEGIN
+  TRUNCATE public.sales_daily_rollups, public.sales_plan_daily_rollups;
+
+  INSERT INTO public.sales_daily_rollups (bot_id, day, sales_count, revenue, lifetime_count, expiring_count)
+  SELECT bot_id, day, SUM(sales_count), SUM(revenue), SUM(lifetime_count), SUM(expiring_count)
+  FROM (
+    SELECT
+      bot_id,
+      (created_at AT TIME ZONE 'UTC')::DATE AS day,
+      1 AS sales_count,
+      amount AS revenue,
+      CASE WHEN expires_at IS NULL THEN 1 ELSE 0 END AS lifetime_count,
+      0 AS expiring_count
+    FROM public.sales
+    WHERE bot_id IS NOT NULL
+    UNION ALL
+    SELECT bot_id, (expires_at AT TIME ZONE 'UTC')::DATE, 0, 0, 0, 1
+    FROM public.sales
+    WHERE bot_id IS NOT NULL AND expires_at IS NOT NULL
+  ) AS s
+  GROUP BY bot_id, day;
+  GET DIAGNOSTICS rebuilt = ROW_COUNT;
+
+  INSERT INTO public.sales_plan_daily_rollups (bot_id, plan_id, day, sales_count, revenue)
+  SELECT bot_id, plan_id, (created_at AT TIME ZONE 'UTC')::DATE, COUNT(*), SUM(amount)
+  FROM public.sales
+  WHERE bot_id IS NOT NULL AND plan_id IS NOT NULL
+  GROUP BY bot_id, plan_id, (created_at AT TIME ZONE 'UTC')::DATE;
+
+  RETURN rebuilt;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS sales_rollups_after_insert ON public.sales;
+
+-- Carga inicial a partir das vendas existentes; o lock impede vendas novas
+-- até o trigger existir
+BEGIN;
+
+LOCK TABLE public.sales IN SHARE MODE;
+
+SELECT public.rebuild_sales_rollups();
+
+CREATE TRIGGER sales_rollups_after_insert
+  AFTER INSERT ON public.sales
+  REFERENCING NEW TABLE AS inserted
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION public.apply_sales_rollups();
+
+COMMIT;
@@ -0,0 +1,25 @@
+-- Uma venda por pagamento (api/webhook_buffer.py)
+--
+-- O lote dos webhooks insere as vendas com ON CONFLICT (payment_id) DO
+-- NOTHING: a reentrega de um pagamento já aprovado recria a venda que
+-- faltou sem duplicar a que existe. A leitura seguida de UPDATE sem
+-- condição permitia que dois workers criassem a mesma venda; as
+-- duplicadas são removidas (fica a mais antiga) antes da restrição, e os
+-- agregados são recalculados sem elas.
+
+BEGIN;
+
+LOCK TABLE public.sales IN SHARE ROW EXCLUSIVE MODE;
+
+DELETE FROM public.sales AS s
+USING public.sales AS kept
+WHERE s.payment_id IS NOT NULL
+  AND s.payment_id = kept.payment_id
+  AND (kept.created_at, kept.id::TEXT) < (s.created_at, s.id::TEXT);
+
+ALTER TABLE public.sales
+  ADD CONSTRAINT sales_payment_id_key UNIQUE (payment_id);
+
+SELECT public.rebuild_sales_rollups();
+
+COMMIT;
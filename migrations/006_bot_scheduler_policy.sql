@@ -0,0 +1,13 @@
+-- Política de escalonamento por bot (api/scheduler.py)
+--
+-- O plano (peso no deficit round-robin) e o limite de tarefas simultâneas
+-- eram guardados só na memória do worker que recebeu o PUT: os outros
+-- workers não viam a política e ela se perdia ao reiniciar. Agora ficam
+-- no bot; cada worker aplica a política lida junto com a consulta do bot
+-- feita a cada update. NULL usa os padrões (SCHEDULER_DEFAULT_TIER e
+-- SCHEDULER_MAX_PER_BOT). Só a rota de administração grava as colunas.
+
+ALTER TABLE public.bots
+  ADD COLUMN IF NOT EXISTS scheduler_tier TEXT,
+  ADD COLUMN IF NOT EXISTS scheduler_max_concurrency INTEGER
+    CHECK (scheduler_max_concurrency IS NULL OR scheduler_max_concurrency >= 1);
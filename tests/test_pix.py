@@ -0,0 +1,105 @@
+"""
+Testes do BR Code PIX (api/payments/pix.py) e do codificador de QR Code (api/payments/qr.py)
+
+Uso:
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+
+import io
+
+import pytest
+import zxingcpp
+from PIL import Image
+
+from api.payments.pix import (
+    build_pix_payload, parse_pix_payload, pix_config, crc16_ccitt, make_txid, _parse_tlv
+)
+from api.payments.qr import encode_qr, render_png
+
+PIX_KEY = "pagamentos@blackinbot.com.br"
+
+# Exemplo do Manual de Padrões para Iniciação do Pix (Banco Central)
+BCB_EXAMPLE = (
+    "00020126580014br.gov.bcb.pix0136123e4567-e12b-12d1-a456-426655440000"
+    "5204000053039865802BR5913Fulano de Tal6008BRASILIA62070503***63041D3D"
+)
+
+def test_crc16_check_value():
+    # Valor de verificação do CRC-16/CCITT-FALSE
+    assert crc16_ccitt(b"123456789") == 0x29B1
+
+def test_crc16_bcb_example():
+    assert f"{crc16_ccitt(BCB_EXAMPLE[:-4].encode('utf-8')):04X}" == BCB_EXAMPLE[-4:]
+
+def test_static_payload_matches_bcb_layout():
+    payload = build_pix_payload(
+        None, "***", pix_key="123e4567-e12b-12d1-a456-426655440000",
+        merchant_name="Fulano de Tal", merchant_city="BRASILIA", single_use=False
+    )
+    # O nome é normalizado para maiúsculas; o resto do layout é o do exemplo
+    assert payload[:-4] == BCB_EXAMPLE[:-4].replace("Fulano de Tal", "FULANO DE TAL")
+    assert parse_pix_payload(payload)["pix_key"] == "123e4567-e12b-12d1-a456-426655440000"
+
+def test_emv_fields():
+    payload = build_pix_payload(
+        29.9, make_txid("3f1d6c1e-8d8f-4c57-9a55-4a1b3c1d2e3f"), pix_key=PIX_KEY,
+        merchant_name="Black Ín Bot", merchant_city="São Paulo", description="Plano Mensal"
+    )
+    fields = dict(_parse_tlv(payload))
+
+    assert fields["00"] == "01"
+    assert fields["01"] == "12"
+    assert fields["52"] == "0000"
+    assert fields["53"] == "986"
+    assert fields["54"] == "29.90"
+    assert fields["58"] == "BR"
+    assert fields["59"] == "BLACK IN BOT"
+    assert fields["60"] == "SAO PAULO"
+    assert payload[-8:-4] == "6304"
+
+    account = dict(_parse_tlv(fields["26"]))
+    assert account == {"00": "br.gov.bcb.pix", "01": PIX_KEY, "02": "PLANO MENSAL"}
+    assert dict(_parse_tlv(fields["62"])) == {"05": "3f1d6c1e8d8f4c579a554a1b3"}
+
+def test_parse_rejects_wrong_crc():
+    payload = build_pix_payload(10, "abc", pix_key=PIX_KEY)
+    corrupted = payload[:-4] + ("0000" if payload[-4:] != "0000" else "FFFF")
+    with pytest.raises(ValueError):
+        parse_pix_payload(corrupted)
+
+def test_pix_config_requires_key(monkeypatch):
+    monkeypatch.setenv("PIX_KEY", "")
+    with pytest.raises(ValueError):
+        pix_config()
+
+    monkeypatch.setenv("PIX_KEY", "x" * 78)
+    with pytest.raises(ValueError):
+        pix_config()
+
+    monkeypatch.setenv("PIX_KEY", PIX_KEY)
+    assert pix_config()["pix_key"] == PIX_KEY
+
+@pytest.mark.parametrize("amount, description", [
+    (5, None),
+    (29.9, "Plano Mensal"),
+    (1499.99, "Plano Anual VIP com acesso a todos os grupos"),
+])
+def test_qr_round_trip(amount, description):
+    payload = build_pix_payload(amount, make_txid("loadtest-123"), pix_key=PIX_KEY, description=description)
+
+    image = Image.open(io.BytesIO(render_png(encode_qr(payload), scale=4)))
+    results = zxingcpp.read_barcodes(image)
+
+    assert len(results) == 1
+    assert results[0].text == payload
+    assert parse_pix_payload(results[0].text)["amount"] == pytest.approx(amount)
+
+@pytest.mark.parametrize("mask", range(8))
+def test_qr_round_trip_every_mask(mask):
+    payload = build_pix_payload(29.9, "mask", pix_key=PIX_KEY)
+
+    image = Image.open(io.BytesIO(render_png(encode_qr(payload, mask=mask), scale=4)))
+    results = zxingcpp.read_barcodes(image)
+
+    assert [result.text for result in results] == [payload]
@@ -0,0 +1,162 @@
+"""
+Testes do escalonamento justo entre bots (api/scheduler.py)
+
+Uso:
+    python -m pytest tests/test_scheduler.py
+"""
+
+import asyncio
+
+import pytest
+
+from api.scheduler import FairScheduler, TenantPolicy, SchedulerQueueFull, parse_tier_weights
+
+async def settle():
+    # Deixa as tarefas criadas chegarem à fila do escalonador
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+async def hold(scheduler: FairScheduler, tenant: str, release: asyncio.Event):
+    async def work():
+        await release.wait()
+    await scheduler.run(tenant, work)
+
+def test_drr_share_follows_tier_weights():
+    async def scenario():
+        scheduler = FairScheduler("teste", concurrency=1, max_per_tenant=1)
+        scheduler.set_policy("grande", TenantPolicy("pro"))
+        order = []
+
+        async def record(tenant):
+            order.append(tenant)
+
+        # Ocupa a única vaga para que as tarefas dos dois bots esperem na fila
+        release = asyncio.Event()
+        blocker = asyncio.create_task(hold(scheduler, "outro", release))
+        await settle()
+
+        tasks = [asyncio.create_task(scheduler.run("grande", lambda: record("grande"))) for _ in range(30)]
+        tasks += [asyncio.create_task(scheduler.run("pequeno", lambda: record("pequeno"))) for _ in range(30)]
+        await settle()
+        assert scheduler.queued == 60
+
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    # pro (peso 2) recebe duas vagas para cada uma do free (peso 1)
+    assert order[:30].count("grande") == 20
+    assert order[:30].count("pequeno") == 10
+    assert order[:6] == ["grande", "grande", "pequeno", "grande", "grande", "pequeno"]
+
+def test_backlog_of_one_bot_does_not_starve_another():
+    async def scenario():
+        scheduler = FairScheduler("teste", concurrency=1)
+        order = []
+
+        async def record(tenant):
+            order.append(tenant)
+
+        release = asyncio.Event()
+        blocker = asyncio.create_task(hold(scheduler, "grande", release))
+        await settle()
+        tasks = [asyncio.create_task(scheduler.run("grande", lambda: record("grande"))) for _ in range(100)]
+        await settle()
+        # O /start do outro bot chega depois de 100 updates na fila
+        tasks.append(asyncio.create_task(scheduler.run("pequeno", lambda: record("pequeno"))))
+        await settle()
+
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    assert order.index("pequeno") <= 1
+
+def test_per_bot_cap_leaves_room_for_other_bots():
+    async def scenario():
+        scheduler = FairScheduler("teste", concurrency=10, max_per_tenant=2)
+        release = asyncio.Event()
+
+        tasks = [asyncio.create_task(hold(scheduler, "grande", release)) for _ in range(6)]
+        await settle()
+        capped = (scheduler.tenants["grande"].running, len(scheduler.tenants["grande"].queue))
+
+        # Com vagas livres, outro bot entra mesmo com a fila do primeiro cheia
+        tasks += [asyncio.create_task(hold(scheduler, "pequeno", release)) for _ in range(2)]
+        await settle()
+        other = scheduler.tenants["pequeno"].running
+
+        # Um limite maior na política libera as tarefas que esperavam
+        scheduler.set_policy("grande", TenantPolicy("free", max_concurrency=4))
+        await settle()
+        raised = scheduler.tenants["grande"].running
+
+        release.set()
+        await asyncio.gather(*tasks)
+        return capped, other, raised, scheduler.running, scheduler.queued
+
+    capped, other, raised, running, queued = asyncio.run(scenario())
+    assert capped == (2, 4)
+    assert other == 2
+    assert raised == 4
+    assert (running, queued) == (0, 0)
+
+def test_queue_limit_rejects_new_tasks():
+    async def scenario():
+        scheduler = FairScheduler("teste", concurrency=1, max_queue_per_tenant=2)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(scheduler, "bot", release)) for _ in range(3)]
+        await settle()
+
+        with pytest.raises(SchedulerQueueFull):
+            await scheduler.run("bot", lambda: asyncio.sleep(0))
+        # Tarefas já aceitas (ex.: recuperadas do log) entram acima do limite
+        tasks.append(asyncio.create_task(scheduler.run("bot", lambda: asyncio.sleep(0), bounded=False)))
+        await settle()
+        queued = len(scheduler.tenants["bot"].queue)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        return queued, scheduler.tenants["bot"].rejected
+
+    assert asyncio.run(scenario()) == (3, 1)
+
+def test_cancelled_waiter_does_not_hold_a_slot():
+    async def scenario():
+        scheduler = FairScheduler("teste", concurrency=1)
+        release = asyncio.Event()
+        blocker = asyncio.create_task(hold(scheduler, "bot", release))
+        waiting = asyncio.create_task(hold(scheduler, "bot", release))
+        await settle()
+
+        waiting.cancel()
+        await settle()
+        release.set()
+        await blocker
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        # A vaga volta livre: a próxima tarefa roda direto
+        await asyncio.wait_for(scheduler.run("bot", lambda: asyncio.sleep(0)), timeout=1)
+        return scheduler.running, scheduler.queued
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+def test_policy_validation():
+    with pytest.raises(ValueError):
+        TenantPolicy("free", max_concurrency=0)
+
+    scheduler = FairScheduler("teste")
+    with pytest.raises(ValueError):
+        scheduler.set_policy("bot", TenantPolicy("enterprise"))
+
+    policy = TenantPolicy.from_row({"scheduler_tier": None, "scheduler_max_concurrency": 3}, "free")
+    assert policy == TenantPolicy("free", 3)
+    assert TenantPolicy.from_row(policy.to_row(), "pro") == policy
+
+def test_parse_tier_weights():
+    assert parse_tier_weights("free=1, pro=2.5") == {"free": 1.0, "pro": 2.5}
+    with pytest.raises(ValueError):
+        parse_tier_weights("free=0")
@@ -0,0 +1,122 @@
+"""
+Testes da verificação das assinaturas dos webhooks (api/payments/signatures.py)
+
+Uso:
+    python -m pytest tests/test_signatures.py
+"""
+
+import time
+
+import pytest
+
+from api.payments import signatures
+from api.payments.signatures import (
+    SignatureVerifier, InvalidSignature, parse_signature_header, mercadopago_manifest, pushinpay_message,
+    verify_mercadopago_signature, verify_pushinpay_signature
+)
+
+SECRET = "segredo-de-teste"
+BODY = b'{"id": "9f1c", "status": "paid"}'
+
+def mercadopago_headers(verifier: SignatureVerifier, data_id: str, timestamp: str, request_id: str = "req-1"):
+    signature = verifier.sign(mercadopago_manifest(data_id, request_id, timestamp))
+    return {"x-signature": f"ts={timestamp},v1={signature}", "x-request-id": request_id}
+
+@pytest.fixture
+def mercadopago(monkeypatch):
+    verifier = SignatureVerifier("mercadopago", [SECRET])
+    monkeypatch.setattr(signatures, "mercadopago_signatures", verifier)
+    return verifier
+
+@pytest.fixture
+def pushinpay(monkeypatch):
+    verifier = SignatureVerifier("pushinpay", [SECRET], required=False)
+    monkeypatch.setattr(signatures, "pushinpay_signatures", verifier)
+    return verifier
+
+def test_parse_signature_header():
+    assert parse_signature_header("ts=1700000000, v1=abc") == {"ts": "1700000000", "v1": "abc"}
+    assert parse_signature_header(None) == {}
+    assert parse_signature_header("sem-separador") == {}
+
+def test_mercadopago_valid_signature(mercadopago):
+    # O Mercado Pago envia o timestamp em milissegundos
+    timestamp = str(int(time.time() * 1000))
+    verify_mercadopago_signature(mercadopago_headers(mercadopago, "123456", timestamp), "123456")
+
+def test_mercadopago_manifest_lowercases_alphanumeric_id(mercadopago):
+    timestamp = str(int(time.time()))
+    headers = mercadopago_headers(mercadopago, "abc123", timestamp)
+    verify_mercadopago_signature(headers, "ABC123")
+
+def test_mercadopago_forged_signature(mercadopago):
+    forger = SignatureVerifier("mercadopago", ["outro-segredo"])
+    timestamp = str(int(time.time()))
+    with pytest.raises(InvalidSignature) as error:
+        verify_mercadopago_signature(mercadopago_headers(forger, "123456", timestamp), "123456")
+    assert error.value.reason == "assinatura não confere"
+
+def test_mercadopago_signature_for_other_payment(mercadopago):
+    # A assinatura de um pagamento não vale para outro
+    timestamp = str(int(time.time()))
+    with pytest.raises(InvalidSignature):
+        verify_mercadopago_signature(mercadopago_headers(mercadopago, "123456", timestamp), "654321")
+
+def test_mercadopago_stale_signature(mercadopago):
+    timestamp = str(int(time.time()) - 3600)
+    with pytest.raises(InvalidSignature) as error:
+        verify_mercadopago_signature(mercadopago_headers(mercadopago, "123456", timestamp), "123456")
+    assert error.value.reason == "timestamp fora da tolerância"
+
+def test_mercadopago_missing_signature(mercadopago):
+    with pytest.raises(InvalidSignature) as error:
+        verify_mercadopago_signature({}, "123456")
+    assert error.value.reason == "assinatura ausente"
+
+def test_required_without_secret_fails_closed():
+    verifier = SignatureVerifier("mercadopago", [])
+    with pytest.raises(InvalidSignature) as error:
+        verifier.verify(b"mensagem", "abc", str(int(time.time())))
+    assert error.value.reason == "segredo do webhook não configurado"
+
+def test_not_required_without_secret_accepts():
+    verifier = SignatureVerifier("pushinpay", [], required=False)
+    assert not verifier.enabled
+    verifier.verify(b"mensagem", None, None)
+
+def test_secret_rotation_accepts_old_and_new():
+    old = SignatureVerifier("mercadopago", ["antigo"])
+    rotating = SignatureVerifier("mercadopago", ["novo", "antigo"])
+    now = time.time()
+    rotating.verify(b"mensagem", old.sign(b"mensagem"), str(int(now)), now=now)
+    rotating.verify(b"mensagem", rotating.sign(b"mensagem"), str(int(now)), now=now)
+
+def test_pushinpay_timestamped_signature(pushinpay):
+    timestamp = str(int(time.time()))
+    signature = pushinpay.sign(pushinpay_message(timestamp, BODY))
+    headers = {"x-pushinpay-signature": f"t={timestamp},v1={signature}"}
+    verify_pushinpay_signature(headers, BODY, header="x-pushinpay-signature", signature_format="timestamped")
+
+    # Corpo alterado depois de assinado
+    with pytest.raises(InvalidSignature):
+        verify_pushinpay_signature(
+            headers, BODY.replace(b"paid", b"canceled"),
+            header="x-pushinpay-signature", signature_format="timestamped"
+        )
+
+def test_pushinpay_timestamped_stale_signature(pushinpay):
+    timestamp = str(int(time.time()) - 3600)
+    signature = pushinpay.sign(pushinpay_message(timestamp, BODY))
+    with pytest.raises(InvalidSignature) as error:
+        verify_pushinpay_signature(
+            {"x-pushinpay-signature": f"t={timestamp},v1={signature}"}, BODY,
+            header="x-pushinpay-signature", signature_format="timestamped"
+        )
+    assert error.value.reason == "timestamp fora da tolerância"
+
+def test_pushinpay_body_signature(pushinpay):
+    headers = {"x-signature": pushinpay.sign(BODY).upper()}
+    verify_pushinpay_signature(headers, BODY, header="x-signature", signature_format="body")
+
+    with pytest.raises(InvalidSignature):
+        verify_pushinpay_signature({"x-signature": "0" * 64}, BODY, header="x-signature", signature_format="body")
@@ -0,0 +1,213 @@
+"""
+Testes do single-flight (api/singleflight.py) e das leituras compartilhadas (Query.execute_shared)
+
+Uso:
+    python -m pytest tests/test_singleflight.py
+"""
+
+import time
+import asyncio
+import itertools
+
+import pytest
+from supabase import create_client
+
+from api.queries import Query, select, read_flight
+from api.singleflight import SingleFlight
+
+names = itertools.count()
+
+def new_flight() -> SingleFlight:
+    # Cada instância se registra em flights pelo nome
+    return SingleFlight(f"teste-{next(names)}")
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = new_flight()
+        executions = 0
+        release = asyncio.Event()
+
+        async def fetch():
+            nonlocal executions
+            executions += 1
+            await release.wait()
+            return {"status": "approved"}
+
+        calls = [asyncio.create_task(flight.do("pagamento-1", fetch)) for _ in range(5)]
+        await settle()
+        assert flight.is_in_flight("pagamento-1")
+        release.set()
+        results = await asyncio.gather(*calls)
+        return flight, executions, results
+
+    flight, executions, results = asyncio.run(scenario())
+    assert executions == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats()["labels"][flight.name] == {
+        "calls": 5, "executions": 1, "shared": 4, "max_shared": 4, "coalesced_ratio": 0.8
+    }
+    assert not flight.is_in_flight("pagamento-1")
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight = new_flight()
+
+        async def fetch(key):
+            await asyncio.sleep(0)
+            return key
+
+        return await asyncio.gather(flight.do("a", lambda: fetch("a")), flight.do("b", lambda: fetch("b"))), flight
+
+    results, flight = asyncio.run(scenario())
+    assert results == ["a", "b"]
+    assert flight.executions == 2
+
+def test_exception_is_shared():
+    async def scenario():
+        flight = new_flight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            raise RuntimeError("gateway fora do ar")
+
+        calls = [asyncio.create_task(flight.do("pagamento-1", fetch)) for _ in range(3)]
+        await settle()
+        release.set()
+        return await asyncio.gather(*calls, return_exceptions=True), flight
+
+    results, flight = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.executions == 1
+
+def test_nothing_is_cached_after_completion():
+    async def scenario():
+        flight = new_flight()
+        counter = itertools.count()
+
+        async def fetch():
+            return next(counter)
+
+        first = await flight.do("chave", fetch)
+        second = await flight.do("chave", fetch)
+        return first, second
+
+    assert asyncio.run(scenario()) == (0, 1)
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = new_flight()
+        release = asyncio.Event()
+        finished = []
+
+        async def fetch():
+            await release.wait()
+            finished.append(True)
+            return "resultado"
+
+        leader = asyncio.create_task(flight.do("chave", fetch))
+        await settle()
+        followers = [asyncio.create_task(flight.do("chave", fetch)) for _ in range(2)]
+        await settle()
+
+        # Quem iniciou a execução desiste (ex.: cliente desconectou)
+        leader.cancel()
+        await settle()
+        assert leader.cancelled()
+        assert flight.is_in_flight("chave")
+
+        release.set()
+        results = await asyncio.gather(*followers)
+        return results, finished, flight
+
+    results, finished, flight = asyncio.run(scenario())
+    assert results == ["resultado", "resultado"]
+    assert finished == [True]
+    assert flight.executions == 1
+
+def test_execution_continues_when_every_caller_is_cancelled():
+    async def scenario():
+        flight = new_flight()
+        release = asyncio.Event()
+        finished = []
+
+        async def fetch():
+            await release.wait()
+            finished.append(True)
+            return "resultado"
+
+        caller = asyncio.create_task(flight.do("chave", fetch))
+        await settle()
+        caller.cancel()
+        await settle()
+
+        # Quem chega depois aproveita a execução que continuou
+        late = asyncio.create_task(flight.do("chave", fetch))
+        await settle()
+        release.set()
+        return await late, finished, flight
+
+    result, finished, flight = asyncio.run(scenario())
+    assert result == "resultado"
+    assert finished == [True]
+    assert flight.executions == 1
+    assert not flight.in_flight
+
+@pytest.fixture
+def client():
+    # Cliente apontando para uma porta sem servidor: execute() é substituído nos testes
+    return create_client("http://127.0.0.1:9", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.teste")
+
+@pytest.fixture
+def executions(monkeypatch):
+    calls = []
+
+    def execute(self):
+        calls.append(self._builder.headers.get("accept"))
+        time.sleep(0.05)
+        return object()
+
+    monkeypatch.setattr(Query, "execute", execute)
+    return calls
+
+def test_shared_reads_key_on_filters_and_shape(client, executions):
+    async def scenario():
+        return await asyncio.gather(
+            select("teste.bot", "bots", ("id",), client=client).eq("token", "a").execute_shared(),
+            select("teste.bot", "bots", ("id",), client=client).eq("token", "a").execute_shared(),
+            # Outro filtro e outro formato da resposta (.single() muda o Accept)
+            select("teste.bot", "bots", ("id",), client=client).eq("token", "b").execute_shared(),
+            select("teste.bot", "bots", ("id",), client=client).eq("token", "a").single().execute_shared()
+        )
+
+    first, second, other, single = asyncio.run(scenario())
+    assert first is second
+    assert other is not first and single is not first
+    assert len(executions) == 3
+    assert "application/vnd.pgrst.object+json" in executions
+    assert not read_flight.in_flight
+
+def test_shared_reads_key_on_credentials(executions):
+    url = "http://127.0.0.1:9"
+    anon = create_client(url, "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.anon")
+    service = create_client(url, "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZSJ9.service")
+
+    async def scenario():
+        return await asyncio.gather(
+            select("teste.bot", "bots", ("id",), client=anon).eq("token", "a").execute_shared(),
+            select("teste.bot", "bots", ("id",), client=service).eq("token", "a").execute_shared()
+        )
+
+    first, second = asyncio.run(scenario())
+    assert first is not second
+    assert len(executions) == 2
+
+def test_shared_reads_reject_writes(client):
+    query = Query("teste.update", "bots", "id", client.table("bots").update({"name": "x"}))
+
+    with pytest.raises(ValueError):
+        asyncio.run(query.execute_shared())
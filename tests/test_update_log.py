@@ -0,0 +1,156 @@
+"""
+Testes do log de updates do webhook (api/update_log.py)
+
+Uso:
+    python -m pytest tests/test_update_log.py
+"""
+
+import os
+
+import pytest
+
+from api.update_log import UpdateLog, HEADER, OFFSETS_FILE, SEGMENT_SUFFIX
+
+def open_log(directory, **kwargs) -> UpdateLog:
+    # fsync só no close (a thread não interfere nos testes)
+    return UpdateLog(str(directory), fsync_interval=60, **kwargs)
+
+def segment_paths(directory):
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)
+    )
+
+@pytest.fixture
+def directory(tmp_path):
+    return tmp_path / "log"
+
+def test_recovers_updates_without_ack(directory):
+    log = open_log(directory)
+    assert log.open() == []
+    first = log.append("bot-a", b"update-1")
+    second = log.append("bot-a", b"update-2")
+    third = log.append("bot-b", b"update-3")
+    log.ack(second, update_id=2)
+    log.close()
+
+    log = open_log(directory)
+    pending = log.open()
+    assert [(record.offset, record.key, record.data) for record in pending] == [
+        (first, "bot-a", b"update-1"), (third, "bot-b", b"update-3")
+    ]
+    # bot-a ainda tem o primeiro update pendente
+    assert log.watermarks == {"bot-a": first - 1, "bot-b": third - 1}
+    assert log.next_offset == third + 1
+    log.close()
+
+def test_truncated_tail_is_discarded(directory):
+    log = open_log(directory)
+    log.open()
+    log.append("bot-a", b"update-1")
+    log.append("bot-a", b"update-2")
+    log.append("bot-a", b"update-3")
+    log.close()
+
+    # Queda no meio da escrita do último registro
+    path = segment_paths(directory)[-1]
+    size = os.path.getsize(path)
+    with open(path, "r+b") as file:
+        file.truncate(size - 4)
+
+    log = open_log(directory)
+    pending = log.open()
+    assert [record.data for record in pending] == [b"update-1", b"update-2"]
+    assert os.path.getsize(path) == 2 * (HEADER.size + len("bot-a") + len(b"update-1"))
+
+    # O offset do registro cortado é reutilizado e o log continua legível
+    offset = log.append("bot-a", b"update-3")
+    assert offset == pending[-1].offset + 1
+    log.close()
+
+    log = open_log(directory)
+    assert [record.data for record in log.open()] == [b"update-1", b"update-2", b"update-3"]
+    log.close()
+
+def test_corrupted_record_stops_the_scan(directory):
+    log = open_log(directory)
+    log.open()
+    log.append("bot-a", b"update-1")
+    log.append("bot-a", b"update-2")
+    log.close()
+
+    # Byte trocado nos dados do segundo registro: o crc não confere
+    path = segment_paths(directory)[-1]
+    with open(path, "r+b") as file:
+        file.seek(-1, os.SEEK_END)
+        file.write(b"X")
+
+    log = open_log(directory)
+    assert [record.data for record in log.open()] == [b"update-1"]
+    log.close()
+
+def test_watermarks_survive_compaction(directory):
+    # Um registro por segmento: cada append abre um segmento novo
+    log = open_log(directory, segment_bytes=1)
+    log.open()
+    offsets_a = [log.append("bot-a", f"a-{index}".encode()) for index in range(3)]
+    pending_b = log.append("bot-b", b"b-0")
+    last_a = log.append("bot-a", b"a-3")
+    for update_id, offset in enumerate(offsets_a + [last_a]):
+        log.ack(offset, update_id=update_id)
+
+    # Só o segmento com o update pendente de bot-b (e os seguintes) fica
+    assert log.compact() == 3
+    assert log.segments[0].base == pending_b
+    assert os.path.exists(os.path.join(directory, OFFSETS_FILE))
+    # bot-b ainda não teve ack: sem watermark
+    assert log.watermarks == {"bot-a": last_a}
+    log.close()
+
+    log = open_log(directory, segment_bytes=1)
+    pending = log.open()
+    assert [(record.offset, record.key) for record in pending] == [(pending_b, "bot-b")]
+    # A watermark de bot-a vem de offsets.json e dos ACKs que sobraram
+    assert log.watermarks["bot-a"] == last_a
+    assert log.watermarks["bot-b"] == pending_b - 1
+
+    log.ack(pending_b, update_id=100)
+    assert log.watermarks["bot-b"] == pending_b
+    log.close()
+
+def test_claim_rejects_repeated_update_id(directory):
+    log = open_log(directory)
+    log.open()
+    assert log.claim("bot-a", 10)
+    assert not log.claim("bot-a", 10)
+    # Mesmo update_id de outro bot é outro update
+    assert log.claim("bot-b", 10)
+    # Sem update_id não há como deduplicar
+    assert log.claim("bot-a", None)
+    assert log.duplicates == 1
+    log.close()
+
+def test_seen_update_ids_survive_restart_and_compaction(directory):
+    log = open_log(directory, segment_bytes=1)
+    log.open()
+    for update_id in (1, 2, 3):
+        assert log.claim("bot-a", update_id)
+        log.ack(log.append("bot-a", b"update"), update_id=update_id)
+    log.compact()
+    log.close()
+
+    log = open_log(directory, segment_bytes=1)
+    log.open()
+    for update_id in (1, 2, 3):
+        assert not log.claim("bot-a", update_id)
+    assert log.claim("bot-a", 4)
+    log.close()
+
+def test_seen_update_ids_are_bounded(directory):
+    log = open_log(directory, seen_per_key=2)
+    log.open()
+    for update_id in (1, 2, 3):
+        assert log.claim("bot-a", update_id)
+    # O mais antigo saiu do conjunto
+    assert log.claim("bot-a", 1)
+    assert not log.claim("bot-a", 3)
+    log.close()
@@ -0,0 +1,716 @@
+"""
+Consultor de índices para os padrões de consulta da API
+
+Uso:
+    python -m tools.index_advisor [--write migrations/003_query_pattern_indexes.sql]
+                                  [--verify postgresql://usuario@localhost/banco]
+
+1. Extrai de api/ (via ast) as cadeias de consulta do Supabase: tabela,
+   filtros .eq/.in_/.is_/.gt/.gte/.lt/.lte, ordenação e paginação por
+   cursor, inclusive as montadas em etapas (query = query.eq(...)) e as
+   das funções do data layer (select, update_returning, insert_if_absent).
+2. Lê os índices existentes nos arquivos .sql do repositório (CREATE INDEX,
+   PRIMARY KEY e UNIQUE).
+3. Para cada padrão sem índice que o atenda, propõe um índice composto
+   (igualdades, depois ordenação/intervalo) e parcial quando o filtro
+   compara uma coluna com uma constante (is_active = true, used_at IS NULL).
+   Tabelas usadas pela API sem CREATE TABLE nos arquivos .sql (criadas
+   direto no Supabase, ex.: user_accesses) também recebem índices, dentro
+   de um bloco que só cria o índice se a tabela existir.
+4. --write grava a migração; --verify cria as tabelas e os índices em um
+   schema temporário de um Postgres local e confere com EXPLAIN que cada
+   padrão é atendido por um índice (com enable_seqscan desligado, já que
+   as tabelas estão vazias). Requer psycopg2.
+"""
+
+import ast
+import re
+import sys
+import glob
+import argparse
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple, Set
+
+ROOT = Path(__file__).resolve().parent.parent
+
+FILTER_OPERATORS = {"eq": "=", "in_": "in", "is_": "is", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+RANGE_METHODS = {"gt", "gte", "lt", "lte"}
+KEYSET_FUNCTIONS = {"fetch_page", "iter_rows"}
+KEYSET_ORDER = ("created_at", "id")
+
+# Funções do data layer (api/queries.py): posição do argumento da tabela
+DATA_LAYER_FUNCTIONS = {"select": 1, "update_returning": 1, "insert_if_absent": 1}
+
+MAX_IDENTIFIER = 63
+
+class QueryPattern:
+    """Filtros e ordenação de uma consulta sobre uma tabela"""
+
+    def __init__(self, table: str):
+        self.table = table
+        self.equalities: List[str] = []
+        self.predicates: Dict[str, str] = {}
+        self.ranges: List[str] = []
+        self.order: List[str] = []
+        self.sources: Set[str] = set()
+
+    def copy(self) -> "QueryPattern":
+        pattern = QueryPattern(self.table)
+        pattern.equalities = list(self.equalities)
+        pattern.predicates = dict(self.predicates)
+        pattern.ranges = list(self.ranges)
+        pattern.order = list(self.order)
+        pattern.sources = set(self.sources)
+        return pattern
+
+    def add_equality(self, column: str):
+        if column not in self.equalities:
+            self.equalities.append(column)
+
+    def add_range(self, column: str):
+        if column not in self.ranges:
+            self.ranges.append(column)
+
+    def with_keyset(self) -> "QueryPattern":
+        pattern = self.copy()
+        pattern.order = list(KEYSET_ORDER)
+        pattern.add_range(KEYSET_ORDER[0])
+        return pattern
+
+    @property
+    def has_filters(self) -> bool:
+        return bool(self.equalities or self.predicates or self.ranges or self.order)
+
+    @property
+    def signature(self) -> Tuple:
+        return (
+            self.table, tuple(sorted(self.equalities)), tuple(sorted(self.predicates.items())),
+            tuple(sorted(self.ranges)), tuple(self.order)
+        )
+
+    def describe(self) -> str:
+        parts = [f"{column} = ?" for column in self.equalities]
+        parts += [predicate for _, predicate in sorted(self.predicates.items())]
+        parts += [f"{column} > ?" for column in self.ranges if column not in self.order]
+        text = " AND ".join(parts) or "(sem filtro)"
+        if self.order:
+            text += f" ORDER BY {', '.join(self.order)}"
+        return f"{self.table}: {text}"
+
+class Index:
+    """Índice existente ou proposto"""
+
+    def __init__(self, name: str, table: str, columns: List[str], unique: bool = False,
+                 predicate: Optional[str] = None, source: str = ""):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+        self.predicate = normalize_predicate(predicate) if predicate else None
+        self.source = source
+        self.patterns: List[QueryPattern] = []
+
+    def covers(self, pattern: QueryPattern) -> bool:
+        if self.table != pattern.table:
+            return False
+
+        equalities = set(pattern.equalities)
+        predicate_columns = set(pattern.predicates)
+
+        if self.predicate and self.predicate not in pattern.predicates.values():
+            return False
+        if self.predicate:
+            predicate_columns = {
+                column for column, text in pattern.predicates.items() if text != self.predicate
+            }
+
+        # Índice único cujas colunas são todas comparadas por igualdade: no máximo uma linha
+        if self.unique and not self.predicate and set(self.columns) <= equalities:
+            return True
+
+        leading = equalities | predicate_columns
+        if not leading:
+            wanted = pattern.order or pattern.ranges[:1]
+            return bool(wanted) and self.columns[:len(wanted)] == list(wanted)
+
+        if set(self.columns[:len(leading)]) != leading:
+            return False
+
+        if pattern.order:
+            rest = self.columns[len(leading):]
+            return rest[:len(pattern.order)] == pattern.order
+        return True
+
+    def definition(self) -> str:
+        unique = "UNIQUE " if self.unique else ""
+        sql = f"CREATE {unique}INDEX IF NOT EXISTS {self.name}\n  ON public.{self.table} ({', '.join(self.columns)})"
+        if self.predicate:
+            sql += f"\n  WHERE {self.predicate}"
+        return sql + ";"
+
+def normalize_predicate(text: str) -> str:
+    text = re.sub(r"\s+", " ", text.strip().strip("()")).lower()
+    text = re.sub(r"^public\.\w+\.", "", text)
+    return text.replace("= true", "= true").replace("is null", "is null")
+
+def _constant(node: ast.AST) -> Any:
+    return node.value if isinstance(node, ast.Constant) else None
+
+def _module_constants(tree: ast.Module) -> Dict[str, str]:
+    """Constantes de texto do módulo (ex.: ROLLUP_TABLE = "sales_daily_rollups")"""
+    constants = {}
+    for node in tree.body:
+        if (
+            isinstance(node, ast.Assign) and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name) and isinstance(_constant(node.value), str)
+        ):
+            constants[node.targets[0].id] = node.value.value
+    return constants
+
+def _is_constant(node: ast.AST) -> bool:
+    return isinstance(node, ast.Constant)
+
+def _flatten(node: ast.AST) -> Tuple[ast.AST, List[Tuple[str, ast.Call]]]:
+    """Separa a cadeia a.b(...).c(...) em (raiz, [(método, chamada), ...])"""
+    calls = []
+    while isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+        calls.append((node.func.attr, node))
+        node = node.func.value
+    calls.reverse()
+    return node, calls
+
+class PatternExtractor:
+    """Percorre um módulo e coleta os padrões de consulta"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.relative = path.relative_to(ROOT).as_posix()
+        self.patterns: List[QueryPattern] = []
+        self.keyset_functions: Set[str] = set()
+        self.function_patterns: Dict[str, List[QueryPattern]] = {}
+        self.constants: Dict[str, str] = {}
+
+    def _text(self, node: Optional[ast.AST]) -> Optional[str]:
+        value = _constant(node) if node is not None else None
+        if isinstance(value, str):
+            return value
+        if isinstance(node, ast.Name):
+            return self.constants.get(node.id)
+        return None
+
+    def run(self) -> List[QueryPattern]:
+        tree = ast.parse(self.path.read_text(encoding="utf-8"))
+        self.constants = _module_constants(tree)
+
+        scopes = [node for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        for scope in scopes:
+            self._scan_function(scope)
+
+        # Padrões de funções passadas para a paginação por cursor ganham a ordenação (created_at, id)
+        for name in self.keyset_functions:
+            for pattern in self.function_patterns.get(name, []):
+                self.patterns.append(pattern.with_keyset())
+
+        return self.patterns
+
+    def _source(self, node: ast.AST) -> str:
+        return f"{self.relative}:{node.lineno}"
+
+    def _scan_function(self, function: ast.AST):
+        scope: Dict[str, QueryPattern] = {}
+        collected: List[QueryPattern] = []
+
+        nodes = [
+            node for node in ast.walk(function)
+            if isinstance(node, (ast.Assign, ast.Call))
+            and node is not function
+        ]
+        # Chamadas internas de uma cadeia são processadas pela chamada mais externa
+        inner = set()
+        for node in nodes:
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Call):
+                inner.add(id(node.func.value))
+
+        for node in sorted(nodes, key=lambda item: (item.lineno, item.col_offset)):
+            if isinstance(node, ast.Assign):
+                if len(node.targets) == 1 and isinstance(node.targets[0], ast.Name) and isinstance(node.value, ast.Call):
+                    pattern = self._build(node.value, scope)
+                    if pattern is not None:
+                        scope[node.targets[0].id] = pattern
+                continue
+
+            if id(node) in inner:
+                continue
+
+            if isinstance(node.func, ast.Name) and node.func.id in KEYSET_FUNCTIONS and node.args:
+                self._mark_keyset(node.args[0], scope, collected)
+
+            pattern = self._build(node, scope)
+            if pattern is not None and pattern.has_filters:
+                collected.append(pattern)
+
+        # Padrões atribuídos a variáveis também são consultas executadas
+        for pattern in scope.values():
+            if pattern.has_filters:
+                collected.append(pattern)
+
+        self.patterns.extend(collected)
+        self.function_patterns.setdefault(function.name, []).extend(collected)
+
+    def _mark_keyset(self, argument: ast.AST, scope: Dict[str, QueryPattern], collected: List[QueryPattern]):
+        if isinstance(argument, ast.Name):
+            self.keyset_functions.add(argument.id)
+        elif isinstance(argument, ast.Lambda):
+            body = argument.body
+            if isinstance(body, ast.Call) and isinstance(body.func, ast.Name) and body.func.id not in DATA_LAYER_FUNCTIONS:
+                self.keyset_functions.add(body.func.id)
+                return
+            pattern = self._build(body, scope)
+            if pattern is not None:
+                collected.append(pattern.with_keyset())
+
+    def _build(self, node: ast.Call, scope: Dict[str, QueryPattern]) -> Optional[QueryPattern]:
+        root, calls = _flatten(node)
+        pattern = None
+
+        if isinstance(root, ast.Name) and root.id in scope:
+            pattern = scope[root.id].copy()
+        elif isinstance(root, ast.Call) and isinstance(root.func, ast.Name) and root.func.id in DATA_LAYER_FUNCTIONS:
+            pattern = self._data_layer_pattern(root)
+
+        for method, call in calls:
+            argument = self._text(call.args[0]) if call.args else None
+            if method == "table" and argument:
+                pattern = QueryPattern(argument)
+            elif pattern is None or not argument:
+                continue
+            elif method in FILTER_OPERATORS and len(call.args) >= 2:
+                self._add_filter(pattern, method, argument, call.args[1])
+            elif method == "order":
+                pattern.order.append(argument)
+
+        if pattern is not None:
+            pattern.sources.add(self._source(node))
+        return pattern
+
+    def _data_layer_pattern(self, call: ast.Call) -> Optional[QueryPattern]:
+        position = DATA_LAYER_FUNCTIONS[call.func.id]
+        table = self._text(call.args[position]) if len(call.args) > position else None
+        if not table:
+            return None
+
+        pattern = QueryPattern(table)
+
+        if call.func.id == "update_returning" and len(call.args) > 3 and isinstance(call.args[3], ast.Dict):
+            for key in call.args[3].keys:
+                if self._text(key):
+                    pattern.add_equality(self._text(key))
+
+        if call.func.id == "insert_if_absent":
+            conflict = next((keyword.value for keyword in call.keywords if keyword.arg == "on_conflict"), None)
+            if conflict is None and len(call.args) > 3:
+                conflict = call.args[3]
+            if self._text(conflict):
+                for column in self._text(conflict).split(","):
+                    pattern.add_equality(column.strip())
+
+        return pattern
+
+    def _add_filter(self, pattern: QueryPattern, method: str, column: str, value: ast.AST):
+        # Filtro em recurso embutido ("bots.token"): padrão na outra tabela
+        if "." in column:
+            table, column = column.split(".", 1)
+            foreign = QueryPattern(table)
+            foreign.add_equality(column)
+            foreign.sources = pattern.sources
+            self.patterns.append(foreign)
+            return
+
+        if method == "is_":
+            literal = str(_constant(value)).lower()
+            pattern.predicates[column] = f"{column} is {'null' if literal in ('null', 'none') else literal}"
+        elif method == "eq" and _is_constant(value) and isinstance(value.value, bool):
+            pattern.predicates[column] = f"{column} = {str(value.value).lower()}"
+        elif method in RANGE_METHODS:
+            pattern.add_range(column)
+        else:
+            pattern.add_equality(column)
+
+def extract_patterns(paths: List[Path]) -> List[QueryPattern]:
+    """Padrões únicos (por tabela, filtros e ordenação) com as origens agrupadas"""
+    unique: Dict[Tuple, QueryPattern] = {}
+    for path in paths:
+        for pattern in PatternExtractor(path).run():
+            if not pattern.has_filters:
+                continue
+            existing = unique.get(pattern.signature)
+            if existing:
+                existing.sources |= pattern.sources
+            else:
+                unique[pattern.signature] = pattern
+    return sorted(unique.values(), key=lambda pattern: pattern.signature)
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+def _balanced(text: str, start: int) -> Tuple[str, int]:
+    """Conteúdo entre o parêntese em text[start] e o seu par"""
+    depth = 0
+    for position in range(start, len(text)):
+        if text[position] == "(":
+            depth += 1
+        elif text[position] == ")":
+            depth -= 1
+            if depth == 0:
+                return text[start + 1:position], position + 1
+    return text[start + 1:], len(text)
+
+def _strip_sql_comments(sql: str) -> str:
+    return re.sub(r"--[^\n]*", "", sql)
+
+TABLE_RE = re.compile(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?:public\.)?\"?(\w+)\"?\s*\(", re.I)
+INDEX_RE = re.compile(
+    r"CREATE\s+(UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+ON\s+(?:ONLY\s+)?"
+    r"(?:public\.)?(\w+)\s*(?:USING\s+\w+\s*)?\(",
+    re.I
+)
+ADD_COLUMN_RE = re.compile(r"ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:public\.)?(\w+)\s+(ADD\s+COLUMN[^;]+);", re.I)
+
+class Schema:
+    """Tabelas, tipos de coluna e índices declarados nos arquivos SQL"""
+
+    def __init__(self):
+        self.columns: Dict[str, Dict[str, str]] = {}
+        self.indexes: List[Index] = []
+
+    def load(self, path: Path):
+        sql = _strip_sql_comments(path.read_text(encoding="utf-8", errors="ignore"))
+        source = path.relative_to(ROOT).as_posix() if path.is_relative_to(ROOT) else str(path)
+
+        for match in TABLE_RE.finditer(sql):
+            table = match.group(1)
+            body, _ = _balanced(sql, match.end() - 1)
+            self._load_table(table, body, source)
+
+        for match in INDEX_RE.finditer(sql):
+            body, end = _balanced(sql, match.end() - 1)
+            rest = sql[end:sql.find(";", end)] if sql.find(";", end) != -1 else ""
+            where = re.match(r"\s*WHERE\s+(.+)", rest, re.I | re.S)
+            columns = [part.split()[0].strip('"') for part in _split_top_level(body)]
+            self.indexes.append(Index(
+                match.group(2), match.group(3), columns, bool(match.group(1)),
+                where.group(1) if where else None, source
+            ))
+
+        for match in ADD_COLUMN_RE.finditer(sql):
+            table = match.group(1)
+            for clause in _split_top_level(match.group(2)):
+                definition = re.sub(r"^ADD\s+COLUMN\s+(IF\s+NOT\s+EXISTS\s+)?", "", clause, flags=re.I)
+                parts = definition.split()
+                if len(parts) >= 2:
+                    self.columns.setdefault(table, {})[parts[0].strip('"')] = _column_type(" ".join(parts[1:]))
+
+    def _load_table(self, table: str, body: str, source: str):
+        columns = self.columns.setdefault(table, {})
+        for definition in _split_top_level(body):
+            upper = definition.upper()
+            constraint = re.match(r"(?:CONSTRAINT\s+\w+\s+)?(PRIMARY\s+KEY|UNIQUE)\s*\(", definition, re.I)
+            if constraint:
+                inner, _ = _balanced(definition, definition.index("(", constraint.start(1)))
+                key_columns = [column.strip().strip('"') for column in inner.split(",")]
+                kind = "pkey" if upper.startswith("PRIMARY") or "PRIMARY" in constraint.group(1).upper() else "key"
+                self.indexes.append(Index(f"{table}_{'_'.join(key_columns)}_{kind}", table, key_columns, True, None, source))
+                continue
+            if upper.startswith(("FOREIGN", "CHECK", "CONSTRAINT", "EXCLUDE")):
+                continue
+
+            parts = definition.split()
+            if len(parts) < 2:
+                continue
+            column = parts[0].strip('"')
+            columns[column] = _column_type(" ".join(parts[1:]))
+            if "PRIMARY KEY" in upper or re.search(r"\bUNIQUE\b", upper):
+                kind = "pkey" if "PRIMARY KEY" in upper else "key"
+                self.indexes.append(Index(f"{table}_{column}_{kind}", table, [column], True, None, source))
+
+    def column_type(self, table: str, column: str) -> str:
+        known = self.columns.get(table, {}).get(column)
+        if known:
+            return known
+        if column.endswith("_at"):
+            return "timestamptz"
+        if column in ("active", "enabled") or column.startswith("is_"):
+            return "boolean"
+        return "text"
+
+def _column_type(definition: str) -> str:
+    text = definition.upper()
+    if text.startswith("UUID"):
+        return "uuid"
+    if text.startswith("TIMESTAMP"):
+        return "timestamptz"
+    if text.startswith("DATE"):
+        return "date"
+    if text.startswith("BOOL"):
+        return "boolean"
+    if text.startswith(("INT", "BIGINT", "SMALLINT", "SERIAL", "BIGSERIAL")):
+        return "bigint"
+    if text.startswith(("DECIMAL", "NUMERIC", "REAL", "DOUBLE", "FLOAT")):
+        return "numeric"
+    if text.startswith("JSON"):
+        return "jsonb"
+    return "text"
+
+def _index_name(table: str, columns: List[str], partial: bool) -> str:
+    name = f"{table}_{'_'.join(columns)}{'_partial' if partial else ''}_idx"
+    if len(name) > MAX_IDENTIFIER:
+        name = name[:MAX_IDENTIFIER - 4].rstrip("_") + "_idx"
+    return name
+
+def recommend(
+    patterns: List[QueryPattern],
+    existing: List[Index],
+    tables: Set[str]
+) -> Tuple[List[Index], Dict[Tuple, Index]]:
+    """
+    Args:
+        tables: Tabelas declaradas nos arquivos SQL; os índices de outras
+            tabelas são gravados com guarda (ver render_migration)
+
+    Returns:
+        (índices propostos, índice que atende cada padrão já coberto)
+    """
+    covered: Dict[Tuple, Index] = {}
+    candidates: List[Index] = []
+
+    # Tabelas sem CREATE TABLE: o Supabase cria a chave primária em id
+    existing = existing + [
+        Index(f"{table}_pkey", table, ["id"], True, source="chave primária presumida")
+        for table in sorted({pattern.table for pattern in patterns} - tables)
+    ]
+
+    for pattern in patterns:
+        index = next((index for index in existing if index.covers(pattern)), None)
+        if index:
+            covered[pattern.signature] = index
+            continue
+
+        predicate = " and ".join(text for _, text in sorted(pattern.predicates.items())) or None
+        columns = list(pattern.equalities)
+        if pattern.order:
+            columns += [column for column in pattern.order if column not in columns]
+        elif pattern.ranges:
+            columns.append(pattern.ranges[0])
+        if not columns:
+            # Só há predicados constantes: índice parcial na primeira coluna do predicado
+            columns = [sorted(pattern.predicates)[0]]
+            predicate = None if len(pattern.predicates) == 1 else predicate
+
+        candidate = Index(_index_name(pattern.table, columns, bool(predicate)), pattern.table, columns, False, predicate)
+        candidate.patterns.append(pattern)
+        candidates.append(candidate)
+
+    # Um índice cujas colunas começam com as de outro (mesmo predicado) atende aos dois
+    selected: List[Index] = []
+    for candidate in sorted(candidates, key=lambda index: -len(index.columns)):
+        wider = next((
+            index for index in selected
+            if index.table == candidate.table and index.predicate == candidate.predicate
+            and all(index.covers(pattern) for pattern in candidate.patterns)
+        ), None)
+        if wider:
+            wider.patterns.extend(candidate.patterns)
+        else:
+            selected.append(candidate)
+
+    return sorted(selected, key=lambda index: index.name), covered
+
+def _guarded(index: Index) -> str:
+    """Definição que só cria o índice se a tabela existir"""
+    body = index.definition().replace("\n", "\n    ")
+    return (
+        "DO $$\nBEGIN\n"
+        f"  IF to_regclass('public.{index.table}') IS NOT NULL THEN\n    {body}\n  END IF;\n"
+        "END $$;"
+    )
+
+def render_migration(indexes: List[Index], tables: Set[str]) -> str:
+    """
+    Args:
+        tables: Tabelas declaradas nos arquivos SQL; índices de outras
+            tabelas só são criados se a tabela existir no banco
+    """
+    lines = [
+        "-- Índices para os padrões de consulta da API",
+        "--",
+        "-- Gerado por tools/index_advisor.py a partir dos filtros usados em api/.",
+        "-- Cada índice lista as consultas que ele atende e os arquivos que as fazem.",
+        ""
+    ]
+    for index in indexes:
+        for pattern in index.patterns:
+            lines.append(f"-- {pattern.describe()}")
+            # Só o arquivo: números de linha ficariam desatualizados a cada edição
+            for path in sorted({source.rsplit(":", 1)[0] for source in pattern.sources}):
+                lines.append(f"--   {path}")
+        if index.table in tables:
+            lines.append(index.definition())
+        else:
+            lines.append(f"-- {index.table} não tem CREATE TABLE nos arquivos .sql (criada no Supabase)")
+            lines.append(_guarded(index))
+        lines.append("")
+    return "\n".join(lines)
+
+def _literal(column_type: str) -> str:
+    return {
+        "uuid": "'00000000-0000-0000-0000-000000000000'::uuid",
+        "timestamptz": "now()",
+        "date": "current_date",
+        "boolean": "true",
+        "bigint": "0",
+        "numeric": "0",
+        "jsonb": "'{}'::jsonb"
+    }.get(column_type, "'x'")
+
+def explain_sql(pattern: QueryPattern, schema: Schema) -> str:
+    conditions = [f"{column} = {_literal(schema.column_type(pattern.table, column))}" for column in pattern.equalities]
+    conditions += [text for _, text in sorted(pattern.predicates.items())]
+    conditions += [
+        f"{column} > {_literal(schema.column_type(pattern.table, column))}"
+        for column in pattern.ranges
+    ]
+    sql = f"SELECT * FROM {pattern.table}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if pattern.order:
+        sql += " ORDER BY " + ", ".join(pattern.order) + " LIMIT 50"
+    return sql
+
+def _plan_indexes(plan: Dict[str, Any]) -> List[str]:
+    found = []
+    if "Index Name" in plan:
+        found.append(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        found.extend(_plan_indexes(child))
+    return found
+
+def verify(dsn: str, patterns: List[QueryPattern], schema: Schema, indexes: List[Index]) -> bool:
+    """
+    Cria tabelas e índices (existentes + propostos) em um schema temporário e
+    confere com EXPLAIN que cada padrão usa um índice
+    """
+    try:
+        import psycopg2
+    except ImportError:
+        print("psycopg2 não está instalado: pip install psycopg2-binary")
+        return False
+
+    tables: Dict[str, Set[str]] = {}
+    for pattern in patterns:
+        tables.setdefault(pattern.table, set()).update(
+            pattern.equalities, pattern.predicates, pattern.ranges, pattern.order
+        )
+    for index in indexes:
+        tables.setdefault(index.table, set()).update(index.columns)
+    for index in schema.indexes:
+        if index.table in tables:
+            tables[index.table].update(index.columns)
+
+    connection = psycopg2.connect(dsn)
+    ok = True
+    try:
+        cursor = connection.cursor()
+        cursor.execute("CREATE SCHEMA index_advisor")
+        cursor.execute("SET search_path TO index_advisor")
+
+        for table, columns in sorted(tables.items()):
+            definitions = [f"{column} {schema.column_type(table, column)}" for column in sorted(columns | {"id"})]
+            cursor.execute(f"CREATE TABLE {table} ({', '.join(definitions)})")
+
+        for index in [index for index in schema.indexes if index.table in tables] + indexes:
+            definition = index.definition().replace("public.", "").replace("IF NOT EXISTS ", "")
+            definition = definition.replace(f"INDEX {index.name}", f"INDEX {index.name}_{id(index)}")
+            cursor.execute(definition)
+
+        cursor.execute("SET enable_seqscan = off")
+        for pattern in patterns:
+            sql = explain_sql(pattern, schema)
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0][0]["Plan"]
+            used = [name.rsplit("_", 1)[0] for name in _plan_indexes(plan)]
+            sort = '"Sort"' in str(plan) or plan.get("Node Type") == "Sort"
+            if used and not (pattern.order and sort):
+                print(f"  OK    {pattern.describe()}  ->  {', '.join(used)}")
+            else:
+                ok = False
+                print(f"  FALHA {pattern.describe()}  ->  {plan['Node Type']}")
+    finally:
+        connection.rollback()
+        connection.close()
+
+    return ok
+
+def default_paths() -> Tuple[List[Path], List[Path]]:
+    sources = sorted(path for path in (ROOT / "api").rglob("*.py") if "__pycache__" not in path.parts)
+    sql_files = sorted(
+        Path(path) for path in glob.glob(str(ROOT / "**" / "*.sql"), recursive=True)
+        if "node_modules" not in Path(path).parts
+    )
+    return sources, sql_files
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--write", metavar="ARQUIVO", help="Grava a migração com os índices propostos")
+    parser.add_argument("--verify", metavar="DSN", help="Confere os padrões com EXPLAIN em um Postgres local")
+    args = parser.parse_args()
+
+    sources, sql_files = default_paths()
+    output = Path(args.write).resolve() if args.write else None
+
+    schema = Schema()
+    for path in sql_files:
+        if path != output:
+            schema.load(path)
+
+    patterns = extract_patterns(sources)
+    indexes, covered = recommend(patterns, schema.indexes, set(schema.columns))
+
+    print(f"{len(patterns)} padrões de consulta em {len(sources)} arquivos; {len(schema.indexes)} índices existentes\n")
+    for pattern in patterns:
+        index = covered.get(pattern.signature)
+        if index:
+            status = f"coberto por {index.name} ({index.source})"
+        elif pattern.table not in schema.columns:
+            status = "SEM ÍNDICE (tabela sem CREATE TABLE nos arquivos .sql)"
+        else:
+            status = "SEM ÍNDICE"
+        print(f"  {pattern.describe():<80} {status}")
+
+    print(f"\n{len(indexes)} índices propostos:\n")
+    for index in indexes:
+        print(index.definition() + "\n")
+
+    if output:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(render_migration(indexes, set(schema.columns)), encoding="utf-8")
+        print(f"Migração gravada em {output.relative_to(ROOT) if output.is_relative_to(ROOT) else output}")
+
+    if args.verify:
+        print("\nVerificação com EXPLAIN:")
+        if not verify(args.verify, patterns, schema, indexes):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -178,7 +178,7 @@ async function processPaymentApproval(paymentId: string) {
     // 2. Registrar venda
     const { error: saleError } = await supabase
       .from('sales')
-      .insert({
+      .upsert({
         payment_id: payment.id,
         bot_id: payment.bot_id,
         plan_id: payment.plan_id,
@@ -187,6 +187,9 @@ async function processPaymentApproval(paymentId: string) {
         currency: payment.currency,
         expires_at: expiresAt,
         created_at: new Date().toISOString(),
+      }, {
+        onConflict: 'payment_id',
+        ignoreDuplicates: true
       });
 
     if (saleError) {
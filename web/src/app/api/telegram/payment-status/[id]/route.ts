@@ -155,7 +155,7 @@ export async function GET(
         // Registrar venda
         const { error: saleError } = await supabase
           .from('sales')
-          .insert({
+          .upsert({
             bot_id: payment.bot_id,
             plan_id: payment.plan_id,
             payment_id: paymentId,
@@ -164,6 +164,9 @@ export async function GET(
             amount: payment.amount,
             status: 'completed',
             sale_date: new Date().toISOString()
+          }, {
+            onConflict: 'payment_id',
+            ignoreDuplicates: true
           });
         
         if (saleError) {